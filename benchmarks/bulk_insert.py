@@ -0,0 +1,87 @@
+"""
+Insert throughput benchmark: looping the single insert endpoint versus the bulk insert endpoint.
+
+Usage:
+    Start the server, then run:
+
+        python -m benchmarks.bulk_insert --url http://127.0.0.1:8000 --documents 20000 --batch 5000
+
+Functions:
+    run_single_inserts: Inserts the documents one POST /sablon/ request at a time.
+    run_bulk_inserts: Inserts the documents with POST /sablon/bulk requests.
+    main: Command line entry point.
+"""
+
+import argparse
+import json
+import time
+
+import httpx
+
+DOCUMENT = {"name": "Bulk_Benchmark_Sablon", "age": 30, "gender": "Neutral"}
+
+
+def run_single_inserts(client: httpx.Client, documents: int) -> tuple[float, list[str]]:
+    """
+    Inserts the documents one POST /sablon/ request at a time.
+
+    Args:
+        client (httpx.Client): The client bound to the running server.
+        documents (int): The number of documents to insert.
+
+    Returns:
+        tuple[float, list[str]]: The elapsed time in seconds and the ObjectIds of the inserted documents.
+    """
+    oids = []
+    start = time.perf_counter()
+    for _ in range(documents):
+        oids.append(client.post("/sablon/", json=DOCUMENT).json()["oid"])
+    return time.perf_counter() - start, oids
+
+
+def run_bulk_inserts(client: httpx.Client, documents: int, batch: int) -> tuple[float, list[str]]:
+    """
+    Inserts the documents with POST /sablon/bulk requests of at most batch documents.
+
+    Args:
+        client (httpx.Client): The client bound to the running server.
+        documents (int): The number of documents to insert.
+        batch (int): The number of documents sent per request.
+
+    Returns:
+        tuple[float, list[str]]: The elapsed time in seconds and the ObjectIds of the inserted documents.
+    """
+    oids = []
+    start = time.perf_counter()
+    for offset in range(0, documents, batch):
+        response = client.post("/sablon/bulk", json=[DOCUMENT] * min(batch, documents - offset))
+        oids.extend(response.json()["oids"])
+    return time.perf_counter() - start, oids
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the throughput of both strategies and the speedup as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Single versus bulk insert throughput for the Sablon API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.url, timeout=300) as client:
+        single_time, single_oids = run_single_inserts(client, args.documents)
+        bulk_time, bulk_oids = run_bulk_inserts(client, args.documents, args.batch)
+        for oid in single_oids + bulk_oids:
+            client.delete(f"/sablon/{oid}")
+
+    print(json.dumps({
+        "documents": args.documents,
+        "single_docs_per_s": round(args.documents / single_time, 1),
+        "bulk_docs_per_s": round(args.documents / bulk_time, 1),
+        "speedup": round(single_time / bulk_time, 1),
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
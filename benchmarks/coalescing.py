@@ -0,0 +1,137 @@
+"""
+Insert coalescing benchmark: throughput and latency of concurrent POST /sablon/ requests with the insert coalescer off
+(an insert_one per request) and on (concurrent inserts sharing insert_many calls), at several concurrency levels.
+
+The application is driven in-process through its ASGI interface. --store memory runs on mongomock instead of a local
+mongod (sync backend only); as mongomock has no network, --rtt-ms adds a simulated round trip to every store write so
+that the numbers reflect what a write costs against a real server.
+
+Usage:
+    python -m benchmarks.coalescing --concurrency 1 8 32 128 --requests 2000
+    python -m benchmarks.coalescing --store memory --rtt-ms 0.5 --concurrency 1 8 32 128
+
+Functions:
+    add_round_trip: Makes every write of a store wait for a simulated round trip first.
+    run_level: Measures one concurrency level with the coalescer on or off.
+    main: Command line entry point.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+
+import httpx
+
+from benchmarks.suite import DB_COLLECTION, DB_NAME, _store, run_case
+from utils.db_store import MongoDBStore
+
+NAME = "Coalescing_Benchmark_Sablon"
+
+
+def add_round_trip(store: MongoDBStore, rtt_ms: float) -> None:
+    """
+    Makes every write of a store wait for a simulated round trip first, blocking like pymongo does.
+
+    Args:
+        store (MongoDBStore): The store, its add_document and add_documents methods are replaced on the instance.
+        rtt_ms (float): The round trip in milliseconds.
+    """
+    for name in ("add_document", "add_documents"):
+        method = getattr(store, name)
+
+        @functools.wraps(method)
+        def with_round_trip(*args, _method=method, **kwargs):
+            time.sleep(rtt_ms / 1000)
+            return _method(*args, **kwargs)
+
+        setattr(store, name, with_round_trip)
+
+
+async def run_level(client: httpx.AsyncClient, requests: int, concurrency: int) -> dict:
+    """
+    Measures one concurrency level of POST /sablon/ requests.
+
+    Args:
+        client (httpx.AsyncClient): The client bound to the application.
+        requests (int): The number of requests.
+        concurrency (int): The number of concurrent clients.
+
+    Returns:
+        dict: The throughput, the latency percentiles and the errors of the level.
+    """
+    async def create(i: int) -> None:
+        response = await client.post("/sablon/", json={"name": NAME, "age": i % 100, "gender": "Neutral"})
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code} {response.text[:200]}")
+
+    return await run_case(create, requests, concurrency)
+
+
+async def run(store_kind: str, levels: list[int], requests: int, max_batch: int, max_delay_ms: float,
+              rtt_ms: float) -> dict:
+    """
+    Measures every concurrency level with the coalescer off then on, and deletes the inserted documents.
+    """
+    from routes import sablon_routes  # pylint: disable=import-outside-toplevel
+    from sablon_api import app  # pylint: disable=import-outside-toplevel
+
+    store = _store(store_kind)
+    if store_kind == "memory":
+        if os.environ.get("SABLON_DB_BACKEND", "sync").lower() != "sync":
+            raise SystemExit("Error! --store memory drives the sync backend only, unset SABLON_DB_BACKEND")
+        sablon_routes.sablon_service.db = MongoDBStore(client=store.client)
+    if rtt_ms:
+        add_round_trip(sablon_routes.sablon_service.db, rtt_ms)
+
+    os.environ.update({"SABLON_INSERT_COALESCING": "1", "SABLON_INSERT_BATCH_SIZE": str(max_batch),
+                       "SABLON_INSERT_MAX_DELAY_MS": str(max_delay_ms)})
+
+    results = {"store": store_kind, "rtt_ms": rtt_ms, "requests": requests, "max_batch": max_batch,
+               "max_delay_ms": max_delay_ms, "levels": {}}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+            async with sablon_routes.sablon_lifespan(app) if store_kind == "mongod" else contextlib.nullcontext():
+                for concurrency in levels:
+                    level = {}
+                    for mode in ("off", "on"):
+                        coalescer = sablon_routes.get_insert_coalescer(sablon_routes.sablon_service) if mode == "on" else None
+                        sablon_routes.insert_coalescer = coalescer
+                        level[mode] = await run_level(client, requests, concurrency)
+                        if coalescer is not None:
+                            level[mode]["average_batch"] = coalescer.stats()["average_batch"]
+                        print(f"concurrency {concurrency} coalescer {mode}: {level[mode]}", file=sys.stderr)
+                    results["levels"][concurrency] = level
+    finally:
+        sablon_routes.insert_coalescer = None
+        store.get_collection(DB_NAME, DB_COLLECTION).delete_many({"name": NAME})
+    return results
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the measures of every concurrency level as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Throughput and latency of POST /sablon/ with the insert coalescer off and on")
+    parser.add_argument("--store", choices=["mongod", "memory"], default="mongod")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per level and mode")
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated round trip added to every store write")
+    args = parser.parse_args()
+
+    # The services log every write on stdout, which is kept for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run(args.store, args.concurrency, args.requests, args.max_batch, args.max_delay_ms,
+                                  args.rtt_ms))
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compression microbenchmark of the list responses: the CPU cost of compressing the JSON body of a GET /sablon/ response
+versus the bytes it saves, for every encoding and level, at several list sizes. No server or database is needed.
+
+Usage:
+    python -m benchmarks.compression --sizes 10 100 1000 10000 --repeat 5
+
+Functions:
+    build_body: Builds the JSON body of a list response.
+    measure: Measures the compression of a body with one encoding and level.
+    main: Command line entry point.
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.serialization import build_documents
+from utils.compression import available_encodings, compress
+from utils.responses import SablonJSONResponse
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 11), "zstd": (1, 3, 9)}
+
+
+def build_body(documents: int) -> bytes:
+    """
+    Builds the JSON body of a list response, as rendered by the read endpoints.
+
+    Args:
+        documents (int): The number of documents of the list.
+
+    Returns:
+        bytes: The JSON body.
+    """
+    return SablonJSONResponse(content=build_documents(documents)).body
+
+
+def measure(body: bytes, encoding: str, level: int, repeat: int) -> dict:
+    """
+    Measures the compression of a body with one encoding and level, keeping the fastest of repeat runs.
+
+    Args:
+        body (bytes): The body to compress.
+        encoding (str): The encoding, one of "zstd", "br" or "gzip".
+        level (int): The compression level of the encoding.
+        repeat (int): The number of runs.
+
+    Returns:
+        dict: The compressed size, the ratio, the compression time (ms) and the compression throughput (MB/s).
+    """
+    best = float("inf")
+    compressed = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compressed = compress(body, encoding, level)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "bytes": len(compressed),
+        "ratio": round(len(body) / len(compressed), 1),
+        "ms": round(best * 1000, 3),
+        "mb_per_s": round(len(body) / best / 1e6, 1) if best else 0.0,
+    }
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the measures of every list size, encoding and level as JSON.
+    """
+    parser = argparse.ArgumentParser(description="CPU cost versus bytes saved of the response compression")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        body = build_body(size)
+        results[size] = {"bytes": len(body)}
+        for encoding in available_encodings():
+            for level in LEVELS[encoding]:
+                results[size][f"{encoding}-{level}"] = measure(body, encoding, level, args.repeat)
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
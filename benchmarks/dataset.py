@@ -0,0 +1,362 @@
+"""
+Synthetic dataset generator and seeding command line: builds realistic Sablon documents with configurable distributions
+and inserts them with parallel batched insert_many calls, so that collections of millions of documents can be seeded in
+minutes to benchmark or reproduce production issues.
+
+Every batch is generated from its own random generator, seeded with the seed of the run and the index of the batch, so
+the same seed always builds the same dataset whatever the number of workers. The columns of a batch are generated with
+numpy when it is installed, with the random module otherwise (slower, and not the same documents for the same seed).
+
+Usage:
+    python -m benchmarks.dataset --documents 10000000 --workers 8 --drop
+    python -m benchmarks.dataset --documents 1000000 --names 1000 --name-skew 1.1 --age-distribution normal \\
+        --genders Female=0.6,Male=0.35,Neutral=0.05 --extra-fields 4 --extra-size 64 --dry-run
+
+Functions:
+    parse_weights: Parses the "value=weight,..." distribution of a categorical field.
+    build_spec: Builds the specification of the distributions of a dataset.
+    generate_batch: Generates one batch of documents.
+    seed_collection: Generates the documents and inserts them with parallel workers.
+    main: Command line entry point.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import accumulate
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from models.sablon_model import SABLON_INDEXES
+from utils.db_store import MongoDBStore
+
+DB_NAME = "sablon_db"
+DB_COLLECTION = "sablon_collection"
+GENDERS = {"Female": 0.48, "Male": 0.48, "Neutral": 0.02, "Non_Binary": 0.02}
+AGE_DISTRIBUTIONS = ("uniform", "normal", "exponential")
+EXTRA_POOL_SIZE = 1024
+
+_worker_store = None
+
+
+def parse_weights(value: str) -> dict:
+    """
+    Parses the distribution of a categorical field, the weights do not have to sum to 1.
+
+    Args:
+        value (str): The "value=weight" pairs separated by commas, e.g. "Female=0.6,Male=0.4".
+
+    Returns:
+        dict: The weight of every value.
+    """
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.strip().partition("=")
+        if not name or not weight:
+            raise argparse.ArgumentTypeError(f"Error! Expected value=weight pairs, got '{item}'")
+        try:
+            weights[name.strip()] = float(weight)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"Error! The weight of '{name}' must be a number, got '{weight}'") from e
+    if sum(weights.values()) <= 0 or min(weights.values()) < 0:
+        raise argparse.ArgumentTypeError("Error! The weights must be positive")
+    return weights
+
+
+def build_spec(name_prefix: str = "Sablon", names: int = 100000, name_skew: float = 0.0,
+               age_distribution: str = "uniform", age_min: int = 0, age_max: int = 99, age_mean: float = 40.0,
+               age_stddev: float = 15.0, age_null_rate: float = 0.0, genders: dict | None = None,
+               gender_null_rate: float = 0.0, extra_fields: int = 0, extra_size: int = 32) -> dict:
+    """
+    Builds the specification of the distributions of a dataset, checking its values.
+
+    Args:
+        name_prefix (str): The prefix of the names, the names are "<prefix>_<rank>".
+        names (int): The number of distinct names (the cardinality of the name field).
+        name_skew (float): The Zipf exponent of the name frequencies, 0 for uniformly frequent names.
+        age_distribution (str): "uniform" between age_min and age_max, "normal" around age_mean, or "exponential"
+            from age_min with the mean age_mean.
+        age_min (int): The lowest age, the generated ages are clipped to [age_min, age_max].
+        age_max (int): The highest age.
+        age_mean (float): The mean age of the normal and exponential distributions.
+        age_stddev (float): The standard deviation of the normal distribution.
+        age_null_rate (float): The share of documents without age.
+        genders (dict | None): The weight of every gender, GENDERS by default.
+        gender_null_rate (float): The share of documents without gender.
+        extra_fields (int): The number of extra string fields ("extra_0", ...), stored but not part of SablonModel.
+        extra_size (int): The length of the extra strings.
+
+    Returns:
+        dict: The specification, to pass to generate_batch and seed_collection.
+    """
+    if names < 1:
+        raise ValueError("Error! names must be at least 1")
+    if age_distribution not in AGE_DISTRIBUTIONS:
+        raise ValueError(f"Error! Unknown age distribution '{age_distribution}', expected {list(AGE_DISTRIBUTIONS)}")
+    if age_min > age_max:
+        raise ValueError("Error! age_min must not be higher than age_max")
+    for rate in (age_null_rate, gender_null_rate):
+        if not 0 <= rate <= 1:
+            raise ValueError("Error! The null rates must be between 0 and 1")
+    genders = genders or GENDERS
+    total = sum(genders.values())
+    return {
+        "name_prefix": name_prefix,
+        "names": names,
+        "name_skew": name_skew,
+        "age_distribution": age_distribution,
+        "age_min": age_min,
+        "age_max": age_max,
+        "age_mean": age_mean,
+        "age_stddev": age_stddev,
+        "age_null_rate": age_null_rate,
+        "genders": {gender: weight / total for gender, weight in genders.items()},
+        "gender_null_rate": gender_null_rate,
+        "extra_fields": extra_fields,
+        "extra_size": extra_size,
+    }
+
+
+def _name_weights(spec: dict) -> list[float] | None:
+    """
+    Computes the Zipf weights of the name ranks, None when the names are uniformly frequent.
+    """
+    if not spec["name_skew"]:
+        return None
+    weights = [1.0 / (rank + 1) ** spec["name_skew"] for rank in range(spec["names"])]
+    total = sum(weights)
+    return [weight / total for weight in weights]
+
+
+def _extra_pool(spec: dict, seed: int) -> list[str]:
+    """
+    Builds the strings the extra fields are drawn from, the same for every batch of a run.
+    """
+    generator = random.Random(f"{seed}:extra")
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    return ["".join(generator.choices(alphabet, k=spec["extra_size"])) for _ in range(EXTRA_POOL_SIZE)]
+
+
+def _numpy_columns(spec: dict, seed: int, batch_index: int, size: int, name_weights: list[float] | None) -> tuple:
+    """
+    Generates the name ranks, ages, gender indexes and extra indexes of a batch with numpy.
+    """
+    generator = numpy.random.default_rng([seed, batch_index])
+    if name_weights is None:
+        ranks = generator.integers(0, spec["names"], size)
+    else:
+        ranks = generator.choice(spec["names"], size, p=name_weights)
+
+    if spec["age_distribution"] == "uniform":
+        ages = generator.integers(spec["age_min"], spec["age_max"] + 1, size)
+    elif spec["age_distribution"] == "normal":
+        ages = numpy.rint(generator.normal(spec["age_mean"], spec["age_stddev"], size))
+    else:
+        ages = numpy.rint(spec["age_min"] + generator.exponential(max(spec["age_mean"] - spec["age_min"], 1e-9), size))
+    ages = numpy.clip(ages, spec["age_min"], spec["age_max"]).astype(numpy.int64).tolist()
+    genders = generator.choice(len(spec["genders"]), size, p=list(spec["genders"].values())).tolist()
+    age_nulls = (generator.random(size) < spec["age_null_rate"]).tolist()
+    gender_nulls = (generator.random(size) < spec["gender_null_rate"]).tolist()
+    extras = generator.integers(0, EXTRA_POOL_SIZE, (spec["extra_fields"], size)).tolist()
+    return ranks.tolist(), ages, genders, age_nulls, gender_nulls, extras
+
+
+def _random_columns(spec: dict, seed: int, batch_index: int, size: int, name_weights: list[float] | None) -> tuple:
+    """
+    Generates the name ranks, ages, gender indexes and extra indexes of a batch with the random module.
+    """
+    generator = random.Random(f"{seed}:{batch_index}")
+    if name_weights is None:
+        ranks = [generator.randrange(spec["names"]) for _ in range(size)]
+    else:
+        ranks = generator.choices(range(spec["names"]), cum_weights=list(accumulate(name_weights)), k=size)
+
+    if spec["age_distribution"] == "uniform":
+        ages = [generator.randint(spec["age_min"], spec["age_max"]) for _ in range(size)]
+    elif spec["age_distribution"] == "normal":
+        ages = [round(generator.gauss(spec["age_mean"], spec["age_stddev"])) for _ in range(size)]
+    else:
+        rate = 1 / max(spec["age_mean"] - spec["age_min"], 1e-9)
+        ages = [round(spec["age_min"] + generator.expovariate(rate)) for _ in range(size)]
+    ages = [min(max(age, spec["age_min"]), spec["age_max"]) for age in ages]
+    genders = generator.choices(range(len(spec["genders"])), weights=list(spec["genders"].values()), k=size)
+    age_nulls = [generator.random() < spec["age_null_rate"] for _ in range(size)]
+    gender_nulls = [generator.random() < spec["gender_null_rate"] for _ in range(size)]
+    extras = [[generator.randrange(EXTRA_POOL_SIZE) for _ in range(size)] for _ in range(spec["extra_fields"])]
+    return ranks, ages, genders, age_nulls, gender_nulls, extras
+
+
+def generate_batch(spec: dict, seed: int, batch_index: int, size: int, name_weights: list[float] | None = None,
+                   extra_pool: list[str] | None = None) -> list[dict]:
+    """
+    Generates one batch of documents, column by column, then zips the columns into the documents.
+
+    Args:
+        spec (dict): The specification of the distributions, built by build_spec.
+        seed (int): The seed of the run.
+        batch_index (int): The index of the batch, the same seed and index always build the same batch.
+        size (int): The number of documents of the batch.
+        name_weights (list[float] | None): The precomputed Zipf weights of the names, computed when None.
+        extra_pool (list[str] | None): The precomputed strings of the extra fields, computed when None.
+
+    Returns:
+        list[dict]: The documents, without "_id".
+    """
+    if name_weights is None:
+        name_weights = _name_weights(spec)
+    if extra_pool is None and spec["extra_fields"]:
+        extra_pool = _extra_pool(spec, seed)
+    columns = _numpy_columns if numpy is not None else _random_columns
+    ranks, ages, genders, age_nulls, gender_nulls, extras = columns(spec, seed, batch_index, size, name_weights)
+
+    prefix = spec["name_prefix"]
+    gender_names = list(spec["genders"])
+    documents = [{"name": f"{prefix}_{rank}", "age": None if age_null else age,
+                  "gender": None if gender_null else gender_names[gender]}
+                 for rank, age, gender, age_null, gender_null in zip(ranks, ages, genders, age_nulls, gender_nulls)]
+    for field, indexes in enumerate(extras):
+        key = f"extra_{field}"
+        for document, index in zip(documents, indexes):
+            document[key] = extra_pool[index]
+    return documents
+
+
+def _init_worker() -> None:
+    """
+    Creates the store of a worker process, every process opens its own connections.
+    """
+    global _worker_store  # pylint: disable=global-statement
+    _worker_store = MongoDBStore()
+
+
+def _seed_batches(spec: dict, seed: int, batch_indexes: list[int], documents: int, batch_size: int, db_name: str,
+                  db_collection: str, dry_run: bool) -> int:
+    """
+    Generates and inserts some batches of a run in a worker process.
+
+    Returns:
+        int: The number of generated documents.
+    """
+    name_weights = _name_weights(spec)
+    extra_pool = _extra_pool(spec, seed) if spec["extra_fields"] else None
+    generated = 0
+    for batch_index in batch_indexes:
+        size = min(batch_size, documents - batch_index * batch_size)
+        batch = generate_batch(spec, seed, batch_index, size, name_weights, extra_pool)
+        if not dry_run:
+            _worker_store.add_documents(db_name, db_collection, batch)
+        generated += size
+    return generated
+
+
+def seed_collection(spec: dict, documents: int, seed: int = 42, batch_size: int = 10000, workers: int = 4,
+                    db_name: str = DB_NAME, db_collection: str = DB_COLLECTION, drop: bool = False,
+                    dry_run: bool = False, progress=sys.stderr) -> dict:
+    """
+    Generates the documents and inserts them with unordered insert_many calls from parallel worker processes.
+
+    With drop, the collection is dropped first and the declared indexes are built once the documents are inserted,
+    which is much faster than maintaining them during the load.
+
+    Args:
+        spec (dict): The specification of the distributions, built by build_spec.
+        documents (int): The number of documents.
+        seed (int): The seed of the run, the same seed builds the same dataset.
+        batch_size (int): The number of documents per insert_many call.
+        workers (int): The number of worker processes.
+        db_name (str): The database name.
+        db_collection (str): The collection name.
+        drop (bool): Whether the collection is dropped first and its indexes built after the load.
+        dry_run (bool): Whether the documents are only generated, to measure the generator alone.
+        progress: The stream the progress is reported to, None to report nothing.
+
+    Returns:
+        dict: The number of documents, the elapsed seconds, the documents per second and the index build seconds.
+    """
+    store = MongoDBStore()
+    if drop and not dry_run:
+        store.get_collection(db_name, db_collection).drop()
+
+    batches = list(range((documents + batch_size - 1) // batch_size))
+    # Small groups of batches per task, so that the progress moves steadily and the workers stay balanced
+    group = max(1, len(batches) // (workers * 16))
+    tasks = [batches[start:start + group] for start in range(0, len(batches), group)]
+    done = 0
+    reported = 0.0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(_seed_batches, spec, seed, task, documents, batch_size, db_name, db_collection,
+                                   dry_run) for task in tasks]
+        for future in as_completed(futures):
+            done += future.result()
+            elapsed = time.perf_counter() - start
+            if progress is not None and (elapsed - reported >= 1 or done == documents):
+                reported = elapsed
+                rate = done / elapsed if elapsed else 0.0
+                eta = (documents - done) / rate if rate else 0.0
+                print(f"{done}/{documents} documents ({done / documents:.0%}), {rate:,.0f} docs/s, ETA {eta:.0f}s",
+                      file=progress, flush=True)
+    elapsed = time.perf_counter() - start
+
+    index_seconds = 0.0
+    if drop and not dry_run:
+        index_start = time.perf_counter()
+        store.create_indexes(db_name, db_collection, [index.to_index_model() for index in SABLON_INDEXES])
+        index_seconds = time.perf_counter() - index_start
+    store.close()
+    return {
+        "documents": documents,
+        "seconds": round(elapsed, 2),
+        "docs_per_s": round(documents / elapsed, 1) if elapsed else 0.0,
+        "index_seconds": round(index_seconds, 2),
+        "generator": "numpy" if numpy is not None else "random",
+    }
+
+
+def main() -> None:
+    """
+    Command line entry point, seeds the collection and prints the summary as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Generate a synthetic Sablon dataset and seed the collection with it")
+    parser.add_argument("--documents", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10000, help="documents per insert_many call")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--collection", default=DB_COLLECTION)
+    parser.add_argument("--drop", action="store_true", help="drop the collection first and build its indexes after the load")
+    parser.add_argument("--dry-run", action="store_true", help="only generate the documents, insert nothing")
+    parser.add_argument("--name-prefix", default="Sablon")
+    parser.add_argument("--names", type=int, default=100000, help="number of distinct names")
+    parser.add_argument("--name-skew", type=float, default=0.0, help="Zipf exponent of the name frequencies, 0 for uniform")
+    parser.add_argument("--age-distribution", choices=AGE_DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--age-min", type=int, default=0)
+    parser.add_argument("--age-max", type=int, default=99)
+    parser.add_argument("--age-mean", type=float, default=40.0)
+    parser.add_argument("--age-stddev", type=float, default=15.0)
+    parser.add_argument("--age-null-rate", type=float, default=0.0)
+    parser.add_argument("--genders", type=parse_weights, default=None, help="e.g. Female=0.6,Male=0.35,Neutral=0.05")
+    parser.add_argument("--gender-null-rate", type=float, default=0.0)
+    parser.add_argument("--extra-fields", type=int, default=0, help="number of extra string fields per document")
+    parser.add_argument("--extra-size", type=int, default=32, help="length of the extra strings")
+    args = parser.parse_args()
+
+    try:
+        spec = build_spec(args.name_prefix, args.names, args.name_skew, args.age_distribution, args.age_min,
+                          args.age_max, args.age_mean, args.age_stddev, args.age_null_rate, args.genders,
+                          args.gender_null_rate, args.extra_fields, args.extra_size)
+    except ValueError as e:
+        parser.error(str(e))
+    result = seed_collection(spec, args.documents, args.seed, args.batch_size, args.workers, args.db, args.collection,
+                             args.drop, args.dry_run)
+    print(json.dumps({**result, "spec": spec}, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Query latency benchmark of the Sablon collection with and without the indexes declared in SABLON_INDEXES.
+
+It fills a separate benchmark collection with synthetic Sablon documents, times the query shapes served by
+GET /sablon/sabloane/{query} without any secondary index, then creates the declared indexes and times them again.
+
+Usage:
+    With a Mongo server reachable through the SABLON_MONGO_* settings, run:
+
+        python -m benchmarks.indexes --documents 1000000 --queries 200
+
+Functions:
+    seed_collection: Fills the benchmark collection with synthetic Sablon documents.
+    time_queries: Times every query shape and returns its latency percentiles.
+    main: Command line entry point.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from models.sablon_model import SABLON_INDEXES
+from utils.db_store import MongoDBStore
+from benchmarks.load_test import percentile
+
+DB_NAME = "sablon_db"
+DB_COLLECTION = "sablon_index_benchmark"
+GENDERS = ["Female", "Male", "Neutral", "Non_Binary"]
+NAMES = 100000
+
+QUERY_SHAPES = {
+    "name": lambda: {"name": f"Sablon_{random.randrange(NAMES)}"},
+    "gender_age": lambda: {"gender": random.choice(GENDERS), "age": random.randrange(100)},
+    "age": lambda: {"age": random.randrange(100)},
+}
+
+
+def seed_collection(store: MongoDBStore, documents: int, chunk: int = 10000) -> None:
+    """
+    Fills the benchmark collection with synthetic Sablon documents, in insert_many chunks.
+
+    Args:
+        store (MongoDBStore): The store bound to the Mongo server.
+        documents (int): The number of documents to insert.
+        chunk (int): The number of documents per insert_many.
+    """
+    for offset in range(0, documents, chunk):
+        store.add_documents(DB_NAME, DB_COLLECTION, [
+            {"name": f"Sablon_{random.randrange(NAMES)}", "age": random.randrange(100), "gender": random.choice(GENDERS)}
+            for _ in range(min(chunk, documents - offset))
+        ])
+
+
+def time_queries(store: MongoDBStore, queries: int) -> dict:
+    """
+    Times every query shape, reading all the matching documents like the query endpoint does.
+
+    Args:
+        store (MongoDBStore): The store bound to the Mongo server.
+        queries (int): The number of queries run per shape.
+
+    Returns:
+        dict: The p50/p95/p99 latencies (ms) of every query shape.
+    """
+    summary = {}
+    for shape, build_query in QUERY_SHAPES.items():
+        latencies = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            list(store.get_documents_by_query(DB_NAME, DB_COLLECTION, build_query()))
+            latencies.append(time.perf_counter() - start)
+        summary[shape] = {f"p{p}": round(percentile(latencies, p), 2) for p in (50, 95, 99)}
+    return summary
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the latencies without and with the declared indexes as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Query latency of the Sablon collection with and without its indexes")
+    parser.add_argument("--documents", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark collection afterwards")
+    args = parser.parse_args()
+
+    store = MongoDBStore()
+    store.get_collection(DB_NAME, DB_COLLECTION).drop()
+    seed_collection(store, args.documents)
+
+    without_indexes = time_queries(store, args.queries)
+    store.create_indexes(DB_NAME, DB_COLLECTION, [index.to_index_model() for index in SABLON_INDEXES])
+    with_indexes = time_queries(store, args.queries)
+
+    if not args.keep:
+        store.get_collection(DB_NAME, DB_COLLECTION).drop()
+    store.close()
+
+    print(json.dumps({
+        "documents": args.documents,
+        "queries_per_shape": args.queries,
+        "latency_ms": {"without_indexes": without_indexes, "with_indexes": with_indexes},
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
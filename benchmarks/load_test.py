@@ -0,0 +1,148 @@
+"""
+Concurrent load test for the Sablon Management API.
+
+It drives a running server with a mix of reads and writes from many concurrent clients and reports latency
+percentiles, so the blocking ("sync") and non-blocking ("async") storage backends can be compared.
+
+Usage:
+    Start the server once per backend and run the load test against it:
+
+        SABLON_DB_BACKEND=sync uvicorn sablon_api:app --port 8000
+        python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 64 --requests 5000
+
+        SABLON_DB_BACKEND=async uvicorn sablon_api:app --port 8000
+        python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 64 --requests 5000
+
+    Without a mongod, serve the in-process mongomock store of benchmarks.workers, with either backend:
+
+        SABLON_DB_BACKEND=async uvicorn benchmarks.workers:memory_app --factory --port 8000
+
+Functions:
+    percentile: Returns the p-th percentile of a list of latencies.
+    run_load_test: Runs the mixed read/write workload and returns the latency summary.
+    main: Command line entry point.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+WRITE_DOCUMENT = {"name": "Load_Test_Sablon", "age": 30, "gender": "Neutral"}
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    """
+    Returns the p-th percentile of a list of latencies using the nearest-rank method.
+
+    Args:
+        latencies (list[float]): The measured latencies, in seconds.
+        p (float): The percentile to compute, between 0 and 100.
+
+    Returns:
+        float: The latency at the requested percentile, in milliseconds.
+    """
+    if not latencies:
+        return 0.0
+    ordered = sorted(latencies)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank] * 1000
+
+
+async def _worker(client: httpx.AsyncClient, queue: asyncio.Queue, oids: list[str], write_ratio: float,
+                  latencies: dict[str, list[float]], errors: dict[str, int]) -> None:
+    """
+    Pulls request slots from the queue and issues a random read or write for each one.
+    """
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        if random.random() < write_ratio or not oids:
+            kind = "write"
+            request = client.post("/sablon/", json=WRITE_DOCUMENT)
+        else:
+            kind = "read"
+            request = client.get(f"/sablon/sabloane/{random.choice(oids)}")
+        start = time.perf_counter()
+        try:
+            response = await request
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                errors[kind] += 1
+                continue
+            latencies[kind].append(elapsed)
+            if kind == "write":
+                oids.append(response.json()["oid"])
+        except httpx.HTTPError:
+            errors[kind] += 1
+
+
+async def run_load_test(url: str, concurrency: int, requests: int, write_ratio: float, seed_documents: int) -> dict:
+    """
+    Runs the mixed read/write workload and returns the latency summary.
+
+    Args:
+        url (str): The base url of the running server.
+        concurrency (int): The number of concurrent clients.
+        requests (int): The total number of requests to send.
+        write_ratio (float): The fraction of requests that are inserts, the rest are reads by ObjectId.
+        seed_documents (int): The number of documents inserted before measuring, used as read targets.
+
+    Returns:
+        dict: Throughput, per-kind latency percentiles (ms) and error counts.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        oids = []
+        for _ in range(seed_documents):
+            response = await client.post("/sablon/", json=WRITE_DOCUMENT)
+            oids.append(response.json()["oid"])
+
+        queue = asyncio.Queue()
+        for slot in range(requests):
+            queue.put_nowait(slot)
+        latencies = {"read": [], "write": []}
+        errors = {"read": 0, "write": 0}
+        start = time.perf_counter()
+        await asyncio.gather(*(_worker(client, queue, oids, write_ratio, latencies, errors) for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+
+        for oid in oids:
+            await client.delete(f"/sablon/{oid}")
+
+    everything = latencies["read"] + latencies["write"]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(everything) / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            kind: {f"p{p}": round(percentile(values, p), 2) for p in (50, 95, 99)}
+            for kind, values in (("read", latencies["read"]), ("write", latencies["write"]), ("all", everything))
+        },
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the latency summary as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Concurrent mixed read/write load test for the Sablon API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--seed-documents", type=int, default=100)
+    args = parser.parse_args()
+    summary = asyncio.run(run_load_test(args.url, args.concurrency, args.requests, args.write_ratio, args.seed_documents))
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Serialization microbenchmark of the read path: the cost of turning the documents read from Mongo into the JSON body of
+a GET /sablon/ response, per 10k documents.
+
+It compares the former path (validate every document, then let FastAPI validate and serialize the response_model and
+render it with the standard json module) with the current one (validate once, render the models with orjson) and with
+the trusted read path (SABLON_TRUSTED_READS, render the stored documents with orjson without building models). No server
+or database is needed.
+
+Usage:
+    python -m benchmarks.serialization --documents 10000 --repeat 5
+
+Functions:
+    build_documents: Builds the documents as the store returns them.
+    fastapi_default: The former read path.
+    orjson_validated: The current read path.
+    orjson_trusted: The trusted read path.
+    main: Command line entry point.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models.sablon_model import SablonModel
+from services.sablon_services import read_model
+from utils.responses import SablonJSONResponse
+
+_response_field = create_response_field(name="Response_get_all_sablons", type_=List[SablonModel], mode="serialization")
+
+
+def build_documents(documents: int) -> list[dict]:
+    """
+    Builds the documents as the store returns them, without "_id".
+
+    Args:
+        documents (int): The number of documents.
+
+    Returns:
+        list[dict]: The documents.
+    """
+    genders = ["Female", "Male", "Neutral", "Non_Binary"]
+    return [{"name": f"Sablon_{index}", "age": random.randrange(100), "gender": random.choice(genders)}
+            for index in range(documents)]
+
+
+def fastapi_default(documents: list[dict]) -> bytes:
+    """
+    The former read path: SablonModel(**document) in the service, then the response_model of FastAPI.
+
+    Args:
+        documents (list[dict]): The documents read from the store.
+
+    Returns:
+        bytes: The JSON body of the response.
+    """
+    sabloane = [SablonModel(**document) for document in documents]
+    content = asyncio.run(serialize_response(field=_response_field, response_content=sabloane))
+    return JSONResponse(content=content).body
+
+
+def orjson_validated(documents: list[dict]) -> bytes:
+    """
+    The current read path: SablonModel(**document) in the service, then SablonJSONResponse.
+
+    Args:
+        documents (list[dict]): The documents read from the store.
+
+    Returns:
+        bytes: The JSON body of the response.
+    """
+    model = read_model(None, trusted=False)
+    return SablonJSONResponse(content=[model(**document) for document in documents]).body
+
+
+def orjson_trusted(documents: list[dict]) -> bytes:
+    """
+    The trusted read path: the documents are kept as dictionaries by the service, then SablonJSONResponse.
+
+    Args:
+        documents (list[dict]): The documents read from the store.
+
+    Returns:
+        bytes: The JSON body of the response.
+    """
+    model = read_model(None, trusted=True)
+    return SablonJSONResponse(content=[model(**document) for document in documents]).body
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the best time of each path per 10k documents and the speedups as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Serialization cost of the Sablon read path")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    documents = build_documents(args.documents)
+    assert json.loads(fastapi_default(documents)) == json.loads(orjson_validated(documents)) == json.loads(orjson_trusted(documents))
+
+    timings = {}
+    for path in (fastapi_default, orjson_validated, orjson_trusted):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            path(documents)
+            best = min(best, time.perf_counter() - start)
+        timings[path.__name__] = round(best * 1000 * 10000 / args.documents, 2)
+
+    print(json.dumps({
+        "documents": args.documents,
+        "ms_per_10k_documents": timings,
+        "speedup_validated": round(timings["fastapi_default"] / timings["orjson_validated"], 1),
+        "speedup_trusted": round(timings["fastapi_default"] / timings["orjson_trusted"], 1),
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
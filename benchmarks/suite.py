@@ -0,0 +1,434 @@
+"""
+Reproducible benchmark suite of the Sablon Management API: every route of routes/sablon_routes.py and every method of
+MongoDBStore, timed with a configurable dataset size and concurrency, recorded to a JSON results file and compared with a
+stored baseline to flag regressions.
+
+The routes are driven in-process through the ASGI interface of the application (or over HTTP against a running server
+with --url, started with the same SABLON_ADMIN_TOKEN for the admin endpoints), so no server has to be started. The store is a local mongod reached through the SABLON_MONGO_* settings, or,
+with --store memory, the in-process mongomock stand-in (optional dependency, sync backend only). The dataset is tagged
+with the "Benchmark_Sablon" name prefix and deleted at the end of the run.
+
+Usage:
+    Run the whole suite and compare it with the baseline, the exit status is 1 when a case regressed:
+
+        python -m benchmarks.suite --store memory --documents 10000 --iterations 500 --concurrency 8
+
+    Record the current run as the baseline of the following ones:
+
+        python -m benchmarks.suite --store memory --save-baseline
+
+Functions:
+    build_documents: Builds the reproducible dataset of a run.
+    run_case: Runs one case with concurrent workers and returns its throughput and latency percentiles.
+    store_cases: Builds the cases of the MongoDBStore methods.
+    http_cases: Builds the cases of the routes.
+    run_suite: Seeds the dataset, runs every case and returns the results.
+    compare: Compares results with a baseline and returns the regressions.
+    main: Command line entry point.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import secrets
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+import httpx
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from benchmarks.load_test import percentile
+from models.sablon_model import SABLON_INDEXES
+from services.sablon_services import count_by_pipeline
+from utils.db_store import MongoDBStore
+
+DB_NAME = "sablon_db"
+DB_COLLECTION = "sablon_collection"
+NAME_PREFIX = "Benchmark_Sablon"
+GENDERS = ["Female", "Male", "Neutral", "Non_Binary"]
+BATCH = 100
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def build_documents(documents: int, seed: int, label: str = "") -> list[dict]:
+    """
+    Builds the reproducible dataset of a run, about 10 documents share every name.
+
+    Args:
+        documents (int): The number of documents.
+        seed (int): The seed of the random generator, the same seed builds the same dataset.
+        label (str): A suffix of the names, used to tell the documents written by the cases apart.
+
+    Returns:
+        list[dict]: The documents.
+    """
+    generator = random.Random(seed)
+    names = max(1, documents // 10)
+    return [{"name": f"{NAME_PREFIX}{label}_{index % names}", "age": generator.randrange(100),
+             "gender": generator.choice(GENDERS)} for index in range(documents)]
+
+
+async def run_case(operation: Callable[[int], Any], iterations: int, concurrency: int,
+                   executor: ThreadPoolExecutor | None = None) -> dict:
+    """
+    Runs one case with concurrent workers and returns its throughput and latency percentiles.
+
+    Args:
+        operation (Callable[[int], Any]): The operation, called with the iteration number. It returns an awaitable, or
+            is blocking and run on the executor. It raises to report an error.
+        iterations (int): The number of operations.
+        concurrency (int): The number of concurrent workers.
+        executor (ThreadPoolExecutor | None): The executor of the blocking operations, None for awaitable ones.
+
+    Returns:
+        dict: The number of operations, the throughput (ops/s), the p50/p95/p99 latencies (ms) and the error count.
+    """
+    loop = asyncio.get_running_loop()
+    slots = iter(range(iterations))
+    latencies, errors = [], []
+
+    async def worker() -> None:
+        for iteration in slots:
+            start = time.perf_counter()
+            try:
+                if executor is not None:
+                    await loop.run_in_executor(executor, operation, iteration)
+                else:
+                    await operation(iteration)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+    return {
+        "operations": iterations,
+        "throughput_ops": round(len(latencies) / duration, 1) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "errors": len(errors),
+        **({"first_error": errors[0][:200]} if errors else {}),
+    }
+
+
+def store_cases(store: MongoDBStore, oids: list[ObjectId], iterations: int, seed: int) -> dict[str, Callable[[int], Any]]:
+    """
+    Builds the cases of the MongoDBStore methods, the reads first so that they are measured on the seeded dataset only.
+    drop_index, close and initialize_database are left out, they would change the state the other cases are measured in.
+
+    Args:
+        store (MongoDBStore): The store holding the dataset.
+        oids (list[ObjectId]): The ObjectIds of the dataset.
+        iterations (int): The number of operations of every case, as many documents are inserted for the delete cases.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        dict[str, Callable[[int], Any]]: The blocking operations by case name.
+    """
+    generator = random.Random(seed)
+    names = max(1, len(oids) // 10)
+    pick = [oids[generator.randrange(len(oids))] for _ in range(iterations)]
+    name = [f"{NAME_PREFIX}_{generator.randrange(names)}" for _ in range(iterations)]
+    deletable = store.add_documents(DB_NAME, DB_COLLECTION, build_documents(iterations, seed, "_Delete")).inserted_ids
+    deletable_by_query = build_documents(iterations, seed + 1, "_DeleteQuery")
+    store.add_documents(DB_NAME, DB_COLLECTION, [dict(document) for document in deletable_by_query])
+    new_document = build_documents(1, seed, "_New")[0]
+
+    return {
+        "connect": lambda i: store.connect(1),
+        "get_collection": lambda i: store.get_collection(DB_NAME, DB_COLLECTION),
+        "get_all_documents": lambda i: list(store.get_all_documents(DB_NAME, DB_COLLECTION, projection={"_id": 0})),
+        "get_document_by_id": lambda i: store.get_document_by_id(DB_NAME, DB_COLLECTION, pick[i]),
+        "get_documents_by_ids": lambda i: list(store.get_documents_by_ids(DB_NAME, DB_COLLECTION, pick[i:i + BATCH])),
+        "get_documents_by_query": lambda i: list(store.get_documents_by_query(DB_NAME, DB_COLLECTION, {"name": name[i]})),
+        "get_all_documents_page": lambda i: list(store.get_all_documents_page(DB_NAME, DB_COLLECTION, BATCH, pick[i])),
+        "get_documents_by_query_page": lambda i: list(store.get_documents_by_query_page(
+            DB_NAME, DB_COLLECTION, {"gender": GENDERS[i % len(GENDERS)]}, BATCH)),
+        "count_documents": lambda i: store.count_documents(DB_NAME, DB_COLLECTION, {"name": name[i]}),
+        "aggregate": lambda i: store.aggregate(DB_NAME, DB_COLLECTION, count_by_pipeline("gender", {"name": name[i]})),
+        "list_indexes": lambda i: store.list_indexes(DB_NAME, DB_COLLECTION),
+        "create_indexes": lambda i: store.create_indexes(DB_NAME, DB_COLLECTION,
+                                                         [index.to_index_model() for index in SABLON_INDEXES]),
+        "explain_query": lambda i: store.explain_query(DB_NAME, DB_COLLECTION, {"name": name[i]}),
+        "check_query_plan": lambda i: store.check_query_plan(DB_NAME, DB_COLLECTION, {"name": name[i]}),
+        "get_slow_queries": lambda i: store.get_slow_queries(),
+        "add_document": lambda i: store.add_document(DB_NAME, DB_COLLECTION, dict(new_document)),
+        "add_documents": lambda i: store.add_documents(DB_NAME, DB_COLLECTION, [dict(new_document) for _ in range(BATCH)]),
+        "update_document": lambda i: store.update_document(DB_NAME, DB_COLLECTION, pick[i], {"age": i % 100}),
+        "bulk_write": lambda i: store.bulk_write(DB_NAME, DB_COLLECTION, [
+            UpdateOne({"_id": oid}, {"$set": {"age": i % 100}}) for oid in pick[i:i + 10]], ordered=False),
+        "delete_document_by_id": lambda i: store.delete_document_by_id(DB_NAME, DB_COLLECTION, deletable[i]),
+        "delete_document_by_query": lambda i: store.delete_document_by_query(DB_NAME, DB_COLLECTION, deletable_by_query[i]),
+    }
+
+
+def _checked(response: httpx.Response) -> httpx.Response:
+    """
+    Raises for the error responses of the routes, 304 Not Modified included as a success.
+    """
+    if response.status_code >= 400:
+        raise RuntimeError(f"{response.request.method} {response.request.url.path}: {response.status_code} {response.text[:200]}")
+    return response
+
+
+def http_cases(client: httpx.AsyncClient, oids: list[str], deletable: list[dict], iterations: int,
+               seed: int) -> dict[str, Callable[[int], Any]]:
+    """
+    Builds the cases of the routes, at least one per endpoint and one per read mode (list, page, NDJSON, projection,
+    conditional read), the reads first so that they are measured on the seeded dataset only.
+
+    Args:
+        client (httpx.AsyncClient): The client bound to the application.
+        oids (list[str]): The ObjectIds of the dataset.
+        deletable (list[dict]): The documents deleted by query, one per iteration, already stored.
+        iterations (int): The number of operations of every case.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        dict[str, Callable[[int], Any]]: The operations, returning awaitables, by case name.
+    """
+    generator = random.Random(seed)
+    names = max(1, len(oids) // 10)
+    pick = [oids[generator.randrange(len(oids))] for _ in range(iterations)]
+    query = [{"name": f"{NAME_PREFIX}_{generator.randrange(names)}"} for _ in range(iterations)]
+    new_document = build_documents(1, seed, "_New")[0]
+    created = []
+
+    async def create(i: int) -> None:
+        created.append(_checked(await client.post("/sablon/", json=new_document)).json()["oid"])
+
+    async def get_conditional(i: int) -> None:
+        etag = _checked(await client.get(f"/sablon/sabloane/{pick[i]}")).headers.get("etag")
+        _checked(await client.get(f"/sablon/sabloane/{pick[i]}", headers={"If-None-Match": etag or ""}))
+
+    async def delete_by_oid(i: int) -> None:
+        oid = created[i % len(created)] if created else pick[i]
+        _checked(await client.delete(f"/sablon/{oid}"))
+
+    async def get(url: str, **kwargs: Any) -> None:
+        response = _checked(await client.request("GET", url, **kwargs))
+        lines = response.content.splitlines() if "ndjson" in response.headers.get("content-type", "") else []
+        # The status code of a stream is sent before the documents, its errors are reported as a last line
+        if lines and lines[-1].startswith(b'{"error"'):
+            raise RuntimeError(lines[-1][:200].decode())
+
+    async def send(method: str, url: str, **kwargs: Any) -> None:
+        _checked(await client.request(method, url, **kwargs))
+
+    admin = {"X-Sablon-Admin-Token": os.environ.get("SABLON_ADMIN_TOKEN", "")}
+
+    return {
+        "GET /": lambda i: get("/sablon/"),
+        "GET /?limit": lambda i: get(f"/sablon/?limit={BATCH}"),
+        "GET / ndjson": lambda i: get("/sablon/", headers={"Accept": "application/x-ndjson"}),
+        "GET /?fields": lambda i: get("/sablon/?fields=name,age"),
+        "GET /sabloane/{oid}": lambda i: get(f"/sablon/sabloane/{pick[i]}"),
+        "GET /sabloane/{oid} If-None-Match": get_conditional,
+        "GET /sabloane/{query}": lambda i: get("/sablon/sabloane/None", json=query[i]),
+        "GET /sabloane/{query}?limit": lambda i: get(f"/sablon/sabloane/None?limit={BATCH}", json={"gender": GENDERS[i % 4]}),
+        "POST /sabloane/multi": lambda i: send("POST", "/sablon/sabloane/multi", json={"oids": pick[i:i + BATCH]}),
+        "GET /cache/stats": lambda i: get("/sablon/cache/stats", headers=admin),
+        "GET /stats/count": lambda i: get("/sablon/stats/count", json=query[i]),
+        "GET /stats/count-by/{field}": lambda i: get("/sablon/stats/count-by/gender", json=query[i]),
+        "GET /stats/summary/{field}": lambda i: get("/sablon/stats/summary/age", json=query[i]),
+        "GET /stats/histogram/{field}": lambda i: get("/sablon/stats/histogram/age?boundaries=0,18,65", json=query[i]),
+        "GET /indexes": lambda i: get("/sablon/indexes", headers=admin),
+        "GET /admin/slow-queries": lambda i: get("/sablon/admin/slow-queries", headers=admin),
+        "PUT /{oid}": lambda i: send("PUT", f"/sablon/{pick[i]}", json={"age": i % 100}),
+        "POST /batch": lambda i: send("POST", "/sablon/batch", json={"operations": [
+            {"op": "update", "oid": oid, "document": {"age": i % 100}} for oid in pick[i:i + 10]]}),
+        "POST /": create,
+        "POST /bulk": lambda i: send("POST", "/sablon/bulk", json=[new_document] * BATCH),
+        "DELETE /{oid}": delete_by_oid,
+        "DELETE /{query}": lambda i: send("DELETE", "/sablon/None", json=deletable[i]),
+    }
+
+
+def _store(kind: str) -> MongoDBStore:
+    """
+    Builds the store of a run, on a local mongod or on the in-process mongomock stand-in.
+    """
+    if kind == "mongod":
+        return MongoDBStore()
+    try:
+        import mongomock  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise SystemExit("Error! --store memory needs the mongomock package: pip install mongomock") from e
+    return MongoDBStore(client=mongomock.MongoClient())
+
+
+def _git_commit() -> str | None:
+    """
+    Returns the commit the suite runs on, None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_suite(store_kind: str, documents: int, iterations: int, concurrency: int, seed: int,
+                    url: str | None = None, only: str | None = None) -> dict:
+    """
+    Seeds the dataset, runs every case and returns the results. The dataset is deleted at the end.
+
+    Args:
+        store_kind (str): "mongod" for the Mongo server of the SABLON_MONGO_* settings, "memory" for mongomock.
+        documents (int): The number of documents of the dataset.
+        iterations (int): The number of operations of every case.
+        concurrency (int): The number of concurrent workers of every case.
+        seed (int): The seed of the random generator.
+        url (str | None): The base url of a running server to drive over HTTP, None to drive the application in-process.
+        only (str | None): "store" or "http" to run a single group of cases, None for both.
+
+    Returns:
+        dict: The parameters of the run and the measures of every case, by group.
+    """
+    from routes.sablon_routes import sablon_lifespan, sablon_service  # pylint: disable=import-outside-toplevel
+    from sablon_api import app  # pylint: disable=import-outside-toplevel
+
+    store = _store(store_kind)
+    backend = os.environ.get("SABLON_DB_BACKEND", "sync").lower()
+    if url is None:
+        if store_kind == "memory" and backend != "sync":
+            raise SystemExit("Error! --store memory drives the sync backend only, unset SABLON_DB_BACKEND")
+        if store_kind == "memory":
+            sablon_service.db = MongoDBStore(client=store.client)
+        # The admin endpoints are part of the suite, they answer 404 without a token
+        os.environ.setdefault("SABLON_ADMIN_TOKEN", secrets.token_hex(16))
+
+    dataset = build_documents(documents, seed)
+    oids = []
+    for start in range(0, len(dataset), 10000):
+        oids.extend(store.add_documents(DB_NAME, DB_COLLECTION, dataset[start:start + 10000]).inserted_ids)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "store": store_kind,
+            "backend": "http" if url else backend,
+            "documents": documents,
+            "iterations": iterations,
+            "concurrency": concurrency,
+            "seed": seed,
+        },
+    }
+    try:
+        if only in (None, "store"):
+            results["store"] = {}
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for name, operation in store_cases(store, oids, iterations, seed).items():
+                    results["store"][name] = await run_case(operation, iterations, concurrency, executor)
+                    print(f"store {name}: {results['store'][name]}", file=sys.stderr)
+
+        if only in (None, "http"):
+            results["http"] = {}
+            transport = None if url else httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url=url or "http://benchmark", timeout=300) as client:
+                async with sablon_lifespan(app) if url is None else contextlib.nullcontext():
+                    deletable = build_documents(iterations, seed + 2, "_HttpDelete")
+                    store.add_documents(DB_NAME, DB_COLLECTION, [dict(document) for document in deletable])
+                    cases = http_cases(client, [str(oid) for oid in oids], deletable, iterations, seed)
+                    for name, operation in cases.items():
+                        results["http"][name] = await run_case(operation, iterations, concurrency)
+                        print(f"http {name}: {results['http'][name]}", file=sys.stderr)
+    finally:
+        store.get_collection(DB_NAME, DB_COLLECTION).delete_many({"name": {"$regex": f"^{NAME_PREFIX}"}})
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """
+    Compares results with a baseline and returns the regressions: the cases whose p95 latency grew, or whose throughput
+    dropped, by more than threshold. Cases missing from either side are not compared.
+
+    Args:
+        results (dict): The results of the current run.
+        baseline (dict): The results of the baseline run.
+        threshold (float): The tolerated relative change, e.g. 0.25 for 25%.
+
+    Returns:
+        list[dict]: The regressions, with their group, case, metric, baseline and current values.
+    """
+    regressions = []
+    for group in ("store", "http"):
+        for name, current in results.get(group, {}).items():
+            previous = baseline.get(group, {}).get(name)
+            if previous is None:
+                continue
+            if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                regressions.append({"group": group, "case": name, "metric": "p95_ms",
+                                    "baseline": previous["p95_ms"], "current": current["p95_ms"]})
+            if previous["throughput_ops"] and current["throughput_ops"] < previous["throughput_ops"] * (1 - threshold):
+                regressions.append({"group": group, "case": name, "metric": "throughput_ops",
+                                    "baseline": previous["throughput_ops"], "current": current["throughput_ops"]})
+            if current["errors"] > previous["errors"]:
+                regressions.append({"group": group, "case": name, "metric": "errors",
+                                    "baseline": previous["errors"], "current": current["errors"]})
+    return regressions
+
+
+def main() -> None:
+    """
+    Command line entry point: runs the suite, writes the results file, compares it with the baseline and exits with
+    status 1 when a case regressed.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark suite of the Sablon routes and MongoDBStore methods")
+    parser.add_argument("--store", choices=["mongod", "memory"], default="mongod")
+    parser.add_argument("--url", default=None, help="drive a running server instead of the in-process application")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", choices=["store", "http"], default=None)
+    parser.add_argument("--output", default=None, help="results file, benchmarks/results/suite-<timestamp>.json by default")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to the baseline file")
+    args = parser.parse_args()
+
+    # The services log every write on stdout, which is kept for the summary
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run_suite(args.store, args.documents, args.iterations, args.concurrency, args.seed,
+                                        args.url, args.only))
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=4)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("meta", {}).get("store") != results["meta"]["store"]:
+            print(f"Warning: the baseline was recorded on the {baseline.get('meta', {}).get('store')} store", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+
+    print(json.dumps({"results": output, "regressions": regressions}, indent=4))
+    if regressions and not args.save_baseline:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
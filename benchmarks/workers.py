@@ -0,0 +1,261 @@
+"""
+Worker scaling benchmark: throughput and latency of the production server (the supervisor of sablon_api.py) for several
+numbers of worker processes, under the same concurrent read load.
+
+Every level starts the server in a subprocess with SABLON_WORKERS set, warms up the caches of its workers, then drives
+GET /sablon/sabloane/{oid} from several client processes, so that the client is not the bottleneck. The throughput
+can only scale up to the number of CPUs, which the clients share with the workers: run the clients on another host for
+exact numbers. --store memory runs every worker on its own mongomock store seeded with the same documents instead of
+a local mongod.
+
+Usage:
+    python -m benchmarks.workers --workers 1 2 4 8 --requests 20000 --concurrency 64
+    python -m benchmarks.workers --store memory --workers 1 2 4 --loop asyncio --http h11
+
+Functions:
+    seed_documents: Inserts the documents read by the benchmark, with ObjectIds known in advance.
+    memory_app: Builds the application on a seeded mongomock store, the app factory of the --store memory workers.
+    serve: Runs the production server of the benchmark, in the subprocess of a level.
+    run_clients: Drives the read load from several client processes and merges their measures.
+    run_level: Measures one number of workers.
+    main: Command line entry point.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+from bson import ObjectId
+
+from benchmarks.load_test import percentile
+from benchmarks.suite import DB_COLLECTION, DB_NAME, _store
+from utils.async_db_store import AsyncMongoDBStore
+from utils.db_store import MongoDBStore
+
+NAME = "Workers_Benchmark_Sablon"
+
+
+def _oids(documents: int) -> list[ObjectId]:
+    """
+    Returns the ObjectIds of the benchmark documents, the same in every process.
+    """
+    return [ObjectId(f"b0b0{index:020x}") for index in range(documents)]
+
+
+def seed_documents(store: MongoDBStore, documents: int) -> list[str]:
+    """
+    Inserts the documents read by the benchmark, with ObjectIds known in advance.
+
+    Args:
+        store (MongoDBStore): The store.
+        documents (int): The number of documents.
+
+    Returns:
+        list[str]: The ObjectIds of the documents.
+    """
+    oids = _oids(documents)
+    collection = store.get_collection(DB_NAME, DB_COLLECTION)
+    collection.delete_many({"name": NAME})
+    collection.insert_many([{"_id": oid, "name": NAME, "age": index % 100, "gender": "Neutral"}
+                            for index, oid in enumerate(oids)])
+    return [str(oid) for oid in oids]
+
+
+def memory_app():
+    """
+    Builds the application on a mongomock store seeded with the benchmark documents, the app factory of the
+    --store memory workers. With SABLON_DB_BACKEND=async the async service reads the same store through mongomock_motor,
+    so that benchmarks.load_test can compare both backends without a mongod.
+
+    Returns:
+        FastAPI: The application.
+    """
+    from routes import sablon_routes  # pylint: disable=import-outside-toplevel
+    from sablon_api import app  # pylint: disable=import-outside-toplevel
+
+    store = _store("memory")
+    documents = int(os.environ.get("SABLON_BENCHMARK_DOCUMENTS", "0"))
+    if documents > 0:
+        seed_documents(store, documents)
+    if isinstance(sablon_routes.sablon_service.db, MongoDBStore):
+        sablon_routes.sablon_service.db = MongoDBStore(client=store.client)
+        return app
+    try:
+        from mongomock_motor import AsyncMongoMockClient  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise SystemExit("Error! The async backend on --store memory needs the mongomock-motor package: "
+                         "pip install mongomock-motor") from e
+    sablon_routes.sablon_service.db = AsyncMongoDBStore(client=AsyncMongoMockClient(mock_mongo_client=store.client))
+    return app
+
+
+def serve(store_kind: str) -> int:
+    """
+    Runs the production server of the benchmark, configured by the environment of the level.
+
+    Args:
+        store_kind (str): "mongod" serves sablon_api:app, "memory" serves memory_app.
+
+    Returns:
+        int: The exit code of the supervisor.
+    """
+    from utils.metrics import mark_worker_dead, multiprocess_metrics  # pylint: disable=import-outside-toplevel
+    from utils.server import ServerSupervisor, server_config  # pylint: disable=import-outside-toplevel
+    from utils.settings import metrics_enabled, server_settings  # pylint: disable=import-outside-toplevel
+
+    settings = server_settings()
+    if store_kind == "memory":
+        config = server_config("benchmarks.workers:memory_app", settings, factory=True, access_log=False)
+    else:
+        config = server_config("sablon_api:app", settings, access_log=False)
+    with multiprocess_metrics(metrics_enabled() and settings["workers"] > 1):
+        return ServerSupervisor(config, settings["workers"], on_worker_exit=mark_worker_dead).run()
+
+
+def _client(url: str, oids: list[str], requests: int, concurrency: int) -> tuple[list[float], int, float, float]:
+    """
+    Runs the reads of one client process, returns its latencies, its error count and its start and end times.
+    """
+    async def run() -> tuple[list[float], int, float, float]:
+        latencies, errors = [], 0
+        slots = iter(range(requests))
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+
+            async def worker() -> None:
+                nonlocal errors
+                for slot in slots:
+                    start = time.perf_counter()
+                    try:
+                        response = await client.get(f"/sablon/sabloane/{oids[slot % len(oids)]}")
+                        if response.status_code != 200:
+                            raise RuntimeError(response.status_code)
+                        latencies.append(time.perf_counter() - start)
+                    except Exception:  # pylint: disable=broad-except
+                        errors += 1
+
+            started = time.time()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return latencies, errors, started, time.time()
+
+    return asyncio.run(run())
+
+
+def run_clients(url: str, oids: list[str], requests: int, concurrency: int, clients: int) -> dict:
+    """
+    Drives the read load from several client processes and merges their measures.
+
+    Args:
+        url (str): The base url of the server.
+        oids (list[str]): The ObjectIds read, in turn.
+        requests (int): The total number of requests.
+        concurrency (int): The total number of concurrent connections, shared by the clients.
+        clients (int): The number of client processes.
+
+    Returns:
+        dict: The throughput (requests/s), the p50/p95/p99 latencies (ms) and the error count.
+    """
+    with ProcessPoolExecutor(max_workers=clients) as executor:
+        futures = [executor.submit(_client, url, oids, requests // clients, max(1, concurrency // clients))
+                   for _ in range(clients)]
+        results = [future.result() for future in futures]
+    latencies = [latency for result in results for latency in result[0]]
+    duration = max(result[3] for result in results) - min(result[2] for result in results)
+    return {
+        "requests": len(latencies) + sum(result[1] for result in results),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "errors": sum(result[1] for result in results),
+    }
+
+
+def run_level(args: argparse.Namespace, workers: int, oids: list[str]) -> dict:
+    """
+    Measures one number of workers: starts the server, waits for it, warms it up, measures and stops it.
+
+    Args:
+        args (argparse.Namespace): The command line options.
+        workers (int): The number of worker processes.
+        oids (list[str]): The ObjectIds read.
+
+    Returns:
+        dict: The measures of the level.
+    """
+    env = {**os.environ, "SABLON_WORKERS": str(workers), "SABLON_HOST": "127.0.0.1", "SABLON_PORT": str(args.port),
+           "SABLON_BENCHMARK_DOCUMENTS": str(args.documents)}
+    env.update({"SABLON_LOOP": args.loop} if args.loop else {})
+    env.update({"SABLON_HTTP": args.http} if args.http else {})
+    if args.store == "memory":
+        env.update({"SABLON_DB_BACKEND": "sync", "SABLON_RECONCILE_INDEXES": "0"})
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.workers", "--serve", "--store", args.store], env=env,
+                              stdout=sys.stderr, stderr=sys.stderr)
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            if server.poll() is not None:
+                raise SystemExit(f"Error! The server exited with code {server.returncode}")
+            try:
+                if httpx.get(f"{url}/readyz", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit("Error! The server did not start within 120 seconds")
+            time.sleep(0.2)
+        run_clients(url, oids, args.warmup, args.concurrency, args.clients)
+        return run_clients(url, oids, args.requests, args.concurrency, args.clients)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(120)
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the measures of every number of workers as JSON.
+    """
+    parser = argparse.ArgumentParser(description="Throughput of the production server by number of worker processes")
+    parser.add_argument("--store", choices=["mongod", "memory"], default="mongod")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=20000, help="measured requests per level")
+    parser.add_argument("--warmup", type=int, default=2000, help="requests per level before measuring")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--loop", choices=["auto", "uvloop", "asyncio"])
+    parser.add_argument("--http", choices=["auto", "httptools", "h11"])
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        sys.exit(serve(args.store))
+    from utils.settings import usable_cpus  # pylint: disable=import-outside-toplevel
+
+    store = _store("mongod") if args.store == "mongod" else None
+    oids = seed_documents(store, args.documents) if store is not None else [str(oid) for oid in _oids(args.documents)]
+    results = {"store": args.store, "cpus": usable_cpus(), "requests": args.requests, "concurrency": args.concurrency,
+               "clients": args.clients, "loop": args.loop or "auto", "http": args.http or "auto", "levels": {}}
+    try:
+        for workers in args.workers:
+            level = results["levels"][workers] = run_level(args, workers, oids)
+            level["speedup"] = round(level["throughput_rps"] / results["levels"][args.workers[0]]["throughput_rps"], 2) \
+                if results["levels"][args.workers[0]]["throughput_rps"] else 0.0
+            print(f"{workers} workers: {level}", file=sys.stderr)
+    finally:
+        if store is not None:
+            store.get_collection(DB_NAME, DB_COLLECTION).delete_many({"name": NAME})
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
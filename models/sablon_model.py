@@ -2,15 +2,23 @@
 This module defines a Pydantic BaseModel for representing Sablon documents.
 
 Attributes:
-    None
+    SABLON_INDEXES (List[SablonIndexModel]): The indexes declared on the Sablon collection, reconciled at startup.
+
+Functions:
+    sablon_partial_model: Builds the Pydantic BaseModel of a Sablon document restricted to some of its fields.
 
 Classes:
     SablonModel: A Pydantic BaseModel representing Sablon documents.
+    SablonPageModel: A Pydantic BaseModel representing one page of Sablon documents.
+    SablonMultiGetModel: A Pydantic BaseModel representing the Sablon documents read by their ObjectIds.
+    SablonIndexModel: A Pydantic BaseModel declaring an index of the Sablon collection.
 
 """
 
-from typing import Optional
-from pydantic import BaseModel
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, create_model, field_validator
+from pymongo import IndexModel
 
 
 class SablonModel(BaseModel):
@@ -26,3 +34,111 @@ class SablonModel(BaseModel):
     name: str
     age: Optional[int] = None
     gender: Optional[str] = None
+
+
+class SablonPageModel(BaseModel):
+    """
+    A Pydantic BaseModel representing one page of Sablon documents.
+
+    Attributes:
+        items (List[SablonModel]): The Sablon documents of the page.
+        next_cursor (Optional[str]): The cursor to pass to get the next page, None on the last page.
+
+    """
+    items: List[SablonModel]
+    next_cursor: Optional[str] = None
+
+
+class SablonMultiGetModel(BaseModel):
+    """
+    A Pydantic BaseModel representing the Sablon documents read by their ObjectIds.
+
+    Attributes:
+        items (List[Optional[SablonModel]]): The Sablon documents in request order, None for misses and errors.
+        missing (List[str]): The ObjectIds that were not found.
+        errors (List[Dict[str, Any]]): The {"index": ..., "error": ...} entries of the invalid items.
+
+    """
+    items: List[Optional[SablonModel]]
+    missing: List[str] = []
+    errors: List[Dict[str, Any]] = []
+
+
+class SablonIndexModel(BaseModel):
+    """
+    A Pydantic BaseModel declaring an index of the Sablon collection.
+
+    Attributes:
+        keys (List[Tuple[str, int]]): The indexed SablonModel fields in order, with their direction (1 or -1).
+        unique (bool): Whether the index rejects two documents with the same keys.
+        partial_filter (Optional[Dict[str, Any]]): The filter of a partial index, None to index every document.
+        name (Optional[str]): The name of the index, None to derive it from the keys like Mongo does ("gender_1_age_1").
+
+    """
+    keys: List[Tuple[str, int]]
+    unique: bool = False
+    partial_filter: Optional[Dict[str, Any]] = None
+    name: Optional[str] = None
+
+    @field_validator("keys")
+    @classmethod
+    def check_keys(cls, keys: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        """
+        Checks that the index has keys, on SablonModel fields only, with a valid direction.
+        """
+        if not keys:
+            raise ValueError("Error! An index needs at least one key")
+        for field, direction in keys:
+            if field not in SablonModel.model_fields:
+                raise ValueError(f"Error! '{field}' is not a SablonModel field")
+            if direction not in (1, -1):
+                raise ValueError(f"Error! The direction of '{field}' must be 1 or -1")
+        return keys
+
+    @property
+    def index_name(self) -> str:
+        """
+        The name of the index, the declared one or the one Mongo derives from the keys.
+        """
+        return self.name or "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+    def to_index_model(self) -> IndexModel:
+        """
+        Builds the pymongo IndexModel creating the declared index.
+
+        Returns:
+            IndexModel: The index model, to pass to create_indexes.
+        """
+        options = {"name": self.index_name}
+        if self.unique:
+            options["unique"] = True
+        if self.partial_filter is not None:
+            options["partialFilterExpression"] = self.partial_filter
+        return IndexModel(self.keys, **options)
+
+
+SABLON_INDEXES: List[SablonIndexModel] = [
+    SablonIndexModel(keys=[("name", 1)]),
+    SablonIndexModel(keys=[("gender", 1), ("age", 1)]),
+    SablonIndexModel(keys=[("age", 1)]),
+]
+
+
+@lru_cache(maxsize=None)
+def sablon_partial_model(fields: tuple[str, ...]) -> Type[BaseModel]:
+    """
+    Builds the Pydantic BaseModel of a Sablon document restricted to some of its fields.
+
+    The fields keep the type and default they have in SablonModel, so a projected read validates exactly
+    like a full one. The models are cached, there is one per distinct field selection.
+
+    Args:
+        fields (tuple[str, ...]): The names of the SablonModel fields to keep.
+
+    Returns:
+        Type[BaseModel]: The partial model.
+    """
+    return create_model(
+        "SablonPartialModel",
+        **{field: (SablonModel.model_fields[field].annotation, SablonModel.model_fields[field]) for field in fields}
+    )
@@ -0,0 +1,47 @@
+"""
+This module provides the health endpoints probed by the load balancer and the orchestrator using FastAPI.
+
+Attributes:
+    None
+
+Classes:
+    None
+
+Functions:
+    get_liveness: Endpoint telling that the worker process answers.
+    get_readiness: Endpoint telling whether the worker process is warmed up and ready to serve.
+
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from utils.health import READINESS
+
+router = APIRouter()
+
+
+@router.get("/healthz", include_in_schema=False)
+async def get_liveness() -> JSONResponse:
+    """
+    Endpoint telling that the worker process answers, without touching Mongo: a failing liveness probe restarts the
+    worker, which a Mongo outage must not do.
+
+    Returns:
+        JSONResponse: {"status": "ok"}.
+    """
+    return JSONResponse({"status": "ok"})
+
+
+@router.get("/readyz", include_in_schema=False)
+async def get_readiness() -> JSONResponse:
+    """
+    Endpoint telling whether the worker process is ready to serve: its Mongo connection pool is open and its warm-up
+    (SABLON_WARMUP*) is done.
+
+    Returns:
+        JSONResponse: The readiness of the worker and the report of its warm-up, with the status code 200 when it is
+        ready and 503 while it starts or shuts down.
+    """
+    status = READINESS.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
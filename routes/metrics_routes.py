@@ -0,0 +1,33 @@
+"""
+This module provides the Prometheus metrics endpoint using FastAPI.
+
+Attributes:
+    None
+
+Classes:
+    None
+
+Functions:
+    get_metrics: Endpoint for scraping the metrics of the application in the Prometheus text format.
+
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from utils.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """
+    Endpoint for scraping the metrics of the application: the requests of every route, the store methods, the Mongo
+    commands and connection pool, and the caches of the service.
+
+    Returns:
+        Response: The metrics in the Prometheus text format.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -8,23 +8,262 @@ Classes:
     None
 
 Functions:
+    get_sablon_service: Builds the service selected by the SABLON_DB_BACKEND environment variable.
+    get_insert_coalescer: Builds the coalescer of the single inserts, when SABLON_INSERT_COALESCING is enabled.
+    sablon_lifespan: Lifespan of the application, opens the Mongo connection pool and warms the worker up at startup and
+        closes the pool at shutdown.
     create_sablon: Endpoint for creating a new Sablon document.
+    create_sablons_bulk: Endpoint for creating many Sablon documents at once.
     get_all_sablons: Endpoint for retrieving all Sablon documents.
     get_sablon_by: Endpoint for retrieving a Sablon document by ObjectId or by query.
+    get_sablons_by_oids: Endpoint for retrieving many Sablon documents by their ObjectIds.
+    get_cache_stats: Endpoint for reading the counters of the document and query caches.
+    count_sablons: Endpoint for counting Sablon documents.
+    count_sablons_by: Endpoint for counting Sablon documents by the values of a field.
+    get_sablons_summary: Endpoint for the count, min, max and average of a numeric field.
+    get_sablons_histogram: Endpoint for the histogram of a numeric field.
+    get_index_drift: Endpoint for comparing the declared indexes with the indexes of the Sablon collection.
+    require_admin: Dependency restricting an endpoint to the admin, with the SABLON_ADMIN_TOKEN token.
+    get_slow_queries: Endpoint for reading the slow query log, restricted to the admin.
     update_sablon: Endpoint for updating a Sablon document.
+    batch_sablons: Endpoint for executing many insert/update/delete operations at once.
     delete_sablon_by: Endpoint for deleting a Sablon document by ObjectId or by query.
 
 """
 
-from typing import List, Dict, Any, Optional, Union
-from fastapi import APIRouter, HTTPException
+import functools
+import hmac
+import inspect
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Union, AsyncIterator, Callable
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import ValidationError
 
-from models.sablon_model import SablonModel
-from services.sablon_services import SablonServices
+from models.sablon_model import SablonModel, SablonPageModel, SablonMultiGetModel
+from utils.responses import SablonJSONResponse, etag_matches
+from utils.coalescer import InsertCoalescer
+from utils.health import READINESS
+from utils.profiling import profiled
+from utils.settings import admin_token, insert_coalescing_settings, reconcile_indexes_on_startup, warmup_settings
+from services.sablon_services import SablonServices, DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, check_update_fields, parse_fields
+
+
+def get_sablon_service() -> Any:
+    """
+    Builds the service selected by the SABLON_DB_BACKEND environment variable.
+
+    "sync" (the default) uses SablonServices on top of the blocking pymongo driver, while "async" uses
+    AsyncSablonServices on top of motor so that Mongo round trips do not block the event loop.
+
+    Returns:
+        Union[SablonServices, AsyncSablonServices]: The service instance used by the endpoints.
+    """
+    backend = os.environ.get("SABLON_DB_BACKEND", "sync").lower()
+    if backend == "async":
+        from services.async_sablon_services import AsyncSablonServices  # pylint: disable=import-outside-toplevel
+        return AsyncSablonServices()
+    if backend != "sync":
+        raise ValueError(f"Error! Unknown SABLON_DB_BACKEND '{backend}', expected 'sync' or 'async'")
+    return SablonServices()
+
+
+async def _call(method: Callable[..., Any], *args: Any) -> Any:
+    """
+    Calls a method of the service: awaits it when the selected service is asynchronous, and runs it on the thread pool
+    when it is synchronous. The Mongo round trips of the sync service then do not block the event loop, and concurrent
+    requests really run at the same time, so that its single-flight groups share the reads of concurrent misses. When
+    the request is profiled, the method is profiled in its worker thread as well.
+
+    Args:
+        method (Callable[..., Any]): The bound method of the service.
+        *args (Any): The arguments of the call.
+
+    Returns:
+        Any: The result of the service call.
+    """
+    if inspect.iscoroutinefunction(method):
+        return await method(*args)
+    return await run_in_threadpool(profiled(method), *args)
+
+
+async def _resolve(result: Any) -> Any:
+    """
+    Awaits the result of a service call if the selected service is asynchronous.
+
+    Args:
+        result (Any): The value or awaitable returned by the service method.
+
+    Returns:
+        Any: The resolved result of the service call.
+    """
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _wants_ndjson(request: Request) -> bool:
+    """
+    Tells whether the client negotiated the streaming NDJSON read mode through the Accept header.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        bool: True if the response should be streamed as NDJSON.
+    """
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    """
+    Parses the fields query parameter of a read endpoint.
+
+    Args:
+        fields (Optional[str]): The comma separated SablonModel fields to return, None for whole documents.
+
+    Returns:
+        Optional[tuple[str, ...]]: The selected field names, or None for whole documents.
+    """
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _read_response(result: Any, etag: Optional[str] = None) -> SablonJSONResponse:
+    """
+    Serializes the result of a read straight to JSON bytes with orjson.
+
+    The service already built (and, off the trusted read path, validated) the models, so the response_model of the
+    endpoint is not applied again. Partial models of a projected read are sent with their selected fields only.
+
+    Args:
+        result (Any): The result of the service call.
+        etag (Optional[str]): The ETag of the result, None to send none.
+
+    Returns:
+        SablonJSONResponse: The JSON response of the result.
+    """
+    return SablonJSONResponse(content=result, headers=_etag_headers(etag))
+
+
+def _etag_headers(etag: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Builds the headers carrying the ETag of a read.
+
+    Args:
+        etag (Optional[str]): The ETag of the read, None when it has none.
+
+    Returns:
+        Optional[Dict[str, str]]: The ETag header, or None.
+    """
+    return {"ETag": etag} if etag else None
+
+
+def _not_modified(etag: str) -> Response:
+    """
+    Builds the 304 Not Modified answer of a conditional read whose ETag still matches.
+
+    Args:
+        etag (str): The ETag held by the client.
+
+    Returns:
+        Response: The empty 304 response.
+    """
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+async def _read_json_items(request: Request) -> Any:
+    """
+    Reads a request body sent either as a JSON document or as NDJSON (one JSON document per line).
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Any: The decoded JSON document, or the list of decoded lines for a NDJSON body.
+
+    Raises:
+        ValueError: If the body is not valid JSON/NDJSON.
+    """
+    if NDJSON_MEDIA_TYPE in request.headers.get("content-type", ""):
+        body = await request.body()
+        return [json.loads(line) for line in body.splitlines() if line.strip()]
+    return json.loads(await request.body())
+
+
+def get_insert_coalescer(service: Any) -> Optional[InsertCoalescer]:
+    """
+    Builds the coalescer of the single inserts, when SABLON_INSERT_COALESCING is enabled.
+
+    The concurrent POST / requests then share unordered insert_many calls instead of an insert_one each. The batches of
+    the sync service are written on the thread pool, so that the event loop keeps gathering the next batch.
+
+    Args:
+        service (Union[SablonServices, AsyncSablonServices]): The service writing the batches.
+
+    Returns:
+        Optional[InsertCoalescer]: The coalescer, or None when the inserts are not coalesced.
+    """
+    settings = insert_coalescing_settings()
+    if not settings["enabled"]:
+        return None
+    insert_batch = service.add_sablon_batch
+    if not inspect.iscoroutinefunction(insert_batch):
+        insert_batch = functools.partial(run_in_threadpool, service.add_sablon_batch)
+    return InsertCoalescer(insert_batch, settings["max_batch"], settings["max_delay"])
+
 
 router = APIRouter()
-sablon_service = SablonServices()
+logger = logging.getLogger("uvicorn.error")
+sablon_service = get_sablon_service()
+insert_coalescer = get_insert_coalescer(sablon_service)
+
+
+@asynccontextmanager
+async def sablon_lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Lifespan of the application: creates the Mongo client of the service, pre-warms its connection pool and reconciles
+    the declared indexes (unless SABLON_RECONCILE_INDEXES is false, as in the workers of the supervisor, which reconciles
+    them once before starting them), then warms the worker up (unless SABLON_WARMUP is
+    false) by building the OpenAPI schema, running the Sablon models and preloading the caches, before the worker is
+    marked ready and its first request is served. A failed reconciliation or warm-up fails the startup of the worker, which never reports
+    ready. The worker is marked not ready and the client is closed at shutdown. Running it per worker keeps the client
+    out of forked processes.
+
+    Args:
+        app (FastAPI): The application being started.
+    """
+    READINESS.mark_not_ready()
+    await _resolve(sablon_service.db.connect())
+    if reconcile_indexes_on_startup():
+        result = await _resolve(sablon_service.reconcile_indexes())
+        if result.get("error") is not None:
+            logger.error("Sablon index reconciliation failed: %s", result.get("error"))
+            sablon_service.db.close()
+            raise RuntimeError(f"Error! The index reconciliation failed: {result.get('error')}")
+        logger.info("Sablon indexes reconciled: %s", result)
+    warmup = warmup_settings()
+    report = None
+    if warmup["enabled"]:
+        app.openapi()
+        report = await _resolve(sablon_service.warm_up(warmup["documents"], warmup["queries"]))
+        print(f"Sablon warm-up: {report}")
+        if report.get("error") is not None:
+            sablon_service.db.close()
+            raise RuntimeError(f"Error! The warm-up failed: {report.get('error')}")
+    READINESS.mark_ready(report)
+    yield
+    READINESS.mark_not_ready()
+    sablon_service.db.close()
 
 
 @router.post("/", response_model=Dict[str, Any])
@@ -39,67 +278,154 @@ async def create_sablon(sablon_data: dict) -> Dict[str, Any]:
       Dict[str, Any]: A dictionary containing the result of the operation.
   """
     try:
-        result = sablon_service.add_sablon(SablonModel(**sablon_data))
-        result["oid"] = str(result["oid"])
-
+        sablon = SablonModel(**sablon_data)
+        if insert_coalescer is not None:
+            result = await insert_coalescer.submit(sablon.model_dump())
+        else:
+            result = await _call(sablon_service.add_sablon, sablon)
         if isinstance(result, dict) and result.get("error") is not None:
             raise HTTPException(status_code=400, detail=result.get("error"))
+        result["oid"] = str(result["oid"])
         return result
     except ValidationError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/", response_model=Union[List[SablonModel], Dict[str, Any]])
-async def get_all_sablons() -> List[SablonModel]:
+@router.post("/bulk", response_model=Dict[str, Any])
+async def create_sablons_bulk(request: Request) -> Dict[str, Any]:
+    """
+    Endpoint for creating many Sablon documents at once.
+
+    The body is a JSON array of Sablon documents, or NDJSON when sent as application/x-ndjson. The documents are
+    validated and written in chunks with unordered insert_many calls.
+
+    Args:
+        request (Request): The incoming request, holding the documents.
+
+    Returns:
+        Dict[str, Any]: The number of inserted documents, their ObjectIds by position (None for the failed items)
+        and the per-item errors.
+    """
+    try:
+        sabloane = await _read_json_items(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Error! Invalid bulk body: {e}")
+
+    result = await _call(sablon_service.add_sabloane, sabloane)
+    if isinstance(result, dict) and result.get("error") is not None:
+        raise HTTPException(status_code=400, detail=result.get("error"))
+    result["oids"] = [str(oid) if oid is not None else None for oid in result["oids"]]
+    return result
+
+
+@router.get("/", response_model=Union[List[SablonModel], SablonPageModel, Dict[str, Any]])
+async def get_all_sablons(request: Request, limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_LIMIT),
+                          cursor: Optional[str] = None, fields: Optional[str] = None) \
+        -> Union[List[SablonModel], Dict[str, Any], StreamingResponse, JSONResponse]:
     """
    Endpoint for retrieving all Sablon documents.
 
+   When limit or cursor is given, a single page ordered by ObjectId is returned together with the next_cursor
+   to pass for the following page. When the client accepts application/x-ndjson, the whole collection is streamed
+   instead, one document per line. When fields is given, only those fields are read from Mongo and returned.
+   Every answer carries the ETag of the version of the collection shared by the workers, a request whose If-None-Match
+   still holds it gets a 304 Not Modified without the documents being read.
+
+   Args:
+       request (Request): The incoming request, used for content negotiation and conditional reads.
+       limit (Optional[int]): The page size, enables pagination.
+       cursor (Optional[str]): The next_cursor of the previous page, enables pagination.
+       fields (Optional[str]): The comma separated SablonModel fields to return, e.g. "name,age".
+
    Returns:
-       Union[List[SablonModel], Dict[str, Any]]: A list of SablonModel instances or a dictionary containing the error message.
+       Union[List[SablonModel], Dict[str, Any], StreamingResponse, JSONResponse]: A list of SablonModel instances, a page
+       or a NDJSON stream.
    """
+    fields = _parse_fields(fields)
+    etag = await _call(sablon_service.get_collection_etag, fields)
+    etag = etag if isinstance(etag, str) else None
+    if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+        return _not_modified(etag)
+    if _wants_ndjson(request):
+        return StreamingResponse(sablon_service.stream_sabloane(fields=fields), media_type=NDJSON_MEDIA_TYPE,
+                                 headers=_etag_headers(etag))
+
+    if limit is not None or cursor is not None:
+        page = await _call(sablon_service.get_sabloane_page, limit or DEFAULT_PAGE_LIMIT, cursor, fields)
+        if isinstance(page, dict) and page.get("error") is not None:
+            raise HTTPException(status_code=400, detail=page.get("error"))
+        return _read_response(page, etag)
+
     try:
-        results = sablon_service.get_all_sabloane()
+        results = await _call(sablon_service.get_all_sabloane, fields)
 
         if isinstance(results, dict) and results.get("error") is not None:
             raise HTTPException(status_code=400, detail=results.get("error"))
-        return results
+        return _read_response(results, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/sabloane/{input_data}", response_model=Union[SablonModel, List[SablonModel]])
-async def get_sablon_by(input_data: Optional[str] = None, body_data: Optional[Dict[str, Any]] = None) \
-        -> Union[SablonModel, List[SablonModel]]:
+@router.get("/sabloane/{input_data}", response_model=Union[SablonModel, List[SablonModel], SablonPageModel])
+async def get_sablon_by(request: Request, input_data: Optional[str] = None, body_data: Optional[Dict[str, Any]] = None,
+                        limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_LIMIT),
+                        cursor: Optional[str] = None, fields: Optional[str] = None) \
+        -> Union[SablonModel, List[SablonModel], Dict[str, Any], StreamingResponse, JSONResponse]:
     """
     Endpoint for retrieving a Sablon document by ObjectId or by query.
 
+    Query reads are streamed as NDJSON when the client accepts application/x-ndjson, and paginated by ObjectId
+    when limit or cursor is given. When fields is given, only those fields are read from Mongo and returned.
+    A document read carries the ETag of the version of the document and of the selected fields, a request whose
+    If-None-Match holds it gets a 304 Not Modified, without Mongo being read when the document is cached.
+
     Args:
+        request (Request): The incoming request, used for content negotiation and conditional reads.
         input_data (Optional[str]): The ObjectId or query parameter.
         body_data (Optional[Dict[str, Any]]): The query body data.
+        limit (Optional[int]): The page size of a query read, enables pagination.
+        cursor (Optional[str]): The next_cursor of the previous page of a query read, enables pagination.
+        fields (Optional[str]): The comma separated SablonModel fields to return, e.g. "name,age".
 
     Returns:
-        Union[SablonModel, List[SablonModel]]: A SablonModel instance or a list of SablonModel instances.
+        Union[SablonModel, List[SablonModel], Dict[str, Any], StreamingResponse, JSONResponse]: A SablonModel instance, a list
+        of SablonModel instances, a page or a NDJSON stream.
     """
+    fields = _parse_fields(fields)
     if input_data == "None":
         input_data = None
     if input_data and body_data is None:
         try:
-            result = sablon_service.get_sablon_by_oid(input_data)
+            result = await _call(sablon_service.get_sablon_and_etag, input_data, fields)
             if isinstance(result, dict) and result.get("error") is not None:
                 raise HTTPException(status_code=400, detail=result.get("error"))
-            return result
+            sablon, etag = result
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return _not_modified(etag)
+            return _read_response(sablon, etag)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    elif input_data is None and body_data and _wants_ndjson(request):
+        return StreamingResponse(sablon_service.stream_sabloane(body_data, fields), media_type=NDJSON_MEDIA_TYPE)
+
+    elif input_data is None and body_data and (limit is not None or cursor is not None):
+        page = await _call(sablon_service.get_sabloane_by_query_page, body_data, limit or DEFAULT_PAGE_LIMIT, cursor, fields)
+        if isinstance(page, dict) and page.get("error") is not None:
+            raise HTTPException(status_code=400, detail=page.get("error"))
+        return _read_response(page)
+
     elif input_data is None and body_data:
         try:
-            results = sablon_service.get_sabloane_by_query(body_data)
+            results = await _call(sablon_service.get_sabloane_by_query, body_data, fields)
             if isinstance(results, dict) and results.get("error") is not None:
                 raise HTTPException(status_code=400, detail=results.get("error"))
-            return results
+            return _read_response(results)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
@@ -108,6 +434,163 @@ async def get_sablon_by(input_data: Optional[str] = None, body_data: Optional[Di
         raise HTTPException(status_code=400, detail="Error! Bad get request")
 
 
+@router.post("/sabloane/multi", response_model=SablonMultiGetModel)
+async def get_sablons_by_oids(body_data: Dict[str, Any], fields: Optional[str] = None) -> Union[Dict[str, Any], JSONResponse]:
+    """
+    Endpoint for retrieving many Sablon documents by their ObjectIds in one call.
+
+    Args:
+        body_data (Dict[str, Any]): {"oids": [...]}, the ObjectIds of the Sablon documents.
+        fields (Optional[str]): The comma separated SablonModel fields to return, e.g. "name,age".
+
+    Returns:
+        Dict[str, Any]: The Sablon documents in request order (null for misses), the missing ObjectIds and the per-item errors.
+    """
+    fields = _parse_fields(fields)
+    result = await _call(sablon_service.get_sabloane_by_oids, body_data.get("oids"), fields)
+    if isinstance(result, dict) and result.get("error") is not None:
+        raise HTTPException(status_code=400, detail=result.get("error"))
+    return _read_response(result)
+
+
+async def require_admin(x_sablon_admin_token: Optional[str] = Header(default=None)) -> None:
+    """
+    Dependency restricting an endpoint to the admin, who sends the SABLON_ADMIN_TOKEN token in the X-Sablon-Admin-Token
+    header. Without a configured token the admin endpoints are disabled and answer 404.
+
+    Args:
+        x_sablon_admin_token (Optional[str]): The X-Sablon-Admin-Token header of the request.
+    """
+    token = admin_token()
+    if token is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_sablon_admin_token is None or not hmac.compare_digest(x_sablon_admin_token.encode("latin-1"),
+                                                                token.encode("latin-1")):
+        raise HTTPException(status_code=403, detail="Error! A valid X-Sablon-Admin-Token header is required")
+
+
+@router.get("/cache/stats", response_model=Dict[str, Any], dependencies=[Depends(require_admin)])
+async def get_cache_stats() -> Dict[str, Any]:
+    """
+    Endpoint for reading the counters of the document and query caches, used to size them, restricted to the admin,
+    see require_admin.
+
+    Returns:
+        Dict[str, Any]: The size, capacity, ttl, hits, misses, hit ratio, evictions and expirations of each cache.
+    """
+    return await _resolve(sablon_service.get_cache_stats())
+
+
+def _stats_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Raises the error of a statistic as a 400, or returns its result.
+
+    Args:
+        result (Dict[str, Any]): The result of the service call.
+
+    Returns:
+        Dict[str, Any]: The result of the statistic.
+    """
+    if result.get("error") is not None:
+        raise HTTPException(status_code=400, detail=result.get("error"))
+    return result
+
+
+@router.get("/stats/count", response_model=Dict[str, Any])
+async def count_sablons(body_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Endpoint for counting Sablon documents on the server.
+
+    Args:
+        body_data (Optional[Dict[str, Any]]): The query restricting the count, none for the whole collection.
+
+    Returns:
+        Dict[str, Any]: {"count": ...}.
+    """
+    return _stats_result(await _call(sablon_service.count_sabloane, body_data))
+
+
+@router.get("/stats/count-by/{field}", response_model=Dict[str, Any])
+async def count_sablons_by(field: str, body_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Endpoint for counting Sablon documents by the values of a field, e.g. /stats/count-by/gender.
+
+    Args:
+        field (str): The SablonModel field to group by.
+        body_data (Optional[Dict[str, Any]]): The query restricting the count, none for the whole collection.
+
+    Returns:
+        Dict[str, Any]: The field and its {"value", "count"} entries, most frequent first.
+    """
+    return _stats_result(await _call(sablon_service.count_sabloane_by, field, body_data))
+
+
+@router.get("/stats/summary/{field}", response_model=Dict[str, Any])
+async def get_sablons_summary(field: str, body_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Endpoint for the count, min, max and average of a numeric field, e.g. /stats/summary/age.
+
+    Args:
+        field (str): The numeric SablonModel field.
+        body_data (Optional[Dict[str, Any]]): The query restricting the statistic, none for the whole collection.
+
+    Returns:
+        Dict[str, Any]: The field, the number of values and their min, max and avg.
+    """
+    return _stats_result(await _call(sablon_service.get_sabloane_summary, field, body_data))
+
+
+@router.get("/stats/histogram/{field}", response_model=Dict[str, Any])
+async def get_sablons_histogram(field: str, boundaries: Optional[str] = None,
+                                buckets: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_LIMIT),
+                                body_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Endpoint for the histogram of a numeric field, e.g. /stats/histogram/age?boundaries=0,18,65,120 or
+    /stats/histogram/age?buckets=10.
+
+    Args:
+        field (str): The numeric SablonModel field.
+        boundaries (Optional[str]): The comma separated ascending bucket boundaries.
+        buckets (Optional[int]): The number of buckets of about the same size, when no boundaries are given.
+        body_data (Optional[Dict[str, Any]]): The query restricting the histogram, none for the whole collection.
+
+    Returns:
+        Dict[str, Any]: The field, its {"min", "max", "count"} buckets and the number of values outside the boundaries.
+    """
+    return _stats_result(await _call(sablon_service.get_sabloane_histogram, field, boundaries, buckets, body_data))
+
+
+@router.get("/indexes", response_model=Dict[str, Any], dependencies=[Depends(require_admin)])
+async def get_index_drift() -> Dict[str, Any]:
+    """
+    Endpoint for comparing the indexes declared in SABLON_INDEXES with the indexes of the Sablon collection, restricted
+    to the admin, see require_admin.
+
+    Returns:
+        Dict[str, Any]: The missing, changed and extra index names and whether the collection is in sync.
+    """
+    result = await _call(sablon_service.get_index_drift)
+    if isinstance(result, dict) and result.get("error") is not None:
+        raise HTTPException(status_code=500, detail=result.get("error"))
+    return result
+
+
+@router.get("/admin/slow-queries", response_model=List[Dict[str, Any]], dependencies=[Depends(require_admin)])
+async def get_slow_queries() -> List[Dict[str, Any]]:
+    """
+    Endpoint for reading the slow query log: the most recent queries slower than SABLON_SLOW_QUERY_MS, with the shape of
+    their filter and the winning plan Mongo picks for their command. The log holds the filters of the queries, so it is
+    restricted to the admin, see require_admin.
+
+    Returns:
+        List[Dict[str, Any]]: The slow queries, the most recent first.
+    """
+    result = await _call(sablon_service.get_slow_queries)
+    if isinstance(result, dict) and result.get("error") is not None:
+        raise HTTPException(status_code=500, detail=result.get("error"))
+    return _read_response(result)
+
+
 @router.put("/{input_data}", response_model=Dict[str, Any])
 async def update_sablon(input_data: str, body_data: dict) -> Dict[str, Any]:
     """
@@ -121,14 +604,9 @@ async def update_sablon(input_data: str, body_data: dict) -> Dict[str, Any]:
         Dict[str, Any]: A dictionary containing the result of the operation.
     """
     try:
-        if "name" in body_data and not isinstance(body_data.get("name"), str):
-            raise HTTPException(status_code=400, detail="Error! 'name' parameter is not a string instance")
-        if "age" in body_data and not isinstance(body_data.get("age"), int):
-            raise HTTPException(status_code=400, detail="Error! 'age' parameter is not an integer instance")
-        if "gender" in body_data and not isinstance(body_data.get("gender"), str):
-            raise HTTPException(status_code=400, detail="Error! 'gender' parameter is not a string instance")
-
-        result = sablon_service.update_sablon(input_data, body_data)
+        check_update_fields(body_data)
+
+        result = await _call(sablon_service.update_sablon, input_data, body_data)
         if isinstance(result, dict) and result.get("error") is not None:
             raise HTTPException(status_code=400, detail=result.get("error"))
         return result
@@ -137,6 +615,29 @@ async def update_sablon(input_data: str, body_data: dict) -> Dict[str, Any]:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/batch", response_model=Dict[str, Any])
+async def batch_sablons(body_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Endpoint for executing many insert/update/delete operations at once, in a single bulk_write.
+
+    Args:
+        body_data (Dict[str, Any]): {"operations": [...], "ordered": bool}. Each operation is one of
+            {"op": "insert", "document": {...}}, {"op": "update", "oid" | "query": ..., "document": {...}} or
+            {"op": "delete", "oid" | "query": ...}. "ordered" (default true) stops the batch at the first failure.
+
+    Returns:
+        Dict[str, Any]: The inserted/matched/modified/deleted counts and one {"status": ...} entry per operation.
+    """
+    ordered = body_data.get("ordered", True)
+    if not isinstance(ordered, bool):
+        raise HTTPException(status_code=400, detail="Error! 'ordered' parameter is not a boolean instance")
+
+    result = await _call(sablon_service.batch_sabloane, body_data.get("operations"), ordered)
+    if isinstance(result, dict) and result.get("error") is not None:
+        raise HTTPException(status_code=400, detail=result.get("error"))
+    return result
+
+
 @router.delete("/{input_data}", response_model=Dict[str, Any])
 async def delete_sablon_by(input_data: Optional[str] = None, body_data: Optional[Dict[str, Any]] = None) -> Dict[
     str, Any]:
@@ -154,13 +655,13 @@ async def delete_sablon_by(input_data: Optional[str] = None, body_data: Optional
         input_data = None
 
     if input_data and body_data is None:
-        result = sablon_service.delete_sablon_by_id(input_data)
+        result = await _call(sablon_service.delete_sablon_by_id, input_data)
         if isinstance(result, dict) and result.get("error") is not None:
             raise HTTPException(status_code=400, detail=result.get("error"))
         return result
 
     elif input_data is None and body_data:
-        result = sablon_service.delete_sablon_by_query(body_data)
+        result = await _call(sablon_service.delete_sablon_by_query, body_data)
         if isinstance(result, dict) and result.get("error") is not None:
             raise HTTPException(status_code=400, detail=result.get("error"))
         return result
@@ -2,31 +2,101 @@
 Sablon Management API
 
 This module defines a FastAPI application for managing Sablon documents. It includes routing for CRUD operations on Sablon documents.
+The Mongo connection pool is opened by the lifespan of the application, so importing this module does not connect to Mongo.
+Responses are compressed for the clients that accept it, as configured by the SABLON_COMPRESSION* environment variables.
+Every request is traced, its timing breakdown is answered in a Server-Timing header and its spans can be exported to a
+file (SABLON_SERVER_TIMING, SABLON_TRACE_FILE).
+An admin can run a request under a profiler, and a share of the requests can be profiled continuously (SABLON_ADMIN_TOKEN,
+SABLON_PROFILE_*).
+The Prometheus metrics of the requests, of Mongo and of the caches are served on /metrics, unless SABLON_METRICS is false.
+A worker answers /healthz once it runs and /readyz once its lifespan has opened its Mongo connection pool and warmed it
+up (SABLON_WARMUP*), so that the load balancer sends it traffic only then.
 
 Usage:
-    To start the server, run this script directly. The server listens on port 8000 by default.
+    To start the production server, run this script directly. It reads config.json and the SABLON_HOST, SABLON_PORT,
+    SABLON_WORKERS, ... environment variables (see utils.settings) and serves on port 8000 with one worker process per
+    CPU by default. SIGHUP restarts the workers one at a time, SIGINT/SIGTERM stops them gracefully.
+    The declared indexes are reconciled once by the supervisor before the workers start (unless
+    SABLON_RECONCILE_INDEXES is false), a failed reconciliation stops the startup.
 
 Attributes:
     None
 
 Functions:
-    None
+    main: Starts the production server.
 """
 
-import uvicorn
+import logging
+import os
+import sys
+
 from fastapi import FastAPI
 
-from routes.sablon_routes import router as sablon_router
+from routes.health_routes import router as health_router
+from routes.metrics_routes import router as metrics_router
+from routes.sablon_routes import router as sablon_router, sablon_lifespan, sablon_service
+from utils.compression import CompressionMiddleware
+from utils.metrics import MetricsMiddleware, mark_worker_dead, multiprocess_metrics, register_cache_collector
+from utils.profiling import ProfilerMiddleware
+from utils.server import ServerSupervisor, server_config
+from utils.indexes import reconcile_declared_indexes
+from utils.settings import compression_settings, metrics_enabled, profiling_settings, reconcile_indexes_on_startup, \
+    server_settings, tracing_settings
+from utils.tracing import SpanFileExporter, TracingMiddleware
+
+# The uvicorn logger, configured by the uvicorn configuration in the supervisor as in the workers
+logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI()
+app = FastAPI(lifespan=sablon_lifespan)
+profiling = profiling_settings()
+if profiling["admin_token"] or profiling["sample_rate"]:
+    # Added first so that it is the innermost middleware and its profiles show the handlers
+    app.add_middleware(ProfilerMiddleware, **profiling)
+compression = compression_settings()
+if compression["enabled"]:
+    app.add_middleware(CompressionMiddleware, minimum_size=compression["minimum_size"],
+                       encodings=compression["encodings"], levels=compression["levels"])
+tracing = tracing_settings()
+if tracing["server_timing"] or tracing["trace_file"]:
+    app.add_middleware(TracingMiddleware, server_timing_header=tracing["server_timing"],
+                       exporter=SpanFileExporter(tracing["trace_file"]) if tracing["trace_file"] else None)
+if metrics_enabled():
+    # Added last so that it is the outermost middleware and its durations include the compression
+    app.add_middleware(MetricsMiddleware)
+    register_cache_collector(sablon_service.get_cache_stats)
+    app.include_router(metrics_router)
+app.include_router(health_router)
 app.include_router(sablon_router, prefix="/sablon", tags=["sabloane"])
 
+
+
+def main() -> int:
+    """
+    Starts the production server: a supervisor binding the socket and the worker processes serving the application.
+    The declared indexes are reconciled here, once, and the workers inherit SABLON_RECONCILE_INDEXES=false so that
+    their lifespans skip it.
+
+    Returns:
+        int: The exit code of the supervisor, 1 if the index reconciliation failed.
+    """
+    settings = server_settings()
+    config = server_config("sablon_api:app", settings)
+    if reconcile_indexes_on_startup():
+        result = reconcile_declared_indexes()
+        if result.get("error") is not None:
+            logger.error("Sablon index reconciliation failed: %s", result.get("error"))
+            return 1
+        logger.info("Sablon indexes reconciled: %s", result)
+        os.environ["SABLON_RECONCILE_INDEXES"] = "false"
+    # With several workers, a scrape of /metrics aggregates the metrics of all of them
+    with multiprocess_metrics(metrics_enabled() and settings["workers"] > 1):
+        return ServerSupervisor(config, settings["workers"], on_worker_exit=mark_worker_dead).run()
+
+
+if __name__ == "__mp_main__":
+    # The workers spawned by the supervisor import this script as __mp_main__, so that importing "sablon_api:app"
+    # afterwards reuses it instead of building the application a second time
+    sys.modules.setdefault("sablon_api", sys.modules[__name__])
+
 if __name__ == "__main__":
-    try:
-        uvicorn.run(
-            app,
-            host="0.0.0.0",
-            port=8000
-        )
-    except KeyboardInterrupt:
-        print("Server is shutting down...")
+    sys.exit(main())
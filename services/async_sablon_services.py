@@ -0,0 +1,758 @@
+"""
+This module provides asynchronous services for managing Sablon documents in a MongoDB database.
+
+Attributes:
+    None
+
+Classes:
+    AsyncSablonServices: A class containing coroutine methods for CRUD operations on Sablon documents.
+
+"""
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator
+
+from bson import ObjectId
+from pydantic import BaseModel
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from utils.async_db_store import AsyncMongoDBStore
+from utils.cache import LRUTTLCache, QueryCache, SharedVersion, MISSING
+from utils.indexes import index_drift
+from utils.singleflight import AsyncSingleFlight
+from utils.tracing import trace_methods
+from models.sablon_model import SablonModel
+from services.sablon_services import DEFAULT_PAGE_LIMIT, STREAM_BATCH_SIZE, MULTI_GET_CHUNK_SIZE, DOCUMENT_CACHE_SIZE, \
+    DOCUMENT_CACHE_TTL, QUERY_CACHE_MAX_BYTES, QUERY_CACHE_TTL, QUERY_CACHE_STALE_TTL, COLLECTION_VERSION_TTL, \
+    VERSION_FIELD, build_page, \
+    check_page_limit, decode_cursor, ndjson_error_line, to_ndjson_line, bulk_insert_chunks, collect_bulk_chunk, \
+    collect_bulk_insert, bulk_write_errors, collect_insert_batch, prepare_batch, batch_changes_documents, collect_batch, \
+    parse_oids, collect_multi_get, parse_fields, build_projection, read_model, read_document, read_documents, \
+    cache_document, read_cached_documents, collect_cache_stats, query_cache_key, collect_query_result, stats_match, \
+    count_by_pipeline, summary_pipeline, collect_summary, parse_boundaries, histogram_pipeline, collect_histogram, \
+    document_etag, collection_etag, declared_indexes, plan_index_reconcile, warm_up_models, check_warm_up_query, \
+    warm_up_report
+
+logger = logging.getLogger(__name__)
+
+
+@trace_methods("service")
+class AsyncSablonServices:
+    """
+       A class containing coroutine methods for CRUD operations on Sablon documents.
+
+       It mirrors SablonServices method for method, but awaits an AsyncMongoDBStore so that a slow Mongo
+       round trip does not stall the other requests served by the same event loop. The logic both services share lives
+       in the module functions of services.sablon_services, the methods only hold the store calls and the caches.
+
+       Methods:
+           __init__: Initializes the AsyncMongoDBStore instance, the document cache and the query cache.
+           get_cache_stats: Returns the counters of the caches of the service.
+           get_slow_queries: Returns the slow query log of the store.
+           get_collection_etag: Returns the ETag of the current version of the Sablon collection.
+           add_sablon: Adds a new Sablon document to the database.
+           add_sabloane: Adds many Sablon documents to the database in chunked insert_many calls.
+           add_sablon_batch: Adds the single Sablon documents of concurrent requests in one insert_many call.
+           get_all_sabloane: Retrieves all Sablon documents from the database.
+           get_sablon_by_oid: Retrieves a Sablon document by its ObjectId.
+           get_sablon_and_etag: Retrieves a Sablon document by its ObjectId together with the ETag of its version.
+           get_sabloane_by_oids: Retrieves many Sablon documents by their ObjectIds.
+           get_sabloane_by_query: Retrieves Sablon documents based on a query.
+           get_sabloane_page: Retrieves one page of Sablon documents.
+           get_sabloane_by_query_page: Retrieves one page of the Sablon documents matching a query.
+           stream_sabloane: Streams Sablon documents as NDJSON lines.
+           update_sablon: Updates a Sablon document.
+           batch_sabloane: Executes a list of insert/update/delete operations in a single bulk_write.
+           delete_sablon_by_id: Deletes a Sablon document by its ObjectId.
+           delete_sablon_by_query: Deletes Sablon documents based on a query.
+           count_sabloane: Counts the Sablon documents.
+           count_sabloane_by: Counts the Sablon documents by the values of a field.
+           get_sabloane_summary: Computes the count, min, max and average of a numeric field.
+           get_sabloane_histogram: Computes the histogram of a numeric field.
+           get_index_drift: Compares the declared indexes with the indexes of the Sablon collection.
+           reconcile_indexes: Creates the missing declared indexes and rebuilds the changed ones.
+           warm_up: Runs the Sablon models once and preloads the document and query caches before the first request.
+       """
+
+    def __init__(self):
+        """
+       Initializes the AsyncMongoDBStore instance, the read-through cache of single documents, the query cache, the
+       single-flight groups of their loads and the view of the collection version the caches are checked against.
+
+       Args:
+           None
+
+       Returns:
+           None
+       """
+        self.db = AsyncMongoDBStore()
+        self.document_cache = LRUTTLCache(DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL)
+        self.query_cache = QueryCache(QUERY_CACHE_MAX_BYTES, QUERY_CACHE_TTL, QUERY_CACHE_STALE_TTL)
+        self.document_flight = AsyncSingleFlight()
+        self.query_flight = AsyncSingleFlight()
+        self.collection_version = SharedVersion(COLLECTION_VERSION_TTL, self._collection_changed)
+        self._query_refreshes = set()
+
+    async def _get_document(self, document_id: ObjectId, fields: tuple[str, ...] | None) -> dict:
+        """
+        Reads a document through the document cache.
+
+        Whole documents are read and cached with their version on a miss. A projected read is served from a cached
+        whole document when there is one, otherwise it is read with its projection and its version, and not cached.
+        Concurrent misses of the same document and fields share one read.
+
+        Args:
+            document_id (ObjectId): The ObjectId of the document.
+            fields (tuple[str, ...] | None): The selected field names, None for the whole document.
+
+        Returns:
+            dict: The stored document, holding its version. It must not be modified, see select_fields.
+        """
+        await self._check_collection_version()
+        cached = self.document_cache.get(document_id)
+        if cached is not MISSING:
+            return cached
+        generation = self.document_cache.generation
+        return await self.document_flight.do((document_id, fields, generation), self._read_document, document_id,
+                                             fields, generation)
+
+    async def _read_document(self, document_id: ObjectId, fields: tuple[str, ...] | None, generation: int) -> dict:
+        """
+        Reads a document from the store and caches it when it is whole, run once for the concurrent misses of _get_document.
+
+        Args:
+            document_id (ObjectId): The ObjectId of the document.
+            fields (tuple[str, ...] | None): The selected field names, None for the whole document.
+            generation (int): The generation of the document cache read before the miss.
+
+        Returns:
+            dict: The stored document.
+        """
+        result = await self.db.get_document_by_id("sablon_db", "sablon_collection", document_id,
+                                                  None if fields is None else {**build_projection(fields), VERSION_FIELD: 1})
+        if result is None:
+            raise LookupError(f"Error! No Sablon document with ObjectId {document_id}")
+        if fields is None:
+            cache_document(self.document_cache, result, generation)
+        return result
+
+    def _collection_changed(self) -> None:
+        """
+        Drops the cached documents and query results of this worker, called when the version of the collection changed
+        in another worker, so that its writes are not hidden by them.
+        """
+        self.document_cache.clear()
+        self.query_cache.bump()
+
+    async def _check_collection_version(self) -> int:
+        """
+        Checks the caches against the version of the collection shared by every worker, read from Mongo at most every
+        COLLECTION_VERSION_TTL seconds, and drops them when another worker wrote to the collection since then.
+
+        Returns:
+            int: The version of the collection.
+        """
+        if self.collection_version.stale():
+            version = None
+            try:
+                version = await self.db.get_collection_version("sablon_db", "sablon_collection")
+            finally:
+                self.collection_version.update(version)
+        return self.collection_version.value
+
+    async def _collection_written(self) -> None:
+        """
+        Marks the Sablon collection as written to: bumps the query cache generation of this worker and the version of the
+        collection shared by every worker, which invalidates the collection ETags they issued and the caches of the
+        other workers.
+
+        The version is bumped after the write, in a round trip of its own. When the bump fails the write is done all the
+        same: the failure is logged, the caches of this worker are dropped and its view of the version is read again,
+        the other workers only see the write once their cached entries expire.
+        """
+        self.query_cache.bump()
+        try:
+            version = await self.db.bump_collection_version("sablon_db", "sablon_collection")
+        except Exception as e:
+            logger.error("Sablon collection version bump failed, the other workers may serve stale reads: %s", e)
+            self.document_cache.clear()
+            self.collection_version.update(None)
+            return
+        self.collection_version.update(version, written=True)
+
+    def get_cache_stats(self) -> dict:
+        """
+        Returns the counters of the caches of the service, used to size them.
+
+        Returns:
+            dict: The size, hits, misses, hit ratio, evictions and expirations of every cache, and the calls in flight,
+            shared and run calls of the single-flight groups of their loads.
+        """
+        return collect_cache_stats(self.document_cache, self.query_cache, self.document_flight, self.query_flight)
+
+    async def get_slow_queries(self) -> list[dict] | dict:
+        """
+        Returns the slow query log of the store, each query with the shape of its filter and its winning plan.
+
+        Returns:
+            Union[list[dict], dict]: The slow queries, the most recent first, or a dictionary containing the error message.
+        """
+        try:
+            return await self.db.get_slow_queries()
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_collection_etag(self, fields: str | list[str] | None = None) -> str | dict:
+        """
+        Returns the ETag of the current version of the Sablon collection, read before the documents it describes. The
+        version is the one the caches are checked against, read from Mongo at most every COLLECTION_VERSION_TTL seconds.
+
+        Args:
+            fields (str | list[str] | None): The SablonModel fields of the read (comma separated), None for whole documents.
+
+        Returns:
+            Union[str, dict]: The quoted ETag or a dictionary containing the error message.
+        """
+        try:
+            return collection_etag(await self._check_collection_version(), parse_fields(fields))
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def _load_query(self, key: str, sablon_query: dict, fields: tuple[str, ...] | None) -> tuple[BaseModel, ...]:
+        """
+        Reads the documents matching a query from the store and stores them in the query cache.
+
+        Args:
+            key (str): The query cache key of the query.
+            sablon_query (dict): The query to filter Sablon documents.
+            fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+        Returns:
+            tuple[BaseModel, ...]: The SablonModel instances (partial models when fields are selected).
+        """
+        generation = self.query_cache.generation
+        await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+        results = self.db.get_documents_by_query("sablon_db", "sablon_collection", sablon_query,
+                                                 projection=build_projection(fields))
+        sabloane, size = collect_query_result(await results.to_list(length=None), fields)
+        self.query_cache.set(key, sabloane, generation, size)
+        return sabloane
+
+    async def _refresh_query(self, key: str, sablon_query: dict, fields: tuple[str, ...] | None) -> None:
+        """
+        Reloads a stale query cache entry, run as a background task by the stale-while-revalidate reads.
+
+        Args:
+            key (str): The query cache key of the query.
+            sablon_query (dict): The query to filter Sablon documents.
+            fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+        """
+        try:
+            await self._load_query(key, sablon_query, fields)
+        except Exception as e:
+            print(f"Query cache refresh failed: {e}")
+        finally:
+            self.query_cache.end_refresh(key)
+
+    async def add_sablon(self, sablon_model: SablonModel) -> dict:
+        """
+       Adds a new Sablon document to the database.
+
+       Args:
+           sablon_model (SablonModel): The SablonModel instance to be added.
+
+       Returns:
+           dict: A dictionary containing the ObjectId of the inserted document or the error message.
+       """
+        try:
+            result = await self.db.add_document("sablon_db", "sablon_collection", sablon_model.dict())
+            await self._collection_written()
+            print(f"Sablon successfully added: {result.inserted_id}")
+            return {"oid": result.inserted_id}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def add_sablon_batch(self, documents: list[dict]) -> list[dict]:
+        """
+       Adds the single Sablon documents of concurrent requests, gathered by the insert coalescer, in one unordered
+       insert_many call, a rejected document does not prevent the others from being inserted.
+
+       Args:
+           documents (list[dict]): The validated Sablon documents, as dictionaries.
+
+       Returns:
+           list[dict]: The result of every document in order, a dictionary containing its ObjectId or the error message.
+       """
+        try:
+            await self.db.add_documents("sablon_db", "sablon_collection", documents)
+            write_errors = {}
+        except PyMongoError as e:
+            write_errors = bulk_write_errors(e, documents)
+        except Exception as e:
+            return [{"error": str(e)} for _ in documents]
+        await self._collection_written()
+        print(f"Sabloane successfully added: {len(documents) - len(write_errors)}")
+        return collect_insert_batch(documents, write_errors)
+
+    async def add_sabloane(self, sabloane: list) -> dict:
+        """
+       Adds many Sablon documents to the database in chunked, unordered insert_many calls.
+
+       Args:
+           sabloane (list): The Sablon documents to be added, as dictionaries.
+
+       Returns:
+           dict: The number of inserted documents, the ObjectIds by request position (None for the failed items) and
+           the per-item errors, or a dictionary containing the error message.
+       """
+        try:
+            chunks = bulk_insert_chunks(sabloane)
+            oids, errors = [None] * len(sabloane), []
+            for documents, positions, chunk_errors in chunks:
+                errors.extend(chunk_errors)
+                if not documents:
+                    continue
+                try:
+                    await self.db.add_documents("sablon_db", "sablon_collection", documents)
+                    write_errors = {}
+                except PyMongoError as e:
+                    write_errors = bulk_write_errors(e, documents)
+                await self._collection_written()
+                collect_bulk_chunk(documents, positions, write_errors, oids, errors)
+            print(f"Sabloane successfully added: {len(sabloane) - len(errors)}")
+            return collect_bulk_insert(len(sabloane), oids, errors)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_all_sabloane(self, fields: str | list[str] | None = None) -> list[BaseModel] | dict:
+        """
+        Retrieves all Sablon documents from the database.
+
+        Args:
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            Union[List[BaseModel], dict]: A list of SablonModel instances (partial models when fields are selected) or a
+            dictionary containing the error message.
+        """
+        try:
+            fields = parse_fields(fields)
+            results = self.db.get_all_documents("sablon_db", "sablon_collection", projection=build_projection(fields))
+            return read_documents(await results.to_list(length=None), fields)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sablon_by_oid(self, sablon_oid: str, fields: str | list[str] | None = None) -> BaseModel | dict:
+        """
+        Retrieves a Sablon document by its ObjectId.
+
+        Args:
+            sablon_oid (str): The ObjectId of the Sablon document.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            Union[BaseModel, dict]: The SablonModel instance (a partial model when fields are selected) or a dictionary
+            containing the error message.
+        """
+        try:
+            fields = parse_fields(fields)
+            result = await self._get_document(ObjectId(sablon_oid), fields)
+            return read_document(result, fields)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sablon_and_etag(self, sablon_oid: str, fields: str | list[str] | None = None) -> tuple[BaseModel, str] | dict:
+        """
+        Retrieves a Sablon document by its ObjectId together with the ETag of its version, from one read.
+
+        Args:
+            sablon_oid (str): The ObjectId of the Sablon document.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            Union[tuple[BaseModel, str], dict]: The SablonModel instance (a partial model when fields are selected) and
+            its quoted ETag, or a dictionary containing the error message.
+        """
+        try:
+            fields = parse_fields(fields)
+            document_id = ObjectId(sablon_oid)
+            result = await self._get_document(document_id, fields)
+            return read_document(result, fields), document_etag(document_id, result.get(VERSION_FIELD, 0), fields)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sabloane_by_oids(self, sablon_oids: list, fields: str | list[str] | None = None) -> dict:
+        """
+        Retrieves many Sablon documents by their ObjectIds, with one $in query per MULTI_GET_CHUNK_SIZE ObjectIds.
+
+        The documents held by the document cache are served from it, only the others are read from Mongo.
+
+        Args:
+            sablon_oids (list): The ObjectIds of the Sablon documents.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            dict: The Sablon documents in request order, the missing ObjectIds and the per-item errors, or a dictionary
+            containing the error message.
+        """
+        try:
+            fields = parse_fields(fields)
+            oids, errors = parse_oids(sablon_oids)
+            await self._check_collection_version()
+            documents, unique_misses = read_cached_documents(self.document_cache, oids, fields)
+            generation = self.document_cache.generation
+            projection = None if fields is None else build_projection(fields, keep_id=True)
+            for start in range(0, len(unique_misses), MULTI_GET_CHUNK_SIZE):
+                chunk = unique_misses[start:start + MULTI_GET_CHUNK_SIZE]
+                async for result in self.db.get_documents_by_ids("sablon_db", "sablon_collection", chunk, projection):
+                    documents[result["_id"]] = result
+                    if fields is None:
+                        cache_document(self.document_cache, result, generation)
+            return collect_multi_get(oids, documents, errors, read_model(fields))
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sabloane_by_query(self, sablon_query: dict, fields: str | list[str] | None = None) -> list[BaseModel] | dict:
+        """
+       Retrieves Sablon documents based on a query, through the query cache.
+
+       A stale cached result is served as is while it is refreshed by a background task when QUERY_CACHE_STALE_TTL
+       allows it, otherwise the query is read again from Mongo. Concurrent misses of the same query share one read.
+
+       Args:
+           sablon_query (dict): The query to filter Sablon documents.
+           fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+       Returns:
+           Union[List[BaseModel], dict]: A list of SablonModel instances (partial models when fields are selected) or a
+           dictionary containing the error message.
+       """
+        try:
+            fields = parse_fields(fields)
+            key = query_cache_key(sablon_query, fields)
+            await self._check_collection_version()
+            cached, fresh = self.query_cache.lookup(key)
+            if cached is MISSING:
+                return list(await self.query_flight.do((key, self.query_cache.generation), self._load_query, key,
+                                                       sablon_query, fields))
+            if not fresh and self.query_cache.begin_refresh(key):
+                task = asyncio.get_running_loop().create_task(self._refresh_query(key, sablon_query, fields))
+                self._query_refreshes.add(task)
+                task.add_done_callback(self._query_refreshes.discard)
+            return list(cached)
+
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sabloane_page(self, limit: int = DEFAULT_PAGE_LIMIT, cursor: str | None = None,
+                          fields: str | list[str] | None = None) -> dict:
+        """
+        Retrieves one page of Sablon documents, ordered by ObjectId.
+
+        Args:
+            limit (int): The maximum number of documents in the page.
+            cursor (str | None): The next_cursor of the previous page, or None for the first page.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            dict: The page ("items" and "next_cursor") or a dictionary containing the error message.
+        """
+        try:
+            limit = check_page_limit(limit)
+            fields = parse_fields(fields)
+            results = self.db.get_all_documents_page("sablon_db", "sablon_collection", limit + 1, decode_cursor(cursor),
+                                                     build_projection(fields, keep_id=True))
+            return build_page(await results.to_list(length=limit + 1), limit, read_model(fields))
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sabloane_by_query_page(self, sablon_query: dict, limit: int = DEFAULT_PAGE_LIMIT, cursor: str | None = None,
+                                   fields: str | list[str] | None = None) -> dict:
+        """
+        Retrieves one page of the Sablon documents matching a query, ordered by ObjectId.
+
+        Args:
+            sablon_query (dict): The query to filter Sablon documents.
+            limit (int): The maximum number of documents in the page.
+            cursor (str | None): The next_cursor of the previous page, or None for the first page.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            dict: The page ("items" and "next_cursor") or a dictionary containing the error message.
+        """
+        try:
+            limit = check_page_limit(limit)
+            fields = parse_fields(fields)
+            await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            results = self.db.get_documents_by_query_page("sablon_db", "sablon_collection", sablon_query, limit + 1,
+                                                          decode_cursor(cursor), build_projection(fields, keep_id=True))
+            return build_page(await results.to_list(length=limit + 1), limit, read_model(fields))
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def stream_sabloane(self, sablon_query: dict | None = None, fields: str | list[str] | None = None) -> AsyncIterator[bytes]:
+        """
+        Streams Sablon documents as NDJSON lines, one serialized document per line.
+
+        Args:
+            sablon_query (dict | None): The query to filter Sablon documents, None streams the whole collection.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            AsyncIterator[bytes]: The NDJSON lines.
+        """
+        try:
+            fields = parse_fields(fields)
+            model, projection = read_model(fields), build_projection(fields)
+            if sablon_query is None:
+                results = self.db.get_all_documents("sablon_db", "sablon_collection", batch_size=STREAM_BATCH_SIZE,
+                                                    projection=projection)
+            else:
+                await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+                results = self.db.get_documents_by_query("sablon_db", "sablon_collection", sablon_query,
+                                                         batch_size=STREAM_BATCH_SIZE, projection=projection)
+            async for result in results:
+                yield to_ndjson_line(result, model)
+        except Exception as e:
+            yield ndjson_error_line(e)
+
+    async def update_sablon(self, sablon_oid: str, sablon: dict) -> dict:
+        """
+        Updates a Sablon document and increments its version.
+
+        Args:
+            sablon_oid (str): The ObjectId of the Sablon document.
+            sablon (dict): The data to update the Sablon document with.
+
+        Returns:
+            dict: A dictionary containing the result of the operation.
+        """
+        try:
+            result = await self.db.update_document("sablon_db", "sablon_collection", ObjectId(sablon_oid), sablon,
+                                                 VERSION_FIELD)
+            self.document_cache.invalidate(ObjectId(sablon_oid))
+            await self._collection_written()
+            return {"result": f"Documents updated: {result.modified_count}"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def batch_sabloane(self, operations: list, ordered: bool = True) -> dict:
+        """
+        Executes a list of insert/update/delete operations in a single bulk_write.
+
+        Args:
+            operations (list): The batch operations, see build_batch_operation.
+            ordered (bool): True to stop at the first failing operation, False to execute every valid operation.
+
+        Returns:
+            dict: The counts of the batch and the per-operation results, or a dictionary containing the error message.
+        """
+        try:
+            requests, positions, results = prepare_batch(operations, ordered)
+            counts, write_errors = {}, {}
+            if requests:
+                try:
+                    counts = (await self.db.bulk_write("sablon_db", "sablon_collection", requests, ordered)).bulk_api_result
+                except BulkWriteError as e:
+                    counts, write_errors = e.details, bulk_write_errors(e, requests)
+                except PyMongoError as e:
+                    write_errors = bulk_write_errors(e, requests)
+                if batch_changes_documents(requests):
+                    self.document_cache.clear()
+                await self._collection_written()
+            return collect_batch(positions, results, counts, write_errors, ordered)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def delete_sablon_by_id(self, sablon_oid: str) -> dict:
+        """
+        Deletes a Sablon document by its ObjectId.
+
+        Args:
+            sablon_oid (str): The ObjectId of the Sablon document.
+
+        Returns:
+            dict: A dictionary containing the result of the operation.
+        """
+
+        try:
+            result = await self.db.delete_document_by_id("sablon_db", "sablon_collection", ObjectId(sablon_oid))
+            self.document_cache.invalidate(ObjectId(sablon_oid))
+            await self._collection_written()
+            return {"result": f"Documents deleted: {result.deleted_count}"}
+
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def delete_sablon_by_query(self, sablon_query: dict) -> dict:
+        """
+        Deletes Sablon documents based on a query.
+
+        Args:
+            sablon_query (dict): The query to filter Sablon documents.
+
+        Returns:
+            dict: A dictionary containing the result of the operation.
+        """
+
+        try:
+            await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            result = await self.db.delete_document_by_query("sablon_db", "sablon_collection", sablon_query)
+            # The deleted document is not known, so every cached document is dropped
+            self.document_cache.clear()
+            await self._collection_written()
+            return {"result": f"Document deleted: {result.deleted_count}"}
+
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def count_sabloane(self, sablon_query: dict | None = None) -> dict:
+        """
+        Counts the Sablon documents on the server, without reading them.
+
+        Args:
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: {"count": ...}, or a dictionary containing the error message.
+        """
+        try:
+            stats_match(sablon_query)
+            if sablon_query:
+                await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            return {"count": await self.db.count_documents("sablon_db", "sablon_collection", sablon_query or {})}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def count_sabloane_by(self, field: str, sablon_query: dict | None = None) -> dict:
+        """
+        Counts the Sablon documents by the values of a field, with a $group aggregation.
+
+        Args:
+            field (str): The name of the SablonModel field.
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: The field and its {"value", "count"} entries, most frequent first, or a dictionary containing the error
+            message.
+        """
+        try:
+            pipeline = count_by_pipeline(field, sablon_query)
+            if sablon_query:
+                await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            return {"field": field, "counts": await self.db.aggregate("sablon_db", "sablon_collection", pipeline)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sabloane_summary(self, field: str, sablon_query: dict | None = None) -> dict:
+        """
+        Computes the count, min, max and average of a numeric field, with a $group aggregation.
+
+        Args:
+            field (str): The name of the numeric SablonModel field.
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: The field, the number of documents with a value and the min, max and avg of the values (None when
+            there are none), or a dictionary containing the error message.
+        """
+        try:
+            pipeline = summary_pipeline(field, sablon_query)
+            if sablon_query:
+                await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            results = await self.db.aggregate("sablon_db", "sablon_collection", pipeline)
+            return collect_summary(field, results)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_sabloane_histogram(self, field: str, boundaries: str | list | None = None, buckets: int | None = None,
+                                     sablon_query: dict | None = None) -> dict:
+        """
+        Computes the histogram of a numeric field, with a $bucket (explicit boundaries) or $bucketAuto (number of
+        buckets) aggregation.
+
+        Args:
+            field (str): The name of the numeric SablonModel field.
+            boundaries (str | list | None): The comma separated ascending bucket boundaries, e.g. "0,18,65,120".
+            buckets (int | None): The number of buckets of about the same size, when no boundaries are given.
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: The field, its buckets and the number of values outside of the boundaries, see collect_histogram, or a
+            dictionary containing the error message.
+        """
+        try:
+            boundaries = parse_boundaries(boundaries)
+            pipeline = histogram_pipeline(field, boundaries, buckets, sablon_query)
+            if sablon_query:
+                await self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            return collect_histogram(field, await self.db.aggregate("sablon_db", "sablon_collection", pipeline), boundaries)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_index_drift(self) -> dict:
+        """
+        Compares the indexes declared in SABLON_INDEXES with the indexes of the Sablon collection.
+
+        Returns:
+            dict: The missing, changed and extra index names and whether the collection is in sync, or a dictionary
+            containing the error message.
+        """
+        try:
+            return index_drift(declared_indexes(), await self.db.list_indexes("sablon_db", "sablon_collection"))
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def reconcile_indexes(self, drop_extra: bool = False) -> dict:
+        """
+        Creates the missing indexes declared in SABLON_INDEXES and rebuilds the changed ones. Running it again on a
+        reconciled collection does nothing.
+
+        Args:
+            drop_extra (bool): True to also drop the indexes of the collection that are not declared.
+
+        Returns:
+            dict: The drift found before reconciling with the created and dropped index names, or a dictionary
+            containing the error message.
+        """
+        try:
+            drift, dropped, rebuilt = plan_index_reconcile(await self.db.list_indexes("sablon_db", "sablon_collection"),
+                                                           drop_extra)
+            for index_name in dropped:
+                await self.db.drop_index("sablon_db", "sablon_collection", index_name)
+            created = await self.db.create_indexes("sablon_db", "sablon_collection", rebuilt) if rebuilt else []
+            return {**drift, "created": created, "dropped": dropped}
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def warm_up(self, documents: int = 0, queries: list[dict] | None = None) -> dict:
+        """
+        Warms up the service before it serves: runs the Sablon models once, preloads the most recent documents in the
+        document cache and the results of the given queries in the query cache.
+
+        Args:
+            documents (int): The number of most recent documents to preload, capped at the size of the document cache.
+            queries (list[dict] | None): The {"query": {...}, "fields": "..."} queries to preload, see SABLON_WARMUP_QUERIES.
+
+        Returns:
+            dict: The numbers of preloaded documents and queries and the duration of the warm-up in milliseconds, or a
+            dictionary containing the error message.
+        """
+        try:
+            start = time.perf_counter()
+            warm_up_models()
+            await self._check_collection_version()
+            generation = self.document_cache.generation
+            preloaded = 0
+            limit = min(documents, self.document_cache.maxsize)
+            if limit > 0:
+                async for document in self.db.get_latest_documents("sablon_db", "sablon_collection", limit):
+                    cache_document(self.document_cache, document, generation)
+                    preloaded += 1
+            for query in queries or []:
+                check_warm_up_query(query, await self.get_sabloane_by_query(query["query"], query.get("fields")))
+            return warm_up_report(preloaded, queries, start)
+        except Exception as e:
+            return {"error": str(e)}
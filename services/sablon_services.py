@@ -2,37 +2,1087 @@
 This module provides services for managing Sablon documents in a MongoDB database.
 
 Attributes:
-    None
+    DEFAULT_PAGE_LIMIT (int): The page size used when a paged read does not specify one.
+    MAX_PAGE_LIMIT (int): The largest page size a paged read may request.
+    STREAM_BATCH_SIZE (int): The number of documents fetched per round trip by the streaming reads.
+    BULK_INSERT_CHUNK_SIZE (int): The number of documents validated and written per insert_many by the bulk insert.
+    MULTI_GET_CHUNK_SIZE (int): The number of ObjectIds looked up per $in query by the multi-get.
+    TRUSTED_READS (bool): Whether the read path returns the stored documents without validating them, see SABLON_TRUSTED_READS.
+    NUMERIC_FIELDS (tuple[str, ...]): The SablonModel fields that support the min/max/avg and histogram statistics.
+    DOCUMENT_CACHE_SIZE (int): The number of documents held by the read-through cache of single documents, 0 disables it.
+    DOCUMENT_CACHE_TTL (float): The number of seconds a document stays in the read-through cache.
+    QUERY_CACHE_MAX_BYTES (int): The maximum total size, in BSON bytes, of the cached query results, 0 disables the cache.
+    QUERY_CACHE_TTL (float): The number of seconds a cached query result is fresh when no write happened since its load.
+    QUERY_CACHE_STALE_TTL (float): The number of seconds a stale query result keeps being served while it is refreshed in
+        the background (stale-while-revalidate), 0 disables it.
+    VERSION_FIELD (str): The field holding the version of a stored document, incremented by every update.
 
 Classes:
     SablonServices: A class containing methods for CRUD operations on Sablon documents.
 
+Functions:
+    parse_fields: Parses the field selection of a projected read.
+    build_projection: Builds the Mongo projection of a field selection.
+    select_fields: Restricts a stored document to the fields of a read.
+    read_model: Returns the Pydantic model used to validate the documents of a read.
+    read_document: Builds the response of a document read by its ObjectId.
+    read_documents: Builds the response of a read of many documents.
+    encode_cursor: Encodes the ObjectId of the last document of a page into an opaque cursor.
+    decode_cursor: Decodes an opaque cursor back into the ObjectId it was built from.
+    check_page_limit: Validates the requested page size and caps it at MAX_PAGE_LIMIT.
+    build_page: Builds a page response out of the documents read for it.
+    to_ndjson_line: Serializes a stored document into one line of a NDJSON stream.
+    ndjson_error_line: Serializes an error raised in the middle of a NDJSON stream.
+    validate_bulk_chunk: Validates one chunk of a bulk insert with SablonModel.
+    bulk_insert_chunks: Splits a bulk insert into validated chunks.
+    collect_bulk_chunk: Records the outcome of the insert_many of one bulk insert chunk.
+    collect_bulk_insert: Builds the result of a bulk insert once all its chunks were written.
+    bulk_write_errors: Maps the failure of an insert_many or bulk_write to the operations it concerns.
+    collect_insert_batch: Builds the result of every document of a coalesced insert batch.
+    check_update_fields: Checks the types of the Sablon fields of an update.
+    build_batch_operation: Builds the pymongo write operation of one batch operation.
+    prepare_batch: Builds the pymongo write operations of a batch.
+    batch_changes_documents: Tells whether a batch updates or deletes documents.
+    collect_batch: Builds the result summary of an executed batch.
+    parse_oids: Parses the ObjectIds of a multi-get.
+    collect_multi_get: Builds the multi-get response in request order.
+    cache_document: Stores a whole document read from the store in the document cache.
+    read_cached_documents: Serves the ObjectIds of a multi-get from the document cache.
+    collect_cache_stats: Builds the counters of the caches of a service.
+    query_cache_key: Builds the canonical query cache key of a query and a field selection.
+    document_etag: Builds the strong ETag of a version of a Sablon document.
+    collection_etag: Builds the strong ETag of a version of the Sablon collection.
+    document_size: Estimates the size of a document read from the store.
+    collect_query_result: Builds the query cache entry of the documents matching a query.
+    check_stats_field: Checks the field of a statistic.
+    parse_boundaries: Parses the bucket boundaries of a histogram.
+    stats_match: Builds the $match stage restricting a statistic to a query.
+    count_by_pipeline: Builds the aggregation pipeline counting the documents by the values of a field.
+    summary_pipeline: Builds the aggregation pipeline of the count, min, max and average of a numeric field.
+    collect_summary: Builds the summary response from the result of the summary pipeline.
+    histogram_pipeline: Builds the aggregation pipeline of the histogram of a numeric field.
+    collect_histogram: Builds the histogram response from the buckets returned by Mongo.
+    declared_indexes: Returns the pymongo IndexModels of the declared indexes.
+    plan_index_reconcile: Plans the reconciliation of the indexes of the Sablon collection with the declared ones.
+    warm_up_models: Runs the validation and serialization of the Sablon models once, before the first request.
+    check_warm_up_query: Checks the result of a query preloaded by the warm-up.
+    warm_up_report: Builds the report of a warm-up.
+
 """
 
-from bson import ObjectId
+import base64
+import binascii
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, get_args
+
+import bson
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from pymongo import InsertOne, UpdateOne, DeleteOne, IndexModel
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from utils.cache import LRUTTLCache, QueryCache, SharedVersion, MISSING
+from utils.indexes import index_drift
+from utils.db_store import MongoDBStore
+from utils.settings import trusted_reads
+from utils.singleflight import SingleFlight
+from utils.tracing import trace_methods, traced
+from models.sablon_model import SablonModel, sablon_partial_model, SABLON_INDEXES
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+STREAM_BATCH_SIZE = 1000
+BULK_INSERT_CHUNK_SIZE = 1000
+MULTI_GET_CHUNK_SIZE = 1000
+DOCUMENT_CACHE_SIZE = 10000
+DOCUMENT_CACHE_TTL = 60.0
+QUERY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+QUERY_CACHE_TTL = 30.0
+QUERY_CACHE_STALE_TTL = 0.0
+COLLECTION_VERSION_TTL = 1.0
+VERSION_FIELD = "_version"
+
+_sablon_list_adapter = TypeAdapter(list[SablonModel])
+logger = logging.getLogger(__name__)
+TRUSTED_READS = trusted_reads()
+NUMERIC_FIELDS = tuple(name for name, field in SablonModel.model_fields.items()
+                       if {int, float} & {field.annotation, *get_args(field.annotation)})
+
+
+def parse_fields(fields: str | list[str] | None) -> tuple[str, ...] | None:
+    """
+    Parses the field selection of a projected read.
+
+    Args:
+        fields (str | list[str] | None): The comma separated (or listed) names of the SablonModel fields to return,
+            None to return whole documents.
+
+    Returns:
+        tuple[str, ...] | None: The selected field names, without duplicates, or None for whole documents.
+
+    Raises:
+        ValueError: If a field is not a SablonModel field.
+    """
+    if fields is None:
+        return None
+    names = fields.split(",") if isinstance(fields, str) else fields
+    if not isinstance(names, (list, tuple)) or not all(isinstance(name, str) for name in names):
+        raise ValueError("Error! 'fields' parameter must be a comma separated list of field names")
+    selected = tuple(dict.fromkeys(name.strip() for name in names if name.strip()))
+    unknown = [name for name in selected if name not in SablonModel.model_fields]
+    if unknown:
+        raise ValueError(f"Error! Unknown fields {unknown}, expected some of {list(SablonModel.model_fields)}")
+    return selected or None
+
+
+def build_projection(fields: tuple[str, ...] | None, keep_id: bool = False) -> dict | None:
+    """
+    Builds the Mongo projection of a field selection.
+
+    Without "_id" in the projection, an index holding all the selected fields lets Mongo answer the read
+    from the index alone (a covered query). The version of whole documents is left out, it is not a SablonModel field.
+
+    Args:
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+        keep_id (bool): Whether "_id" is needed by the caller, e.g. for pagination cursors.
+
+    Returns:
+        dict: The projection.
+    """
+    if fields is None:
+        return {VERSION_FIELD: 0} if keep_id else {"_id": 0, VERSION_FIELD: 0}
+    projection = {field: 1 for field in fields}
+    if not keep_id:
+        projection["_id"] = 0
+    return projection
+
+
+def select_fields(document: dict, fields: tuple[str, ...] | None) -> dict:
+    """
+    Restricts a stored document to the fields of a read, e.g. when a projected read is served from a cached whole document.
+
+    Args:
+        document (dict): The stored document.
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+    Returns:
+        dict: A copy of the document without its "_id" and version, holding only the selected fields.
+    """
+    return {key: value for key, value in document.items()
+            if key not in ("_id", VERSION_FIELD) and (fields is None or key in fields)}
+
+
+def read_model(fields: tuple[str, ...] | None, trusted: bool | None = None) -> Callable[..., BaseModel | dict]:
+    """
+    Returns the constructor of the documents of a read.
+
+    Off the trusted read path every document is validated by SablonModel (or the partial model of the selected
+    fields). On the trusted read path the documents are the ones this API wrote, so they are kept as the plain
+    dictionaries Mongo returned, already restricted by the projection, and rendered to JSON as is. model_construct is
+    not used, it costs about as much as validating with pydantic 2.
+
+    Args:
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+        trusted (bool | None): True for the trusted read path, None to follow TRUSTED_READS.
+
+    Returns:
+        Callable[..., BaseModel | dict]: SablonModel or the partial model of the selected fields, or dict.
+    """
+    if TRUSTED_READS if trusted is None else trusted:
+        return dict
+    return SablonModel if fields is None else sablon_partial_model(fields)
+
+
+def read_document(document: dict, fields: tuple[str, ...] | None) -> BaseModel | dict:
+    """
+    Builds the response of a document read by its ObjectId.
+
+    Args:
+        document (dict): The stored document, as returned by the store or the document cache.
+        fields (tuple[str, ...] | None): The selected field names, None for the whole document.
+
+    Returns:
+        BaseModel | dict: The SablonModel instance (a partial model when fields are selected), see read_model.
+    """
+    return read_model(fields)(**select_fields(document, fields))
+
+
+def read_documents(documents: Iterable[dict], fields: tuple[str, ...] | None) -> list[BaseModel | dict]:
+    """
+    Builds the response of a read of many documents, projected without their "_id" and version by build_projection.
+
+    Args:
+        documents (Iterable[dict]): The documents returned by the store.
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+    Returns:
+        list[BaseModel | dict]: The SablonModel instances (partial models when fields are selected), see read_model.
+    """
+    model = read_model(fields)
+    return [model(**document) for document in documents]
+
+
+def encode_cursor(document_id: ObjectId) -> str:
+    """
+    Encodes the ObjectId of the last document of a page into an opaque cursor.
+
+    Args:
+        document_id (ObjectId): The ObjectId of the last document of the page.
+
+    Returns:
+        str: The url safe cursor pointing right after that document.
+    """
+    return base64.urlsafe_b64encode(document_id.binary).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> ObjectId | None:
+    """
+    Decodes an opaque cursor back into the ObjectId it was built from.
+
+    Args:
+        cursor (str | None): The cursor received from a previous page, or None for the first page.
+
+    Returns:
+        ObjectId | None: The ObjectId after which the next page starts, or None for the first page.
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor.
+    """
+    if not cursor:
+        return None
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError("Error! Invalid pagination cursor") from e
+
+
+def check_page_limit(limit: int) -> int:
+    """
+    Validates the requested page size and caps it at MAX_PAGE_LIMIT.
+
+    Args:
+        limit (int): The requested page size.
+
+    Returns:
+        int: The page size to use.
+
+    Raises:
+        ValueError: If the page size is not a positive integer.
+    """
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        raise ValueError("Error! 'limit' parameter must be a positive integer")
+    return min(limit, MAX_PAGE_LIMIT)
+
+
+@traced("validate")
+def build_page(documents: list[dict], limit: int, model: Callable[..., BaseModel | dict] = SablonModel) -> dict:
+    """
+    Builds a page response out of the documents read for it.
+
+    The store is asked for limit + 1 documents, the extra one only tells whether another page exists,
+    so the last page never costs an additional empty round trip.
+
+    Args:
+        documents (list[dict]): The documents read from the store, sorted by ObjectId.
+        limit (int): The page size.
+        model (Callable[..., BaseModel | dict]): The model the documents are built with, see read_model.
+
+    Returns:
+        dict: The model instances of the page under "items" and the cursor of the next page under "next_cursor".
+    """
+    page = documents[:limit]
+    next_cursor = encode_cursor(page[-1]["_id"]) if len(documents) > limit else None
+    items = []
+    for document in page:
+        document.pop("_id")
+        items.append(model(**document))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def to_ndjson_line(document: dict, model: Callable[..., BaseModel | dict] = SablonModel) -> bytes:
+    """
+    Serializes a stored document into one line of a NDJSON stream.
+
+    Args:
+        document (dict): The document read from the store.
+        model (Callable[..., BaseModel | dict]): The model the document is built with, see read_model.
+
+    Returns:
+        bytes: The validated model as JSON, terminated by a newline.
+    """
+    document.pop("_id", None)
+    item = model(**document)
+    return (orjson.dumps(item) if isinstance(item, dict) else item.model_dump_json().encode()) + b"\n"
+
+
+def ndjson_error_line(error: Exception) -> bytes:
+    """
+    Serializes an error raised in the middle of a NDJSON stream, once the status code has already been sent.
+
+    Args:
+        error (Exception): The error that interrupted the stream.
+
+    Returns:
+        bytes: The {"error": ...} object as JSON, terminated by a newline.
+    """
+    return json.dumps({"error": str(error)}).encode() + b"\n"
+
+
+@traced("validate")
+def validate_bulk_chunk(chunk: list, start: int) -> tuple[list[dict], list[int], list[dict]]:
+    """
+    Validates one chunk of a bulk insert with SablonModel.
+
+    The whole chunk is validated in a single call first; only when it contains an invalid item is it
+    validated again item by item, to tell the valid documents from the invalid ones.
+
+    Args:
+        chunk (list): The items of the chunk, as received in the request.
+        start (int): The position of the first item of the chunk in the request.
+
+    Returns:
+        tuple[list[dict], list[int], list[dict]]: The valid documents, their positions in the request and the
+        {"index": ..., "error": ...} entries of the invalid items.
+    """
+    try:
+        models = _sablon_list_adapter.validate_python(chunk)
+        return [model.model_dump() for model in models], list(range(start, start + len(chunk))), []
+    except ValidationError:
+        pass
+
+    documents, positions, errors = [], [], []
+    for offset, item in enumerate(chunk):
+        try:
+            documents.append(SablonModel.model_validate(item).model_dump())
+            positions.append(start + offset)
+        except ValidationError as e:
+            errors.append({"index": start + offset, "error": str(e)})
+    return documents, positions, errors
+
+
+def bulk_insert_chunks(sabloane: list) -> Iterator[tuple[list[dict], list[int], list[dict]]]:
+    """
+    Splits a bulk insert into chunks of BULK_INSERT_CHUNK_SIZE items and validates each of them, see validate_bulk_chunk.
+
+    Args:
+        sabloane (list): The Sablon documents to be added, as received in the request.
+
+    Returns:
+        Iterator[tuple[list[dict], list[int], list[dict]]]: The valid documents, their positions and the errors of
+        every chunk, validated only when the previous chunk was written.
+
+    Raises:
+        TypeError: If the bulk insert is not a list.
+    """
+    if not isinstance(sabloane, list):
+        raise TypeError("Error! Bulk insert expects a list of Sablon documents")
+    return (validate_bulk_chunk(sabloane[start:start + BULK_INSERT_CHUNK_SIZE], start)
+            for start in range(0, len(sabloane), BULK_INSERT_CHUNK_SIZE))
+
+
+def collect_bulk_chunk(documents: list[dict], positions: list[int], write_errors: dict[int, str], oids: list,
+                       errors: list[dict]) -> None:
+    """
+    Records the outcome of the insert_many of one bulk insert chunk.
+
+    Args:
+        documents (list[dict]): The documents sent to insert_many, each one holding its "_id".
+        positions (list[int]): The positions of the documents in the request.
+        write_errors (dict[int, str]): The error messages of the documents that were not inserted, by index in documents.
+        oids (list): The ObjectIds of the request, by position, filled in place.
+        errors (list[dict]): The {"index": ..., "error": ...} entries of the request, extended in place.
+    """
+    for index, (document, position) in enumerate(zip(documents, positions)):
+        if index in write_errors:
+            errors.append({"index": position, "error": write_errors[index]})
+        else:
+            oids[position] = document["_id"]
+
+
+def collect_bulk_insert(total: int, oids: list, errors: list[dict]) -> dict:
+    """
+    Builds the result of a bulk insert once all its chunks were written.
+
+    Args:
+        total (int): The number of items of the request.
+        oids (list): The ObjectIds of the request, by position, None for the failed items.
+        errors (list[dict]): The {"index": ..., "error": ...} entries of the failed items.
+
+    Returns:
+        dict: The number of inserted documents, the ObjectIds by request position and the per-item errors in request order.
+    """
+    return {"inserted_count": total - len(errors), "oids": oids, "errors": sorted(errors, key=lambda error: error["index"])}
+
+
+def bulk_write_errors(error: PyMongoError, operations: list) -> dict[int, str]:
+    """
+    Maps the failure of an insert_many or bulk_write to the operations it concerns.
+
+    Args:
+        error (PyMongoError): The error raised by insert_many or bulk_write.
+        operations (list): The documents or operations sent to the server.
+
+    Returns:
+        dict[int, str]: The error messages of the operations that were not executed, by index in operations.
+    """
+    if isinstance(error, BulkWriteError):
+        return {write_error["index"]: write_error["errmsg"] for write_error in error.details.get("writeErrors", [])}
+    return {index: str(error) for index in range(len(operations))}
+
+
+def collect_insert_batch(documents: list[dict], write_errors: dict[int, str]) -> list[dict]:
+    """
+    Builds the result of every document of a coalesced insert batch, as add_sablon returns it.
+
+    Args:
+        documents (list[dict]): The documents sent to insert_many, each one holding its "_id".
+        write_errors (dict[int, str]): The error messages of the documents that were not inserted, by index in documents.
+
+    Returns:
+        list[dict]: The {"oid": ...} or {"error": ...} result of every document, in order.
+    """
+    return [{"error": write_errors[index]} if index in write_errors else {"oid": document["_id"]}
+            for index, document in enumerate(documents)]
+
+
+def check_update_fields(sablon: dict) -> None:
+    """
+    Checks the types of the Sablon fields of an update.
+
+    Args:
+        sablon (dict): The data to update the Sablon document with.
+
+    Raises:
+        ValueError: If name, age or gender has the wrong type, or if the update sets the version of the document.
+    """
+    if VERSION_FIELD in sablon:
+        raise ValueError(f"Error! '{VERSION_FIELD}' is maintained by the API and cannot be updated")
+    if "name" in sablon and not isinstance(sablon.get("name"), str):
+        raise ValueError("Error! 'name' parameter is not a string instance")
+    if "age" in sablon and not isinstance(sablon.get("age"), int):
+        raise ValueError("Error! 'age' parameter is not an integer instance")
+    if "gender" in sablon and not isinstance(sablon.get("gender"), str):
+        raise ValueError("Error! 'gender' parameter is not a string instance")
+
+
+def _batch_filter(operation: dict) -> dict:
+    """
+    Builds the filter of a batch update or delete, keyed by exactly one of "oid" or "query".
+    """
+    if ("oid" in operation) == ("query" in operation):
+        raise ValueError("Error! Operation must be keyed by exactly one of 'oid' or 'query'")
+    if "oid" in operation:
+        try:
+            return {"_id": ObjectId(operation["oid"])}
+        except (InvalidId, TypeError) as e:
+            raise ValueError(f"Error! Invalid 'oid': {e}") from e
+    if not isinstance(operation["query"], dict) or not operation["query"]:
+        raise ValueError("Error! 'query' must be a non empty dictionary")
+    return operation["query"]
+
+
+def build_batch_operation(operation: Any) -> tuple[InsertOne | UpdateOne | DeleteOne, ObjectId | None]:
+    """
+    Builds the pymongo write operation of one batch operation.
+
+    Args:
+        operation (Any): One of {"op": "insert", "document": {...}},
+            {"op": "update", "oid" | "query": ..., "document": {...}} or {"op": "delete", "oid" | "query": ...}.
+
+    Returns:
+        tuple[InsertOne | UpdateOne | DeleteOne, ObjectId | None]: The write operation and, for inserts, the ObjectId
+        assigned to the new document. Updates and deletes concern the first matching document like update_sablon and
+        delete_sablon_by_query do.
+
+    Raises:
+        ValueError: If the operation is malformed or its document is invalid.
+    """
+    if not isinstance(operation, dict):
+        raise ValueError("Error! Operation must be a dictionary")
+    kind = operation.get("op")
+    if kind == "insert":
+        document = SablonModel.model_validate(operation.get("document")).model_dump()
+        document["_id"] = ObjectId()
+        return InsertOne(document), document["_id"]
+    if kind == "update":
+        document = operation.get("document")
+        if not isinstance(document, dict) or not document:
+            raise ValueError("Error! Update operation needs a non empty 'document'")
+        check_update_fields(document)
+        return UpdateOne(_batch_filter(operation), {"$set": document, "$inc": {VERSION_FIELD: 1}}), None
+    if kind == "delete":
+        return DeleteOne(_batch_filter(operation)), None
+    raise ValueError(f"Error! Unknown operation '{kind}', expected one of insert, update, delete")
+
+
+def prepare_batch(operations: list, ordered: bool) -> tuple[list, list[tuple[int, ObjectId | None]], list]:
+    """
+    Builds the pymongo write operations of a batch.
+
+    In an ordered batch nothing after an invalid operation is sent, like the server stops at the first failing one.
+
+    Args:
+        operations (list): The batch operations, as received in the request.
+        ordered (bool): Whether the batch stops at the first failing operation.
+
+    Returns:
+        tuple[list, list[tuple[int, ObjectId | None]], list]: The write operations to send, their positions in the batch
+        with the ObjectIds of the inserts, and the per-operation results, already filled for the invalid and skipped
+        operations.
+    """
+    if not isinstance(operations, list):
+        raise TypeError("Error! Batch expects a list of operations")
+    requests, positions, results = [], [], [None] * len(operations)
+    for position, operation in enumerate(operations):
+        try:
+            request, oid = build_batch_operation(operation)
+            requests.append(request)
+            positions.append((position, oid))
+        except ValueError as e:
+            results[position] = {"status": "error", "error": str(e)}
+            if ordered:
+                results[position + 1:] = [{"status": "skipped"}] * (len(operations) - position - 1)
+                break
+    return requests, positions, results
+
+
+def batch_changes_documents(requests: list) -> bool:
+    """
+    Tells whether a batch updates or deletes documents, which have to be dropped from the document cache since their
+    ObjectIds are not all known.
+
+    Args:
+        requests (list): The write operations sent to bulk_write.
+
+    Returns:
+        bool: True if the batch holds an operation other than an insert.
+    """
+    return any(not isinstance(request, InsertOne) for request in requests)
+
+
+def collect_batch(positions: list[tuple[int, ObjectId | None]], results: list, counts: dict, write_errors: dict[int, str],
+                  ordered: bool) -> dict:
+    """
+    Builds the result summary of an executed batch.
+
+    Args:
+        positions (list[tuple[int, ObjectId | None]]): The positions of the write operations sent to bulk_write, with
+            the ObjectIds of the inserts.
+        results (list): The per-operation results, filled in place.
+        counts (dict): The nInserted, nMatched, nModified and nRemoved counts reported by the server.
+        write_errors (dict[int, str]): The error messages of the failed write operations, by index in the bulk_write.
+        ordered (bool): Whether the batch stopped at the first failing operation.
+
+    Returns:
+        dict: The counts of the batch and one {"status": ...} entry per operation, inserts also hold their "oid".
+    """
+    failed_at = min(write_errors) if ordered and write_errors else None
+    for index, (position, oid) in enumerate(positions):
+        if index in write_errors:
+            results[position] = {"status": "error", "error": write_errors[index]}
+        elif failed_at is not None and index > failed_at:
+            results[position] = {"status": "skipped"}
+        elif oid is not None:
+            results[position] = {"status": "ok", "oid": str(oid)}
+        else:
+            results[position] = {"status": "ok"}
+    return {
+        "ordered": ordered,
+        "inserted_count": counts.get("nInserted", 0),
+        "matched_count": counts.get("nMatched", 0),
+        "modified_count": counts.get("nModified", 0),
+        "deleted_count": counts.get("nRemoved", 0),
+        "error_count": sum(1 for result in results if result["status"] == "error"),
+        "results": results,
+    }
+
+
+def parse_oids(sablon_oids: list) -> tuple[list[ObjectId | None], list[dict]]:
+    """
+    Parses the ObjectIds of a multi-get.
+
+    Args:
+        sablon_oids (list): The ObjectIds, as received in the request.
+
+    Returns:
+        tuple[list[ObjectId | None], list[dict]]: The ObjectIds by request position (None for the invalid ones) and the
+        {"index": ..., "error": ...} entries of the invalid ones.
+    """
+    if not isinstance(sablon_oids, list):
+        raise TypeError("Error! Multi-get expects a list of ObjectIds")
+    oids, errors = [], []
+    for index, sablon_oid in enumerate(sablon_oids):
+        try:
+            oids.append(ObjectId(sablon_oid))
+        except (InvalidId, TypeError) as e:
+            oids.append(None)
+            errors.append({"index": index, "error": str(e)})
+    return oids, errors
+
+
+@traced("validate")
+def collect_multi_get(oids: list[ObjectId | None], documents: dict[ObjectId, dict], errors: list[dict],
+                      model: Callable[..., BaseModel | dict] = SablonModel) -> dict:
+    """
+    Builds the multi-get response in request order.
+
+    Args:
+        oids (list[ObjectId | None]): The ObjectIds by request position, None for the invalid ones.
+        documents (dict[ObjectId, dict]): The documents found, by ObjectId.
+        errors (list[dict]): The {"index": ..., "error": ...} entries, extended in place.
+        model (Callable[..., BaseModel | dict]): The model the documents are built with, see read_model.
+
+    Returns:
+        dict: The model instances by request position under "items" (None for misses and errors), the ObjectIds
+        that were not found under "missing" and the per-item errors under "errors".
+    """
+    items, missing = [], []
+    for index, oid in enumerate(oids):
+        if oid is None:
+            items.append(None)
+        elif oid not in documents:
+            items.append(None)
+            missing.append(str(oid))
+        else:
+            try:
+                items.append(model(**select_fields(documents[oid], None)))
+            except ValidationError as e:
+                items.append(None)
+                errors.append({"index": index, "error": str(e)})
+    return {"items": items, "missing": missing, "errors": sorted(errors, key=lambda error: error["index"])}
+
+
+def cache_document(cache: LRUTTLCache, document: dict, generation: int) -> None:
+    """
+    Stores a whole document read from the store in the document cache, with its version.
+
+    Args:
+        cache (LRUTTLCache): The document cache.
+        document (dict): The document, holding its "_id".
+        generation (int): The generation of the cache read before the document was loaded.
+    """
+    cache.set(document["_id"], {key: value for key, value in document.items() if key != "_id"}, generation)
+
+
+def read_cached_documents(cache: LRUTTLCache, oids: list[ObjectId | None],
+                          fields: tuple[str, ...] | None = None) -> tuple[dict[ObjectId, dict], list[ObjectId]]:
+    """
+    Serves the ObjectIds of a multi-get from the document cache.
+
+    Args:
+        cache (LRUTTLCache): The document cache.
+        oids (list[ObjectId | None]): The ObjectIds by request position, None for the invalid ones.
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+    Returns:
+        tuple[dict[ObjectId, dict], list[ObjectId]]: The cached documents by ObjectId and the distinct ObjectIds that
+        still have to be read from the store.
+    """
+    documents, misses = {}, []
+    for oid in dict.fromkeys(oid for oid in oids if oid is not None):
+        cached = cache.get(oid)
+        if cached is MISSING:
+            misses.append(oid)
+        else:
+            documents[oid] = select_fields(cached, fields)
+    return documents, misses
+
+
+def collect_cache_stats(document_cache: LRUTTLCache, query_cache: QueryCache, document_flight: Any,
+                        query_flight: Any) -> dict:
+    """
+    Builds the counters of the caches of a service and of the single-flight groups of their loads.
+
+    Args:
+        document_cache (LRUTTLCache): The document cache.
+        query_cache (QueryCache): The query cache.
+        document_flight (Any): The SingleFlight (or AsyncSingleFlight) of the document loads.
+        query_flight (Any): The SingleFlight (or AsyncSingleFlight) of the query loads.
+
+    Returns:
+        dict: The size, hits, misses, hit ratio, evictions and expirations of every cache, and the calls in flight,
+        shared and run calls of the single-flight groups.
+    """
+    return {"documents": document_cache.stats(), "queries": query_cache.stats(),
+            "document_flights": document_flight.stats(), "query_flights": query_flight.stats()}
+
+
+def _canonical(value: Any) -> Any:
+    """
+    Tags the BSON values that JSON cannot tell apart from strings, e.g. ObjectId("...") from "...".
+    """
+    return {f"${type(value).__name__}": str(value)}
+
+
+def query_cache_key(query: dict, fields: tuple[str, ...] | None) -> str:
+    """
+    Builds the canonical query cache key of a query and a field selection.
+
+    The keys of the query are sorted at every level, so two equal query dictionaries share their cache entry whatever
+    the order of their keys.
+
+    Args:
+        query (dict): The query to filter Sablon documents.
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+    Returns:
+        str: The cache key.
+    """
+    return json.dumps([query, fields], sort_keys=True, separators=(",", ":"), default=_canonical)
+
+
+def document_etag(document_id: ObjectId, version: int, fields: tuple[str, ...] | None = None) -> str:
+    """
+    Builds the strong ETag of a version of a Sablon document, as read with a field selection.
+
+    Every field selection is a different representation of the document, so the selected fields are part of the ETag.
+
+    Args:
+        document_id (ObjectId): The ObjectId of the document.
+        version (int): The version of the document, 0 for a document that was never updated.
+        fields (tuple[str, ...] | None): The selected field names, None for the whole document.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    return f'"{document_id}.{version}{_fields_tag(fields)}"'
+
+
+def collection_etag(version: int, fields: tuple[str, ...] | None = None) -> str:
+    """
+    Builds the strong ETag of a version of the Sablon collection, as read with a field selection.
+
+    The version is the one kept in Mongo by the store, which every write made through any worker increments, so every
+    worker issues and honors the same ETag.
+
+    Args:
+        version (int): The version of the collection, 0 for a collection that was never written to.
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    return f'"sablon_collection.{version}{_fields_tag(fields)}"'
+
+
+def _fields_tag(fields: tuple[str, ...] | None) -> str:
+    """
+    Returns the part of an ETag naming a field selection, empty for whole documents.
+    """
+    return "" if fields is None else "." + "+".join(sorted(fields))
+
+
+def document_size(document: dict) -> int:
+    """
+    Estimates the size of a document read from the store, used to cap the memory of the query cache.
+
+    Args:
+        document (dict): The document.
+
+    Returns:
+        int: The size of the document encoded as BSON, in bytes.
+    """
+    return len(bson.encode(document))
+
+
+def collect_query_result(documents: Iterable[dict], fields: tuple[str, ...] | None) -> tuple[tuple, int]:
+    """
+    Builds the query cache entry of the documents matching a query.
+
+    Args:
+        documents (Iterable[dict]): The documents returned by the store.
+        fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+    Returns:
+        tuple[tuple, int]: The SablonModel instances (partial models when fields are selected) and their total size, see
+        document_size.
+    """
+    model = read_model(fields)
+    sabloane, size = [], 0
+    for document in documents:
+        size += document_size(document)
+        sabloane.append(model(**document))
+    return tuple(sabloane), size
+
+
+def check_stats_field(field: str, numeric: bool = False) -> str:
+    """
+    Checks the field of a statistic.
+
+    Args:
+        field (str): The name of the SablonModel field.
+        numeric (bool): True if the statistic needs a numeric field.
+
+    Returns:
+        str: The field name.
+
+    Raises:
+        ValueError: If the field is not a SablonModel field, or not a numeric one when required.
+    """
+    expected = NUMERIC_FIELDS if numeric else tuple(SablonModel.model_fields)
+    if field not in expected:
+        raise ValueError(f"Error! Unknown {'numeric ' if numeric else ''}field '{field}', expected one of {list(expected)}")
+    return field
+
+
+def parse_boundaries(boundaries: str | list | None) -> list[float] | None:
+    """
+    Parses the bucket boundaries of a histogram.
+
+    Args:
+        boundaries (str | list | None): The comma separated (or listed) boundaries, e.g. "0,18,65,120", None for none.
+
+    Returns:
+        list[float] | None: The boundaries, integers kept as integers, or None.
+
+    Raises:
+        ValueError: If there are less than two boundaries, or they are not numbers in strictly ascending order.
+    """
+    if boundaries is None:
+        return None
+    values = boundaries.split(",") if isinstance(boundaries, str) else boundaries
+    try:
+        parsed = [float(value) for value in values]
+    except (TypeError, ValueError) as e:
+        raise ValueError("Error! 'boundaries' must be a comma separated list of numbers") from e
+    if len(parsed) < 2 or any(low >= high for low, high in zip(parsed, parsed[1:])):
+        raise ValueError("Error! 'boundaries' must hold at least two numbers in strictly ascending order")
+    return [int(value) if value.is_integer() else value for value in parsed]
+
+
+def stats_match(query: dict | None) -> list[dict]:
+    """
+    Builds the $match stage restricting a statistic to a query.
+
+    Args:
+        query (dict | None): The query to filter Sablon documents, None or {} for the whole collection.
+
+    Returns:
+        list[dict]: The $match stage, or no stage for the whole collection.
+    """
+    if query is not None and not isinstance(query, dict):
+        raise ValueError("Error! The query of a statistic must be a dictionary")
+    return [{"$match": query}] if query else []
+
+
+def count_by_pipeline(field: str, query: dict | None = None) -> list[dict]:
+    """
+    Builds the aggregation pipeline counting the documents by the values of a field, most frequent first.
+
+    Args:
+        field (str): The name of the SablonModel field.
+        query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+    Returns:
+        list[dict]: The aggregation pipeline.
+    """
+    return stats_match(query) + [
+        {"$group": {"_id": f"${check_stats_field(field)}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$project": {"_id": 0, "value": "$_id", "count": 1}},
+    ]
+
+
+def summary_pipeline(field: str, query: dict | None = None) -> list[dict]:
+    """
+    Builds the aggregation pipeline of the count, min, max and average of a numeric field. Documents without a numeric
+    value for the field are left out.
+
+    Args:
+        field (str): The name of the numeric SablonModel field.
+        query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+    Returns:
+        list[dict]: The aggregation pipeline.
+    """
+    field = check_stats_field(field, numeric=True)
+    return stats_match(query) + [
+        {"$match": {field: {"$type": "number"}}},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "min": {"$min": f"${field}"}, "max": {"$max": f"${field}"},
+                    "avg": {"$avg": f"${field}"}}},
+        {"$project": {"_id": 0}},
+    ]
+
+
+def collect_summary(field: str, results: list[dict]) -> dict:
+    """
+    Builds the summary response from the result of the summary pipeline.
+
+    Args:
+        field (str): The name of the numeric SablonModel field.
+        results (list[dict]): The documents returned by the summary pipeline, empty when no document matched.
+
+    Returns:
+        dict: The field, the number of documents with a value and the min, max and avg of the values (None when there
+        are none).
+    """
+    return {"field": field, **(results[0] if results else {"count": 0, "min": None, "max": None, "avg": None})}
+
+
+def histogram_pipeline(field: str, boundaries: list[float] | None = None, buckets: int | None = None,
+                       query: dict | None = None) -> list[dict]:
+    """
+    Builds the aggregation pipeline of the histogram of a numeric field, with either explicit bucket boundaries
+    ($bucket) or a number of buckets of about the same size ($bucketAuto).
+
+    Args:
+        field (str): The name of the numeric SablonModel field.
+        boundaries (list[float] | None): The ascending bucket boundaries, see parse_boundaries.
+        buckets (int | None): The number of buckets, when no boundaries are given.
+        query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+    Returns:
+        list[dict]: The aggregation pipeline.
+
+    Raises:
+        ValueError: If not exactly one of boundaries and buckets is given.
+    """
+    field = check_stats_field(field, numeric=True)
+    if (boundaries is None) == (buckets is None):
+        raise ValueError("Error! A histogram needs exactly one of 'boundaries' or 'buckets'")
+    if boundaries is not None:
+        stage = {"$bucket": {"groupBy": f"${field}", "boundaries": boundaries, "default": "other",
+                             "output": {"count": {"$sum": 1}}}}
+    else:
+        if not isinstance(buckets, int) or buckets < 1:
+            raise ValueError("Error! 'buckets' must be a positive integer")
+        stage = {"$bucketAuto": {"groupBy": f"${field}", "buckets": buckets, "output": {"count": {"$sum": 1}}}}
+    return stats_match(query) + [{"$match": {field: {"$type": "number"}}}, stage]
+
+
+def collect_histogram(field: str, results: list[dict], boundaries: list[float] | None = None) -> dict:
+    """
+    Builds the histogram response from the buckets returned by Mongo. With explicit boundaries the empty buckets,
+    which Mongo leaves out, are listed with a count of 0.
+
+    Args:
+        field (str): The name of the numeric SablonModel field.
+        results (list[dict]): The buckets returned by the histogram pipeline.
+        boundaries (list[float] | None): The boundaries the pipeline was built with, None for $bucketAuto.
+
+    Returns:
+        dict: The field, the {"min", "max", "count"} buckets (min inclusive, max exclusive except for the last
+        $bucketAuto bucket) and the number of values outside of the boundaries.
+    """
+    if boundaries is None:
+        histogram = [{"min": result["_id"]["min"], "max": result["_id"]["max"], "count": result["count"]} for result in results]
+        return {"field": field, "buckets": histogram, "other": 0}
+    counts = {result["_id"]: result["count"] for result in results}
+    histogram = [{"min": low, "max": high, "count": counts.get(low, 0)} for low, high in zip(boundaries, boundaries[1:])]
+    return {"field": field, "buckets": histogram, "other": counts.get("other", 0)}
+
+
+def declared_indexes() -> list[IndexModel]:
+    """
+    Returns the pymongo IndexModels of the indexes declared in SABLON_INDEXES.
+    """
+    return [index.to_index_model() for index in SABLON_INDEXES]
+
+
+def plan_index_reconcile(existing: list[dict], drop_extra: bool = False) -> tuple[dict, list[str], list[IndexModel]]:
+    """
+    Plans the reconciliation of the indexes of the Sablon collection with the declared ones.
+
+    Args:
+        existing (list[dict]): The indexes of the collection, as listed by the store.
+        drop_extra (bool): True to also drop the indexes of the collection that are not declared.
+
+    Returns:
+        tuple[dict, list[str], list[IndexModel]]: The drift, see index_drift, the names of the indexes to drop and the
+        indexes to create, dropped first so that the changed ones are rebuilt.
+    """
+    declared = declared_indexes()
+    drift = index_drift(declared, existing)
+    dropped = drift["changed"] + (drift["extra"] if drop_extra else [])
+    rebuilt = [index for index in declared if index.document["name"] in drift["missing"] + drift["changed"]]
+    return drift, dropped, rebuilt
 
-from utils.db_store import MongoDBStore
-from models.sablon_model import SablonModel
 
+def warm_up_models() -> None:
+    """
+    Runs the validation and serialization of the Sablon models once, building the partial models of the single field
+    reads on the way, so that the first requests of a worker do not pay for them.
+    """
+    sample = {"name": "warm-up", "age": 0, "gender": "warm-up"}
+    _sablon_list_adapter.dump_json(_sablon_list_adapter.validate_python([sample]))
+    for field in SablonModel.model_fields:
+        orjson.dumps(read_model((field,), trusted=False)(**{field: sample.get(field)}).model_dump())
+
+
+def check_warm_up_query(query: dict, result: Any) -> None:
+    """
+    Checks the result of a query preloaded by the warm-up.
+
+    Args:
+        query (dict): The {"query": {...}, "fields": "..."} warm-up query.
+        result (Any): The result of get_sabloane_by_query.
+
+    Raises:
+        ValueError: If the query failed.
+    """
+    if isinstance(result, dict):
+        raise ValueError(f"Error! The warm-up query {query} failed: {result['error']}")
 
+
+def warm_up_report(documents: int, queries: list[dict] | None, start: float) -> dict:
+    """
+    Builds the report of a warm-up.
+
+    Args:
+        documents (int): The number of documents preloaded in the document cache.
+        queries (list[dict] | None): The queries preloaded in the query cache.
+        start (float): The time.perf_counter() value taken when the warm-up started.
+
+    Returns:
+        dict: The numbers of preloaded documents and queries and the duration of the warm-up in milliseconds.
+    """
+    return {"documents": documents, "queries": len(queries or []),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+@trace_methods("service")
 class SablonServices:
     """
        A class containing methods for CRUD operations on Sablon documents.
 
        Methods:
-           __init__: Initializes the MongoDBStore instance.
+           __init__: Initializes the MongoDBStore instance, the document cache and the query cache.
+           get_cache_stats: Returns the counters of the caches of the service.
+           get_slow_queries: Returns the slow query log of the store.
+           get_collection_etag: Returns the ETag of the current version of the Sablon collection.
            add_sablon: Adds a new Sablon document to the database.
+           add_sabloane: Adds many Sablon documents to the database in chunked insert_many calls.
+           add_sablon_batch: Adds the single Sablon documents of concurrent requests in one insert_many call.
            get_all_sabloane: Retrieves all Sablon documents from the database.
            get_sablon_by_oid: Retrieves a Sablon document by its ObjectId.
+           get_sablon_and_etag: Retrieves a Sablon document by its ObjectId together with the ETag of its version.
+           get_sabloane_by_oids: Retrieves many Sablon documents by their ObjectIds.
            get_sabloane_by_query: Retrieves Sablon documents based on a query.
+           get_sabloane_page: Retrieves one page of Sablon documents.
+           get_sabloane_by_query_page: Retrieves one page of the Sablon documents matching a query.
+           stream_sabloane: Streams Sablon documents as NDJSON lines.
            update_sablon: Updates a Sablon document.
+           batch_sabloane: Executes a list of insert/update/delete operations in a single bulk_write.
            delete_sablon_by_id: Deletes a Sablon document by its ObjectId.
            delete_sablon_by_query: Deletes Sablon documents based on a query.
+           count_sabloane: Counts the Sablon documents.
+           count_sabloane_by: Counts the Sablon documents by the values of a field.
+           get_sabloane_summary: Computes the count, min, max and average of a numeric field.
+           get_sabloane_histogram: Computes the histogram of a numeric field.
+           get_index_drift: Compares the declared indexes with the indexes of the Sablon collection.
+           reconcile_indexes: Creates the missing declared indexes and rebuilds the changed ones.
+           warm_up: Runs the Sablon models once and preloads the document and query caches before the first request.
        """
 
     def __init__(self):
         """
-       Initializes the MongoDBStore instance.
+       Initializes the MongoDBStore instance, the read-through cache of single documents, the query cache, the
+       single-flight groups of their loads and the view of the collection version the caches are checked against.
 
        Args:
            None
@@ -41,6 +1091,173 @@ class SablonServices:
            None
        """
         self.db = MongoDBStore()
+        self.document_cache = LRUTTLCache(DOCUMENT_CACHE_SIZE, DOCUMENT_CACHE_TTL)
+        self.query_cache = QueryCache(QUERY_CACHE_MAX_BYTES, QUERY_CACHE_TTL, QUERY_CACHE_STALE_TTL)
+        self.document_flight = SingleFlight()
+        self.query_flight = SingleFlight()
+        self.collection_version = SharedVersion(COLLECTION_VERSION_TTL, self._collection_changed)
+        self._query_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sablon-query-refresh")
+
+    def _collection_changed(self) -> None:
+        """
+        Drops the cached documents and query results of this worker, called when the version of the collection changed
+        in another worker, so that its writes are not hidden by them.
+        """
+        self.document_cache.clear()
+        self.query_cache.bump()
+
+    def _check_collection_version(self) -> int:
+        """
+        Checks the caches against the version of the collection shared by every worker, read from Mongo at most every
+        COLLECTION_VERSION_TTL seconds, and drops them when another worker wrote to the collection since then.
+
+        Returns:
+            int: The version of the collection.
+        """
+        if self.collection_version.stale():
+            version = None
+            try:
+                version = self.db.get_collection_version("sablon_db", "sablon_collection")
+            finally:
+                self.collection_version.update(version)
+        return self.collection_version.value
+
+    def _get_document(self, document_id: ObjectId, fields: tuple[str, ...] | None) -> dict:
+        """
+        Reads a document through the document cache.
+
+        Whole documents are read and cached with their version on a miss. A projected read is served from a cached
+        whole document when there is one, otherwise it is read with its projection and its version, and not cached.
+        Concurrent misses of the same document and fields share one read.
+
+        Args:
+            document_id (ObjectId): The ObjectId of the document.
+            fields (tuple[str, ...] | None): The selected field names, None for the whole document.
+
+        Returns:
+            dict: The stored document, holding its version. It must not be modified, see select_fields.
+        """
+        self._check_collection_version()
+        cached = self.document_cache.get(document_id)
+        if cached is not MISSING:
+            return cached
+        generation = self.document_cache.generation
+        return self.document_flight.do((document_id, fields, generation), self._read_document, document_id, fields,
+                                       generation)
+
+    def _read_document(self, document_id: ObjectId, fields: tuple[str, ...] | None, generation: int) -> dict:
+        """
+        Reads a document from the store and caches it when it is whole, run once for the concurrent misses of _get_document.
+
+        Args:
+            document_id (ObjectId): The ObjectId of the document.
+            fields (tuple[str, ...] | None): The selected field names, None for the whole document.
+            generation (int): The generation of the document cache read before the miss.
+
+        Returns:
+            dict: The stored document.
+        """
+        result = self.db.get_document_by_id("sablon_db", "sablon_collection", document_id,
+                                            None if fields is None else {**build_projection(fields), VERSION_FIELD: 1})
+        if result is None:
+            raise LookupError(f"Error! No Sablon document with ObjectId {document_id}")
+        if fields is None:
+            cache_document(self.document_cache, result, generation)
+        return result
+
+    def _collection_written(self) -> None:
+        """
+        Marks the Sablon collection as written to: bumps the query cache generation of this worker and the version of the
+        collection shared by every worker, which invalidates the collection ETags they issued and the caches of the
+        other workers.
+
+        The version is bumped after the write, in a round trip of its own. When the bump fails the write is done all the
+        same: the failure is logged, the caches of this worker are dropped and its view of the version is read again,
+        the other workers only see the write once their cached entries expire.
+        """
+        self.query_cache.bump()
+        try:
+            version = self.db.bump_collection_version("sablon_db", "sablon_collection")
+        except Exception as e:
+            logger.error("Sablon collection version bump failed, the other workers may serve stale reads: %s", e)
+            self.document_cache.clear()
+            self.collection_version.update(None)
+            return
+        self.collection_version.update(version, written=True)
+
+    def get_cache_stats(self) -> dict:
+        """
+        Returns the counters of the caches of the service, used to size them.
+
+        Returns:
+            dict: The size, hits, misses, hit ratio, evictions and expirations of every cache, and the calls in flight,
+            shared and run calls of the single-flight groups of their loads.
+        """
+        return collect_cache_stats(self.document_cache, self.query_cache, self.document_flight, self.query_flight)
+
+    def get_slow_queries(self) -> list[dict] | dict:
+        """
+        Returns the slow query log of the store, each query with the shape of its filter and its winning plan.
+
+        Returns:
+            Union[list[dict], dict]: The slow queries, the most recent first, or a dictionary containing the error message.
+        """
+        try:
+            return self.db.get_slow_queries()
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_collection_etag(self, fields: str | list[str] | None = None) -> str | dict:
+        """
+        Returns the ETag of the current version of the Sablon collection, read before the documents it describes. The
+        version is the one the caches are checked against, read from Mongo at most every COLLECTION_VERSION_TTL seconds.
+
+        Args:
+            fields (str | list[str] | None): The SablonModel fields of the read (comma separated), None for whole documents.
+
+        Returns:
+            Union[str, dict]: The quoted ETag or a dictionary containing the error message.
+        """
+        try:
+            return collection_etag(self._check_collection_version(), parse_fields(fields))
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _load_query(self, key: str, sablon_query: dict, fields: tuple[str, ...] | None) -> tuple[BaseModel, ...]:
+        """
+        Reads the documents matching a query from the store and stores them in the query cache.
+
+        Args:
+            key (str): The query cache key of the query.
+            sablon_query (dict): The query to filter Sablon documents.
+            fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+
+        Returns:
+            tuple[BaseModel, ...]: The SablonModel instances (partial models when fields are selected).
+        """
+        generation = self.query_cache.generation
+        self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+        results = self.db.get_documents_by_query("sablon_db", "sablon_collection", sablon_query,
+                                                 projection=build_projection(fields))
+        sabloane, size = collect_query_result(results, fields)
+        self.query_cache.set(key, sabloane, generation, size)
+        return sabloane
+
+    def _refresh_query(self, key: str, sablon_query: dict, fields: tuple[str, ...] | None) -> None:
+        """
+        Reloads a stale query cache entry, run in the background by the stale-while-revalidate reads.
+
+        Args:
+            key (str): The query cache key of the query.
+            sablon_query (dict): The query to filter Sablon documents.
+            fields (tuple[str, ...] | None): The selected field names, None for whole documents.
+        """
+        try:
+            self._load_query(key, sablon_query, fields)
+        except Exception as e:
+            print(f"Query cache refresh failed: {e}")
+        finally:
+            self.query_cache.end_refresh(key)
 
     def add_sablon(self, sablon_model: SablonModel) -> dict:
         """
@@ -54,68 +1271,263 @@ class SablonServices:
        """
         try:
             result = self.db.add_document("sablon_db", "sablon_collection", sablon_model.dict())
+            self._collection_written()
             print(f"Sablon successfully added: {result.inserted_id}")
             return {"oid": result.inserted_id}
         except Exception as e:
             return {"error": str(e)}
 
-    def get_all_sabloane(self) -> list[SablonModel] | dict:
+    def add_sablon_batch(self, documents: list[dict]) -> list[dict]:
+        """
+       Adds the single Sablon documents of concurrent requests, gathered by the insert coalescer, in one unordered
+       insert_many call, a rejected document does not prevent the others from being inserted.
+
+       Args:
+           documents (list[dict]): The validated Sablon documents, as dictionaries.
+
+       Returns:
+           list[dict]: The result of every document in order, a dictionary containing its ObjectId or the error message.
+       """
+        try:
+            self.db.add_documents("sablon_db", "sablon_collection", documents)
+            write_errors = {}
+        except PyMongoError as e:
+            write_errors = bulk_write_errors(e, documents)
+        except Exception as e:
+            return [{"error": str(e)} for _ in documents]
+        self._collection_written()
+        print(f"Sabloane successfully added: {len(documents) - len(write_errors)}")
+        return collect_insert_batch(documents, write_errors)
+
+    def add_sabloane(self, sabloane: list) -> dict:
+        """
+       Adds many Sablon documents to the database in chunked, unordered insert_many calls.
+
+       Every chunk of BULK_INSERT_CHUNK_SIZE items is validated with SablonModel and written in a single round trip,
+       an invalid or rejected item does not prevent the others from being inserted.
+
+       Args:
+           sabloane (list): The Sablon documents to be added, as dictionaries.
+
+       Returns:
+           dict: The number of inserted documents, the ObjectIds by request position (None for the failed items) and
+           the per-item errors, or a dictionary containing the error message.
+       """
+        try:
+            chunks = bulk_insert_chunks(sabloane)
+            oids, errors = [None] * len(sabloane), []
+            for documents, positions, chunk_errors in chunks:
+                errors.extend(chunk_errors)
+                if not documents:
+                    continue
+                try:
+                    self.db.add_documents("sablon_db", "sablon_collection", documents)
+                    write_errors = {}
+                except PyMongoError as e:
+                    write_errors = bulk_write_errors(e, documents)
+                self._collection_written()
+                collect_bulk_chunk(documents, positions, write_errors, oids, errors)
+            print(f"Sabloane successfully added: {len(sabloane) - len(errors)}")
+            return collect_bulk_insert(len(sabloane), oids, errors)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_all_sabloane(self, fields: str | list[str] | None = None) -> list[BaseModel] | dict:
         """
         Retrieves all Sablon documents from the database.
 
+        Args:
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
         Returns:
-            Union[List[SablonModel], dict]: A list of SablonModel instances or a dictionary containing the error message.
+            Union[List[BaseModel], dict]: A list of SablonModel instances (partial models when fields are selected) or a
+            dictionary containing the error message.
         """
         try:
-            results = self.db.get_all_documents("sablon_db", "sablon_collection")
-            sabloane = []
-            for result in results:
-                result.pop("_id")
-                sabloane.append(SablonModel(**result))
-            return sabloane  # Vom returna o lista de Sablon Modele
+            fields = parse_fields(fields)
+            results = self.db.get_all_documents("sablon_db", "sablon_collection", projection=build_projection(fields))
+            return read_documents(results, fields)  # Vom returna o lista de Sablon Modele
         except Exception as e:
             return {"error": str(e)}
 
-    def get_sablon_by_oid(self, sablon_oid: str) -> SablonModel | dict:
+    def get_sablon_by_oid(self, sablon_oid: str, fields: str | list[str] | None = None) -> BaseModel | dict:
         """
         Retrieves a Sablon document by its ObjectId.
 
         Args:
             sablon_oid (str): The ObjectId of the Sablon document.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            Union[BaseModel, dict]: The SablonModel instance (a partial model when fields are selected) or a dictionary
+            containing the error message.
+        """
+        try:
+            fields = parse_fields(fields)
+            result = self._get_document(ObjectId(sablon_oid), fields)
+            return read_document(result, fields)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_sablon_and_etag(self, sablon_oid: str, fields: str | list[str] | None = None) -> tuple[BaseModel, str] | dict:
+        """
+        Retrieves a Sablon document by its ObjectId together with the ETag of its version, from one read.
+
+        Args:
+            sablon_oid (str): The ObjectId of the Sablon document.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            Union[tuple[BaseModel, str], dict]: The SablonModel instance (a partial model when fields are selected) and
+            its quoted ETag, or a dictionary containing the error message.
+        """
+        try:
+            fields = parse_fields(fields)
+            document_id = ObjectId(sablon_oid)
+            result = self._get_document(document_id, fields)
+            return read_document(result, fields), document_etag(document_id, result.get(VERSION_FIELD, 0), fields)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_sabloane_by_oids(self, sablon_oids: list, fields: str | list[str] | None = None) -> dict:
+        """
+        Retrieves many Sablon documents by their ObjectIds, with one $in query per MULTI_GET_CHUNK_SIZE ObjectIds.
+
+        The documents held by the document cache are served from it, only the others are read from Mongo.
+
+        Args:
+            sablon_oids (list): The ObjectIds of the Sablon documents.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
 
         Returns:
-            Union[SablonModel, dict]: The SablonModel instance or a dictionary containing the error message.
+            dict: The Sablon documents in request order, the missing ObjectIds and the per-item errors, or a dictionary
+            containing the error message.
         """
         try:
-            result = self.db.get_document_by_id("sablon_db", "sablon_collection", ObjectId(sablon_oid))
-            result.pop("_id")
-            return SablonModel(**result)
+            fields = parse_fields(fields)
+            oids, errors = parse_oids(sablon_oids)
+            self._check_collection_version()
+            documents, unique_misses = read_cached_documents(self.document_cache, oids, fields)
+            generation = self.document_cache.generation
+            projection = None if fields is None else build_projection(fields, keep_id=True)
+            for start in range(0, len(unique_misses), MULTI_GET_CHUNK_SIZE):
+                chunk = unique_misses[start:start + MULTI_GET_CHUNK_SIZE]
+                for result in self.db.get_documents_by_ids("sablon_db", "sablon_collection", chunk, projection):
+                    documents[result["_id"]] = result
+                    if fields is None:
+                        cache_document(self.document_cache, result, generation)
+            return collect_multi_get(oids, documents, errors, read_model(fields))
         except Exception as e:
             return {"error": str(e)}
 
-    def get_sabloane_by_query(self, sablon_query: dict) -> list[SablonModel] | dict:
+    def get_sabloane_by_query(self, sablon_query: dict, fields: str | list[str] | None = None) -> list[BaseModel] | dict:
         """
-       Retrieves Sablon documents based on a query.
+       Retrieves Sablon documents based on a query, through the query cache.
+
+       A stale cached result is served as is while it is refreshed in the background when QUERY_CACHE_STALE_TTL allows
+       it, otherwise the query is read again from Mongo. Concurrent misses of the same query share one read.
 
        Args:
            sablon_query (dict): The query to filter Sablon documents.
+           fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
 
        Returns:
-           Union[List[SablonModel], dict]: A list of SablonModel instances or a dictionary containing the error message.
+           Union[List[BaseModel], dict]: A list of SablonModel instances (partial models when fields are selected) or a
+           dictionary containing the error message.
        """
         try:
-            results = self.db.get_documents_by_query("sablon_db", "sablon_collection", sablon_query)
-            sabloane = []
-            for result in results:
-                sabloane.append(SablonModel(**result))
-            return sabloane
+            fields = parse_fields(fields)
+            key = query_cache_key(sablon_query, fields)
+            self._check_collection_version()
+            cached, fresh = self.query_cache.lookup(key)
+            if cached is MISSING:
+                return list(self.query_flight.do((key, self.query_cache.generation), self._load_query, key,
+                                                 sablon_query, fields))
+            if not fresh and self.query_cache.begin_refresh(key):
+                self._query_refresher.submit(self._refresh_query, key, sablon_query, fields)
+            return list(cached)
+
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_sabloane_page(self, limit: int = DEFAULT_PAGE_LIMIT, cursor: str | None = None,
+                          fields: str | list[str] | None = None) -> dict:
+        """
+        Retrieves one page of Sablon documents, ordered by ObjectId.
+
+        Args:
+            limit (int): The maximum number of documents in the page.
+            cursor (str | None): The next_cursor of the previous page, or None for the first page.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            dict: The page ("items" and "next_cursor") or a dictionary containing the error message.
+        """
+        try:
+            limit = check_page_limit(limit)
+            fields = parse_fields(fields)
+            results = self.db.get_all_documents_page("sablon_db", "sablon_collection", limit + 1, decode_cursor(cursor),
+                                                     build_projection(fields, keep_id=True))
+            return build_page(list(results), limit, read_model(fields))
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_sabloane_by_query_page(self, sablon_query: dict, limit: int = DEFAULT_PAGE_LIMIT, cursor: str | None = None,
+                                   fields: str | list[str] | None = None) -> dict:
+        """
+        Retrieves one page of the Sablon documents matching a query, ordered by ObjectId.
+
+        Args:
+            sablon_query (dict): The query to filter Sablon documents.
+            limit (int): The maximum number of documents in the page.
+            cursor (str | None): The next_cursor of the previous page, or None for the first page.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
 
+        Returns:
+            dict: The page ("items" and "next_cursor") or a dictionary containing the error message.
+        """
+        try:
+            limit = check_page_limit(limit)
+            fields = parse_fields(fields)
+            self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            results = self.db.get_documents_by_query_page("sablon_db", "sablon_collection", sablon_query, limit + 1,
+                                                          decode_cursor(cursor), build_projection(fields, keep_id=True))
+            return build_page(list(results), limit, read_model(fields))
         except Exception as e:
             return {"error": str(e)}
 
+    def stream_sabloane(self, sablon_query: dict | None = None, fields: str | list[str] | None = None) -> Iterator[bytes]:
+        """
+        Streams Sablon documents as NDJSON lines, one serialized document per line.
+
+        The cursor is iterated in batches of STREAM_BATCH_SIZE documents, so memory stays flat no matter how large
+        the collection is. An error met while streaming is reported as a last {"error": ...} line.
+
+        Args:
+            sablon_query (dict | None): The query to filter Sablon documents, None streams the whole collection.
+            fields (str | list[str] | None): The SablonModel fields to return (comma separated), None for whole documents.
+
+        Returns:
+            Iterator[bytes]: The NDJSON lines.
+        """
+        try:
+            fields = parse_fields(fields)
+            model, projection = read_model(fields), build_projection(fields)
+            if sablon_query is None:
+                results = self.db.get_all_documents("sablon_db", "sablon_collection", batch_size=STREAM_BATCH_SIZE,
+                                                    projection=projection)
+            else:
+                self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+                results = self.db.get_documents_by_query("sablon_db", "sablon_collection", sablon_query,
+                                                         batch_size=STREAM_BATCH_SIZE, projection=projection)
+            for result in results:
+                yield to_ndjson_line(result, model)
+        except Exception as e:
+            yield ndjson_error_line(e)
+
     def update_sablon(self, sablon_oid: str, sablon: dict) -> dict:
         """
-        Updates a Sablon document.
+        Updates a Sablon document and increments its version.
 
         Args:
             sablon_oid (str): The ObjectId of the Sablon document.
@@ -125,11 +1537,41 @@ class SablonServices:
             dict: A dictionary containing the result of the operation.
         """
         try:
-            result = self.db.update_document("sablon_db", "sablon_collection", ObjectId(sablon_oid), sablon)
+            result = self.db.update_document("sablon_db", "sablon_collection", ObjectId(sablon_oid), sablon, VERSION_FIELD)
+            self.document_cache.invalidate(ObjectId(sablon_oid))
+            self._collection_written()
             return {"result": f"Documents updated: {result.modified_count}"}
         except Exception as e:
             return {"error": str(e)}
 
+    def batch_sabloane(self, operations: list, ordered: bool = True) -> dict:
+        """
+        Executes a list of insert/update/delete operations in a single bulk_write.
+
+        Args:
+            operations (list): The batch operations, see build_batch_operation.
+            ordered (bool): True to stop at the first failing operation, False to execute every valid operation.
+
+        Returns:
+            dict: The counts of the batch and the per-operation results, or a dictionary containing the error message.
+        """
+        try:
+            requests, positions, results = prepare_batch(operations, ordered)
+            counts, write_errors = {}, {}
+            if requests:
+                try:
+                    counts = self.db.bulk_write("sablon_db", "sablon_collection", requests, ordered).bulk_api_result
+                except BulkWriteError as e:
+                    counts, write_errors = e.details, bulk_write_errors(e, requests)
+                except PyMongoError as e:
+                    write_errors = bulk_write_errors(e, requests)
+                if batch_changes_documents(requests):
+                    self.document_cache.clear()
+                self._collection_written()
+            return collect_batch(positions, results, counts, write_errors, ordered)
+        except Exception as e:
+            return {"error": str(e)}
+
     def delete_sablon_by_id(self, sablon_oid: str) -> dict:
         """
         Deletes a Sablon document by its ObjectId.
@@ -143,6 +1585,8 @@ class SablonServices:
 
         try:
             result = self.db.delete_document_by_id("sablon_db", "sablon_collection", ObjectId(sablon_oid))
+            self.document_cache.invalidate(ObjectId(sablon_oid))
+            self._collection_written()
             return {"result": f"Documents deleted: {result.deleted_count}"}
 
         except Exception as e:
@@ -160,8 +1604,161 @@ class SablonServices:
         """
 
         try:
+            self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
             result = self.db.delete_document_by_query("sablon_db", "sablon_collection", sablon_query)
+            # The deleted document is not known, so every cached document is dropped
+            self.document_cache.clear()
+            self._collection_written()
             return {"result": f"Document deleted: {result.deleted_count}"}
 
         except Exception as e:
             return {"error": str(e)}
+
+    def count_sabloane(self, sablon_query: dict | None = None) -> dict:
+        """
+        Counts the Sablon documents on the server, without reading them.
+
+        Args:
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: {"count": ...}, or a dictionary containing the error message.
+        """
+        try:
+            stats_match(sablon_query)
+            if sablon_query:
+                self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            return {"count": self.db.count_documents("sablon_db", "sablon_collection", sablon_query or {})}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def count_sabloane_by(self, field: str, sablon_query: dict | None = None) -> dict:
+        """
+        Counts the Sablon documents by the values of a field, with a $group aggregation.
+
+        Args:
+            field (str): The name of the SablonModel field.
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: The field and its {"value", "count"} entries, most frequent first, or a dictionary containing the error
+            message.
+        """
+        try:
+            pipeline = count_by_pipeline(field, sablon_query)
+            if sablon_query:
+                self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            return {"field": field, "counts": self.db.aggregate("sablon_db", "sablon_collection", pipeline)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_sabloane_summary(self, field: str, sablon_query: dict | None = None) -> dict:
+        """
+        Computes the count, min, max and average of a numeric field, with a $group aggregation.
+
+        Args:
+            field (str): The name of the numeric SablonModel field.
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: The field, the number of documents with a value and the min, max and avg of the values (None when
+            there are none), or a dictionary containing the error message.
+        """
+        try:
+            pipeline = summary_pipeline(field, sablon_query)
+            if sablon_query:
+                self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            results = self.db.aggregate("sablon_db", "sablon_collection", pipeline)
+            return collect_summary(field, results)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_sabloane_histogram(self, field: str, boundaries: str | list | None = None, buckets: int | None = None,
+                               sablon_query: dict | None = None) -> dict:
+        """
+        Computes the histogram of a numeric field, with a $bucket (explicit boundaries) or $bucketAuto (number of
+        buckets) aggregation.
+
+        Args:
+            field (str): The name of the numeric SablonModel field.
+            boundaries (str | list | None): The comma separated ascending bucket boundaries, e.g. "0,18,65,120".
+            buckets (int | None): The number of buckets of about the same size, when no boundaries are given.
+            sablon_query (dict | None): The query to filter Sablon documents, None for the whole collection.
+
+        Returns:
+            dict: The field, its buckets and the number of values outside of the boundaries, see collect_histogram, or a
+            dictionary containing the error message.
+        """
+        try:
+            boundaries = parse_boundaries(boundaries)
+            pipeline = histogram_pipeline(field, boundaries, buckets, sablon_query)
+            if sablon_query:
+                self.db.check_query_plan("sablon_db", "sablon_collection", sablon_query)
+            return collect_histogram(field, self.db.aggregate("sablon_db", "sablon_collection", pipeline), boundaries)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def get_index_drift(self) -> dict:
+        """
+        Compares the indexes declared in SABLON_INDEXES with the indexes of the Sablon collection.
+
+        Returns:
+            dict: The missing, changed and extra index names and whether the collection is in sync, or a dictionary
+            containing the error message.
+        """
+        try:
+            return index_drift(declared_indexes(), self.db.list_indexes("sablon_db", "sablon_collection"))
+        except Exception as e:
+            return {"error": str(e)}
+
+    def reconcile_indexes(self, drop_extra: bool = False) -> dict:
+        """
+        Creates the missing indexes declared in SABLON_INDEXES and rebuilds the changed ones. Running it again on a
+        reconciled collection does nothing.
+
+        Args:
+            drop_extra (bool): True to also drop the indexes of the collection that are not declared.
+
+        Returns:
+            dict: The drift found before reconciling with the created and dropped index names, or a dictionary
+            containing the error message.
+        """
+        try:
+            drift, dropped, rebuilt = plan_index_reconcile(self.db.list_indexes("sablon_db", "sablon_collection"),
+                                                           drop_extra)
+            for index_name in dropped:
+                self.db.drop_index("sablon_db", "sablon_collection", index_name)
+            created = self.db.create_indexes("sablon_db", "sablon_collection", rebuilt) if rebuilt else []
+            return {**drift, "created": created, "dropped": dropped}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def warm_up(self, documents: int = 0, queries: list[dict] | None = None) -> dict:
+        """
+        Warms up the service before it serves: runs the Sablon models once, preloads the most recent documents in the
+        document cache and the results of the given queries in the query cache.
+
+        Args:
+            documents (int): The number of most recent documents to preload, capped at the size of the document cache.
+            queries (list[dict] | None): The {"query": {...}, "fields": "..."} queries to preload, see SABLON_WARMUP_QUERIES.
+
+        Returns:
+            dict: The numbers of preloaded documents and queries and the duration of the warm-up in milliseconds, or a
+            dictionary containing the error message.
+        """
+        try:
+            start = time.perf_counter()
+            warm_up_models()
+            self._check_collection_version()
+            generation = self.document_cache.generation
+            preloaded = 0
+            limit = min(documents, self.document_cache.maxsize)
+            if limit > 0:
+                for document in self.db.get_latest_documents("sablon_db", "sablon_collection", limit):
+                    cache_document(self.document_cache, document, generation)
+                    preloaded += 1
+            for query in queries or []:
+                check_warm_up_query(query, self.get_sabloane_by_query(query["query"], query.get("fields")))
+            return warm_up_report(preloaded, queries, start)
+        except Exception as e:
+            return {"error": str(e)}
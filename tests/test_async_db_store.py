@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from utils.async_db_store import AsyncMongoDBStore
+
+
+class TestAsyncMongoDBStore:
+    @pytest.fixture(scope="function")
+    def mongo_driver(self):
+        db = AsyncMongoDBStore()
+        return db
+
+    @pytest.fixture(scope="function")
+    def sablon_document(self):
+        pytest_document = {
+            "name": "pytest_async_name"
+        }
+        return pytest_document
+
+    @pytest.fixture(scope="function")
+    def sablon_document_update(self):
+        pytest_document = {
+            "name": "pytest_async_name_update",
+            "age": 65,
+            "active": False
+        }
+        return pytest_document
+
+    def test_add_document(self, mongo_driver, sablon_document):
+        async def scenario():
+            # Clean db from previous run
+            await mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+            # Create document
+            result = await mongo_driver.add_document("sablon_db", "sablon_collection", sablon_document)
+            print(f"\n\033[91mUtils: \033[92mAsync add document: \033[96mAdded document {result.inserted_id}\033[0m\n")
+
+            assert result.inserted_id is not None
+
+            # Clean db after successful test run
+            await mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+        asyncio.run(scenario())
+
+    def test_get_documents_by_query(self, mongo_driver, sablon_document):
+        async def scenario():
+            # Clean db from previous run
+            await mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+            # Create document
+            result = await mongo_driver.add_document("sablon_db", "sablon_collection", sablon_document)
+            document_id = result.inserted_id
+
+            # Get documents by query
+            cursor = mongo_driver.get_documents_by_query("sablon_db", "sablon_collection", {"name": sablon_document.get("name")})
+            result = await cursor.to_list(length=None)
+            print(f"\n\033[91mUtils: \033[92mAsync get documents by query: \033[96m{result}\033[0m\n")
+
+            assert result[0].get("_id") == document_id
+            assert result[0].get("name") == sablon_document.get("name")
+
+            # Clean db after successful test run
+            await mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+        asyncio.run(scenario())
+
+    def test_update_and_delete_document(self, mongo_driver, sablon_document, sablon_document_update):
+        async def scenario():
+            # Clean db from previous run
+            await mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+            await mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document_update)
+
+            # Create document
+            result = await mongo_driver.add_document("sablon_db", "sablon_collection", sablon_document)
+            document_id = result.inserted_id
+
+            # Update document
+            result = await mongo_driver.update_document("sablon_db", "sablon_collection", document_id, sablon_document_update)
+            print(f"\n\033[91mUtils: \033[92mAsync update document: \033[96mUpdated document {result.modified_count}\033[0m\n")
+            assert result.modified_count == 1
+
+            # Get document by id
+            result = await mongo_driver.get_document_by_id("sablon_db", "sablon_collection", document_id)
+            assert result.get("name") == sablon_document_update.get("name")
+            assert result.get("age") == sablon_document_update.get("age")
+
+            # Delete document by id
+            result = await mongo_driver.delete_document_by_id("sablon_db", "sablon_collection", document_id)
+            assert result.deleted_count == 1
+
+        asyncio.run(scenario())
+
+    def test_collection_version(self, mongo_driver):
+        async def scenario():
+            version = await mongo_driver.get_collection_version("sablon_db", "sablon_collection")
+            bumped = await mongo_driver.bump_collection_version("sablon_db", "sablon_collection")
+            result = await mongo_driver.get_collection_version("sablon_db", "sablon_collection")
+            print(f"\n\033[91mUtils: \033[92mAsync collection version: \033[96m{version} -> {result}\033[0m\n")
+            assert result == version + 1
+            assert bumped == result
+            assert await mongo_driver.get_collection_version("sablon_db", "missing_collection") == 0
+
+        asyncio.run(scenario())
+
+    def test_initialize_database(self, mongo_driver):
+        result = asyncio.run(mongo_driver.initialize_database("sablon_db", "sablon_collection"))
+        print(f"\n\033[91mUtils: \033[92mAsync initialize database: \033[96m{result}\033[0m\n")
+
+        assert result is True
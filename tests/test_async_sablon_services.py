@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from services.async_sablon_services import AsyncSablonServices
+from models.sablon_model import SablonModel
+
+
+class TestAsyncSablonServices:
+    @pytest.fixture(scope="function")
+    def sablon_services(self):
+        return AsyncSablonServices()
+
+    @pytest.fixture(scope="class")
+    def sablon_dict(self):
+        return {
+            "name": "Test_Name_Async_Sablon",
+            "age": 24,
+            "gender": "Neutral"
+        }
+
+    @pytest.fixture(scope="class")
+    def sablon_model(self, sablon_dict):
+        return SablonModel(**sablon_dict)
+
+    def test_add_and_get_sablon_by_oid_success(self, sablon_services, sablon_model, sablon_dict):
+        async def scenario():
+            await sablon_services.delete_sablon_by_query(sablon_dict)
+            result = await sablon_services.add_sablon(sablon_model)
+            result = await sablon_services.get_sablon_by_oid(result.get("oid"))
+            print(f"\n\033[93mService: \033[92mAsync get sablon by oid success: \033[96m{result}\033[0m\n")
+            assert result == sablon_model
+            await sablon_services.delete_sablon_by_query(sablon_dict)
+
+        asyncio.run(scenario())
+
+    def test_get_sabloane_by_query_success(self, sablon_services, sablon_model, sablon_dict):
+        async def scenario():
+            for _ in range(0, 2):
+                await sablon_services.delete_sablon_by_query(sablon_dict)
+            await sablon_services.add_sablon(sablon_model)
+            await sablon_services.add_sablon(sablon_model)
+
+            results = await sablon_services.get_sabloane_by_query(sablon_dict)
+            print(f"\n\033[93mService: \033[92mAsync get sabloane by query success: \033[96m{results}\033[0m\n")
+            assert len(results) == 2
+            for result in results:
+                assert result == sablon_model
+
+            for _ in range(0, 2):
+                await sablon_services.delete_sablon_by_query(sablon_dict)
+
+        asyncio.run(scenario())
+
+    def test_two_workers_cache_success(self, sablon_model, sablon_dict):
+        async def scenario():
+            worker, other_worker = AsyncSablonServices(), AsyncSablonServices()
+            worker.collection_version.ttl = 0.1
+            await worker.delete_sablon_by_query(sablon_dict)
+            oid = (await worker.add_sablon(sablon_model)).get("oid")
+            assert await worker.get_sablon_by_oid(oid) == sablon_model
+            assert len(await worker.get_sabloane_by_query(sablon_dict)) == 1
+
+            await other_worker.update_sablon(oid, {"name": "Test_Name_Async_Sablon_Update"})
+            # Once its view of the collection version expired, the worker drops the entries cached before the write
+            await asyncio.sleep(0.15)
+            result = await worker.get_sablon_by_oid(oid)
+            print(f"\n\033[93mService: \033[92mAsync two workers cache success: \033[96m{result}\033[0m\n")
+            assert result.name == "Test_Name_Async_Sablon_Update"
+            assert await worker.get_sabloane_by_query(sablon_dict) == []
+            await other_worker.delete_sablon_by_id(oid)
+
+        asyncio.run(scenario())
+
+    def test_add_sablon_batch_success(self, sablon_services, sablon_model, sablon_dict):
+        async def scenario():
+            await sablon_services.delete_sablon_by_query(sablon_dict)
+            result = await sablon_services.add_sablon_batch([dict(sablon_dict), dict(sablon_dict)])
+            print(f"\n\033[93mService: \033[92mAsync add sablon batch success: \033[96m{result}\033[0m\n")
+            assert len(result) == 2 and result[0].get("oid") != result[1].get("oid")
+            assert await sablon_services.get_sablon_by_oid(result[1].get("oid")) == sablon_model
+            for i in range(0, 2):
+                await sablon_services.delete_sablon_by_query(sablon_dict)
+
+        asyncio.run(scenario())
+
+    def test_single_flight_success(self, sablon_services, sablon_model, sablon_dict):
+        async def scenario():
+            await sablon_services.delete_sablon_by_query(sablon_dict)
+            oid = (await sablon_services.add_sablon(sablon_model)).get("oid")
+            results = await asyncio.gather(*(sablon_services.get_sablon_by_oid(oid) for _ in range(8)),
+                                           *(sablon_services.get_sabloane_by_query(sablon_dict) for _ in range(8)))
+            stats = sablon_services.get_cache_stats()
+            print(f"\n\033[93mService: \033[92mAsync single flight success: \033[96m{stats}\033[0m\n")
+            assert results == [sablon_model] * 8 + [[sablon_model]] * 8
+            assert stats.get("document_flights").get("misses") == 1
+            assert stats.get("query_flights").get("misses") == 1
+            await sablon_services.delete_sablon_by_query(sablon_dict)
+
+        asyncio.run(scenario())
+
+    def test_warm_up_success(self, sablon_services, sablon_model, sablon_dict):
+        async def scenario():
+            await sablon_services.delete_sablon_by_query(sablon_dict)
+            oid = (await sablon_services.add_sablon(sablon_model)).get("oid")
+            services = AsyncSablonServices()
+            report = await services.warm_up(1, [{"query": sablon_dict}])
+            print(f"\n\033[93mService: \033[92mAsync warm up success: \033[96m{report}\033[0m\n")
+            assert report.get("documents") == 1 and report.get("queries") == 1
+            assert await services.get_sablon_by_oid(oid) == sablon_model
+            assert services.get_cache_stats().get("documents").get("hits") == 1
+            await sablon_services.delete_sablon_by_query(sablon_dict)
+
+        asyncio.run(scenario())
+
+    def test_add_sablon_fail(self, sablon_services, sablon_dict):
+        result = asyncio.run(sablon_services.add_sablon(sablon_dict))
+        print(f"\n\033[93mService: \033[92mAsync add sablon fail: \033[96m{result}\033[0m\n")
+        assert result.get("error") is not None
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from utils.cache import LRUTTLCache, QueryCache, SharedVersion, MISSING
+
+
+class TestLRUTTLCache:
+    @pytest.fixture(scope="function")
+    def cache(self):
+        return LRUTTLCache(maxsize=2, ttl=60)
+
+    def test_get_set(self, cache):
+        assert cache.get("a") is MISSING
+        cache.set("a", 1)
+        print(f"\n\033[91mUtils: \033[92mCache get set: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.get("a") == 1
+        assert cache.stats().get("hits") == 1
+        assert cache.stats().get("misses") == 1
+
+    def test_lru_eviction(self, cache):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        print(f"\n\033[91mUtils: \033[92mCache lru eviction: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.get("b") is MISSING
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.stats().get("evictions") == 1
+
+    def test_ttl_expiration(self):
+        cache = LRUTTLCache(maxsize=2, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        print(f"\n\033[91mUtils: \033[92mCache ttl expiration: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.get("a") is MISSING
+        assert cache.stats().get("expirations") == 1
+
+    def test_invalidate_generation(self, cache):
+        cache.set("a", 1)
+        generation = cache.generation
+        cache.invalidate("a")
+        cache.set("a", 1, generation)
+        print(f"\n\033[91mUtils: \033[92mCache invalidate generation: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.get("a") is MISSING
+        cache.set("a", 2, cache.generation)
+        assert cache.get("a") == 2
+
+    def test_disabled(self):
+        cache = LRUTTLCache(maxsize=0, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") is MISSING
+
+
+class TestQueryCache:
+    @pytest.fixture(scope="function")
+    def cache(self):
+        return QueryCache(max_bytes=100, ttl=60)
+
+    def test_lookup_set(self, cache):
+        assert cache.lookup("a") == (MISSING, False)
+        cache.set("a", (1,), cache.generation, 10)
+        print(f"\n\033[91mUtils: \033[92mQuery cache lookup set: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.lookup("a") == ((1,), True)
+        assert cache.stats().get("bytes") == 10
+
+    def test_bump_invalidates(self, cache):
+        generation = cache.generation
+        cache.set("a", (1,), generation, 10)
+        cache.bump()
+        print(f"\n\033[91mUtils: \033[92mQuery cache bump invalidates: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.lookup("a") == (MISSING, False)
+        cache.set("a", (2,), generation, 10)
+        assert cache.lookup("a") == (MISSING, False)
+
+    def test_memory_cap(self, cache):
+        cache.set("a", (1,), cache.generation, 60)
+        cache.set("b", (2,), cache.generation, 60)
+        cache.set("c", (3,), cache.generation, 101)
+        print(f"\n\033[91mUtils: \033[92mQuery cache memory cap: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.lookup("a") == (MISSING, False)
+        assert cache.lookup("b") == ((2,), True)
+        assert cache.lookup("c") == (MISSING, False)
+        assert cache.stats().get("evictions") == 1
+
+    def test_stale_while_revalidate(self):
+        cache = QueryCache(max_bytes=100, ttl=60, stale_ttl=60)
+        cache.set("a", (1,), cache.generation, 10)
+        cache.bump()
+        print(f"\n\033[91mUtils: \033[92mQuery cache stale while revalidate: \033[96m{cache.stats()}\033[0m\n")
+        assert cache.lookup("a") == ((1,), False)
+        assert cache.begin_refresh("a") is True
+        assert cache.begin_refresh("a") is False
+        cache.set("a", (2,), cache.generation, 10)
+        cache.end_refresh("a")
+        assert cache.lookup("a") == ((2,), True)
+
+
+class TestSharedVersion:
+    @pytest.fixture(scope="function")
+    def changes(self):
+        return []
+
+    @pytest.fixture(scope="function")
+    def version(self, changes):
+        return SharedVersion(ttl=60, on_change=lambda: changes.append(1))
+
+    def test_read_once_per_ttl(self, version, changes):
+        assert version.stale() is True
+        version.update(3)
+        print(f"\n\033[91mUtils: \033[92mShared version read once per ttl: \033[96m{version.value}\033[0m\n")
+        assert version.value == 3 and changes == [1]
+        assert version.stale() is False
+        version.update(3)
+        assert changes == [1]
+
+    def test_changed_elsewhere(self, version, changes):
+        version.update(3)
+        version.update(4, written=True)
+        print(f"\n\033[91mUtils: \033[92mShared version changed elsewhere: \033[96m{version.value}\033[0m\n")
+        # The local write directly follows the known version, the caches it invalidated itself are kept
+        assert version.value == 4 and changes == [1]
+        version.update(6, written=True)
+        assert version.value == 6 and changes == [1, 1]
+        version.update(5)
+        assert version.value == 6 and changes == [1, 1]
+
+    def test_expired(self, changes):
+        version = SharedVersion(ttl=0.05, on_change=lambda: changes.append(1))
+        version.update(3)
+        assert version.stale() is False
+        time.sleep(0.06)
+        assert version.stale() is True
+        # A single caller reads it, the others keep the known version meanwhile
+        assert version.stale() is False
+        version.update(None)
+        print(f"\n\033[91mUtils: \033[92mShared version expired: \033[96m{version.value}\033[0m\n")
+        assert version.value == 3
+        assert version.stale() is True
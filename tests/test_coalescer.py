@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from utils.coalescer import InsertCoalescer
+
+
+def _recorder(batches: list):
+    async def insert_batch(documents):
+        batches.append(list(documents))
+        return [{"oid": document} for document in documents]
+    return insert_batch
+
+
+class TestInsertCoalescer:
+    def test_coalesce_window(self):
+        batches = []
+
+        async def scenario():
+            coalescer = InsertCoalescer(_recorder(batches), max_batch=100, max_delay=0.01)
+            return await asyncio.gather(*(coalescer.submit(index) for index in range(5))), coalescer.stats()
+
+        results, stats = asyncio.run(scenario())
+        print(f"\n\033[91mUtils: \033[92mCoalesce window: \033[96m{batches} {stats}\033[0m\n")
+        # The first document is written right away, the others gather while it is in flight
+        assert batches == [[0], [1, 2, 3, 4]]
+        assert results == [{"oid": index} for index in range(5)]
+        assert stats == {"batches": 2, "documents": 5, "average_batch": 2.5}
+
+    def test_coalesce_max_batch(self):
+        batches = []
+
+        async def scenario():
+            coalescer = InsertCoalescer(_recorder(batches), max_batch=2, max_delay=10)
+            return await asyncio.wait_for(asyncio.gather(*(coalescer.submit(index) for index in range(5))), 1)
+
+        results = asyncio.run(scenario())
+        assert batches == [[0], [1, 2], [3, 4]]
+        assert results == [{"oid": index} for index in range(5)]
+
+    def test_coalesce_max_delay(self):
+        batches = []
+
+        async def scenario():
+            written = asyncio.Event()
+
+            async def slow_batch(documents):
+                if documents == ["first"]:
+                    await written.wait()
+                batches.append(list(documents))
+                return [{"oid": document} for document in documents]
+
+            coalescer = InsertCoalescer(slow_batch, max_batch=100, max_delay=0.001)
+            first = asyncio.ensure_future(coalescer.submit("first"))
+            await asyncio.sleep(0)
+            # The second document does not wait for the first write beyond max_delay
+            second = await asyncio.wait_for(coalescer.submit("second"), 1)
+            written.set()
+            return await first, second
+
+        assert asyncio.run(scenario()) == ({"oid": "first"}, {"oid": "second"})
+        assert batches == [["second"], ["first"]]
+
+    def test_coalesce_fail(self):
+        async def insert_batch(documents):
+            raise ConnectionError("Error! Test failure")
+
+        async def scenario():
+            coalescer = InsertCoalescer(insert_batch, max_delay=0.001)
+            return await asyncio.gather(coalescer.submit(1), coalescer.submit(2), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, ConnectionError) for result in results)
+        with pytest.raises(ValueError):
+            InsertCoalescer(insert_batch, max_batch=0)
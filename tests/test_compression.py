@@ -0,0 +1,113 @@
+import gzip
+
+import brotli
+import pytest
+import zstandard
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from utils.compression import CompressionMiddleware, compress, is_compressible, negotiate_encoding
+
+BODY = b'{"name":"Name_One","age":30,"gender":"Female"}\n' * 100
+
+DECODERS = {
+    "gzip": gzip.decompress,
+    "br": brotli.decompress,
+    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+
+def _app(minimum_size: int = 1024) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+
+    @app.get("/large")
+    def large():
+        return PlainTextResponse(BODY, headers={"ETag": '"large.0"'})
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse(BODY[:100])
+
+    @app.get("/image")
+    def image():
+        return Response(BODY, media_type="image/png", headers={"Vary": "Origin"})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BODY[:500]] * 10), media_type="application/x-ndjson")
+
+    return app
+
+
+def _get_raw(client: TestClient, path: str, accept_encoding: str) -> tuple[dict, bytes]:
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response.headers, b"".join(response.iter_raw())
+
+
+class TestNegotiateEncoding:
+    def test_negotiate_encoding(self):
+        encodings = ["zstd", "br", "gzip"]
+        print(f"\n\033[91mUtils: \033[92mNegotiate encoding: \033[96m{negotiate_encoding('gzip, br', encodings)}\033[0m\n")
+        assert negotiate_encoding("gzip, deflate, br", encodings) == "br"
+        assert negotiate_encoding("gzip, zstd;q=0.5", encodings) == "zstd"
+        assert negotiate_encoding("zstd;q=0, gzip", encodings) == "gzip"
+        assert negotiate_encoding("*", encodings) == "zstd"
+        assert negotiate_encoding("identity", encodings) is None
+        assert negotiate_encoding("", encodings) is None
+
+
+class TestCompressionMiddleware:
+    @pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+    def test_compress_large(self, encoding):
+        headers, raw = _get_raw(TestClient(_app()), "/large", encoding)
+        print(f"\n\033[91mUtils: \033[92mCompress large {encoding}: \033[96m{len(BODY)} -> {len(raw)} bytes\033[0m\n")
+        assert headers.get("content-encoding") == encoding
+        assert headers.get("vary") == "Accept-Encoding"
+        assert int(headers.get("content-length")) == len(raw) < len(BODY)
+        assert headers.get("etag") == 'W/"large.0"'
+        assert DECODERS[encoding](raw) == BODY
+
+    def test_compress_small(self):
+        headers, raw = _get_raw(TestClient(_app()), "/small", "gzip")
+        print(f"\n\033[91mUtils: \033[92mCompress small: \033[96m{headers}\033[0m\n")
+        assert "content-encoding" not in headers
+        assert headers.get("vary") == "Accept-Encoding"
+        assert raw == BODY[:100]
+
+    def test_compress_not_accepted(self):
+        headers, raw = _get_raw(TestClient(_app()), "/large", "identity")
+        print(f"\n\033[91mUtils: \033[92mCompress not accepted: \033[96m{headers}\033[0m\n")
+        assert "content-encoding" not in headers
+        assert headers.get("vary") == "Accept-Encoding"
+        assert headers.get("etag") == '"large.0"'
+        assert raw == BODY
+
+    def test_compress_not_compressible(self):
+        headers, raw = _get_raw(TestClient(_app()), "/image", "gzip")
+        print(f"\n\033[91mUtils: \033[92mCompress not compressible: \033[96m{headers}\033[0m\n")
+        assert "content-encoding" not in headers
+        assert headers.get("vary") == "Origin"
+        assert raw == BODY
+
+    @pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+    def test_compress_stream(self, encoding):
+        headers, raw = _get_raw(TestClient(_app()), "/stream", encoding)
+        print(f"\n\033[91mUtils: \033[92mCompress stream {encoding}: \033[96m{len(raw)} bytes\033[0m\n")
+        assert headers.get("content-encoding") == encoding
+        assert headers.get("vary") == "Accept-Encoding"
+        assert "content-length" not in headers
+        assert DECODERS[encoding](raw) == BODY[:500] * 10
+
+    def test_compress(self):
+        assert gzip.decompress(compress(BODY, "gzip", 1)) == BODY
+
+    def test_is_compressible(self):
+        assert is_compressible("application/json") and is_compressible("text/plain; charset=utf-8")
+        assert is_compressible("application/problem+json") and is_compressible("application/x-ndjson")
+        assert not is_compressible("image/png") and not is_compressible("")
+
+    def test_compress_fail(self):
+        with pytest.raises(ValueError):
+            CompressionMiddleware(FastAPI(), encodings=["lzma"])
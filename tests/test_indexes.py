@@ -0,0 +1,21 @@
+from pymongo import IndexModel
+
+from utils.indexes import index_drift
+
+
+class TestIndexDrift:
+    def test_index_drift_in_sync(self):
+        declared = [IndexModel([("name", 1)], name="name_1")]
+        actual = [{"key": {"_id": 1}, "name": "_id_"}, {"key": {"name": 1.0}, "name": "name_1", "v": 2}]
+        result = index_drift(declared, actual)
+        print(f"\n\033[91mUtils: \033[92mIndex drift in sync: \033[96m{result}\033[0m\n")
+        assert result == {"missing": [], "changed": [], "extra": [], "in_sync": True}
+
+    def test_index_drift(self):
+        declared = [IndexModel([("name", 1)], name="name_1"), IndexModel([("age", 1)], name="age_1", unique=True),
+                    IndexModel([("gender", 1)], name="gender_1")]
+        actual = [{"key": {"_id": 1}, "name": "_id_"}, {"key": {"age": 1}, "name": "age_1"},
+                  {"key": {"gender": 1}, "name": "gender_1"}, {"key": {"name": -1}, "name": "name_-1"}]
+        result = index_drift(declared, actual)
+        print(f"\n\033[91mUtils: \033[92mIndex drift: \033[96m{result}\033[0m\n")
+        assert result == {"missing": ["name_1"], "changed": ["age_1"], "extra": ["name_-1"], "in_sync": False}
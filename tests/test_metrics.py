@@ -0,0 +1,134 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from routes.metrics_routes import router as metrics_router
+from utils.cache import LRUTTLCache
+from utils.metrics import MONGO_METRICS, CacheCollector, MetricsMiddleware, instrument_store, multiprocess_metrics
+
+
+def _sample(name: str, labels: dict | None = None) -> float:
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/items/{item_id}")
+    def item(item_id: str):
+        return {"item_id": item_id}
+
+    @app.get("/metrics-test/stream")
+    def stream():
+        return StreamingResponse(iter([b"a\n"] * 3), media_type="application/x-ndjson")
+
+    return app
+
+
+@instrument_store("metrics-test")
+class _Store:
+    def read(self, value):
+        return value
+
+    async def read_async(self, value):
+        return value
+
+    def fail(self):
+        raise ValueError("Error! Test failure")
+
+
+class TestMetricsMiddleware:
+    def test_route_template(self):
+        labels = {"method": "GET", "route": "/metrics-test/items/{item_id}", "status": "200"}
+        before = _sample("sablon_http_requests_total", labels)
+        client = TestClient(_app())
+        client.get("/metrics-test/items/1")
+        client.get("/metrics-test/items/2")
+        print(f"\n\033[91mUtils: \033[92mMetrics route template: \033[96m{_sample('sablon_http_requests_total', labels)}\033[0m\n")
+        assert _sample("sablon_http_requests_total", labels) == before + 2
+        assert _sample("sablon_http_request_duration_seconds_count",
+                       {"method": "GET", "route": "/metrics-test/items/{item_id}"}) >= 2
+        assert _sample("sablon_http_requests_in_progress", {"method": "GET"}) == 0
+
+    def test_unmatched_route(self):
+        labels = {"method": "GET", "route": "unmatched", "status": "404"}
+        before = _sample("sablon_http_requests_total", labels)
+        TestClient(_app()).get("/metrics-test/missing/path")
+        assert _sample("sablon_http_requests_total", labels) == before + 1
+
+    def test_stream(self):
+        labels = {"method": "GET", "route": "/metrics-test/stream", "status": "200"}
+        before = _sample("sablon_http_requests_total", labels)
+        assert TestClient(_app()).get("/metrics-test/stream").text == "a\n" * 3
+        assert _sample("sablon_http_requests_total", labels) == before + 1
+
+
+class TestStoreMetrics:
+    def test_instrument_store(self):
+        labels = {"store": "metrics-test", "method": "read"}
+        before = _sample("sablon_store_operation_duration_seconds_count", labels)
+        assert _Store().read(1) == 1
+        assert asyncio.run(_Store().read_async(2)) == 2
+        print(f"\n\033[91mUtils: \033[92mStore metrics: \033[96m{_sample('sablon_store_operation_duration_seconds_count', labels)}\033[0m\n")
+        assert _sample("sablon_store_operation_duration_seconds_count", labels) == before + 1
+        assert _sample("sablon_store_operation_duration_seconds_count",
+                       {"store": "metrics-test", "method": "read_async"}) >= 1
+
+    def test_instrument_store_fail(self):
+        labels = {"store": "metrics-test", "method": "fail"}
+        before = _sample("sablon_store_operation_errors_total", labels)
+        with pytest.raises(ValueError):
+            _Store().fail()
+        assert _sample("sablon_store_operation_errors_total", labels) == before + 1
+
+    def test_mongo_listener(self):
+        before_find = _sample("sablon_mongo_command_duration_seconds_count", {"command": "find"})
+        before_failures = _sample("sablon_mongo_command_failures_total", {"command": "insert"})
+        before_wait = _sample("sablon_mongo_pool_checkout_wait_seconds_count")
+        MONGO_METRICS.succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+        MONGO_METRICS.failed(SimpleNamespace(command_name="insert", duration_micros=800))
+        MONGO_METRICS.connection_check_out_started(SimpleNamespace())
+        MONGO_METRICS.connection_checked_out(SimpleNamespace())
+        MONGO_METRICS.connection_checked_in(SimpleNamespace())
+        assert _sample("sablon_mongo_command_duration_seconds_count", {"command": "find"}) == before_find + 1
+        assert _sample("sablon_mongo_command_failures_total", {"command": "insert"}) == before_failures + 1
+        assert _sample("sablon_mongo_pool_checkout_wait_seconds_count") == before_wait + 1
+
+
+class TestCacheMetrics:
+    def test_cache_collector(self):
+        cache = LRUTTLCache(10, 60)
+        cache.set("key", "value")
+        cache.get("key")
+        cache.get("missing")
+        families = {family.name: family for family in CacheCollector(lambda: {"documents": cache.stats()}).collect()}
+        print(f"\n\033[91mUtils: \033[92mCache collector: \033[96m{list(families)}\033[0m\n")
+        assert families["sablon_cache_hits"].samples[0].value == 1
+        assert families["sablon_cache_misses"].samples[0].value == 1
+        assert families["sablon_cache_hit_ratio"].samples[0].value == 0.5
+
+    def test_metrics_endpoint(self):
+        response = TestClient(metrics_router).get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "sablon_store_operation_duration_seconds" in response.text
+
+    def test_multiprocess_metrics(self, monkeypatch):
+        monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+        with multiprocess_metrics():
+            directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+            assert os.path.isdir(directory)
+            # A scrape aggregates the files of the directory, empty as no worker wrote to it
+            response = TestClient(metrics_router).get("/metrics")
+            assert response.status_code == 200
+        assert "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+        assert not os.path.exists(directory)
+        with multiprocess_metrics(enabled=False):
+            assert "PROMETHEUS_MULTIPROC_DIR" not in os.environ
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.profiling import PROFILERS, ProfilerMiddleware, prune_profiles
+
+TOKEN = "test-admin-token"
+
+
+def _app(tmp_path, **options) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilerMiddleware, directory=str(tmp_path), **{"admin_token": TOKEN, **options})
+
+    @app.get("/work")
+    def work():
+        return {"total": sum(range(100000))}
+
+    return app
+
+
+class TestProfilerMiddleware:
+    @pytest.mark.parametrize("profiler", ["sampling", "deterministic"])
+    def test_return_profile(self, tmp_path, profiler):
+        client = TestClient(_app(tmp_path, profiler=profiler))
+        response = client.get("/work", headers={"X-Sablon-Profile": "return", "X-Sablon-Admin-Token": TOKEN})
+        print(f"\n\033[91mUtils: \033[92mReturn profile {profiler}: \033[96m{response.text[:200]}\033[0m\n")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert response.headers["x-sablon-profile-status"] == "200"
+        assert "work" in response.text
+
+    def test_save_profile(self, tmp_path):
+        client = TestClient(_app(tmp_path, profiler="deterministic"))
+        response = client.get("/work?profile=save", headers={"X-Sablon-Admin-Token": TOKEN})
+        print(f"\n\033[91mUtils: \033[92mSave profile: \033[96m{response.headers['x-sablon-profile-file']}\033[0m\n")
+        assert response.json() == {"total": sum(range(100000))}
+        assert os.listdir(tmp_path) == [response.headers["x-sablon-profile-file"]]
+        assert response.headers["x-sablon-profile-file"].endswith(".prof")
+
+    def test_profile_no_token(self, tmp_path):
+        client = TestClient(_app(tmp_path))
+        response = client.get("/work", headers={"X-Sablon-Profile": "return", "X-Sablon-Admin-Token": "wrong"})
+        assert response.json() == {"total": sum(range(100000))}
+        assert "x-sablon-profile-status" not in response.headers
+        response = client.get("/work?profile=return")
+        assert response.json() == {"total": sum(range(100000))}
+
+    def test_sample_rate(self, tmp_path):
+        client = TestClient(_app(tmp_path, admin_token=None, sample_rate=1.0, profiler="deterministic", keep=2))
+        for _ in range(4):
+            assert client.get("/work").status_code == 200
+        print(f"\n\033[91mUtils: \033[92mSampled profiles: \033[96m{os.listdir(tmp_path)}\033[0m\n")
+        assert len(os.listdir(tmp_path)) == 2
+
+    def test_profile_busy(self, tmp_path):
+        middleware = ProfilerMiddleware(_app(tmp_path, admin_token=None), admin_token=TOKEN, sample_rate=1.0,
+                                        profiler="deterministic", directory=str(tmp_path))
+        middleware._active = True
+        client = TestClient(middleware)
+        response = client.get("/work")
+        print(f"\n\033[91mUtils: \033[92mProfile busy: \033[96m{dict(response.headers)}\033[0m\n")
+        assert response.json() == {"total": sum(range(100000))}
+        assert "x-sablon-profile" not in response.headers
+        response = client.get("/work", headers={"X-Sablon-Profile": "save", "X-Sablon-Admin-Token": TOKEN})
+        assert response.headers["x-sablon-profile"] == "busy"
+        assert os.listdir(tmp_path) == []
+
+    def test_prune_profiles(self, tmp_path):
+        for index in range(5):
+            (tmp_path / f"sablon-profile-{index:020d}-GET-work.prof").write_bytes(b"")
+        (tmp_path / "other.txt").write_bytes(b"")
+        deleted = prune_profiles(str(tmp_path), 3)
+        assert deleted == [f"sablon-profile-{index:020d}-GET-work.prof" for index in range(2)]
+        assert len(os.listdir(tmp_path)) == 4
+
+    @pytest.mark.parametrize("profiler", ["sampling", "deterministic"])
+    def test_profile_worker_thread(self, profiler):
+        def worker_thread_work():
+            deadline = time.perf_counter() + 0.02
+            while time.perf_counter() < deadline:
+                sum(range(1000))
+
+        request_profiler = PROFILERS[profiler]()
+        request_profiler.start()
+        thread = threading.Thread(target=request_profiler.run, args=(worker_thread_work,))
+        thread.start()
+        thread.join()
+        request_profiler.stop()
+        text = request_profiler.text()
+        print(f"\n\033[91mUtils: \033[92mProfile worker thread {profiler}: \033[96m{text[:200]}\033[0m\n")
+        assert "worker_thread_work" in text
+
+    def test_profiler_fail(self, tmp_path):
+        with pytest.raises(ValueError):
+            ProfilerMiddleware(FastAPI(), admin_token=TOKEN, profiler="perf")
@@ -0,0 +1,78 @@
+import datetime
+
+import pytest
+from pymongo import monitoring
+
+from utils.db_store import MongoDBStore
+from utils.query_monitor import SlowQueryMonitor, CollectionScanError, explain_command, query_shape, plan_stages, winning_plan
+
+
+class TestSlowQueryMonitor:
+    @pytest.fixture(scope="function")
+    def monitor(self):
+        return SlowQueryMonitor(threshold_ms=50, maxlen=2)
+
+    @staticmethod
+    def run_command(monitor, request_id, command, duration_ms):
+        command_name = next(iter(command))
+        monitor.started(monitoring.CommandStartedEvent(command, "sablon_db", request_id, ("localhost", 27017), request_id))
+        monitor.succeeded(monitoring.CommandSucceededEvent(datetime.timedelta(milliseconds=duration_ms), {"ok": 1},
+                                                           command_name, request_id, ("localhost", 27017), request_id))
+
+    def test_slow_query_recorded(self, monitor):
+        self.run_command(monitor, 1, {"find": "sablon_collection", "filter": {"name": "Slow", "age": {"$gt": 3}}}, 120)
+        self.run_command(monitor, 2, {"find": "sablon_collection", "filter": {"name": "Fast"}}, 10)
+        self.run_command(monitor, 3, {"ping": 1}, 120)
+        entries = monitor.snapshot()
+        print(f"\n\033[91mUtils: \033[92mSlow query recorded: \033[96m{entries}\033[0m\n")
+        assert len(entries) == 1
+        assert entries[0].get("collection") == "sablon_collection"
+        assert entries[0].get("filter_shape") == {"name": "str", "age": {"$gt": "int"}}
+        assert entries[0].get("duration_ms") == 120
+
+    def test_slow_query_log_size(self, monitor):
+        for request_id in range(3):
+            self.run_command(monitor, request_id, {"delete": "sablon_collection", "deletes": [{"q": {"age": request_id}}]}, 60)
+        entries = monitor.snapshot()
+        print(f"\n\033[91mUtils: \033[92mSlow query log size: \033[96m{entries}\033[0m\n")
+        assert [entry.get("filter") for entry in entries] == [{"age": 2}, {"age": 1}]
+
+    def test_explain_command(self):
+        pipeline = [{"$match": {"age": {"$gt": 3}}}, {"$group": {"_id": "$gender"}}]
+        command = explain_command("aggregate", {"aggregate": "sablon_collection", "pipeline": pipeline, "cursor": {},
+                                                "lsid": {"id": 1}, "$db": "sablon_db"})
+        print(f"\n\033[91mUtils: \033[92mExplain command: \033[96m{command}\033[0m\n")
+        assert command == {"aggregate": "sablon_collection", "pipeline": pipeline, "cursor": {}}
+        updates = [{"q": {"age": 1}, "u": {"$set": {"age": 2}}}, {"q": {"age": 3}, "u": {"$set": {"age": 4}}}]
+        command = explain_command("update", {"update": "sablon_collection", "updates": updates, "ordered": True})
+        assert command == {"update": "sablon_collection", "updates": updates[:1]}
+
+    def test_slow_query_explained_as_recorded(self, monitor, monkeypatch):
+        store = MongoDBStore()
+        store.monitor = monitor
+        self.run_command(monitor, 1, {"count": "sablon_collection", "query": {"age": 3}, "$db": "sablon_db"}, 120)
+        explained = []
+        monkeypatch.setattr(store, "explain_command", lambda db_name, command: explained.append(command) or {"stage": "COUNT"})
+        entries = store.get_slow_queries()
+        assert explained == [{"count": "sablon_collection", "query": {"age": 3}}]
+        assert entries[0].get("winning_plan") == {"stage": "COUNT"}
+        store.get_slow_queries()
+        assert len(explained) == 1
+
+    def test_plan_stages(self):
+        explain = {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}
+        assert plan_stages(winning_plan(explain)) == {"FETCH", "IXSCAN"}
+        explain = {"stages": [{"$cursor": explain}, {"$group": {}}]}
+        assert plan_stages(winning_plan(explain)) == {"FETCH", "IXSCAN"}
+        assert query_shape({"$or": [{"name": "a"}, {"age": 1}]}) == {"$or": [{"name": "str"}, {"age": "int"}]}
+
+    def test_check_query_plan_strict(self, monkeypatch):
+        store = MongoDBStore()
+        store.collscan_strict, store.collscan_max_documents = True, -1
+        monkeypatch.setattr(store, "explain_query", lambda *args: {"stage": "COLLSCAN"})
+        with pytest.raises(CollectionScanError):
+            store.check_query_plan("sablon_db", "sablon_collection", {"name": "Unindexed"})
+        store.check_query_plan("sablon_db", "sablon_collection", {})
+
+        monkeypatch.setattr(store, "explain_query", lambda *args: {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}})
+        store.check_query_plan("sablon_db", "sablon_collection", {"age": 24})
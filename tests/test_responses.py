@@ -0,0 +1,28 @@
+import orjson
+from bson import ObjectId
+
+from models.sablon_model import SablonModel, sablon_partial_model
+from utils.responses import SablonJSONResponse, etag_matches, etag_values
+
+
+class TestSablonJSONResponse:
+    def test_render(self):
+        oid = ObjectId()
+        content = {"items": [SablonModel(name="Name_One", age=30), sablon_partial_model(("name",))(name="Name_Two")],
+                   "oid": oid}
+        response = SablonJSONResponse(content=content)
+        print(f"\n\033[91mUtils: \033[92mSablon JSON response render: \033[96m{response.body}\033[0m\n")
+        assert orjson.loads(response.body) == {"items": [{"name": "Name_One", "age": 30, "gender": None}, {"name": "Name_Two"}],
+                                               "oid": str(oid)}
+        assert response.media_type == "application/json"
+
+
+class TestETags:
+    def test_etag_matches(self):
+        values = etag_values('W/"a.1", "b.2", junk')
+        print(f"\n\033[91mUtils: \033[92mETag values: \033[96m{values}\033[0m\n")
+        assert values == ["a.1", "b.2"]
+        assert etag_matches('"a.0", W/"a.1"', '"a.1"')
+        assert etag_matches("*", '"a.1"')
+        assert not etag_matches('"a.0"', '"a.1"')
+        assert not etag_matches(None, '"a.1"')
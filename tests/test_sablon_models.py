@@ -1,6 +1,7 @@
 import pytest
+from pydantic import ValidationError
 
-from models.sablon_model import SablonModel
+from models.sablon_model import SablonModel, SablonIndexModel, sablon_partial_model
 
 
 @pytest.mark.parametrize("sablon_input, sablon_output", [
@@ -25,6 +26,28 @@ def test_sablon_model(sablon_input, sablon_output):
     for key, value in sablon_output.items():
         assert getattr(sablon, key) == value
 
+
+def test_sablon_partial_model():
+    partial_model = sablon_partial_model(("name", "age"))
+    sablon = partial_model(name="Name_One", age=30, gender="Non_Binary")
+    print(f"\n\033[94mModel: \033[92mSablon partial model: \033[96m{sablon}\033[0m\n")
+    assert sablon.model_dump() == {"name": "Name_One", "age": 30}
+    assert sablon_partial_model(("name", "age")) is partial_model
+    with pytest.raises(ValidationError):
+        partial_model(age=30)
+
+
+def test_sablon_index_model():
+    index = SablonIndexModel(keys=[("gender", 1), ("age", -1)], unique=True, partial_filter={"age": {"$gt": 18}})
+    print(f"\n\033[94mModel: \033[92mSablon index model: \033[96m{index.to_index_model().document}\033[0m\n")
+    assert index.index_name == "gender_1_age_-1"
+    assert index.to_index_model().document == {"key": {"gender": 1, "age": -1}, "name": "gender_1_age_-1", "unique": True,
+                                               "partialFilterExpression": {"age": {"$gt": 18}}}
+    with pytest.raises(ValidationError):
+        SablonIndexModel(keys=[("place_of_birth", 1)])
+    with pytest.raises(ValidationError):
+        SablonIndexModel(keys=[("name", 2)])
+
 #     assert sablon.name == sablon_output["name"]
 #     assert sablon.age == sablon_output["age"]
 #     assert sablon.gender == sablon_output["gender"]
@@ -1,7 +1,16 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from fastapi import HTTPException
+from pymongo.errors import PyMongoError
 
+from routes import sablon_routes
 from routes.sablon_routes import router
 from utils.db_store import MongoDBStore
 
@@ -47,6 +56,29 @@ class TestSablonRoutes:
         assert response.json().get("oid") is not None
         sablon_router.delete(f"/{response.json().get('oid')}")
 
+    def test_create_sablon_coalesced(self, sablon_router, sablon_data, monkeypatch):
+        monkeypatch.setenv("SABLON_INSERT_COALESCING", "1")
+        monkeypatch.setattr(sablon_routes, "insert_coalescer", sablon_routes.get_insert_coalescer(sablon_routes.sablon_service))
+        response = sablon_router.post("/", json=sablon_data)
+        print(f"\n\033[95mRouter: \033[92mCreate sablon coalesced: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert sablon_routes.insert_coalescer.stats()["documents"] == 1
+        sablon_router.delete(f"/{response.json().get('oid')}")
+
+    def test_create_sablon_coalesced_fail(self, sablon_router, sablon_data, monkeypatch):
+        monkeypatch.setenv("SABLON_INSERT_COALESCING", "1")
+        monkeypatch.setattr(sablon_routes, "insert_coalescer", sablon_routes.get_insert_coalescer(sablon_routes.sablon_service))
+
+        def insert_many_fail(*args, **kwargs):
+            raise PyMongoError("Error! insert_many failed")
+
+        monkeypatch.setattr(sablon_routes.sablon_service.db, "add_documents", insert_many_fail)
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.post("/", json=sablon_data)
+        print(f"\n\033[95mRouter: \033[92mCreate sablon coalesced fail: \033[96m{exc_info.value.detail}\033[0m\n")
+        assert exc_info.value.status_code == 400
+        assert exc_info.value.detail == "Error! insert_many failed"
+
     def test_create_sablon_fail(self, sablon_router, sablon_data_bad):
         sablon_router.request("DELETE", "/", json=sablon_data_bad)
         with pytest.raises(HTTPException) as exc_info:
@@ -55,6 +87,35 @@ class TestSablonRoutes:
         assert exc_info.value.status_code == 400
         assert "Input should be a valid integer" in str(exc_info.value.detail)  # Check for the substring
 
+    def test_create_sablons_bulk_succes(self, sablon_router, sablon_data, sablon_data_bad):
+        for _ in range(0, 3):
+            sablon_router.request("DELETE", "/", json=sablon_data)
+
+        # JSON array
+        response = sablon_router.post("/bulk", json=[sablon_data, sablon_data_bad])
+        print(f"\n\033[95mRouter: \033[92mCreate sablons bulk success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json().get("inserted_count") == 1
+        assert response.json().get("oids")[1] is None
+        assert response.json().get("errors")[0].get("index") == 1
+        sablon_router.delete(f"/{response.json().get('oids')[0]}")
+
+        # NDJSON
+        body = "\n".join(json.dumps(sablon_data) for _ in range(0, 2))
+        response = sablon_router.post("/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+        print(f"\n\033[95mRouter: \033[92mCreate sablons bulk ndjson success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json().get("inserted_count") == 2
+        for oid in response.json().get("oids"):
+            sablon_router.delete(f"/{oid}")
+
+    def test_create_sablons_bulk_fail(self, sablon_router, sablon_data):
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.post("/bulk", json=sablon_data)
+        print(f"\n\033[95mRouter: \033[92mCreate sablons bulk fail: \033[96m{exc_info}\033[0m\n")
+        assert exc_info.value.status_code == 400
+        assert "expects a list" in str(exc_info.value.detail)
+
     def test_get_all_sablons_succes(self, sablon_router, sablon_data):
         sablon_router.request("DELETE", "/", json=sablon_data)
         sablon_router.request("DELETE", "/", json=sablon_data)
@@ -86,6 +147,82 @@ class TestSablonRoutes:
         sablon_router.delete(f"/{sablon_1.inserted_id}")
         sablon_router.delete(f"/{sablon_2.inserted_id}")
 
+    def test_get_all_sablons_page_succes(self, sablon_router, sablon_data):
+        sablon_router.request("DELETE", "/", json=sablon_data)
+        sablon_router.request("DELETE", "/", json=sablon_data)
+        response = sablon_router.post("/", json=sablon_data)
+        sablon_oid_1 = response.json().get("oid")
+        response = sablon_router.post("/", json=sablon_data)
+        sablon_oid_2 = response.json().get("oid")
+
+        response = sablon_router.get("/", params={"limit": 1})
+        print(f"\n\033[95mRouter: \033[92mGet all sablons page success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json().get("items") == [sablon_data]
+        response = sablon_router.get("/", params={"limit": 1, "cursor": response.json().get("next_cursor")})
+        assert response.status_code == 200
+        assert response.json() == {"items": [sablon_data], "next_cursor": None}
+
+        sablon_router.delete(f"/{sablon_oid_1}")
+        sablon_router.delete(f"/{sablon_oid_2}")
+
+    def test_get_all_sablons_page_fail(self, sablon_router):
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.get("/", params={"cursor": "not-a-cursor"})
+        print(f"\n\033[95mRouter: \033[92mGet all sablons page fail: \033[96m{exc_info}\033[0m\n")
+        assert exc_info.value.status_code == 400
+        assert "Invalid pagination cursor" in str(exc_info.value.detail)
+
+    def test_get_sablons_ndjson_succes(self, sablon_router, sablon_data):
+        sablon_router.request("DELETE", "/", json=sablon_data)
+        response = sablon_router.post("/", json=sablon_data)
+        sablon_oid = response.json().get("oid")
+
+        # Whole collection
+        response = sablon_router.get("/", headers={"Accept": "application/x-ndjson"})
+        print(f"\n\033[95mRouter: \033[92mGet all sablons ndjson success: \033[96m{response.text}\033[0m\n")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line) for line in response.text.splitlines()] == [sablon_data]
+
+        # Query
+        response = sablon_router.request("GET", f"/sabloane/{None}", json=sablon_data, headers={"Accept": "application/x-ndjson"})
+        print(f"\n\033[95mRouter: \033[92mGet sablons by query ndjson success: \033[96m{response.text}\033[0m\n")
+        assert response.status_code == 200
+        assert [json.loads(line) for line in response.text.splitlines()] == [sablon_data]
+
+        sablon_router.delete(f"/{sablon_oid}")
+
+    def test_get_sablons_fields_succes(self, sablon_router, sablon_data):
+        sablon_router.request("DELETE", "/", json=sablon_data)
+        response = sablon_router.post("/", json=sablon_data)
+        sablon_oid = response.json().get("oid")
+
+        # Get all
+        response = sablon_router.get("/", params={"fields": "name"})
+        print(f"\n\033[95mRouter: \033[92mGet sablons fields success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json() == [{"name": sablon_data.get("name")}]
+
+        # Get by oid
+        response = sablon_router.get(f"/sabloane/{sablon_oid}", params={"fields": "name,gender"})
+        assert response.status_code == 200
+        assert response.json() == {"name": sablon_data.get("name"), "gender": sablon_data.get("gender")}
+
+        # Get page by query
+        response = sablon_router.request("GET", f"/sabloane/{None}", json=sablon_data, params={"fields": "age", "limit": 10})
+        assert response.status_code == 200
+        assert response.json() == {"items": [{"age": sablon_data.get("age")}], "next_cursor": None}
+
+        sablon_router.delete(f"/{sablon_oid}")
+
+    def test_get_sablons_fields_fail(self, sablon_router):
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.get("/", params={"fields": "name,place_of_birth"})
+        print(f"\n\033[95mRouter: \033[92mGet sablons fields fail: \033[96m{exc_info}\033[0m\n")
+        assert exc_info.value.status_code == 400
+        assert "Unknown fields" in str(exc_info.value.detail)
+
     def test_get_sablon_by_succes(self, sablon_router, sablon_data):
         sablon_router.request("DELETE", "/", json=sablon_data)
         response = sablon_router.post("/", json=sablon_data)
@@ -134,6 +271,55 @@ class TestSablonRoutes:
 
         sablon_router.delete(f"/{sablon.inserted_id}")
 
+    def test_get_sablon_by_single_flight(self, sablon_router, sablon_data, monkeypatch):
+        sablon_oid = sablon_router.post("/", json=sablon_data).json().get("oid")
+        service = sablon_routes.sablon_service
+        read, reads = service.db.get_document_by_id, []
+        if inspect.iscoroutinefunction(read):
+            async def slow_read(*args, **kwargs):
+                reads.append(args)
+                await asyncio.sleep(0.05)
+                return await read(*args, **kwargs)
+        else:
+            def slow_read(*args, **kwargs):
+                reads.append(args)
+                time.sleep(0.05)
+                return read(*args, **kwargs)
+        monkeypatch.setattr(service.db, "get_document_by_id", slow_read)
+        shared = service.get_cache_stats().get("document_flights").get("hits")
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=router), base_url="http://test") as client:
+                return await asyncio.gather(*(client.get(f"/sabloane/{sablon_oid}") for _ in range(8)))
+
+        responses = asyncio.run(scenario())
+        stats = service.get_cache_stats().get("document_flights")
+        print(f"\n\033[95mRouter: \033[92mGet sablon by single flight: \033[96m{stats}\033[0m\n")
+        assert [response.json() for response in responses] == [sablon_data] * 8
+        # The concurrent misses overlap and share one find, instead of running one after the other on the event loop
+        assert len(reads) == 1
+        assert stats.get("hits") - shared == 7
+        sablon_router.delete(f"/{sablon_oid}")
+
+    def test_get_sablons_by_oids_succes(self, sablon_router, sablon_data):
+        sablon_router.request("DELETE", "/", json=sablon_data)
+        response = sablon_router.post("/", json=sablon_data)
+        sablon_oid = response.json().get("oid")
+
+        response = sablon_router.post("/sabloane/multi", json={"oids": [sablon_oid, "0123456789ab0123456789ab"]})
+        print(f"\n\033[95mRouter: \033[92mGet sablons by oids success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json() == {"items": [sablon_data, None], "missing": ["0123456789ab0123456789ab"], "errors": []}
+
+        sablon_router.delete(f"/{sablon_oid}")
+
+    def test_get_sablons_by_oids_fail(self, sablon_router):
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.post("/sabloane/multi", json={"oid": "0123456789ab0123456789ab"})
+        print(f"\n\033[95mRouter: \033[92mGet sablons by oids fail: \033[96m{exc_info}\033[0m\n")
+        assert exc_info.value.status_code == 400
+        assert "expects a list of ObjectIds" in str(exc_info.value.detail)
+
     def test_update_sablon_success(self, sablon_router, sablon_data, sablon_data_update):
         sablon_router.request("DELETE", "/", json=sablon_data)
         sablon_router.request("DELETE", "/", json=sablon_data_update)
@@ -162,6 +348,28 @@ class TestSablonRoutes:
         assert expected_output in str(exc_info.value.detail)  # Check for the substring
         sablon_router.delete(f"/{sablon_id}")
 
+    def test_batch_sablons_succes(self, sablon_router, sablon_data, sablon_data_update):
+        sablon_router.request("DELETE", "/", json=sablon_data)
+        sablon_router.request("DELETE", "/", json=sablon_data_update)
+        response = sablon_router.post("/batch", json={"ordered": False, "operations": [
+            {"op": "insert", "document": sablon_data},
+            {"op": "update", "query": sablon_data, "document": sablon_data_update},
+            {"op": "delete", "oid": "not-an-oid"},
+        ]})
+        print(f"\n\033[95mRouter: \033[92mBatch sablons success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json().get("inserted_count") == 1
+        assert response.json().get("modified_count") == 1
+        assert [entry.get("status") for entry in response.json().get("results")] == ["ok", "ok", "error"]
+        sablon_router.delete(f"/{response.json().get('results')[0].get('oid')}")
+
+    def test_batch_sablons_fail(self, sablon_router):
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.post("/batch", json={"operations": {"op": "insert"}})
+        print(f"\n\033[95mRouter: \033[92mBatch sablons fail: \033[96m{exc_info}\033[0m\n")
+        assert exc_info.value.status_code == 400
+        assert "Batch expects a list of operations" in str(exc_info.value.detail)
+
     def test_delete_sablon_by_succes(self, sablon_router, sablon_data):
         sablon_router.request("DELETE", "/", json=sablon_data)
         sablon_router.request("DELETE", "/", json=sablon_data)
@@ -180,4 +388,171 @@ class TestSablonRoutes:
         response = sablon_router.request("DELETE",f"/{None}", json=sablon_data)
         print(f"\n\033[95mRouter: \033[92mDelete sablon by query success: \033[96m{response.json()}\033[0m\n")
         assert response.status_code == 200
-        assert response.json() == {"result": f"Document deleted: 1"}
\ No newline at end of file
+        assert response.json() == {"result": f"Document deleted: 1"}
+    def test_app_lifespan_success(self, monkeypatch):
+        from sablon_api import app
+
+        monkeypatch.setenv("SABLON_ADMIN_TOKEN", "test-admin-token")
+        with TestClient(app) as client:
+            assert client.get("/sablon/cache/stats").status_code == 403
+            response = client.get("/sablon/cache/stats", headers={"X-Sablon-Admin-Token": "test-admin-token"})
+            print(f"\n\033[95mRouter: \033[92mApp lifespan success: \033[96m{response.json()}\033[0m\n")
+            assert response.status_code == 200
+
+    def test_app_readiness_success(self, sablon_router, sablon_data, monkeypatch):
+        from sablon_api import app
+
+        monkeypatch.setenv("SABLON_WARMUP_DOCUMENTS", "1")
+        sablon_oid = sablon_router.post("/", json=sablon_data).json().get("oid")
+        with TestClient(app) as client:
+            response = client.get("/readyz")
+            print(f"\n\033[95mRouter: \033[92mApp readiness success: \033[96m{response.json()}\033[0m\n")
+            assert response.status_code == 200
+            assert response.json().get("warmup").get("documents") == 1
+            assert client.get("/healthz").json() == {"status": "ok"}
+        # Shut down, the worker is live but no longer ready
+        client = TestClient(app)
+        assert client.get("/readyz").status_code == 503
+        assert client.get("/healthz").status_code == 200
+        sablon_router.delete(f"/{sablon_oid}")
+
+    def test_app_readiness_fail(self, monkeypatch):
+        from sablon_api import app
+
+        monkeypatch.setattr(sablon_routes.sablon_service, "warm_up", lambda *args: {"error": "Error! Preload failed"})
+        with pytest.raises(RuntimeError) as exc_info:
+            with TestClient(app):
+                pass
+        print(f"\n\033[95mRouter: \033[92mApp readiness fail: \033[96m{exc_info.value}\033[0m\n")
+        assert "Preload failed" in str(exc_info.value)
+        assert TestClient(app).get("/readyz").status_code == 503
+
+    def test_app_reconcile_fail(self, monkeypatch):
+        from sablon_api import app
+
+        monkeypatch.setenv("SABLON_RECONCILE_INDEXES", "true")
+        monkeypatch.setattr(sablon_routes.sablon_service, "reconcile_indexes", lambda: {"error": "Error! Index conflict"})
+        with pytest.raises(RuntimeError) as exc_info:
+            with TestClient(app):
+                pass
+        print(f"\n\033[95mRouter: \033[92mApp reconcile fail: \033[96m{exc_info.value}\033[0m\n")
+        assert "Index conflict" in str(exc_info.value)
+
+    def test_main_reconciles_once(self, monkeypatch):
+        import sablon_api
+
+        calls, started = [], []
+        monkeypatch.setenv("SABLON_RECONCILE_INDEXES", "true")
+        monkeypatch.setenv("SABLON_WORKERS", "4")
+        monkeypatch.setattr(sablon_api, "reconcile_declared_indexes", lambda: calls.append(1) or {"created": []})
+        monkeypatch.setattr(sablon_api.ServerSupervisor, "run", lambda supervisor: started.append(supervisor.workers) or 0)
+        result = sablon_api.main()
+        print(f"\n\033[95mRouter: \033[92mMain reconciles once: \033[96m{calls, started}\033[0m\n")
+        assert result == 0
+        assert calls == [1] and started == [4]
+        # The spawned workers inherit the environment and skip the reconciliation in their lifespan
+        assert os.environ["SABLON_RECONCILE_INDEXES"] == "false"
+
+    def test_main_reconcile_fail(self, monkeypatch):
+        import sablon_api
+
+        started = []
+        monkeypatch.setenv("SABLON_RECONCILE_INDEXES", "true")
+        monkeypatch.setattr(sablon_api, "reconcile_declared_indexes", lambda: {"error": "Error! Index conflict"})
+        monkeypatch.setattr(sablon_api.ServerSupervisor, "run", lambda supervisor: started.append(supervisor) or 0)
+        result = sablon_api.main()
+        print(f"\n\033[95mRouter: \033[92mMain reconcile fail: \033[96m{result}\033[0m\n")
+        assert result == 1
+        assert started == []
+
+    def test_get_index_drift_success(self, sablon_router, monkeypatch):
+        monkeypatch.delenv("SABLON_ADMIN_TOKEN", raising=False)
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.get("/indexes")
+        assert exc_info.value.status_code == 404
+        monkeypatch.setenv("SABLON_ADMIN_TOKEN", "test-admin-token")
+        response = sablon_router.get("/indexes", headers={"X-Sablon-Admin-Token": "test-admin-token"})
+        print(f"\n\033[95mRouter: \033[92mGet index drift success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json().get("missing") == []
+
+    def test_profile_sablon_success(self, sablon_router, sablon_data, tmp_path):
+        from fastapi import FastAPI
+        from utils.profiling import ProfilerMiddleware
+
+        app = FastAPI()
+        app.add_middleware(ProfilerMiddleware, admin_token="test-admin-token", profiler="deterministic",
+                           directory=str(tmp_path))
+        app.include_router(router, prefix="/sablon")
+        sablon_oid = sablon_router.post("/", json=sablon_data).json().get("oid")
+        response = TestClient(app).get(f"/sablon/sabloane/{sablon_oid}?profile=return",
+                                       headers={"X-Sablon-Admin-Token": "test-admin-token"})
+        print(f"\n\033[95mRouter: \033[92mProfile sablon success: \033[96m{response.text[:200]}\033[0m\n")
+        assert response.headers["x-sablon-profile-status"] == "200"
+        # The sync service runs on the thread pool, its frames are profiled in the worker thread
+        assert "get_sablon_and_etag" in response.text
+        sablon_router.delete(f"/{sablon_oid}")
+
+    def test_get_slow_queries_admin(self, sablon_router, monkeypatch):
+        monkeypatch.delenv("SABLON_ADMIN_TOKEN", raising=False)
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.get("/admin/slow-queries")
+        assert exc_info.value.status_code == 404
+        monkeypatch.setenv("SABLON_ADMIN_TOKEN", "test-admin-token")
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.get("/admin/slow-queries", headers={"X-Sablon-Admin-Token": "wrong"})
+        print(f"\n\033[95mRouter: \033[92mGet slow queries admin: \033[96m{exc_info.value.detail}\033[0m\n")
+        assert exc_info.value.status_code == 403
+        response = sablon_router.get("/admin/slow-queries", headers={"X-Sablon-Admin-Token": "test-admin-token"})
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+
+    def test_stats_success(self, sablon_router, sablon_data):
+        for _ in range(0, 2):
+            sablon_router.request("DELETE", f"/{None}", json=sablon_data)
+        sablon_router.post("/", json=sablon_data)
+        sablon_router.post("/", json=sablon_data)
+
+        response = sablon_router.request("GET", "/stats/count-by/age", json=sablon_data)
+        print(f"\n\033[95mRouter: \033[92mStats success: \033[96m{response.json()}\033[0m\n")
+        assert response.status_code == 200
+        assert response.json() == {"field": "age", "counts": [{"value": sablon_data.get("age"), "count": 2}]}
+        response = sablon_router.request("GET", "/stats/histogram/age?boundaries=0,100", json=sablon_data)
+        assert response.status_code == 200
+        assert [bucket.get("count") for bucket in response.json().get("buckets")] == [2]
+
+        for _ in range(0, 2):
+            sablon_router.request("DELETE", f"/{None}", json=sablon_data)
+
+    def test_stats_fail(self, sablon_router):
+        with pytest.raises(HTTPException) as exc_info:
+            sablon_router.get("/stats/summary/name")
+        print(f"\n\033[95mRouter: \033[92mStats fail: \033[96m{exc_info.value.detail}\033[0m\n")
+        assert exc_info.value.status_code == 400
+
+    def test_conditional_get_succes(self, sablon_router, sablon_data, sablon_data_update):
+        sablon_router.request("DELETE", f"/{None}", json=sablon_data)
+        sablon_oid = sablon_router.post("/", json=sablon_data).json().get("oid")
+
+        response = sablon_router.get(f"/sabloane/{sablon_oid}")
+        etag = response.headers.get("etag")
+        print(f"\n\033[95mRouter: \033[92mConditional get success: \033[96m{etag}\033[0m\n")
+        assert etag == f'"{sablon_oid}.0"'
+        response = sablon_router.get(f"/sabloane/{sablon_oid}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        sablon_router.put(f"/{sablon_oid}", json=sablon_data_update)
+        response = sablon_router.get(f"/sabloane/{sablon_oid}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers.get("etag") == f'"{sablon_oid}.1"'
+        response = sablon_router.get(f"/sabloane/{sablon_oid}?fields=name",
+                                     headers={"If-None-Match": response.headers.get("etag")})
+        assert response.status_code == 200
+        assert response.headers.get("etag") == f'"{sablon_oid}.1.name"'
+
+        etag = sablon_router.get("/").headers.get("etag")
+        assert sablon_router.get("/", headers={"If-None-Match": etag}).status_code == 304
+        sablon_router.delete(f"/{sablon_oid}")
+        response = sablon_router.get("/", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers.get("etag") != etag
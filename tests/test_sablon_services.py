@@ -1,8 +1,14 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from pymongo.errors import PyMongoError
 
 from utils.db_store import MongoDBStore
-from services.sablon_services import SablonServices
-from models.sablon_model import SablonModel
+from services.sablon_services import SablonServices, QUERY_CACHE_MAX_BYTES, read_model, build_projection, \
+    collection_etag, bulk_insert_chunks, collect_bulk_insert, collect_summary, plan_index_reconcile
+from utils.cache import QueryCache
+from models.sablon_model import SablonModel, sablon_partial_model
 
 
 class TestSablonServices:
@@ -178,3 +184,377 @@ class TestSablonServices:
         print(f"\n\033[93mService: \033[92mDelete sablon by query fail: \033[96m{result}\033[0m\n")
         assert result.get("error") is not None
         sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_get_sabloane_by_query_page_success(self, sablon_services, sablon_model, sablon_dict):
+        for i in range(0, 3):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+        for i in range(0, 3):
+            sablon_services.add_sablon(sablon_model)
+
+        first_page = sablon_services.get_sabloane_by_query_page(sablon_dict, limit=2)
+        second_page = sablon_services.get_sabloane_by_query_page(sablon_dict, limit=2, cursor=first_page.get("next_cursor"))
+        print(f"\n\033[93mService: \033[92mGet sabloane by query page success: \033[96m{first_page} {second_page}\033[0m\n")
+        assert first_page.get("items") == [sablon_model, sablon_model]
+        assert first_page.get("next_cursor") is not None
+        assert second_page.get("items") == [sablon_model]
+        assert second_page.get("next_cursor") is None
+
+        for i in range(0, 3):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+    @pytest.mark.parametrize("limit, cursor", [
+        (0, None),
+        (10, "not-a-cursor"),
+    ])
+    def test_get_sabloane_page_fail(self, sablon_services, limit, cursor):
+        result = sablon_services.get_sabloane_page(limit=limit, cursor=cursor)
+        print(f"\n\033[93mService: \033[92mGet sabloane page fail: \033[96m{result}\033[0m\n")
+        assert result.get("error") is not None
+
+    def test_stream_sabloane_success(self, sablon_services, sablon_model, sablon_dict):
+        for i in range(0, 2):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+        sablon_services.add_sablon(sablon_model)
+        sablon_services.add_sablon(sablon_model)
+
+        lines = list(sablon_services.stream_sabloane(sablon_dict))
+        print(f"\n\033[93mService: \033[92mStream sabloane success: \033[96m{lines}\033[0m\n")
+        assert [SablonModel.model_validate_json(line) for line in lines] == [sablon_model, sablon_model]
+
+        for i in range(0, 2):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_stream_sabloane_fail(self, sablon_services, sablon_db_store, sablon_dict_bad):
+        sablon_services.delete_sablon_by_query(sablon_dict_bad)
+
+        sablon_db_store.add_document("sablon_db", "sablon_collection", sablon_dict_bad)
+        lines = list(sablon_services.stream_sabloane({"name": sablon_dict_bad.get("name")}))
+        print(f"\n\033[93mService: \033[92mStream sabloane fail: \033[96m{lines}\033[0m\n")
+        assert b'"error"' in lines[-1]
+
+        sablon_services.delete_sablon_by_query({"name": sablon_dict_bad.get("name")})
+
+    def test_add_sabloane_success(self, sablon_services, sablon_model, sablon_dict, sablon_dict_bad):
+        for i in range(0, 2):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+        result = sablon_services.add_sabloane([sablon_dict, sablon_dict_bad, sablon_dict])
+        print(f"\n\033[93mService: \033[92mAdd sabloane success: \033[96m{result}\033[0m\n")
+        assert result.get("inserted_count") == 2
+        assert result.get("oids")[0] is not None
+        assert result.get("oids")[1] is None
+        assert result.get("oids")[2] is not None
+        assert [error.get("index") for error in result.get("errors")] == [1]
+        assert sablon_services.get_sablon_by_oid(result.get("oids")[2]) == sablon_model
+
+        for i in range(0, 2):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_add_sablon_batch_success(self, sablon_services, sablon_model, sablon_dict):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        result = sablon_services.add_sablon_batch([dict(sablon_dict), dict(sablon_dict)])
+        print(f"\n\033[93mService: \033[92mAdd sablon batch success: \033[96m{result}\033[0m\n")
+        assert len(result) == 2 and result[0].get("oid") != result[1].get("oid")
+        assert sablon_services.get_sablon_by_oid(result[1].get("oid")) == sablon_model
+        for i in range(0, 2):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_add_sablon_batch_fail(self, sablon_services, sablon_dict):
+        oid = sablon_services.add_sablon_batch([dict(sablon_dict)])[0].get("oid")
+        result = sablon_services.add_sablon_batch([{**sablon_dict, "_id": oid}, dict(sablon_dict)])
+        print(f"\n\033[93mService: \033[92mAdd sablon batch fail: \033[96m{result}\033[0m\n")
+        assert result[0].get("error") is not None
+        assert result[1].get("oid") is not None
+        for i in range(0, 2):
+            sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_add_sabloane_fail(self, sablon_services, sablon_dict):
+        result = sablon_services.add_sabloane(sablon_dict)
+        print(f"\n\033[93mService: \033[92mAdd sabloane fail: \033[96m{result}\033[0m\n")
+        assert result.get("error") is not None
+
+    def test_batch_sabloane_success(self, sablon_services, sablon_model, sablon_dict, sablon_dict_update):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        sablon_services.delete_sablon_by_query(sablon_dict_update)
+        oid = str(sablon_services.add_sablon(sablon_model).get("oid"))
+
+        result = sablon_services.batch_sabloane([
+            {"op": "insert", "document": sablon_dict},
+            {"op": "update", "oid": oid, "document": sablon_dict_update},
+            {"op": "delete", "query": sablon_dict},
+        ])
+        print(f"\n\033[93mService: \033[92mBatch sabloane success: \033[96m{result}\033[0m\n")
+        assert result.get("inserted_count") == 1
+        assert result.get("modified_count") == 1
+        assert result.get("deleted_count") == 1
+        assert result.get("results")[0].get("oid") is not None
+        assert [entry.get("status") for entry in result.get("results")] == ["ok", "ok", "ok"]
+
+        sablon_services.delete_sablon_by_query(sablon_dict_update)
+
+    @pytest.mark.parametrize("ordered, statuses", [
+        (True, ["error", "skipped"]),
+        (False, ["error", "ok"]),
+    ])
+    def test_batch_sabloane_fail(self, sablon_services, sablon_dict, ordered, statuses):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        result = sablon_services.batch_sabloane([
+            {"op": "update", "oid": "not-an-oid", "document": sablon_dict},
+            {"op": "insert", "document": sablon_dict},
+        ], ordered)
+        print(f"\n\033[93mService: \033[92mBatch sabloane fail: \033[96m{result}\033[0m\n")
+        assert [entry.get("status") for entry in result.get("results")] == statuses
+        assert result.get("error_count") == 1
+        sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_get_sabloane_by_oids_success(self, sablon_services, sablon_model, sablon_dict):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        oid = str(sablon_services.add_sablon(sablon_model).get("oid"))
+        missing_oid = "0123456789ab0123456789ab"
+
+        result = sablon_services.get_sabloane_by_oids([missing_oid, oid, "not-an-oid", oid])
+        print(f"\n\033[93mService: \033[92mGet sabloane by oids success: \033[96m{result}\033[0m\n")
+        assert result.get("items") == [None, sablon_model, None, sablon_model]
+        assert result.get("missing") == [missing_oid]
+        assert [error.get("index") for error in result.get("errors")] == [2]
+
+        sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_get_sabloane_by_oids_fail(self, sablon_services):
+        result = sablon_services.get_sabloane_by_oids("0123456789ab0123456789ab")
+        print(f"\n\033[93mService: \033[92mGet sabloane by oids fail: \033[96m{result}\033[0m\n")
+        assert result.get("error") is not None
+
+    def test_get_sabloane_fields_success(self, sablon_services, sablon_model, sablon_dict):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        oid = sablon_services.add_sablon(sablon_model).get("oid")
+
+        result = sablon_services.get_sablon_by_oid(oid, fields="name,age")
+        print(f"\n\033[93mService: \033[92mGet sabloane fields success: \033[96m{result}\033[0m\n")
+        assert result.model_dump() == {"name": sablon_dict.get("name"), "age": sablon_dict.get("age")}
+        results = sablon_services.get_sabloane_by_query(sablon_dict, fields=["gender"])
+        assert [result.model_dump() for result in results] == [{"gender": sablon_dict.get("gender")}]
+
+        sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_get_sabloane_fields_fail(self, sablon_services):
+        result = sablon_services.get_all_sabloane(fields="name,place_of_birth")
+        print(f"\n\033[93mService: \033[92mGet sabloane fields fail: \033[96m{result}\033[0m\n")
+        assert "Unknown fields" in result.get("error")
+
+    def test_get_sablon_by_oid_cache_success(self, sablon_services, sablon_model, sablon_dict, sablon_dict_update):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        oid = sablon_services.add_sablon(sablon_model).get("oid")
+
+        sablon_services.get_sablon_by_oid(oid)
+        hits = sablon_services.get_cache_stats().get("documents").get("hits")
+        result = sablon_services.get_sablon_by_oid(oid)
+        print(f"\n\033[93mService: \033[92mGet sablon by oid cache success: \033[96m{sablon_services.get_cache_stats()}\033[0m\n")
+        assert result == sablon_model
+        assert sablon_services.get_cache_stats().get("documents").get("hits") == hits + 1
+
+        sablon_services.update_sablon(oid, sablon_dict_update)
+        assert sablon_services.get_sablon_by_oid(oid) == SablonModel(**sablon_dict_update)
+
+        sablon_services.delete_sablon_by_id(oid)
+        assert sablon_services.get_sablon_by_oid(oid).get("error") is not None
+
+    def test_get_sabloane_by_query_cache_success(self, sablon_model, sablon_dict):
+        sablon_services = SablonServices()
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        sablon_services.add_sablon(sablon_model)
+
+        assert sablon_services.get_sabloane_by_query(dict(reversed(sablon_dict.items()))) == [sablon_model]
+        result = sablon_services.get_sabloane_by_query(sablon_dict)
+        print(f"\n\033[93mService: \033[92mGet sabloane by query cache success: \033[96m{sablon_services.get_cache_stats()}\033[0m\n")
+        assert result == [sablon_model]
+        assert sablon_services.get_cache_stats().get("queries").get("hits") == 1
+
+        sablon_services.add_sablon(sablon_model)
+        assert sablon_services.get_sabloane_by_query(sablon_dict) == [sablon_model, sablon_model]
+
+        sablon_services.query_cache = QueryCache(QUERY_CACHE_MAX_BYTES, ttl=0, stale_ttl=60)
+        sablon_services.get_sabloane_by_query(sablon_dict)
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        assert len(sablon_services.get_sabloane_by_query(sablon_dict)) == 2
+        sablon_services._query_refresher.submit(lambda: None).result()
+        assert len(sablon_services.get_sabloane_by_query(sablon_dict)) == 1
+
+        sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_single_flight_success(self, sablon_model, sablon_dict):
+        sablon_services = SablonServices()
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        oid = sablon_services.add_sablon(sablon_model).get("oid")
+        reads = []
+
+        def slow(read):
+            def slow_read(*args, **kwargs):
+                reads.append(read.__name__)
+                time.sleep(0.05)
+                return read(*args, **kwargs)
+            return slow_read
+
+        sablon_services.db.get_document_by_id = slow(sablon_services.db.get_document_by_id)
+        sablon_services.db.get_documents_by_query = slow(sablon_services.db.get_documents_by_query)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            by_oid = list(executor.map(lambda _: sablon_services.get_sablon_by_oid(oid), range(8)))
+            by_query = list(executor.map(lambda _: sablon_services.get_sabloane_by_query(sablon_dict), range(8)))
+        print(f"\n\033[93mService: \033[92mSingle flight success: \033[96m{sablon_services.get_cache_stats()}\033[0m\n")
+        assert by_oid == [sablon_model] * 8
+        assert by_query == [[sablon_model]] * 8
+        assert sorted(reads) == ["get_document_by_id", "get_documents_by_query"]
+
+        sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_reconcile_indexes_success(self, sablon_services):
+        result = sablon_services.reconcile_indexes()
+        print(f"\n\033[93mService: \033[92mReconcile indexes success: \033[96m{result}\033[0m\n")
+        assert result.get("error") is None
+        assert sablon_services.get_index_drift().get("missing") == []
+        assert sablon_services.get_index_drift().get("changed") == []
+        assert sablon_services.reconcile_indexes().get("created") == []
+
+    def test_sabloane_stats_success(self, sablon_services):
+        query = {"name": "Test_Stats_Sablon"}
+        for _ in range(0, 4):
+            sablon_services.delete_sablon_by_query(query)
+        for age, gender in ((10, "Female"), (20, "Male"), (30, "Female"), (70, "Female")):
+            sablon_services.add_sablon(SablonModel(name="Test_Stats_Sablon", age=age, gender=gender))
+
+        result = sablon_services.count_sabloane_by("gender", query)
+        print(f"\n\033[93mService: \033[92mSabloane stats success: \033[96m{result}\033[0m\n")
+        assert sablon_services.count_sabloane(query) == {"count": 4}
+        assert result.get("counts") == [{"value": "Female", "count": 3}, {"value": "Male", "count": 1}]
+        assert sablon_services.get_sabloane_summary("age", query) == {"field": "age", "count": 4, "min": 10, "max": 70, "avg": 32.5}
+        result = sablon_services.get_sabloane_histogram("age", boundaries="0,18,65", sablon_query=query)
+        assert result.get("buckets") == [{"min": 0, "max": 18, "count": 1}, {"min": 18, "max": 65, "count": 2}]
+        assert result.get("other") == 1
+
+        for _ in range(0, 4):
+            sablon_services.delete_sablon_by_query(query)
+
+    def test_sabloane_stats_fail(self, sablon_services):
+        result = sablon_services.get_sabloane_summary("gender")
+        print(f"\n\033[93mService: \033[92mSabloane stats fail: \033[96m{result}\033[0m\n")
+        assert result.get("error") is not None
+        assert sablon_services.get_sabloane_histogram("age", boundaries="18,0").get("error") is not None
+        assert sablon_services.get_sabloane_histogram("age").get("error") is not None
+
+    def test_shared_helpers(self, sablon_dict, sablon_dict_bad):
+        chunks = list(bulk_insert_chunks([sablon_dict, sablon_dict_bad]))
+        print(f"\n\033[93mService: \033[92mShared helpers: \033[96m{chunks}\033[0m\n")
+        assert [positions for _, positions, _ in chunks] == [[0]]
+        assert collect_bulk_insert(2, [None, None], chunks[0][2]) == {"inserted_count": 1, "oids": [None, None],
+                                                                     "errors": chunks[0][2]}
+        with pytest.raises(TypeError):
+            bulk_insert_chunks({"name": "not a list"})
+        assert collect_summary("age", []) == {"field": "age", "count": 0, "min": None, "max": None, "avg": None}
+        drift, dropped, rebuilt = plan_index_reconcile([], drop_extra=True)
+        assert dropped == [] and [index.document["name"] for index in rebuilt] == drift["missing"]
+
+    def test_read_model_trusted(self, sablon_dict_bad):
+        result = read_model(None, trusted=True)(**sablon_dict_bad)
+        print(f"\n\033[93mService: \033[92mRead model trusted: \033[96m{result}\033[0m\n")
+        assert result == sablon_dict_bad
+        assert read_model(("name",), trusted=False) is sablon_partial_model(("name",))
+
+    def test_sablon_etag_success(self, sablon_services, sablon_model, sablon_dict, sablon_dict_update):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        oid = sablon_services.add_sablon(sablon_model).get("oid")
+
+        sablon, etag = sablon_services.get_sablon_and_etag(oid)
+        print(f"\n\033[93mService: \033[92mSablon etag success: \033[96m{etag}\033[0m\n")
+        assert etag == f'"{oid}.0"'
+        assert sablon == sablon_services.get_sablon_by_oid(oid)
+        assert sablon_services.get_sablon_and_etag(oid)[1] == etag
+        sablon_services.update_sablon(oid, sablon_dict_update)
+        assert sablon_services.get_sablon_and_etag(oid, "name,age")[1] == f'"{oid}.1.age+name"'
+        assert sablon_services.get_sablon_and_etag(oid)[1] == f'"{oid}.1"'
+        sablon_services.document_cache.clear()
+        assert sablon_services.get_sablon_and_etag(oid, "age")[1] == f'"{oid}.1.age"'
+        assert sablon_services.get_sablon_by_oid(oid) == SablonModel(**sablon_dict_update)
+        stored = sablon_services.db.get_documents_by_query("sablon_db", "sablon_collection", sablon_dict_update,
+                                                           projection=build_projection(None))
+        assert list(stored) == [sablon_dict_update]
+
+        sablon_services.delete_sablon_by_id(oid)
+        assert sablon_services.get_sablon_and_etag(oid).get("error") is not None
+
+    def test_collection_etag_success(self, sablon_services, sablon_model, sablon_dict, monkeypatch):
+        etag = sablon_services.get_collection_etag()
+        print(f"\n\033[93mService: \033[92mCollection etag success: \033[96m{etag}\033[0m\n")
+        other_worker = SablonServices()
+        assert other_worker.get_collection_etag() == etag
+        assert sablon_services.get_collection_etag("name,age") != etag
+
+        other_worker.add_sablon(sablon_model)
+        # The version of this worker is read again from Mongo once it is older than its ttl
+        assert sablon_services.get_collection_etag() == etag
+        monkeypatch.setattr(sablon_services.collection_version, "ttl", 0)
+        assert sablon_services.get_collection_etag() not in (etag, None)
+        assert sablon_services.get_collection_etag() == other_worker.get_collection_etag()
+        sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_two_workers_cache_success(self, sablon_model, sablon_dict, sablon_dict_update):
+        worker, other_worker = SablonServices(), SablonServices()
+        worker.collection_version.ttl = 0.1
+        worker.delete_sablon_by_query(sablon_dict)
+        oid = worker.add_sablon(sablon_model).get("oid")
+        assert worker.get_sablon_by_oid(oid) == sablon_model
+        assert len(worker.get_sabloane_by_query(sablon_dict)) == 1
+        _, etag = worker.get_sablon_and_etag(oid)
+
+        other_worker.update_sablon(oid, sablon_dict_update)
+        # Once its view of the collection version expired, the worker drops the entries cached before the write
+        time.sleep(0.15)
+        result = worker.get_sablon_by_oid(oid)
+        print(f"\n\033[93mService: \033[92mTwo workers cache success: \033[96m{result}\033[0m\n")
+        assert result == SablonModel(**sablon_dict_update)
+        assert worker.get_sabloane_by_query(sablon_dict) == []
+        assert worker.get_sablon_and_etag(oid)[1] != etag
+        other_worker.delete_sablon_by_id(oid)
+
+    def test_collection_version_bump_fail(self, sablon_model, sablon_dict, monkeypatch, caplog):
+        sablon_services = SablonServices()
+        oid = sablon_services.add_sablon(sablon_model).get("oid")
+        sablon_services.get_sablon_by_oid(oid)
+
+        def bump_fail(*args):
+            raise PyMongoError("Error! Bump failed")
+
+        monkeypatch.setattr(sablon_services.db, "bump_collection_version", bump_fail)
+        result = sablon_services.update_sablon(oid, {"name": "Test_Name_Sablon_Bump"})
+        print(f"\n\033[93mService: \033[92mCollection version bump fail: \033[96m{caplog.messages}\033[0m\n")
+        # The write is done, the failure is logged and the caches of the worker are dropped
+        assert result.get("error") is None
+        assert "Bump failed" in caplog.text
+        assert sablon_services.get_cache_stats().get("documents").get("size") == 0
+        assert sablon_services.collection_version.stale() is True
+        sablon_services.delete_sablon_by_id(oid)
+
+    def test_collection_etag(self):
+        etag = collection_etag(3, ("name", "age"))
+        print(f"\n\033[93mService: \033[92mCollection etag: \033[96m{etag}\033[0m\n")
+        assert etag == '"sablon_collection.3.age+name"'
+        assert collection_etag(3) == '"sablon_collection.3"'
+
+    def test_warm_up_success(self, sablon_services, sablon_model, sablon_dict):
+        sablon_services.delete_sablon_by_query(sablon_dict)
+        oid = sablon_services.add_sablon(sablon_model).get("oid")
+        services = SablonServices()
+        report = services.warm_up(1, [{"query": sablon_dict, "fields": "name"}])
+        print(f"\n\033[93mService: \033[92mWarm up success: \033[96m{report}\033[0m\n")
+        assert report.get("documents") == 1 and report.get("queries") == 1
+        stats = services.get_cache_stats()
+        assert stats.get("documents").get("size") == 1 and stats.get("queries").get("size") == 1
+        assert services.get_sablon_by_oid(oid) == sablon_model
+        assert services.get_cache_stats().get("documents").get("hits") == 1
+        sablon_services.delete_sablon_by_query(sablon_dict)
+
+    def test_warm_up_fail(self, sablon_services):
+        report = sablon_services.warm_up(0, [{"query": {"age": {"$bad": 1}}}])
+        print(f"\n\033[93mService: \033[92mWarm up fail: \033[96m{report}\033[0m\n")
+        assert report.get("error") is not None
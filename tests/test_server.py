@@ -0,0 +1,82 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from utils.server import ServerSupervisor, resolved_implementations, server_config
+from utils.settings import SERVER_DEFAULTS
+
+app = FastAPI()
+
+
+@app.get("/pid")
+def get_pid():
+    return {"pid": os.getpid()}
+
+
+SUPERVISOR = """
+import sys
+from utils.server import ServerSupervisor, server_config
+from utils.settings import SERVER_DEFAULTS
+settings = {**SERVER_DEFAULTS, "host": "127.0.0.1", "port": int(sys.argv[1]), "graceful_timeout": 5}
+sys.exit(ServerSupervisor(server_config("tests.test_server:app", settings, access_log=False), 1).run())
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _pid(url: str) -> int:
+    return httpx.get(f"{url}/pid", timeout=5).json()["pid"]
+
+
+def _wait(condition, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = condition()
+            if result:
+                return result
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError
+
+
+class TestServerSupervisor:
+    def test_server_config(self):
+        config = server_config("sablon_api:app", {**SERVER_DEFAULTS, "keep_alive": 75, "loop": "asyncio", "http": "h11"})
+        assert config.timeout_keep_alive == 75
+        assert config.backlog == 2048
+        assert resolved_implementations(config) == ("asyncio", "h11")
+
+    def test_supervisor_fail(self):
+        with pytest.raises(ValueError):
+            ServerSupervisor(server_config("sablon_api:app", SERVER_DEFAULTS), 0)
+
+    @pytest.mark.skipif(not hasattr(signal, "SIGHUP"), reason="rolling restarts are triggered by SIGHUP")
+    def test_rolling_restart(self):
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        supervisor = subprocess.Popen([sys.executable, "-c", SUPERVISOR, str(port)], stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT, text=True)
+        try:
+            before = _wait(lambda: _pid(url))
+            supervisor.send_signal(signal.SIGHUP)
+            # The old worker serves until its replacement does
+            after = _wait(lambda: (pid := _pid(url)) != before and pid)
+            print(f"\n\033[91mUtils: \033[92mRolling restart: \033[96m{before} -> {after}\033[0m\n")
+        finally:
+            supervisor.send_signal(signal.SIGTERM)
+            output, _ = supervisor.communicate(timeout=60)
+        assert supervisor.returncode == 0
+        assert "rolling restart done" in output
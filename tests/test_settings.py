@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from utils.settings import compression_settings, mongo_client_options, server_settings, usable_cpus, warmup_settings
+
+
+class TestSettings:
+    def test_mongo_client_options_default(self, monkeypatch):
+        for name in ("SABLON_MONGO_HOST", "SABLON_MONGO_PORT", "SABLON_MONGO_COMPRESSORS"):
+            monkeypatch.delenv(name, raising=False)
+        options = mongo_client_options()
+        print(f"\n\033[91mUtils: \033[92mMongo client options default: \033[96m{options}\033[0m\n")
+        assert options.get("host") == "localhost"
+        assert options.get("port") == 27017
+        assert "compressors" not in options
+
+    def test_mongo_client_options_env(self, monkeypatch):
+        monkeypatch.setenv("SABLON_MONGO_HOST", "mongo.internal")
+        monkeypatch.setenv("SABLON_MONGO_MAX_POOL_SIZE", "250")
+        monkeypatch.setenv("SABLON_MONGO_COMPRESSORS", "zstd,zlib")
+        options = mongo_client_options()
+        print(f"\n\033[91mUtils: \033[92mMongo client options env: \033[96m{options}\033[0m\n")
+        assert options.get("host") == "mongo.internal"
+        assert options.get("maxPoolSize") == 250
+        assert options.get("compressors") == "zstd,zlib"
+
+    def test_mongo_client_options_fail(self, monkeypatch):
+        monkeypatch.setenv("SABLON_MONGO_PORT", "twentyseven")
+        with pytest.raises(ValueError):
+            mongo_client_options()
+
+    def test_compression_settings(self, monkeypatch):
+        monkeypatch.setenv("SABLON_COMPRESSION_MIN_SIZE", "4096")
+        monkeypatch.setenv("SABLON_COMPRESSION_ENCODINGS", "gzip, br")
+        monkeypatch.setenv("SABLON_GZIP_LEVEL", "1")
+        settings = compression_settings()
+        print(f"\n\033[91mUtils: \033[92mCompression settings: \033[96m{settings}\033[0m\n")
+        assert settings.get("enabled") is True
+        assert settings.get("minimum_size") == 4096
+        assert settings.get("encodings") == ["gzip", "br"]
+        assert settings.get("levels").get("gzip") == 1
+
+    def test_server_settings_default(self, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        for name in ("SABLON_CONFIG", "SABLON_HOST", "SABLON_PORT", "SABLON_WORKERS", "SABLON_LOOP", "SABLON_HTTP"):
+            monkeypatch.delenv(name, raising=False)
+        settings = server_settings()
+        print(f"\n\033[91mUtils: \033[92mServer settings default: \033[96m{settings}\033[0m\n")
+        assert settings.get("host") == "0.0.0.0"
+        assert settings.get("port") == 8000
+        assert settings.get("workers") == usable_cpus()
+        assert settings.get("loop") == "auto"
+
+    def test_server_settings_config(self, monkeypatch, tmp_path):
+        config = tmp_path / "server.json"
+        config.write_text(json.dumps({"port": 9000, "workers": 3, "keep_alive": 75, "loop": "asyncio"}), encoding="utf-8")
+        monkeypatch.setenv("SABLON_CONFIG", str(config))
+        monkeypatch.setenv("SABLON_WORKERS", "5")
+        monkeypatch.delenv("SABLON_PORT", raising=False)
+        settings = server_settings()
+        print(f"\n\033[91mUtils: \033[92mServer settings config: \033[96m{settings}\033[0m\n")
+        assert settings.get("port") == 9000
+        assert settings.get("workers") == 5
+        assert settings.get("keep_alive") == 75
+        assert settings.get("loop") == "asyncio"
+
+    @pytest.mark.parametrize("config, env", [
+        ({"threads": 4}, {}),
+        ({"loop": "trio"}, {}),
+        ({}, {"SABLON_HTTP": "http2"}),
+        ({"port": "eighty"}, {}),
+        ({}, {"SABLON_WORKERS": "-1"}),
+    ])
+    def test_server_settings_fail(self, monkeypatch, tmp_path, config, env):
+        path = tmp_path / "server.json"
+        path.write_text(json.dumps(config), encoding="utf-8")
+        monkeypatch.setenv("SABLON_CONFIG", str(path))
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        with pytest.raises(ValueError):
+            server_settings()
+
+    def test_server_settings_missing_config(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("SABLON_CONFIG", str(tmp_path / "missing.json"))
+        with pytest.raises(ValueError):
+            server_settings()
+
+    def test_warmup_settings(self, monkeypatch, tmp_path):
+        queries = [{"query": {"gender": "Neutral"}, "fields": "name,age"}]
+        (tmp_path / "warmup.json").write_text(json.dumps(queries))
+        monkeypatch.setenv("SABLON_WARMUP_DOCUMENTS", "500")
+        monkeypatch.setenv("SABLON_WARMUP_QUERIES", str(tmp_path / "warmup.json"))
+        settings = warmup_settings()
+        print(f"\n\033[91mUtils: \033[92mWarm-up settings: \033[96m{settings}\033[0m\n")
+        assert settings == {"enabled": True, "documents": 500, "queries": queries}
+
+    @pytest.mark.parametrize("content, env", [
+        ('{"query": {}}', {}),
+        ('[{"fields": "name"}]', {}),
+        ("[", {}),
+        ("[]", {"SABLON_WARMUP_DOCUMENTS": "-1"}),
+    ])
+    def test_warmup_settings_fail(self, monkeypatch, tmp_path, content, env):
+        (tmp_path / "warmup.json").write_text(content)
+        monkeypatch.setenv("SABLON_WARMUP_QUERIES", str(tmp_path / "warmup.json"))
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        with pytest.raises(ValueError):
+            warmup_settings()
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.singleflight import AsyncSingleFlight, SingleFlight
+
+
+class TestSingleFlight:
+    def test_share_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def read(key):
+            calls.append(key)
+            release.wait(1)
+            return {"key": key}
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(flight.do, "hot", read, "hot") for _ in range(8)]
+            while flight.stats()["hits"] < 7:
+                threading.Event().wait(0.001)
+            release.set()
+            results = [future.result(1) for future in futures]
+        print(f"\n\033[91mUtils: \033[92mSingle flight share call: \033[96m{flight.stats()}\033[0m\n")
+        assert calls == ["hot"]
+        assert all(result is results[0] for result in results)
+        assert flight.stats() == {"size": 0, "hits": 7, "misses": 1, "hit_ratio": 0.875}
+
+    def test_distinct_keys(self):
+        flight = SingleFlight()
+        assert flight.do("a", str.upper, "a") == "A"
+        assert flight.do("a", str.upper, "b") == "B"
+        assert flight.stats()["misses"] == 2
+
+    def test_share_call_fail(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait(1)
+            raise LookupError("Error! Test failure")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(flight.do, "hot", fail) for _ in range(2)]
+            while flight.stats()["hits"] < 1:
+                threading.Event().wait(0.001)
+            release.set()
+            for future in futures:
+                with pytest.raises(LookupError):
+                    future.result(1)
+        assert flight.stats()["size"] == 0
+
+
+class TestAsyncSingleFlight:
+    def test_share_call(self):
+        calls = []
+
+        async def read(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return {"key": key}
+
+        async def scenario():
+            flight = AsyncSingleFlight()
+            results = await asyncio.gather(*(flight.do("hot", read, "hot") for _ in range(8)))
+            return results, flight.stats()
+
+        results, stats = asyncio.run(scenario())
+        print(f"\n\033[91mUtils: \033[92mAsync single flight share call: \033[96m{stats}\033[0m\n")
+        assert calls == ["hot"]
+        assert all(result is results[0] for result in results)
+        assert stats == {"size": 0, "hits": 7, "misses": 1, "hit_ratio": 0.875}
+
+    def test_leader_cancelled(self):
+        async def read():
+            await asyncio.sleep(0.01)
+            return "value"
+
+        async def scenario():
+            flight = AsyncSingleFlight()
+            leader = asyncio.ensure_future(flight.do("hot", read))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("hot", read))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(scenario()) == "value"
+
+    def test_share_call_fail(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise LookupError("Error! Test failure")
+
+        async def scenario():
+            flight = AsyncSingleFlight()
+            return await asyncio.gather(flight.do("hot", fail), flight.do("hot", fail), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, LookupError) for result in results)
+        assert results[0] is results[1]
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.tracing import (TRACE_LISTENER, SpanFileExporter, Trace, TracingMiddleware, _current_span, _current_trace,
+                           parse_traceparent, server_timing, start_span, end_span, trace_methods, traced)
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+@trace_methods("store")
+class _Store:
+    def read(self):
+        time.sleep(0.002)
+        return "stored"
+
+
+@trace_methods("service")
+class _Service:
+    def __init__(self):
+        self.store = _Store()
+
+    def read(self):
+        return self.store.read()
+
+    async def read_async(self):
+        return self.store.read()
+
+
+def _app(exporter: SpanFileExporter | None = None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware, exporter=exporter)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        return {"item_id": item_id, "value": _Service().read()}
+
+    return app
+
+
+def _traced(function, *args):
+    trace = Trace()
+    trace_token = _current_trace.set(trace)
+    try:
+        return function(*args), trace
+    finally:
+        _current_trace.reset(trace_token)
+
+
+class TestTracing:
+    def test_parse_traceparent(self):
+        print(f"\n\033[91mUtils: \033[92mParse traceparent: \033[96m{parse_traceparent(TRACEPARENT)}\033[0m\n")
+        assert parse_traceparent(TRACEPARENT) == ("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7")
+        assert parse_traceparent("00-00000000000000000000000000000000-00f067aa0ba902b7-01") == (None, None)
+        assert parse_traceparent("garbage") == (None, None)
+        assert parse_traceparent(None) == (None, None)
+
+    def test_trace_methods(self):
+        result, trace = _traced(_Service().read)
+        spans = {span.name: span for span in trace.spans}
+        print(f"\n\033[91mUtils: \033[92mTrace methods: \033[96m{list(spans)}\033[0m\n")
+        assert result == "stored"
+        assert spans["store.read"].parent is spans["service.read"]
+        assert spans["service.read"].children == spans["store.read"].duration
+
+    def test_trace_methods_async(self):
+        result, trace = _traced(lambda: asyncio.run(_Service().read_async()))
+        assert result == "stored"
+        assert [span.name for span in trace.spans] == ["store.read", "service.read_async"]
+
+    def test_traced_outside_request(self):
+        assert _current_trace.get() is None
+        assert start_span("service.read", "service") is None
+        assert traced("validate")(lambda value: value)(1) == 1
+
+    def test_traced_fail(self):
+        def fail():
+            raise ValueError("Error! Test failure")
+
+        trace = Trace()
+        trace_token = _current_trace.set(trace)
+        try:
+            traced("service")(fail)()
+        except ValueError:
+            pass
+        finally:
+            _current_trace.reset(trace_token)
+        assert trace.spans[0].error == "Error! Test failure"
+        assert _current_span.get() is None
+
+    def test_server_timing(self):
+        _, trace = _traced(_Service().read)
+        header = server_timing(trace)
+        print(f"\n\033[91mUtils: \033[92mServer-Timing: \033[96m{header}\033[0m\n")
+        layers = dict(metric.split(";dur=") for metric in header.split(", "))
+        assert list(layers) == ["service", "store", "total"]
+        assert float(layers["store"]) >= 2
+
+    def test_command_listener(self):
+        def run_command():
+            handle = start_span("store.read", "store")
+            event = SimpleNamespace(connection_id=("localhost", 27017), request_id=1, command_name="find",
+                                    duration_micros=1500)
+            TRACE_LISTENER.started(event)
+            TRACE_LISTENER.succeeded(event)
+            end_span(handle)
+
+        _, trace = _traced(run_command)
+        mongo, store = trace.spans
+        assert mongo.name == "mongo.find" and mongo.parent is store
+        assert abs(mongo.duration - 0.0015) < 1e-6
+
+
+class TestTracingMiddleware:
+    def test_server_timing_header(self):
+        response = TestClient(_app()).get("/items/1")
+        print(f"\n\033[91mUtils: \033[92mServer-Timing header: \033[96m{response.headers['server-timing']}\033[0m\n")
+        assert response.json() == {"item_id": "1", "value": "stored"}
+        layers = [metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")]
+        assert layers[0] == "app" and "service" in layers and "store" in layers and layers[-1] == "total"
+
+    def test_export(self, tmp_path):
+        exporter = SpanFileExporter(str(tmp_path / "traces.jsonl"))
+        TestClient(_app(exporter)).get("/items/1", headers={"traceparent": TRACEPARENT})
+        exporter.flush()
+        lines = (tmp_path / "traces.jsonl").read_text(encoding="utf-8").splitlines()
+        spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        by_name = {span["name"]: span for span in spans}
+        print(f"\n\033[91mUtils: \033[92mExported spans: \033[96m{list(by_name)}\033[0m\n")
+        root = by_name["GET /items/{item_id}"]
+        assert root["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert root["parentSpanId"] == "00f067aa0ba902b7"
+        assert by_name["service.read"]["parentSpanId"] == root["spanId"]
+        assert by_name["store.read"]["parentSpanId"] == by_name["service.read"]["spanId"]
+        assert int(root["endTimeUnixNano"]) > int(root["startTimeUnixNano"])
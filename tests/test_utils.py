@@ -1,3 +1,6 @@
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+
 from utils.db_store import MongoDBStore
 import pytest
 
@@ -77,6 +80,17 @@ class TestMongoDBStore:
         # Clean db after successful test run
         mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
 
+    def test_collection_version(self, mongo_driver):
+        version = mongo_driver.get_collection_version("sablon_db", "sablon_collection")
+        bumped = mongo_driver.bump_collection_version("sablon_db", "sablon_collection")
+        result = mongo_driver.get_collection_version("sablon_db", "sablon_collection")
+        print(f"\n\033[91mUtils: \033[92mCollection version: \033[96m{version} -> {result}\033[0m\n")
+
+        assert result == version + 1
+        assert bumped == result
+        assert MongoDBStore().get_collection_version("sablon_db", "sablon_collection") == result
+        assert mongo_driver.get_collection_version("sablon_db", "missing_collection") == 0
+
     def test_get_documents_by_query(self, mongo_driver, sablon_document):
         # Clean db from previous run
         mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
@@ -177,3 +191,109 @@ class TestMongoDBStore:
         # Clean db after successful test run
         mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
         mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document_update)
+
+    def test_get_documents_by_query_page(self, mongo_driver, sablon_document):
+        # Clean db from previous run
+        for _ in range(0, 3):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+        # Create documents
+        document_ids = [mongo_driver.add_document("sablon_db", "sablon_collection", dict(sablon_document)).inserted_id
+                        for _ in range(0, 3)]
+
+        # Get the first page, then the page after its last document
+        first_page = list(mongo_driver.get_documents_by_query_page("sablon_db", "sablon_collection", sablon_document, 2))
+        second_page = list(mongo_driver.get_documents_by_query_page("sablon_db", "sablon_collection", sablon_document, 2,
+                                                                    first_page[-1].get("_id")))
+        print(f"\n\033[91mUtils: \033[92mGet documents by query page: \033[96m{first_page} {second_page}\033[0m\n")
+
+        assert [document.get("_id") for document in first_page] == document_ids[:2]
+        assert [document.get("_id") for document in second_page] == document_ids[2:]
+
+        # Clean db after successful test run
+        for _ in range(0, 3):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+    def test_get_latest_documents(self, mongo_driver, sablon_document):
+        # Clean db from previous run
+        for _ in range(0, 3):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+        # Create documents, the latest ones are read newest first
+        document_ids = [mongo_driver.add_document("sablon_db", "sablon_collection", dict(sablon_document)).inserted_id
+                        for _ in range(0, 3)]
+        latest = list(mongo_driver.get_latest_documents("sablon_db", "sablon_collection", 2))
+        print(f"\n\033[91mUtils: \033[92mGet latest documents: \033[96m{latest}\033[0m\n")
+
+        assert [document.get("_id") for document in latest] == document_ids[:0:-1]
+
+        # Clean db after successful test run
+        for _ in range(0, 3):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+    def test_add_documents(self, mongo_driver, sablon_document):
+        # Clean db from previous run
+        for _ in range(0, 3):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+        # Create documents
+        result = mongo_driver.add_documents("sablon_db", "sablon_collection", [dict(sablon_document) for _ in range(0, 3)])
+        print(f"\n\033[91mUtils: \033[92mAdd documents: \033[96mAdded documents {result.inserted_ids}\033[0m\n")
+
+        assert len(result.inserted_ids) == 3
+        assert len(list(mongo_driver.get_documents_by_query("sablon_db", "sablon_collection", sablon_document))) == 3
+
+        # Clean db after successful test run
+        for _ in range(0, 3):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+    def test_bulk_write(self, mongo_driver, sablon_document, sablon_document_update):
+        # Clean db from previous run
+        mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+        mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document_update)
+
+        # Insert, update and delete in one round trip
+        result = mongo_driver.bulk_write("sablon_db", "sablon_collection", [
+            InsertOne(dict(sablon_document)),
+            UpdateOne(sablon_document, {"$set": sablon_document_update}),
+            DeleteOne(sablon_document_update),
+        ])
+        print(f"\n\033[91mUtils: \033[92mBulk write: \033[96m{result.bulk_api_result}\033[0m\n")
+
+        assert result.inserted_count == 1
+        assert result.modified_count == 1
+        assert result.deleted_count == 1
+
+    def test_get_documents_by_ids(self, mongo_driver, sablon_document):
+        # Clean db from previous run
+        for _ in range(0, 2):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+        # Create documents
+        document_ids = [mongo_driver.add_document("sablon_db", "sablon_collection", dict(sablon_document)).inserted_id
+                        for _ in range(0, 2)]
+
+        # Get documents by ids, including one that does not exist
+        result = list(mongo_driver.get_documents_by_ids("sablon_db", "sablon_collection", document_ids + [ObjectId()]))
+        print(f"\n\033[91mUtils: \033[92mGet documents by ids: \033[96m{result}\033[0m\n")
+
+        assert sorted(document.get("_id") for document in result) == sorted(document_ids)
+
+        # Clean db after successful test run
+        for _ in range(0, 2):
+            mongo_driver.delete_document_by_query("sablon_db", "sablon_collection", sablon_document)
+
+    def test_get_collection(self, mongo_driver):
+        collection = mongo_driver.get_collection("sablon_db", "sablon_collection")
+        print(f"\n\033[91mUtils: \033[92mGet collection: \033[96m{collection.full_name}\033[0m\n")
+        assert collection is mongo_driver.get_collection("sablon_db", "sablon_collection")
+
+    def test_connect_close(self, mongo_driver, sablon_document):
+        mongo_driver.connect(2)
+        mongo_driver.close()
+        print(f"\n\033[91mUtils: \033[92mConnect close: \033[96mClient reopened after close\033[0m\n")
+
+        # The store creates a new client on first use after close
+        result = mongo_driver.add_document("sablon_db", "sablon_collection", sablon_document)
+        assert result.inserted_id is not None
+        mongo_driver.delete_document_by_id("sablon_db", "sablon_collection", result.inserted_id)
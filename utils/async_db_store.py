@@ -0,0 +1,433 @@
+"""
+This module provides an AsyncMongoDBStore class for general CRUD operations that do not block the event loop.
+"""
+import asyncio
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorCursor
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import PyMongoError
+from pymongo.results import UpdateResult, InsertOneResult, InsertManyResult, DeleteResult, BulkWriteResult
+
+from utils.db_store import COLLECTION_VERSIONS, keyset_filter
+from utils.metrics import MONGO_METRICS, instrument_store
+from utils.query_monitor import SlowQueryMonitor, CollectionScanError, query_shape, query_shape_key, winning_plan, plan_stages
+from utils.settings import mongo_client_options, query_guard_settings
+from utils.tracing import TRACE_LISTENER, trace_methods
+
+
+@instrument_store("async")
+@trace_methods("store")
+class AsyncMongoDBStore:
+    """
+    Asynchronous Mongo database driver for general CRUD operations, with the same method surface as MongoDBStore
+    """
+
+    def __init__(self, client: AsyncIOMotorClient | None = None):
+        """
+        Initializing the AsyncMongoDBStore class. The motor AsyncIOMotorClient is only created on first use (or by connect) with the options of utils.settings, so importing and constructing the store opens no connection and stays safe before forking workers
+        The client reports its commands to the SlowQueryMonitor of the store, which keeps the slow query log, its commands and pool events to the Prometheus metrics of utils.metrics and its commands to the trace spans of utils.tracing
+        :param client: receives an already configured AsyncIOMotorClient to use, None to create one from the settings
+        """
+        self._client = client
+        self._collections = {}
+        settings = query_guard_settings()
+        self.monitor = SlowQueryMonitor(settings["slow_query_ms"], settings["slow_query_log_size"])
+        self.collscan_strict = settings["collscan_strict"]
+        self.collscan_max_documents = settings["collscan_max_documents"]
+        self._plan_checks = {}
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        """
+        Property returning the motor AsyncIOMotorClient of the store, created on first access from mongo_client_options
+        :return: returns the AsyncIOMotorClient of the store
+        """
+        if self._client is None:
+            self._client = AsyncIOMotorClient(**mongo_client_options(), event_listeners=[self.monitor, MONGO_METRICS, TRACE_LISTENER])
+        return self._client
+
+    def get_collection(self, db_name: str, db_collection: str) -> AsyncIOMotorCollection:
+        """
+        Method for retrieving the handle of a collection, cached so that it is resolved only once per store
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :return: returns the motor AsyncIOMotorCollection
+        """
+        collection = self._collections.get((db_name, db_collection))
+        if collection is None:
+            collection = self._collections[(db_name, db_collection)] = self.client[db_name][db_collection]
+        return collection
+
+    async def connect(self, connections: int | None = None) -> None:
+        """
+        Method that creates the client and pre-warms its pool with concurrent pings, used at application startup so that the first requests do not pay for the connection handshakes
+        :param connections: receives the number of concurrent pings, None uses the minimum pool size of the settings
+        :return: returns nothing, a pymongo ServerSelectionTimeoutError is raised if the server cannot be reached
+        """
+        client = self.client
+        if connections is None:
+            connections = mongo_client_options()["minPoolSize"]
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, connections))))
+
+    def close(self) -> None:
+        """
+        Method that closes the client and its pool, used at application shutdown. The next use of the store creates a new client
+        :return: returns nothing
+        """
+        if self._client is not None:
+            self._client.close()
+        self._client = None
+        self._collections.clear()
+
+    async def add_document(self, db_name: str, db_collection: str, document: dict) -> InsertOneResult:
+        """
+        Method for adding a single document in the mongo database, specifying the database name and collection name of where the insertion to be made
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param document: receives the dictionary containing the document to be added in the database and collection specified in db_name and db_collection
+        :return: returns the ObjectId of the inserted document
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.insert_one(document)
+
+    async def add_documents(self, db_name: str, db_collection: str, documents: list[dict], ordered: bool = False) -> InsertManyResult:
+        """
+        Method for adding many documents in a single insert_many round trip. Each document receives its "_id" in place, even when the insertion of another document fails
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param documents: receives the list of dictionaries containing the documents to be added
+        :param ordered: receives False (the default) to let the server insert every valid document instead of stopping at the first failure
+        :return: returns the InsertManyResult response of the pymongo library, a pymongo BulkWriteError describing the failed documents is raised if some of them could not be inserted
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.insert_many(documents, ordered=ordered)
+
+    def get_all_documents(self, db_name: str, db_collection: str, batch_size: int | None = None, projection: dict | None = None) -> AsyncIOMotorCursor:
+        """
+        Method for retrieving all documents inside a collection that is part of a database. Creating the cursor does no I/O, so this method is not a coroutine
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param batch_size: receives the number of documents fetched per round trip while iterating the cursor, None keeps the server default
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns an async cursor containing the documents, iterate it with "async for" or drain it with "to_list"
+        """
+        collection = self.get_collection(db_name, db_collection)
+        cursor = collection.find({}, projection)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    async def get_document_by_id(self, db_name: str, db_collection: str, document_id: ObjectId, projection: dict | None = None) -> dict:
+        """
+        Method for retrieving the first document found in the mentioned database and collection that has the specified ObjectId
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param document_id: receives the ObjectId for which the query will search in the mongo database
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns the document in a dictionary form of the search query made after the passed ObjectId
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.find_one({"_id": document_id}, projection)
+
+    def get_documents_by_ids(self, db_name: str, db_collection: str, document_ids: list[ObjectId], projection: dict | None = None) -> AsyncIOMotorCursor:
+        """
+        Method for retrieving the documents that have any of the specified ObjectIds with a single $in query
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param document_ids: receives the list of ObjectIds for which the query will search in the mongo database
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns a cursor over the documents found, in no particular order, the ObjectIds that do not exist are simply absent
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.find({"_id": {"$in": document_ids}}, projection)
+
+    def get_documents_by_query(self, db_name: str, db_collection: str, query: dict, batch_size: int | None = None,
+                               projection: dict | None = None) -> AsyncIOMotorCursor:
+        """
+        Method for retrieving all the documents that match the values of each key-value pair passed in the query dictionary. Creating the cursor does no I/O, so this method is not a coroutine
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query after which the search is going to be made
+        :param batch_size: receives the number of documents fetched per round trip while iterating the cursor, None keeps the server default
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns an async cursor over the documents that match the query, iterate it with "async for" or drain it with "to_list"
+        """
+        collection = self.get_collection(db_name, db_collection)
+        cursor = collection.find(query, projection)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    def get_all_documents_page(self, db_name: str, db_collection: str, limit: int, after_id: ObjectId | None = None,
+                               projection: dict | None = None) -> AsyncIOMotorCursor:
+        """
+        Method for retrieving one page of the documents inside a collection, ordered by ObjectId. The page starts right after after_id (keyset pagination)
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param limit: receives the maximum number of documents returned in the page
+        :param after_id: receives the ObjectId of the last document of the previous page, or None for the first page
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns an async cursor over at most limit documents sorted ascending by ObjectId
+        """
+        return self.get_documents_by_query_page(db_name, db_collection, {}, limit, after_id, projection)
+
+    def get_documents_by_query_page(self, db_name: str, db_collection: str, query: dict, limit: int,
+                                    after_id: ObjectId | None = None, projection: dict | None = None) -> AsyncIOMotorCursor:
+        """
+        Method for retrieving one page of the documents that match the query, ordered by ObjectId. The page starts right after after_id (keyset pagination)
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query after which the search is going to be made
+        :param limit: receives the maximum number of documents returned in the page
+        :param after_id: receives the ObjectId of the last document of the previous page, or None for the first page
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns an async cursor over at most limit matching documents sorted ascending by ObjectId
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.find(keyset_filter(query, after_id), projection).sort("_id", ASCENDING).limit(limit)
+
+    def get_latest_documents(self, db_name: str, db_collection: str, limit: int,
+                             projection: dict | None = None) -> AsyncIOMotorCursor:
+        """
+        Method for retrieving the most recently inserted documents of a collection, newest first. The ObjectIds grow with their insertion time, so the read is a backward scan of the _id index
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param limit: receives the maximum number of documents returned
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns an async cursor over at most limit documents sorted descending by ObjectId
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.find({}, projection).sort("_id", DESCENDING).limit(limit)
+
+    async def count_documents(self, db_name: str, db_collection: str, query: dict) -> int:
+        """
+        Method for counting the documents that match a query on the server, without reading them
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query after which the count is going to be made, {} counts the whole collection
+        :return: returns the number of matching documents
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.count_documents(query)
+
+    async def aggregate(self, db_name: str, db_collection: str, pipeline: list[dict]) -> list[dict]:
+        """
+        Method for running an aggregation pipeline on the server, so that only its result travels over the wire
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param pipeline: receives the list of aggregation stages
+        :return: returns the documents produced by the last stage of the pipeline
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.aggregate(pipeline).to_list(None)
+
+    async def update_document(self, db_name: str, db_collection: str, document_id: ObjectId, document: dict,
+                              version_field: str | None = None) -> UpdateResult:
+        """
+        Method for updating an existing document inside the collection of the database, overwriting existing key-value pairs and adding new ones
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param document_id: receives the ObjectId of the document you wish to update in the database
+        :param document: receives the dictionary of the document that you wish to update it with
+        :param version_field: receives the name of the version field of the document, incremented by the same update, or None to leave the document unversioned
+        :return: returns the UpdateResult response of the pymongo library for the update operation. You can use .modified_count method to check if the update has been made
+        """
+        collection = self.get_collection(db_name, db_collection)
+        update = {"$set": document}
+        if version_field is not None:
+            update["$inc"] = {version_field: 1}
+        return await collection.update_one({"_id": document_id}, update)
+
+    async def get_collection_version(self, db_name: str, db_collection: str) -> int:
+        """
+        Method for reading the version of a collection, kept in the COLLECTION_VERSIONS collection of the database so that every worker reads the same one
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :return: returns the number of times bump_collection_version was called for the collection, 0 if it never was
+        """
+        document = await self.get_collection(db_name, COLLECTION_VERSIONS).find_one({"_id": db_collection})
+        return 0 if document is None else document.get("version", 0)
+
+    async def bump_collection_version(self, db_name: str, db_collection: str) -> int:
+        """
+        Method for incrementing the version of a collection, called after every write made to the collection
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :return: returns the version the collection was bumped to, read in the same round trip
+        """
+        document = await self.get_collection(db_name, COLLECTION_VERSIONS).find_one_and_update(
+            {"_id": db_collection}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+        return document["version"]
+
+    async def bulk_write(self, db_name: str, db_collection: str, operations: list, ordered: bool = True) -> BulkWriteResult:
+        """
+        Method for executing a list of pymongo write operations (InsertOne, UpdateOne, DeleteOne, ...) in a single bulk_write round trip
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param operations: receives the list of pymongo write operations to be executed
+        :param ordered: receives True (the default) to stop at the first failing operation, False to let the server execute every operation
+        :return: returns the BulkWriteResult response of the pymongo library, a pymongo BulkWriteError describing the failed operations is raised if some of them could not be executed
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.bulk_write(operations, ordered=ordered)
+
+    async def delete_document_by_id(self, db_name: str, db_collection: str, document_id: ObjectId) -> DeleteResult:
+        """
+        Method for deleting a document after its ObjectId
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param document_id: receives the ObjectId of the document you wish to delete from the database
+        :return: returns the DeleteResult response of the pymongo library for the delete operation. You can use .deleted_count method to check if the deletion has been made
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.delete_one({"_id": document_id})
+
+    async def delete_document_by_query(self, db_name: str, db_collection: str, query: dict) -> DeleteResult:
+        """
+        Method for deleting the first document whose field values matches the key values of the query dictionary
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary containing the key-value pairs after which the pymongo library will search in the database
+        :return: returns the DeleteResult response of the pymongo library for the delete operation. You can use .deleted_count method to check if the deletion has been made
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.delete_one(query)
+
+    async def list_indexes(self, db_name: str, db_collection: str) -> list[dict]:
+        """
+        Method for retrieving the indexes that exist on a collection
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :return: returns the list of index descriptions ("key", "name", "unique", "partialFilterExpression", ...) as returned by the listIndexes command
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return await collection.list_indexes().to_list(None)
+
+    async def create_indexes(self, db_name: str, db_collection: str, indexes: list[IndexModel]) -> list[str]:
+        """
+        Method for creating many indexes with a single createIndexes command. Creating an index that already exists with the same options does nothing
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param indexes: receives the list of pymongo IndexModel describing the indexes
+        :return: returns the names of the created indexes
+        """
+        collection = self.get_collection(db_name, db_collection)
+        self._plan_checks.clear()
+        return await collection.create_indexes(indexes)
+
+    async def drop_index(self, db_name: str, db_collection: str, index_name: str) -> None:
+        """
+        Method for dropping an index by its name
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param index_name: receives the name of the index to be dropped
+        :return: returns nothing, a pymongo OperationFailure is raised if the index does not exist
+        """
+        collection = self.get_collection(db_name, db_collection)
+        self._plan_checks.clear()
+        await collection.drop_index(index_name)
+
+    async def explain_query(self, db_name: str, db_collection: str, query: dict) -> dict:
+        """
+        Method for retrieving the plan Mongo picks for a query, without executing it (queryPlanner verbosity)
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query to be explained
+        :return: returns the winning plan of the query, a tree of stages such as IXSCAN, FETCH or COLLSCAN
+        """
+        return await self.explain_command(db_name, {"find": db_collection, "filter": query})
+
+    async def explain_command(self, db_name: str, command: dict) -> dict:
+        """
+        Method for retrieving the plan Mongo picks for a command (find, aggregate, count, distinct, update, delete or findAndModify), without executing it (queryPlanner verbosity)
+        :param db_name: receives the string name of the database name to be accessed
+        :param command: receives the command to be explained, see utils.query_monitor.explain_command
+        :return: returns the winning plan of the command, a tree of stages such as IXSCAN, FETCH or COLLSCAN
+        """
+        explain = await self.client[db_name].command("explain", command, verbosity="queryPlanner")
+        return winning_plan(explain)
+
+    async def check_query_plan(self, db_name: str, db_collection: str, query: dict) -> None:
+        """
+        Method that rejects, in strict mode, a query planned as a collection scan over more than collscan_max_documents documents. The plan is explained once per query shape, until the indexes of the store change. An empty query reads the whole collection on purpose and is always allowed
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query about to be executed
+        :return: returns nothing, a CollectionScanError is raised if the query is rejected
+        """
+        if not self.collscan_strict or not query:
+            return
+        key = (db_name, db_collection, query_shape_key(query))
+        scans = self._plan_checks.get(key)
+        if scans is None:
+            scans = "COLLSCAN" in plan_stages(await self.explain_query(db_name, db_collection, query))
+            if len(self._plan_checks) >= 1000:
+                self._plan_checks.clear()
+            self._plan_checks[key] = scans
+        if scans:
+            count = await self.get_collection(db_name, db_collection).estimated_document_count()
+            if count > self.collscan_max_documents:
+                raise CollectionScanError(f"Error! The query {query_shape(query)} scans the whole collection of {count} documents, "
+                                          f"add an index or narrow the query")
+
+    async def get_slow_queries(self) -> list[dict]:
+        """
+        Method for retrieving the slow query log of the store, each entry completed on first read with the winning plan of its recorded command, explained as the command it was (find, aggregate, count, update...).
+        :return: returns the slow queries, the most recent first, with their command, collection, filter shape, filter, duration, explained command and winning plan
+        """
+        entries = self.monitor.snapshot()
+        for entry in entries:
+            if "winning_plan" not in entry:
+                try:
+                    entry["winning_plan"] = await self.explain_command(entry["database"], entry["explain_command"])
+                except PyMongoError as e:
+                    entry["winning_plan"] = {"error": str(e)}
+        return entries
+
+    async def initialize_database(self, db_name: str, db_collection: str) -> bool:
+        """
+        Method that can be used to cycle a basic CRUD operation cycle on a specified collection part of a specified database
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :return: returns False if a step in initialization fails, and True if all steps in initialization pass
+        """
+        test_document = {"name": "test_name"}
+        test_document_update = {"name": "test_name_update"}
+        # Create document
+        result = await self.add_document(db_name, db_collection, test_document)
+        test_document_id = result.inserted_id
+        print(f"Document added oid: {test_document_id}")
+        if not test_document_id:
+            return False
+        result = await self.get_all_documents(db_name, db_collection).to_list(length=None)
+        print(f"Documents found: {result}")
+        if not result[0].get("_id") == test_document_id:
+            return False
+
+        # Read document by id
+        result = await self.get_document_by_id(db_name, db_collection, test_document_id)
+        print(f"Document found: {result}")
+        if not result.get("_id") == test_document_id:
+            return False
+
+        # Update document
+        result = await self.update_document(db_name, db_collection, test_document_id, test_document_update)
+        print(f"Documents updated: {result}")
+        if not result.modified_count == 1:
+            return False
+
+        # Get all documents that match the query values
+        result = await self.get_documents_by_query(db_name, db_collection, test_document_update).to_list(length=None)
+        print(f"Document found: {result[0]}")
+        if not result[0].get("_id") == test_document_id:
+            return False
+
+        # Delete document by id
+        result = await self.delete_document_by_id(db_name, db_collection, ObjectId(test_document_id))
+        print(f"Document deleted: {result.deleted_count}")
+        if not result.deleted_count == 1:
+            return False
+
+        # This return is True only if all previous steps pass
+        return True
@@ -0,0 +1,301 @@
+"""
+This module provides in-process caches used in front of the MongoDBStore: an LRU cache with time-to-live expiration for
+single documents, a generation-invalidated cache for query results, and the per-process view of a version shared by
+every worker through the store, which drops those caches when another worker writes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+MISSING = object()
+
+
+class LRUTTLCache:
+    """
+    Bounded, thread safe LRU cache whose entries expire after a fixed time-to-live.
+
+    Readers that load a value from the database should read the generation before the load and pass it to set, so that a value
+    read before a concurrent invalidation is not stored after it.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        """
+        Initializing the LRUTTLCache class
+        :param maxsize: receives the maximum number of entries, the least recently used entry is evicted beyond it. 0 disables the cache
+        :param ttl: receives the number of seconds an entry stays valid after being stored
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Method for reading an entry and marking it as the most recently used
+        :param key: receives the key of the entry
+        :return: returns the cached value, or MISSING if the key is not cached or has expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        """
+        Method for storing an entry, evicting the least recently used entries beyond maxsize
+        :param key: receives the key of the entry
+        :param value: receives the value to be cached
+        :param generation: receives the generation read before loading the value, the value is dropped if an invalidation happened since then
+        :return: returns nothing
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Method for removing an entry after the value it caches has been changed or deleted
+        :param key: receives the key of the entry
+        :return: returns nothing
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Method for removing every entry, used when a write cannot tell which entries it changed
+        :return: returns nothing
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Method for reading the counters of the cache, used to size it
+        :return: returns the size, capacity, ttl, hits, misses, hit ratio, evictions and expirations of the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class QueryCache:
+    """
+    Bounded, thread safe cache of query results, invalidated as a whole by bumping a generation counter.
+
+    Every entry remembers the generation it was loaded under. A write bumps the generation in O(1), which turns every
+    entry into a stale one without walking the cache. Stale and expired entries are dropped on lookup, unless a
+    stale-while-revalidate window is configured, in which case they keep being served while the caller refreshes them.
+    The total size of the entries is capped in bytes, the least recently used entries are evicted beyond it.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, stale_ttl: float = 0.0):
+        """
+        Initializing the QueryCache class
+        :param max_bytes: receives the maximum total size of the cached results, in bytes. 0 disables the cache
+        :param ttl: receives the number of seconds an entry is fresh after being stored, as long as no write happened since its load
+        :param stale_ttl: receives the number of seconds a stale entry keeps being served past its ttl while it is refreshed, 0 disables stale-while-revalidate
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def bump(self) -> None:
+        """
+        Method for invalidating every entry after a write to the collection
+        :return: returns nothing
+        """
+        with self._lock:
+            self.generation += 1
+
+    def lookup(self, key: Hashable) -> tuple[Any, bool]:
+        """
+        Method for reading an entry and marking it as the most recently used
+        :param key: receives the key of the entry
+        :return: returns the cached value and True if it is fresh, the cached value and False if it is stale but still within the stale-while-revalidate window, or MISSING and False
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING, False
+            generation, stored_at, size, value = entry
+            age = time.monotonic() - stored_at
+            if generation == self.generation and age < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value, True
+            if self.stale_ttl > 0 and age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return value, False
+            del self._entries[key]
+            self._size -= size
+            self.misses += 1
+            return MISSING, False
+
+    def set(self, key: Hashable, value: Any, generation: int, size: int) -> None:
+        """
+        Method for storing an entry, evicting the least recently used entries beyond max_bytes
+        :param key: receives the key of the entry
+        :param value: receives the value to be cached
+        :param generation: receives the generation read before loading the value, the entry is stale right away if a write happened since then
+        :param size: receives the estimated size of the value, in bytes. Values larger than max_bytes are not cached
+        :return: returns nothing
+        """
+        if self.max_bytes <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[2]
+            self._entries[key] = (generation, time.monotonic(), size, value)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, _, evicted_size, _) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def begin_refresh(self, key: Hashable) -> bool:
+        """
+        Method for claiming the refresh of a stale entry, so that concurrent readers do not all reload it
+        :param key: receives the key of the entry
+        :return: returns True if the caller has to refresh the entry, False if another refresh is already running
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def end_refresh(self, key: Hashable) -> None:
+        """
+        Method for releasing the refresh claimed with begin_refresh, whether it succeeded or not
+        :param key: receives the key of the entry
+        :return: returns nothing
+        """
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def stats(self) -> dict:
+        """
+        Method for reading the counters of the cache, used to size it
+        :return: returns the number of entries, their size, the capacity, ttls, generation, hits, stale hits, misses, hit ratio and evictions of the cache
+        """
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "generation": self.generation,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class SharedVersion:
+    """
+    Thread safe, per-process view of a version kept in the store and shared by every worker, e.g. the version of a
+    collection that every write bumps.
+
+    The view is read from the store again only once it is older than its ttl, by a single caller at a time while the
+    others keep using it, so that the reads in between cost no round trip. A version other than the known one runs the
+    on_change callback, which drops the caches filled under the old version. The version a local write bumped the store
+    to is recorded as well: when it directly follows the known one, no other worker wrote in between and the caches,
+    already invalidated by the write, are kept.
+    """
+
+    def __init__(self, ttl: float, on_change: Callable[[], None]):
+        """
+        Initializing the SharedVersion class
+        :param ttl: receives the number of seconds the view is used before the store is read again, 0 reads it every time
+        :param on_change: receives the function called when the version changed in another worker
+        """
+        self.ttl = ttl
+        self.on_change = on_change
+        self.value = None
+        self._read_at = float("-inf")
+        self._reading = False
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        """
+        Method for claiming the read of the version from the store, the caller has to pass what it read to update
+        :return: returns True if the caller has to read the version, False if the view is fresh or another caller is reading it
+        """
+        with self._lock:
+            if self.value is None or self.ttl <= 0:
+                return True
+            if self._reading or time.monotonic() - self._read_at < self.ttl:
+                return False
+            self._reading = True
+            return True
+
+    def update(self, version: int | None, written: bool = False) -> None:
+        """
+        Method for recording the version read from the store, or bumped by a local write
+        :param version: receives the version, None when its read or bump failed, which leaves the view to be read again
+        :param written: receives True when the version was returned by the bump of a local write
+        :return: returns nothing
+        """
+        with self._lock:
+            self._reading = False
+            if version is None:
+                self._read_at = float("-inf")
+                return
+            self._read_at = time.monotonic()
+            if self.value is not None and version <= self.value:
+                return
+            changed = self.value is None or not (written and version == self.value + 1)
+            self.value = version
+        if changed:
+            self.on_change()
@@ -0,0 +1,104 @@
+"""
+This module provides the write coalescer of the single inserts: concurrent callers submit one document each, the
+documents arriving while a batch is being written are written together by one batch call, and every caller is resolved with
+the result of its own document.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class InsertCoalescer:
+    """
+    Micro-batching coalescer of the single inserts of concurrent requests.
+
+    A document submitted while no batch is being written is written right away, so a lone request waits for nothing.
+    While a batch is being written, the documents submitted meanwhile gather into the next batch, which is flushed as
+    soon as the write in flight ends, when it holds max_batch documents, or max_delay seconds after its first document,
+    whichever comes first. The batch size thus follows the load. A caller whose request is cancelled after submitting
+    is not waited for, its document is still written with its batch.
+    """
+
+    def __init__(self, insert_batch: Callable[[list], Awaitable[list]], max_batch: int = 100,
+                 max_delay: float = 0.002):
+        """
+        Initializing the InsertCoalescer class
+        :param insert_batch: receives the coroutine function writing a batch, it returns the result of every document in order
+        :param max_batch: receives the number of documents from which a batch is flushed without waiting for the window to end
+        :param max_delay: receives the number of seconds the first document of a batch waits for the write in flight at most
+        """
+        if max_batch < 1:
+            raise ValueError("Error! max_batch must be at least 1")
+        self.insert_batch = insert_batch
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.documents = 0
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+
+    async def submit(self, document: Any) -> Any:
+        """
+        Method adding a document to the current batch and waiting for the result of its write
+        :param document: receives the document
+        :return: returns the result insert_batch gave for the document, the exception raised by insert_batch is raised to every caller of the batch
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((document, future))
+        if len(self._pending) >= self.max_batch or not self._flushes:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def stats(self) -> dict:
+        """
+        Method for reading the counters of the coalescer
+        :return: returns the number of flushed batches and documents, and the average batch size
+        """
+        return {
+            "batches": self.batches,
+            "documents": self.documents,
+            "average_batch": round(self.documents / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _flush(self) -> None:
+        """
+        Starts the write of the pending documents as one batch
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.documents += len(batch)
+        task = asyncio.ensure_future(self._write(batch))
+        # The loop only keeps a weak reference to the tasks
+        self._flushes.add(task)
+        task.add_done_callback(self._written)
+
+    def _written(self, task: asyncio.Task) -> None:
+        """
+        Flushes the documents gathered while a batch was being written, once no other write is in flight
+        """
+        self._flushes.discard(task)
+        if self._pending and not self._flushes:
+            self._flush()
+
+    async def _write(self, batch: list[tuple[Any, asyncio.Future]]) -> None:
+        """
+        Writes a batch and resolves the future of every document with its own result
+        """
+        try:
+            results = await self.insert_batch([document for document, _ in batch])
+        except Exception as e:  # pylint: disable=broad-except
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,319 @@
+"""
+This module provides the compression of the HTTP responses: an ASGI middleware that negotiates gzip, brotli or zstd with
+the Accept-Encoding header of the client and compresses the bodies from a minimum size on, including the NDJSON streams.
+Only the compressible content types (text, JSON, NDJSON, XML, JavaScript) are compressed, and every response of such a
+type varies on Accept-Encoding, compressed or not, so that a shared cache never serves one encoding to another client.
+
+brotli and zstandard are optional, the encodings whose module is not installed are not offered.
+"""
+import zlib
+from typing import Any, Callable, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+SUPPORTED_ENCODINGS = ("zstd", "br", "gzip")
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/xml", "application/javascript")
+
+
+class GzipCompressor:
+    """
+    Incremental gzip compressor.
+    """
+
+    def __init__(self, level: int):
+        """
+        Initializing the GzipCompressor class
+        :param level: receives the compression level, from 1 to 9
+        """
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Method for compressing a chunk of the body and flushing it, so that the client can decode it right away
+        :param data: receives the chunk
+        :return: returns the compressed bytes of the chunk
+        """
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """
+        Method for compressing the last chunk of the body and ending the compressed stream
+        :param data: receives the last chunk
+        :return: returns the compressed bytes of the chunk and the end of the stream
+        """
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    """
+    Incremental brotli compressor.
+    """
+
+    def __init__(self, level: int):
+        """
+        Initializing the BrotliCompressor class
+        :param level: receives the quality, from 0 to 11
+        """
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Method for compressing a chunk of the body and flushing it, so that the client can decode it right away
+        :param data: receives the chunk
+        :return: returns the compressed bytes of the chunk
+        """
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """
+        Method for compressing the last chunk of the body and ending the compressed stream
+        :param data: receives the last chunk
+        :return: returns the compressed bytes of the chunk and the end of the stream
+        """
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdCompressor:
+    """
+    Incremental zstd compressor.
+    """
+
+    def __init__(self, level: int):
+        """
+        Initializing the ZstdCompressor class
+        :param level: receives the compression level, from 1 to 22
+        """
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Method for compressing a chunk of the body and flushing it, so that the client can decode it right away
+        :param data: receives the chunk
+        :return: returns the compressed bytes of the chunk
+        """
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """
+        Method for compressing the last chunk of the body and ending the compressed stream
+        :param data: receives the last chunk
+        :return: returns the compressed bytes of the chunk and the end of the stream
+        """
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+COMPRESSORS = {"gzip": GzipCompressor, "br": BrotliCompressor, "zstd": ZstdCompressor}
+
+
+def available_encodings() -> list[str]:
+    """
+    Function that lists the encodings whose compression module is installed
+    :return: returns the available encodings, by order of preference
+    """
+    modules = {"zstd": zstandard, "br": brotli, "gzip": zlib}
+    return [encoding for encoding in SUPPORTED_ENCODINGS if modules[encoding] is not None]
+
+
+def negotiate_encoding(accept_encoding: str, encodings: list[str]) -> Optional[str]:
+    """
+    Function that picks the encoding of a response from the Accept-Encoding header of the request
+    :param accept_encoding: receives the value of the Accept-Encoding header, e.g. "gzip, br;q=0.8"
+    :param encodings: receives the encodings offered by the server, by order of preference
+    :return: returns the first offered encoding the client accepts with a non zero quality, None if the body has to be sent as is
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    """
+    Function that tells whether the bodies of a content type are worth compressing, already compressed formats (images, archives) are not
+    :param content_type: receives the value of the Content-Type header, e.g. "application/json; charset=utf-8"
+    :return: returns True for the text, JSON, NDJSON, XML and JavaScript types, "+json" and "+xml" types included
+    """
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith(("+json", "+xml"))
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    """
+    Function that compresses a whole body
+    :param data: receives the body
+    :param encoding: receives the encoding, one of "zstd", "br" or "gzip"
+    :param level: receives the compression level of the encoding
+    :return: returns the compressed body
+    """
+    return COMPRESSORS[encoding](level).finish(data)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses the responses for the clients that accept it.
+
+    Only the bodies of a compressible content type are compressed, see is_compressible, and all of them carry
+    Vary: Accept-Encoding, including those sent as is because they are small or the client accepts no offered encoding. A body sent in one message is compressed only from minimum_size bytes on, smaller bodies do not pay the CPU cost for
+    a few saved bytes. A body sent in many messages (the NDJSON streams) is always compressed, every chunk is flushed so
+    that the client keeps receiving the documents as they are read. Responses that already carry a Content-Encoding are
+    left untouched. The strong ETag of a compressed response is made weak, the compressed bytes differ from the
+    representation it was computed for.
+    """
+
+    def __init__(self, app: Callable, minimum_size: int = 1024, encodings: Optional[list[str]] = None,
+                 levels: Optional[dict] = None):
+        """
+        Initializing the CompressionMiddleware class
+        :param app: receives the wrapped ASGI application
+        :param minimum_size: receives the size, in bytes, from which a body sent in one message is compressed
+        :param encodings: receives the offered encodings by order of preference, the available ones by default. The encodings whose module is not installed are dropped
+        :param levels: receives the compression level of every encoding, the default level of an encoding is used when missing
+        """
+        encodings = available_encodings() if encodings is None else encodings
+        unknown = [encoding for encoding in encodings if encoding not in SUPPORTED_ENCODINGS]
+        if unknown:
+            raise ValueError(f"Error! Unknown compression encodings {unknown}, expected {list(SUPPORTED_ENCODINGS)}")
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = [encoding for encoding in encodings if encoding in available_encodings()]
+        self.levels = {"gzip": 6, "br": 4, "zstd": 3, **(levels or {})}
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """
+        Method called by the ASGI server for every connection
+        :param scope: receives the connection scope
+        :param receive: receives the function reading the messages of the client
+        :param send: receives the function sending the messages of the response
+        :return: returns nothing
+        """
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        encoding = negotiate_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"), self.encodings)
+        level = self.levels[encoding] if encoding is not None else None
+        await _CompressedResponder(self.app, encoding, level, self.minimum_size)(scope, receive, send)
+
+
+class _CompressedResponder:
+    """
+    Compresses the body of a single response, holding the start message until the first body message tells its size.
+    The encoding is None when the client accepts none of the offered encodings, the body is then only marked as varying.
+    """
+
+    def __init__(self, app: Callable, encoding: Optional[str], level: Optional[int], minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: dict) -> None:
+        """
+        Method replacing the send function of the wrapped application
+        :param message: receives the ASGI message sent by the application
+        :return: returns nothing
+        """
+        if message["type"] == "http.response.start":
+            headers = message.get("headers", [])
+            content_type = next((value for name, value in headers if name.lower() == b"content-type"), b"")
+            if not is_compressible(content_type.decode("latin-1")):
+                self.passthrough = True
+                await self.send(message)
+                return
+            self.start_message = {**message, "headers": _vary_accept_encoding(headers)}
+            self.passthrough = self.encoding is None or any(name.lower() == b"content-encoding" for name, _ in headers)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._flush_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._flush_start()
+                await self.send(message)
+                return
+            self.compressor = COMPRESSORS[self.encoding](self.level)
+            if more_body:
+                await self._flush_start(None)
+            else:
+                body = self.compressor.finish(body)
+                await self._flush_start(len(body))
+                await self.send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+        body = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _flush_start(self, compressed_length: Any = False) -> None:
+        """
+        Method sending the held start message, with the compression headers when the body is compressed
+        :param compressed_length: receives False if the body is sent as is, the length of the compressed body, or None for a compressed stream
+        :return: returns nothing
+        """
+        if self.start_message is None:
+            return
+        message, self.start_message = self.start_message, None
+        if compressed_length is not False:
+            headers = [(name, _weak_etag(value) if name.lower() == b"etag" else value)
+                       for name, value in message.get("headers", []) if name.lower() != b"content-length"]
+            headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+            if compressed_length is not None:
+                headers.append((b"content-length", str(compressed_length).encode("latin-1")))
+            message = {**message, "headers": headers}
+        await self.send(message)
+
+
+def _weak_etag(etag: bytes) -> bytes:
+    """
+    Function that turns a strong entity tag into a weak one
+    :param etag: receives the value of the ETag header
+    :return: returns the weak entity tag, W/"..."
+    """
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+def _vary_accept_encoding(headers: list) -> list:
+    """
+    Function that adds Accept-Encoding to the Vary header of a response, keeping the fields it already varies on
+    :param headers: receives the headers of the response, as (name, value) byte pairs
+    :return: returns the headers with Vary naming Accept-Encoding
+    """
+    vary = [value for name, value in headers if name.lower() == b"vary"]
+    fields = [field.strip() for value in vary for field in value.split(b",") if field.strip()]
+    if any(field.lower() in (b"accept-encoding", b"*") for field in fields):
+        return headers
+    return [(name, value) for name, value in headers if name.lower() != b"vary"] + \
+        [(b"vary", b", ".join(fields + [b"Accept-Encoding"]))]
@@ -1,24 +1,108 @@
 """
 This module provides a MongoDBStore class for general CRUD operations.
 """
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Mapping
 
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.collection import Collection
 from pymongo.cursor import Cursor
-from pymongo.results import UpdateResult, InsertOneResult, DeleteResult
+from pymongo.errors import PyMongoError
+from pymongo.results import UpdateResult, InsertOneResult, InsertManyResult, DeleteResult, BulkWriteResult
 
+from utils.metrics import MONGO_METRICS, instrument_store
+from utils.query_monitor import SlowQueryMonitor, CollectionScanError, query_shape, query_shape_key, winning_plan, plan_stages
+from utils.settings import mongo_client_options, query_guard_settings
+from utils.tracing import TRACE_LISTENER, trace_methods
 
+COLLECTION_VERSIONS = "collection_versions"
+
+
+def keyset_filter(query: dict, after_id: ObjectId | None) -> dict:
+    """
+    Function that combines a query with the keyset condition used by the paged read methods
+    :param query: receives the dictionary query after which the search is going to be made
+    :param after_id: receives the ObjectId of the last document of the previous page, or None for the first page
+    :return: returns the filter selecting the documents of the query that come after after_id
+    """
+    if after_id is None:
+        return query
+    if not query:
+        return {"_id": {"$gt": after_id}}
+    return {"$and": [query, {"_id": {"$gt": after_id}}]}
+
+
+@instrument_store("sync")
+@trace_methods("store")
 class MongoDBStore:
     """
     Mongo database driver for general CRUD operations
     """
 
-    def __init__(self):
+    def __init__(self, client: MongoClient | None = None):
+        """
+        Initializing the MongoDBStore class. The pymongo MongoClient is only created on first use (or by connect) with the options of utils.settings, so importing and constructing the store opens no connection and stays safe before forking workers
+        The client reports its commands to the SlowQueryMonitor of the store, which keeps the slow query log, its commands and pool events to the Prometheus metrics of utils.metrics and its commands to the trace spans of utils.tracing
+        :param client: receives an already configured MongoClient to use, None to create one from the settings
+        """
+        self._client = client
+        self._collections = {}
+        settings = query_guard_settings()
+        self.monitor = SlowQueryMonitor(settings["slow_query_ms"], settings["slow_query_log_size"])
+        self.collscan_strict = settings["collscan_strict"]
+        self.collscan_max_documents = settings["collscan_max_documents"]
+        self._plan_checks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> MongoClient:
+        """
+        Property returning the pymongo MongoClient of the store, created on first access from mongo_client_options
+        :return: returns the MongoClient of the store
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = MongoClient(**mongo_client_options(), event_listeners=[self.monitor, MONGO_METRICS, TRACE_LISTENER])
+        return self._client
+
+    def get_collection(self, db_name: str, db_collection: str) -> Collection:
+        """
+        Method for retrieving the handle of a collection, cached so that it is resolved only once per store
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :return: returns the pymongo Collection
+        """
+        collection = self._collections.get((db_name, db_collection))
+        if collection is None:
+            collection = self._collections.setdefault((db_name, db_collection), self.client[db_name][db_collection])
+        return collection
+
+    def connect(self, connections: int | None = None) -> None:
+        """
+        Method that creates the client and pre-warms its pool with concurrent pings, used at application startup so that the first requests do not pay for the connection handshakes
+        :param connections: receives the number of concurrent pings, None uses the minimum pool size of the settings
+        :return: returns nothing, a pymongo ServerSelectionTimeoutError is raised if the server cannot be reached
+        """
+        client = self.client
+        if connections is None:
+            connections = mongo_client_options()["minPoolSize"]
+        connections = max(1, connections)
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(lambda _: client.admin.command("ping"), range(connections)))
+
+    def close(self) -> None:
         """
-        Initializing the MongoDBStore class with a pymongo MongoCLient set on localhost:27017
+        Method that closes the client and its pool, used at application shutdown. The next use of the store creates a new client
+        :return: returns nothing
         """
-        self.client = MongoClient('localhost', 27017)
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self._collections.clear()
 
     def add_document(self, db_name: str, db_collection: str, document: dict) -> InsertOneResult:
         """
@@ -28,57 +112,189 @@ class MongoDBStore:
         :param document: receives the dictionary containing the document to be added in the database and collection specified in db_name and db_collection
         :return: returns the ObjectId of the inserted document
         """
-        db = self.client[db_name]
-        collection = db[db_collection]
+        collection = self.get_collection(db_name, db_collection)
         return collection.insert_one(document)
 
-    def get_all_documents(self, db_name: str, db_collection: str) -> Cursor[Mapping[str, Any] | Any]:
+    def add_documents(self, db_name: str, db_collection: str, documents: list[dict], ordered: bool = False) -> InsertManyResult:
+        """
+        Method for adding many documents in a single insert_many round trip. Each document receives its "_id" in place, even when the insertion of another document fails
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param documents: receives the list of dictionaries containing the documents to be added
+        :param ordered: receives False (the default) to let the server insert every valid document instead of stopping at the first failure
+        :return: returns the InsertManyResult response of the pymongo library, a pymongo BulkWriteError describing the failed documents is raised if some of them could not be inserted
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.insert_many(documents, ordered=ordered)
+
+    def get_all_documents(self, db_name: str, db_collection: str, batch_size: int | None = None, projection: dict | None = None) -> Cursor[Mapping[str, Any] | Any]:
         """
         Method for retrieving all documents inside a collection that is part of a database
         :param db_name: receives the string name of the database name to be accessed
         :param db_collection: receives the string name of the collection name to be accessed
+        :param batch_size: receives the number of documents fetched per round trip while iterating the cursor, None keeps the server default
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
         :return: returns a cursor containing the documents, this return needs to be stored in a variable when calling this function
         """
-        db = self.client[db_name]
-        collection = db[db_collection]
-        return collection.find()
+        collection = self.get_collection(db_name, db_collection)
+        cursor = collection.find({}, projection)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
 
-    def get_document_by_id(self, db_name: str, db_collection: str, document_id: ObjectId) -> dict:
+    def get_document_by_id(self, db_name: str, db_collection: str, document_id: ObjectId, projection: dict | None = None) -> dict:
         """
         Method for retrieving the first document found in the mentioned database and collection that has the specified ObjectId
         :param db_name: receives the string name of the database name to be accessed
         :param db_collection: receives the string name of the collection name to be access
         :param document_id: receives the ObjectId for which the query will search in the mongo database
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
         :return: returns the document in a dictionary form of the search query made after the passed ObjectId
         """
-        db = self.client[db_name]
-        collection = db[db_collection]
-        return collection.find_one({"_id": document_id})
+        collection = self.get_collection(db_name, db_collection)
+        return collection.find_one({"_id": document_id}, projection)
+
+    def get_documents_by_ids(self, db_name: str, db_collection: str, document_ids: list[ObjectId], projection: dict | None = None) -> Cursor[Mapping[str, Any] | Any]:
+        """
+        Method for retrieving the documents that have any of the specified ObjectIds with a single $in query
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param document_ids: receives the list of ObjectIds for which the query will search in the mongo database
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns a cursor over the documents found, in no particular order, the ObjectIds that do not exist are simply absent
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.find({"_id": {"$in": document_ids}}, projection)
 
-    def get_documents_by_query(self, db_name: str, db_collection: str, query: dict) -> Cursor[Mapping[str, Any] | Any]:
+    def get_documents_by_query(self, db_name: str, db_collection: str, query: dict, batch_size: int | None = None,
+                               projection: dict | None = None) -> Cursor[Mapping[str, Any] | Any]:
         """
         Method for retrieving all the documents that match the values of each key-value pair passed in the query dictionary
         :param db_name: receives the string name of the database name to be accessed
         :param db_collection: receives the string name of the collection name to be access
         :param query: receives the dictionary query after which the search is going to be made
+        :param batch_size: receives the number of documents fetched per round trip while iterating the cursor, None keeps the server default
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
         :return: returns all the documents it find that contain the values of each key-value pair passed in the query, this return needs to be stored in a variable when calling this function
         """
-        db = self.client[db_name]
-        collection = db[db_collection]
-        return collection.find(query)
+        collection = self.get_collection(db_name, db_collection)
+        cursor = collection.find(query, projection)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    def get_all_documents_page(self, db_name: str, db_collection: str, limit: int, after_id: ObjectId | None = None,
+                               projection: dict | None = None) -> Cursor[Mapping[str, Any] | Any]:
+        """
+        Method for retrieving one page of the documents inside a collection, ordered by ObjectId. The page starts right after after_id (keyset pagination), so every page costs the same index range scan no matter how deep it is
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param limit: receives the maximum number of documents returned in the page
+        :param after_id: receives the ObjectId of the last document of the previous page, or None for the first page
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns a cursor over at most limit documents sorted ascending by ObjectId
+        """
+        return self.get_documents_by_query_page(db_name, db_collection, {}, limit, after_id, projection)
+
+    def get_documents_by_query_page(self, db_name: str, db_collection: str, query: dict, limit: int,
+                                    after_id: ObjectId | None = None, projection: dict | None = None) -> Cursor[Mapping[str, Any] | Any]:
+        """
+        Method for retrieving one page of the documents that match the query, ordered by ObjectId. The page starts right after after_id (keyset pagination)
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query after which the search is going to be made
+        :param limit: receives the maximum number of documents returned in the page
+        :param after_id: receives the ObjectId of the last document of the previous page, or None for the first page
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns a cursor over at most limit matching documents sorted ascending by ObjectId
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.find(keyset_filter(query, after_id), projection).sort("_id", ASCENDING).limit(limit)
+
+    def get_latest_documents(self, db_name: str, db_collection: str, limit: int,
+                             projection: dict | None = None) -> Cursor[Mapping[str, Any] | Any]:
+        """
+        Method for retrieving the most recently inserted documents of a collection, newest first. The ObjectIds grow with their insertion time, so the read is a backward scan of the _id index
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be accessed
+        :param limit: receives the maximum number of documents returned
+        :param projection: receives the dictionary of the fields to return (a pymongo projection), None returns the whole documents
+        :return: returns a cursor over at most limit documents sorted descending by ObjectId
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.find({}, projection).sort("_id", DESCENDING).limit(limit)
 
-    def update_document(self, db_name: str, db_collection: str, document_id: ObjectId, document: dict) -> UpdateResult:
+    def count_documents(self, db_name: str, db_collection: str, query: dict) -> int:
+        """
+        Method for counting the documents that match a query on the server, without reading them
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query after which the count is going to be made, {} counts the whole collection
+        :return: returns the number of matching documents
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.count_documents(query)
+
+    def aggregate(self, db_name: str, db_collection: str, pipeline: list[dict]) -> list[dict]:
+        """
+        Method for running an aggregation pipeline on the server, so that only its result travels over the wire
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param pipeline: receives the list of aggregation stages
+        :return: returns the documents produced by the last stage of the pipeline
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return list(collection.aggregate(pipeline))
+
+    def update_document(self, db_name: str, db_collection: str, document_id: ObjectId, document: dict,
+                        version_field: str | None = None) -> UpdateResult:
         """
         Method for updating an existing document inside the collection of the database. This method looks up the ObjectIds inside collection and after it finds the document matching the ObjectId, then it will try to overwrite existing key-value pairs and will also add new key-value pairs that the existing document might not have had it before the update
         :param db_name: receives the string name of the database name to be accessed
         :param db_collection: receives the string name of the collection name to be access
         :param document_id: receives the ObjectId of the document you wish to update in the database
         :param document: receives the dictionary of the document that you wish to update it with
+        :param version_field: receives the name of the version field of the document, incremented by the same update, or None to leave the document unversioned
         :return: returns the UpdateResult response of the pymongo library for the update operation. You can use .modified_count method to check if the update has been made
         """
-        db = self.client[db_name]
-        collection = db[db_collection]
-        return collection.update_one({"_id": document_id}, {"$set": document})
+        collection = self.get_collection(db_name, db_collection)
+        update = {"$set": document}
+        if version_field is not None:
+            update["$inc"] = {version_field: 1}
+        return collection.update_one({"_id": document_id}, update)
+
+    def get_collection_version(self, db_name: str, db_collection: str) -> int:
+        """
+        Method for reading the version of a collection, kept in the COLLECTION_VERSIONS collection of the database so that every worker reads the same one
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :return: returns the number of times bump_collection_version was called for the collection, 0 if it never was
+        """
+        document = self.get_collection(db_name, COLLECTION_VERSIONS).find_one({"_id": db_collection})
+        return 0 if document is None else document.get("version", 0)
+
+    def bump_collection_version(self, db_name: str, db_collection: str) -> int:
+        """
+        Method for incrementing the version of a collection, called after every write made to the collection
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :return: returns the version the collection was bumped to, read in the same round trip
+        """
+        document = self.get_collection(db_name, COLLECTION_VERSIONS).find_one_and_update(
+            {"_id": db_collection}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER)
+        return document["version"]
+
+    def bulk_write(self, db_name: str, db_collection: str, operations: list, ordered: bool = True) -> BulkWriteResult:
+        """
+        Method for executing a list of pymongo write operations (InsertOne, UpdateOne, DeleteOne, ...) in a single bulk_write round trip
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param operations: receives the list of pymongo write operations to be executed
+        :param ordered: receives True (the default) to stop at the first failing operation, False to let the server execute every operation
+        :return: returns the BulkWriteResult response of the pymongo library, a pymongo BulkWriteError describing the failed operations is raised if some of them could not be executed
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return collection.bulk_write(operations, ordered=ordered)
 
     def delete_document_by_id(self, db_name: str, db_collection: str, document_id: ObjectId) -> DeleteResult:
         """
@@ -88,8 +304,7 @@ class MongoDBStore:
         :param document_id: receives the ObjectId of the document you wish to delete from the database
         :return: returns the DeleteResult response of the pymongo library for the delete operation. You can use .deleted_count method to check if the deletion has been made
         """
-        db = self.client[db_name]
-        collection = db[db_collection]
+        collection = self.get_collection(db_name, db_collection)
         return collection.delete_one({"_id": document_id})
 
     def delete_document_by_query(self, db_name: str, db_collection: str, query: dict) -> DeleteResult:
@@ -100,10 +315,100 @@ class MongoDBStore:
         :param query: receives the dictionary containing the key-value pairs after which the pymongo library will search in the database
         :return: returns the DeleteResult response of the pymongo library for the delete operation. You can use .deleted_count method to check if the deletion has been made
         """
-        db = self.client[db_name]
-        collection = db[db_collection]
+        collection = self.get_collection(db_name, db_collection)
         return collection.delete_one(query)
 
+    def list_indexes(self, db_name: str, db_collection: str) -> list[dict]:
+        """
+        Method for retrieving the indexes that exist on a collection
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :return: returns the list of index descriptions ("key", "name", "unique", "partialFilterExpression", ...) as returned by the listIndexes command
+        """
+        collection = self.get_collection(db_name, db_collection)
+        return list(collection.list_indexes())
+
+    def create_indexes(self, db_name: str, db_collection: str, indexes: list[IndexModel]) -> list[str]:
+        """
+        Method for creating many indexes with a single createIndexes command. Creating an index that already exists with the same options does nothing
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param indexes: receives the list of pymongo IndexModel describing the indexes
+        :return: returns the names of the created indexes
+        """
+        collection = self.get_collection(db_name, db_collection)
+        self._plan_checks.clear()
+        return collection.create_indexes(indexes)
+
+    def drop_index(self, db_name: str, db_collection: str, index_name: str) -> None:
+        """
+        Method for dropping an index by its name
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param index_name: receives the name of the index to be dropped
+        :return: returns nothing, a pymongo OperationFailure is raised if the index does not exist
+        """
+        collection = self.get_collection(db_name, db_collection)
+        self._plan_checks.clear()
+        collection.drop_index(index_name)
+
+    def explain_query(self, db_name: str, db_collection: str, query: dict) -> dict:
+        """
+        Method for retrieving the plan Mongo picks for a query, without executing it (queryPlanner verbosity)
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query to be explained
+        :return: returns the winning plan of the query, a tree of stages such as IXSCAN, FETCH or COLLSCAN
+        """
+        return self.explain_command(db_name, {"find": db_collection, "filter": query})
+
+    def explain_command(self, db_name: str, command: dict) -> dict:
+        """
+        Method for retrieving the plan Mongo picks for a command (find, aggregate, count, distinct, update, delete or findAndModify), without executing it (queryPlanner verbosity)
+        :param db_name: receives the string name of the database name to be accessed
+        :param command: receives the command to be explained, see utils.query_monitor.explain_command
+        :return: returns the winning plan of the command, a tree of stages such as IXSCAN, FETCH or COLLSCAN
+        """
+        explain = self.client[db_name].command("explain", command, verbosity="queryPlanner")
+        return winning_plan(explain)
+
+    def check_query_plan(self, db_name: str, db_collection: str, query: dict) -> None:
+        """
+        Method that rejects, in strict mode, a query planned as a collection scan over more than collscan_max_documents documents. The plan is explained once per query shape, until the indexes of the store change. An empty query reads the whole collection on purpose and is always allowed
+        :param db_name: receives the string name of the database name to be accessed
+        :param db_collection: receives the string name of the collection name to be access
+        :param query: receives the dictionary query about to be executed
+        :return: returns nothing, a CollectionScanError is raised if the query is rejected
+        """
+        if not self.collscan_strict or not query:
+            return
+        key = (db_name, db_collection, query_shape_key(query))
+        scans = self._plan_checks.get(key)
+        if scans is None:
+            scans = "COLLSCAN" in plan_stages(self.explain_query(db_name, db_collection, query))
+            if len(self._plan_checks) >= 1000:
+                self._plan_checks.clear()
+            self._plan_checks[key] = scans
+        if scans:
+            count = self.get_collection(db_name, db_collection).estimated_document_count()
+            if count > self.collscan_max_documents:
+                raise CollectionScanError(f"Error! The query {query_shape(query)} scans the whole collection of {count} documents, "
+                                          f"add an index or narrow the query")
+
+    def get_slow_queries(self) -> list[dict]:
+        """
+        Method for retrieving the slow query log of the store, each entry completed on first read with the winning plan of its recorded command, explained as the command it was (find, aggregate, count, update...). It runs explains, so the sync store is called off the event loop
+        :return: returns the slow queries, the most recent first, with their command, collection, filter shape, filter, duration, explained command and winning plan
+        """
+        entries = self.monitor.snapshot()
+        for entry in entries:
+            if "winning_plan" not in entry:
+                try:
+                    entry["winning_plan"] = self.explain_command(entry["database"], entry["explain_command"])
+                except PyMongoError as e:
+                    entry["winning_plan"] = {"error": str(e)}
+        return entries
+
     def initialize_database(self, db_name: str, db_collection: str):
         """
         Method that can be used to cycle a basic CRUD operation cycle on a specified collection part of a specified database
@@ -0,0 +1,57 @@
+"""
+This module provides the readiness state of a worker process, reported by the /readyz endpoint.
+
+A worker is live as soon as it answers, but it is only ready once the lifespan of the application has opened its Mongo
+connection pool and warmed it up, so that a load balancer probing /readyz sends it traffic only when its first requests
+no longer pay for the connection handshakes, the model building and the cold caches.
+"""
+import threading
+import time
+
+
+class Readiness:
+    """
+    Readiness of the worker process: not ready until the warm-up of the lifespan is done, and not ready again once the
+    worker shuts down.
+    """
+
+    def __init__(self):
+        """
+        Initializing the Readiness class, not ready
+        """
+        self.ready = False
+        self.warmup = None
+        self._since = None
+        self._lock = threading.Lock()
+
+    def mark_ready(self, warmup: dict | None = None) -> None:
+        """
+        Method marking the worker ready to serve
+        :param warmup: receives the report of the warm-up, None when it was disabled
+        :return: returns nothing
+        """
+        with self._lock:
+            self.warmup = warmup
+            self._since = time.time()
+            self.ready = True
+
+    def mark_not_ready(self) -> None:
+        """
+        Method marking the worker not ready, when it starts again or shuts down
+        :return: returns nothing
+        """
+        with self._lock:
+            self.ready = False
+            self._since = None
+
+    def status(self) -> dict:
+        """
+        Method returning the readiness of the worker, answered by /readyz
+        :return: returns whether the worker is ready (ready), the number of seconds since it is (uptime) and the report of its warm-up (warmup)
+        """
+        with self._lock:
+            return {"ready": self.ready, "uptime": round(time.time() - self._since, 3) if self.ready else None,
+                    "warmup": self.warmup}
+
+
+READINESS = Readiness()
@@ -0,0 +1,84 @@
+"""
+This module compares the declared indexes of a collection with the ones that exist in Mongo, and provides the command line used to report and reconcile them.
+
+Usage:
+    python -m utils.indexes drift
+    python -m utils.indexes reconcile [--drop-extra]
+"""
+import argparse
+import json
+from typing import Mapping
+
+from pymongo import IndexModel
+
+
+def index_signature(index: Mapping) -> tuple:
+    """
+    Function that reduces an index description to the options that make two indexes equivalent
+    :param index: receives the index description, a listIndexes entry or the document of a pymongo IndexModel
+    :return: returns the keys with their direction, the unique flag and the partial filter of the index
+    """
+    keys = tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in index["key"].items())
+    return keys, bool(index.get("unique", False)), index.get("partialFilterExpression")
+
+
+def index_drift(declared: list[IndexModel], actual: list[dict]) -> dict:
+    """
+    Function that compares the declared indexes with the indexes that exist on the collection. The "_id_" index is ignored
+    :param declared: receives the pymongo IndexModel of the declared indexes
+    :param actual: receives the listIndexes descriptions of the existing indexes
+    :return: returns the names of the missing, changed (same name, other keys or options) and extra (not declared) indexes and whether the collection is in sync
+    """
+    existing = {index["name"]: index for index in actual if index["name"] != "_id_"}
+    missing, changed = [], []
+    for index in declared:
+        current = existing.pop(index.document["name"], None)
+        if current is None:
+            missing.append(index.document["name"])
+        elif index_signature(current) != index_signature(index.document):
+            changed.append(index.document["name"])
+    extra = list(existing)
+    return {"missing": missing, "changed": changed, "extra": extra, "in_sync": not (missing or changed or extra)}
+
+
+def reconcile_declared_indexes(drop_extra: bool = False) -> dict:
+    """
+    Function that reconciles the declared indexes of the Sablon collection once, with its own Mongo client closed afterwards.
+    It is run by the server supervisor before the workers start, so that they do not race to build the same indexes
+    :param drop_extra: receives whether the existing indexes that are not declared are dropped as well
+    :return: returns the reconciliation result of SablonServices.reconcile_indexes
+    """
+    from services.sablon_services import SablonServices  # pylint: disable=import-outside-toplevel
+
+    sablon_services = SablonServices()
+    try:
+        return sablon_services.reconcile_indexes(drop_extra=drop_extra)
+    finally:
+        sablon_services.db.close()
+
+
+def main() -> None:
+    """
+    Command line entry point, prints the drift report or the reconciliation result of the Sablon collection as JSON
+    """
+    from services.sablon_services import SablonServices  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description="Report or reconcile the declared indexes of the Sablon collection")
+    parser.add_argument("command", choices=("drift", "reconcile"))
+    parser.add_argument("--drop-extra", action="store_true", help="also drop the existing indexes that are not declared")
+    args = parser.parse_args()
+
+    if args.command == "drift":
+        sablon_services = SablonServices()
+        result = sablon_services.get_index_drift()
+        sablon_services.db.close()
+    else:
+        result = reconcile_declared_indexes(drop_extra=args.drop_extra)
+    print(json.dumps(result, indent=4, default=str))
+    if result.get("error") is not None:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+This module provides the Prometheus metrics of the application: the requests of every route (ASGI middleware), the Mongo
+commands and connection pool (pymongo listener), the MongoDBStore methods (class decorator) and the caches of the
+service (collector read at scrape time).
+
+The metrics are registered in the default prometheus_client registry and exposed by the /metrics endpoint. On the hot
+path an observation is a clock read and a counter increment on a label child bound in advance, the cache counters cost
+nothing until they are scraped.
+
+When the server runs several worker processes, prometheus_client runs in multiprocess mode: every worker writes its
+metrics to files of the PROMETHEUS_MULTIPROC_DIR directory, and a scrape answered by any worker aggregates the files of
+all of them. The cache counters are not written to files, a scrape reports those of the worker answering it.
+"""
+import contextlib
+import functools
+import inspect
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Iterator
+
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, \
+    generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+# Latency buckets in seconds, from half a millisecond (a cached read) to 10 seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = "unmatched"
+
+HTTP_REQUESTS = Counter("sablon_http_requests", "HTTP requests by route, method and status code",
+                        ["method", "route", "status"])
+HTTP_REQUEST_DURATION = Histogram("sablon_http_request_duration_seconds", "HTTP request latency by route and method",
+                                  ["method", "route"], buckets=LATENCY_BUCKETS)
+HTTP_REQUESTS_IN_PROGRESS = Gauge("sablon_http_requests_in_progress", "HTTP requests being served by method",
+                                  ["method"], multiprocess_mode="livesum")
+STORE_OPERATION_DURATION = Histogram("sablon_store_operation_duration_seconds", "Store method latency",
+                                     ["store", "method"], buckets=LATENCY_BUCKETS)
+STORE_OPERATION_ERRORS = Counter("sablon_store_operation_errors", "Store method calls that raised",
+                                 ["store", "method"])
+MONGO_COMMAND_DURATION = Histogram("sablon_mongo_command_duration_seconds", "Mongo command latency by command name",
+                                   ["command"], buckets=LATENCY_BUCKETS)
+MONGO_COMMAND_FAILURES = Counter("sablon_mongo_command_failures", "Mongo commands that failed by command name",
+                                 ["command"])
+MONGO_POOL_CHECKOUT_WAIT = Histogram("sablon_mongo_pool_checkout_wait_seconds",
+                                     "Time spent waiting for a connection of the pool", buckets=LATENCY_BUCKETS)
+MONGO_POOL_CHECKOUT_FAILURES = Counter("sablon_mongo_pool_checkout_failures",
+                                       "Connection checkouts that failed by reason", ["reason"])
+MONGO_POOL_CONNECTIONS = Gauge("sablon_mongo_pool_connections", "Open connections of the pools",
+                               multiprocess_mode="livesum")
+MONGO_POOL_CHECKED_OUT = Gauge("sablon_mongo_pool_checked_out", "Connections of the pools in use",
+                               multiprocess_mode="livesum")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing the HTTP requests.
+
+    The route label is the path template of the matched route ("/sablon/sabloane/{input_data}"), read from the scope once
+    the router matched it, so that the label set stays bounded whatever the requested paths. The route is not known
+    before the request is routed, so the in-progress gauge is labelled by method only. The duration runs until the last
+    body message is sent, streamed responses included.
+    """
+
+    def __init__(self, app: Callable):
+        """
+        Initializing the MetricsMiddleware class
+        :param app: receives the wrapped ASGI application
+        """
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """
+        Method called by the ASGI server for every connection
+        :param scope: receives the connection scope
+        :param receive: receives the function reading the messages of the client
+        :param send: receives the function sending the messages of the response
+        :return: returns nothing
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", UNMATCHED_ROUTE)
+            HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+
+class MongoMetricsListener(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """
+    pymongo listener timing the commands and the connection checkouts, and tracking the size of the pools.
+
+    A checkout starts and ends on the thread asking for the connection (motor runs pymongo on its executor threads),
+    so its start time is kept in a thread local.
+    """
+
+    def __init__(self):
+        """
+        Initializing the MongoMetricsListener class
+        """
+        self._checkout = threading.local()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """
+        Method called by pymongo when a command starts, nothing to record before it ends
+        :param event: receives the pymongo CommandStartedEvent
+        :return: returns nothing
+        """
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """
+        Method called by pymongo when a command succeeds, recording its duration
+        :param event: receives the pymongo CommandSucceededEvent
+        :return: returns nothing
+        """
+        MONGO_COMMAND_DURATION.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """
+        Method called by pymongo when a command fails, recording its duration and the failure
+        :param event: receives the pymongo CommandFailedEvent
+        :return: returns nothing
+        """
+        MONGO_COMMAND_DURATION.labels(event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name).inc()
+
+    def connection_check_out_started(self, event: monitoring.ConnectionCheckOutStartedEvent) -> None:
+        """
+        Method called by pymongo when a thread starts waiting for a connection
+        :param event: receives the pymongo ConnectionCheckOutStartedEvent
+        :return: returns nothing
+        """
+        self._checkout.started = time.perf_counter()
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        """
+        Method called by pymongo when a thread got its connection, recording the wait
+        :param event: receives the pymongo ConnectionCheckedOutEvent
+        :return: returns nothing
+        """
+        self._observe_checkout()
+        MONGO_POOL_CHECKED_OUT.inc()
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        """
+        Method called by pymongo when a thread could not get a connection, recording the wait and the reason
+        :param event: receives the pymongo ConnectionCheckOutFailedEvent
+        :return: returns nothing
+        """
+        self._observe_checkout()
+        MONGO_POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_in(self, event: monitoring.ConnectionCheckedInEvent) -> None:
+        """
+        Method called by pymongo when a connection is given back to the pool
+        :param event: receives the pymongo ConnectionCheckedInEvent
+        :return: returns nothing
+        """
+        MONGO_POOL_CHECKED_OUT.dec()
+
+    def connection_created(self, event: monitoring.ConnectionCreatedEvent) -> None:
+        """
+        Method called by pymongo when the pool opens a connection
+        :param event: receives the pymongo ConnectionCreatedEvent
+        :return: returns nothing
+        """
+        MONGO_POOL_CONNECTIONS.inc()
+
+    def connection_closed(self, event: monitoring.ConnectionClosedEvent) -> None:
+        """
+        Method called by pymongo when the pool closes a connection
+        :param event: receives the pymongo ConnectionClosedEvent
+        :return: returns nothing
+        """
+        MONGO_POOL_CONNECTIONS.dec()
+
+    def _observe_checkout(self) -> None:
+        """
+        Records the wait of the checkout started on the current thread
+        """
+        started = getattr(self._checkout, "started", None)
+        if started is not None:
+            MONGO_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self._checkout.started = None
+
+    # The other pool events do not change the metrics
+    def pool_created(self, event: monitoring.PoolCreatedEvent) -> None:  # pylint: disable=missing-function-docstring
+        pass
+
+    def pool_ready(self, event: monitoring.PoolReadyEvent) -> None:  # pylint: disable=missing-function-docstring
+        pass
+
+    def pool_cleared(self, event: monitoring.PoolClearedEvent) -> None:  # pylint: disable=missing-function-docstring
+        pass
+
+    def pool_closed(self, event: monitoring.PoolClosedEvent) -> None:  # pylint: disable=missing-function-docstring
+        pass
+
+    def connection_ready(self, event: monitoring.ConnectionReadyEvent) -> None:  # pylint: disable=missing-function-docstring
+        pass
+
+
+MONGO_METRICS = MongoMetricsListener()
+
+
+def instrument_store(store: str) -> Callable[[type], type]:
+    """
+    Class decorator timing every public method of a store and counting the calls that raise
+    The methods returning a cursor are timed until the cursor is returned, the round trips fetching its documents are
+    timed by the Mongo command metrics
+    :param store: receives the value of the "store" label, e.g. "sync" or "async"
+    :return: returns the decorator, which replaces the public methods of the class in place
+    """
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.isfunction(method):
+                continue
+            setattr(cls, name, _timed(method, STORE_OPERATION_DURATION.labels(store, name),
+                                      STORE_OPERATION_ERRORS.labels(store, name)))
+        return cls
+    return decorate
+
+
+def _timed(method: Callable, duration: Any, errors: Any) -> Callable:
+    """
+    Wraps a method with the label children of its metrics, bound once so that a call only observes them
+    """
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def timed_coroutine(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - start)
+        return timed_coroutine
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - start)
+    return timed
+
+
+class CacheCollector:
+    """
+    Collector reading the counters of the caches of the service when the metrics are scraped.
+    """
+
+    def __init__(self, get_stats: Callable[[], dict]):
+        """
+        Initializing the CacheCollector class
+        :param get_stats: receives the function returning the stats of every cache by name, e.g. get_cache_stats of the service
+        """
+        self.get_stats = get_stats
+
+    def collect(self):
+        """
+        Method called by the registry on every scrape
+        :return: returns the metric families of the caches
+        """
+        hits = CounterMetricFamily("sablon_cache_hits", "Cache lookups served from the cache", labels=["cache"])
+        misses = CounterMetricFamily("sablon_cache_misses", "Cache lookups that missed", labels=["cache"])
+        evictions = CounterMetricFamily("sablon_cache_evictions", "Cache entries evicted for room", labels=["cache"])
+        ratio = GaugeMetricFamily("sablon_cache_hit_ratio", "Share of the cache lookups served from the cache",
+                                  labels=["cache"])
+        size = GaugeMetricFamily("sablon_cache_entries", "Entries held by the cache", labels=["cache"])
+        for name, stats in self.get_stats().items():
+            hits.add_metric([name], stats["hits"] + stats.get("stale_hits", 0))
+            misses.add_metric([name], stats["misses"])
+            evictions.add_metric([name], stats.get("evictions", 0))
+            ratio.add_metric([name], stats["hit_ratio"])
+            size.add_metric([name], stats["size"])
+        return [hits, misses, evictions, ratio, size]
+
+
+_cache_collector = None
+
+
+def register_cache_collector(get_stats: Callable[[], dict]) -> None:
+    """
+    Function that registers the collector of the caches, replacing the one registered before if any
+    :param get_stats: receives the function returning the stats of every cache by name
+    :return: returns nothing
+    """
+    global _cache_collector  # pylint: disable=global-statement
+    if _cache_collector is not None:
+        REGISTRY.unregister(_cache_collector)
+    _cache_collector = CacheCollector(get_stats)
+    REGISTRY.register(_cache_collector)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Function that renders every registered metric in the Prometheus text format, aggregated over the worker processes in multiprocess mode
+    :return: returns the body and its content type
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if _cache_collector is not None:
+        registry.register(_cache_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+@contextlib.contextmanager
+def multiprocess_metrics(enabled: bool = True) -> Iterator[None]:
+    """
+    Context manager switching the worker processes started within it to the multiprocess mode of prometheus_client.
+
+    The mode is read when prometheus_client is imported, so it only applies to processes spawned afterwards. A
+    PROMETHEUS_MULTIPROC_DIR set beforehand is used as is, otherwise an empty directory is created and deleted on exit.
+    :param enabled: receives whether the multiprocess mode is used, the context manager does nothing otherwise
+    :return: returns nothing
+    """
+    if not enabled or os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        yield
+        return
+    directory = tempfile.mkdtemp(prefix="sablon-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    try:
+        yield
+    finally:
+        del os.environ["PROMETHEUS_MULTIPROC_DIR"]
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def mark_worker_dead(pid: int) -> None:
+    """
+    Function that drops the live gauges of a worker process that exited, in multiprocess mode
+    :param pid: receives the process id of the worker
+    :return: returns nothing
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,372 @@
+"""
+This module provides the opt-in request profiler: an ASGI middleware running a request under a profiler when an admin
+asks for it, with the X-Sablon-Profile header or the profile query parameter, or for a sampled share of the requests.
+
+The profile is either answered instead of the response ("return") or written to a directory keeping the most recent
+profiles only ("save", the mode of the sampled requests). The sampling profiler is pyinstrument (optional dependency),
+which follows the awaits of the request, the deterministic profiler is cProfile. Both only see the thread they are
+started on, so the work a request hands to the thread pool is wrapped with profiled, which profiles it in its worker
+thread and merges it into the profile of the request. The middleware is only installed when an admin token or a sample
+rate is configured, so that a disabled profiler costs nothing.
+"""
+import asyncio
+import cProfile
+import functools
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs
+
+try:
+    from pyinstrument import Profiler, renderers
+    from pyinstrument.session import Session
+except ImportError:  # pragma: no cover
+    Profiler = renderers = Session = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("return", "save")
+PROFILE_PREFIX = "sablon-profile-"
+
+# The profiler of the request being profiled, seen by the code the request runs
+_request_profiler: ContextVar[Optional["SamplingProfiler | DeterministicProfiler"]] = \
+    ContextVar("sablon_request_profiler", default=None)
+
+
+class SamplingProfiler:
+    """
+    pyinstrument profiler sampling the stack every millisecond, following the request across its awaits only. The
+    sessions of the work run in worker threads by run are merged into its profile.
+    """
+
+    extension = "html"
+
+    def __init__(self, interval: float = 0.001):
+        """
+        Initializing the SamplingProfiler class
+        :param interval: receives the sampling interval in seconds
+        """
+        self.interval = interval
+        self._profiler = Profiler(interval=interval, async_mode="enabled")
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Method starting the profiler
+        :return: returns nothing
+        """
+        self._profiler.start()
+
+    def stop(self) -> None:
+        """
+        Method stopping the profiler
+        :return: returns nothing
+        """
+        self._profiler.stop()
+
+    def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Method running a function under a profiler of the current thread, merged into this profile once it returns
+        :param function: receives the function, run in a worker thread
+        :param args: receives the arguments of the function
+        :return: returns the result of the function
+        """
+        profiler = Profiler(interval=self.interval, async_mode="disabled")
+        profiler.start()
+        try:
+            return function(*args)
+        finally:
+            session = profiler.stop()
+            with self._lock:
+                self._sessions.append(session)
+
+    def text(self) -> str:
+        """
+        Method rendering the profile as a call tree
+        :return: returns the text of the profile
+        """
+        return renderers.ConsoleRenderer(unicode=True, color=False).render(self._session())
+
+    def save(self, path: str) -> None:
+        """
+        Method writing the profile as an interactive HTML page
+        :param path: receives the path of the file
+        :return: returns nothing
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(renderers.HTMLRenderer().render(self._session()))
+
+    def _session(self) -> "Session":
+        """
+        Merges the session of the request with the sessions of its worker threads
+        """
+        return functools.reduce(Session.combine, self._sessions, self._profiler.last_session)
+
+
+class DeterministicProfiler:
+    """
+    cProfile profiler recording every call. It profiles the event loop thread as a whole, so the requests served while
+    the profiled one awaits show up in its profile. The profiles of the work run in worker threads by run are merged
+    into it.
+    """
+
+    extension = "prof"
+
+    def __init__(self, limit: int = 60):
+        """
+        Initializing the DeterministicProfiler class
+        :param limit: receives the number of functions listed by text
+        """
+        self._profiler = cProfile.Profile()
+        self.limit = limit
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Method starting the profiler
+        :return: returns nothing
+        """
+        self._profiler.enable()
+
+    def stop(self) -> None:
+        """
+        Method stopping the profiler
+        :return: returns nothing
+        """
+        self._profiler.disable()
+
+    def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Method running a function under a profiler of the current thread, merged into this profile once it returns
+        :param function: receives the function, run in a worker thread
+        :param args: receives the arguments of the function
+        :return: returns the result of the function
+        """
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # From Python 3.12 cProfile hooks sys.monitoring, a single profiler runs at a time and it sees every thread
+            return function(*args)
+        try:
+            return function(*args)
+        finally:
+            profiler.disable()
+            with self._lock:
+                self._threads.append(profiler)
+
+    def text(self) -> str:
+        """
+        Method rendering the profile as the functions with the highest cumulative time
+        :return: returns the text of the profile
+        """
+        stream = io.StringIO()
+        pstats.Stats(self._profiler, *self._threads, stream=stream).sort_stats("cumulative").print_stats(self.limit)
+        return stream.getvalue()
+
+    def save(self, path: str) -> None:
+        """
+        Method writing the profile in the pstats format, read by pstats, snakeviz or gprof2dot
+        :param path: receives the path of the file
+        :return: returns nothing
+        """
+        pstats.Stats(self._profiler, *self._threads).dump_stats(path)
+
+
+PROFILERS = {"sampling": SamplingProfiler, "deterministic": DeterministicProfiler}
+
+
+def default_profiler() -> str:
+    """
+    Function that picks the profiler used when none is configured
+    :return: returns "sampling" when pyinstrument is installed, "deterministic" otherwise
+    """
+    return "sampling" if Profiler is not None else "deterministic"
+
+
+def profiled(function: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Function that wraps a function the request hands to a worker thread, so that it shows up in the profile of the
+    request when the request is profiled
+    :param function: receives the function, called from the request before it is handed to the thread pool
+    :return: returns the function run under a profiler of its worker thread, or the function itself when the request is not profiled
+    """
+    profiler = _request_profiler.get()
+    if profiler is None:
+        return function
+    return functools.partial(profiler.run, function)
+
+
+def prune_profiles(directory: str, keep: int) -> list[str]:
+    """
+    Function that deletes the oldest saved profiles beyond the retention limit
+    :param directory: receives the directory of the saved profiles
+    :param keep: receives the number of profiles kept
+    :return: returns the names of the deleted files
+    """
+    names = sorted(name for name in os.listdir(directory) if name.startswith(PROFILE_PREFIX))
+    deleted = names[:max(0, len(names) - keep)]
+    for name in deleted:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware running the requests an admin asks for, and a sampled share of the others, under a profiler.
+
+    An admin asks for a profile with the X-Sablon-Profile header, or the profile query parameter, set to "return" (the
+    response is replaced by the profile, the status of the handler is kept in X-Sablon-Profile-Status) or "save" (the
+    profile is written to the directory, its name is answered in X-Sablon-Profile-File), along with the admin token in
+    the X-Sablon-Admin-Token header. Requests without a valid token are served as usual. A single request is profiled
+    at a time: an admin asking for a profile meanwhile is answered X-Sablon-Profile: busy, a request sampled meanwhile
+    is served without a profile, so that nothing tells the other clients that a profiler runs.
+    """
+
+    def __init__(self, app: Callable, admin_token: Optional[str] = None, sample_rate: float = 0.0,
+                 profiler: Optional[str] = None, directory: str = "profiles", keep: int = 100):
+        """
+        Initializing the ProfilerMiddleware class
+        :param app: receives the wrapped ASGI application
+        :param admin_token: receives the token the on-demand profiles require, None to disable them
+        :param sample_rate: receives the share of the requests profiled and saved, from 0 to 1
+        :param profiler: receives "sampling" or "deterministic", None for the default profiler
+        :param directory: receives the directory the profiles are saved to, created when missing
+        :param keep: receives the number of saved profiles kept, the oldest ones are deleted beyond it
+        """
+        profiler = profiler or default_profiler()
+        if profiler not in PROFILERS:
+            raise ValueError(f"Error! Unknown profiler '{profiler}', expected {list(PROFILERS)}")
+        if profiler == "sampling" and Profiler is None:
+            raise ValueError("Error! The sampling profiler needs pyinstrument, install it or use 'deterministic'")
+        self.app = app
+        self.admin_token = admin_token.encode("latin-1") if admin_token else None
+        self.sample_rate = sample_rate
+        self.profiler = PROFILERS[profiler]
+        self.directory = directory
+        self.keep = keep
+        self._active = False
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """
+        Method called by the ASGI server for every connection
+        :param scope: receives the connection scope
+        :param receive: receives the function reading the messages of the client
+        :param send: receives the function sending the messages of the response
+        :return: returns nothing
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = self._requested_mode(scope) if self.admin_token is not None else None
+        requested = mode is not None
+        if mode is None and self.sample_rate and random.random() < self.sample_rate:
+            mode = "save"
+        if mode is None or (self._active and not requested):
+            await self.app(scope, receive, send)
+            return
+        if self._active:
+            await self.app(scope, receive, _with_headers(send, [(b"x-sablon-profile", b"busy")]))
+            return
+
+        self._active = True
+        try:
+            if mode == "return":
+                await self._return_profile(scope, receive, send)
+            else:
+                await self._save_profile(scope, receive, send)
+        finally:
+            self._active = False
+
+    def _requested_mode(self, scope: dict) -> Optional[str]:
+        """
+        Reads the profile mode an admin asked for, None when the request asks for none or has no valid token
+        """
+        headers = dict(scope.get("headers") or [])
+        mode = headers.get(b"x-sablon-profile", b"").decode("latin-1").strip().lower()
+        if not mode and b"profile=" in scope.get("query_string", b""):
+            mode = parse_qs(scope["query_string"].decode("latin-1")).get("profile", [""])[0].strip().lower()
+        if mode not in PROFILE_MODES:
+            return None
+        if not hmac.compare_digest(headers.get(b"x-sablon-admin-token", b""), self.admin_token):
+            return None
+        return mode
+
+    async def _return_profile(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """
+        Runs the request under the profiler and answers the text of the profile instead of the response
+        """
+        status = 500
+
+        async def discard(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        profiler = self.profiler()
+        token = _request_profiler.set(profiler)
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+            _request_profiler.reset(token)
+        body = profiler.text().encode("utf-8")
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"x-sablon-profile-status", str(status).encode("latin-1")),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _save_profile(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """
+        Runs the request under the profiler and writes the profile to the directory once the response is sent
+        """
+        path = re.sub(r"[^A-Za-z0-9_.-]+", "_", scope["path"]).strip("_")[:80]
+        name = f"{PROFILE_PREFIX}{time.time_ns():020d}-{scope['method']}-{path}.{self.profiler.extension}"
+        profiler = self.profiler()
+        token = _request_profiler.set(profiler)
+        profiler.start()
+        try:
+            await self.app(scope, receive, _with_headers(send, [(b"x-sablon-profile-file", name.encode("latin-1"))]))
+        finally:
+            profiler.stop()
+            _request_profiler.reset(token)
+        # Rendering and writing a profile takes milliseconds, it is kept off the event loop
+        await asyncio.to_thread(self._write, profiler, name)
+
+    def _write(self, profiler: SamplingProfiler | DeterministicProfiler, name: str) -> None:
+        """
+        Writes a profile to the directory and deletes the oldest profiles beyond the retention limit
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.save(os.path.join(self.directory, name))
+            prune_profiles(self.directory, self.keep)
+        except OSError as e:
+            logger.warning("Profile save failed: %s", e)
+
+
+def _with_headers(send: Callable, headers: list[tuple[bytes, bytes]]) -> Callable:
+    """
+    Wraps the send function of a response to add headers to its start message
+    """
+    async def send_with_headers(message: dict) -> None:
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": [*message.get("headers", []), *headers]}
+        await send(message)
+    return send_with_headers
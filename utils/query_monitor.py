@@ -0,0 +1,194 @@
+"""
+This module provides the pymongo command listener recording the slow queries of a MongoDBStore, and the helpers used to inspect their explain plans.
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from pymongo import monitoring
+
+# The filter of each monitored command, by command name
+_FILTER_GETTERS = {
+    "find": lambda command: command.get("filter", {}),
+    "count": lambda command: command.get("query", {}),
+    "distinct": lambda command: command.get("query", {}),
+    "findAndModify": lambda command: command.get("query", {}),
+    "delete": lambda command: command.get("deletes", [{}])[0].get("q", {}),
+    "update": lambda command: command.get("updates", [{}])[0].get("q", {}),
+    "aggregate": lambda command: next((stage["$match"] for stage in command.get("pipeline", []) if "$match" in stage), {}),
+}
+
+# The fields of each monitored command that its plan depends on, the ones an explain of the command keeps
+_EXPLAIN_FIELDS = {
+    "find": ("filter", "sort", "projection", "hint", "skip", "limit", "collation"),
+    "count": ("query", "hint", "skip", "limit", "collation"),
+    "distinct": ("key", "query", "collation"),
+    "findAndModify": ("query", "sort", "update", "remove", "upsert", "collation"),
+    "delete": ("deletes",),
+    "update": ("updates",),
+    "aggregate": ("pipeline", "hint", "collation"),
+}
+
+
+class CollectionScanError(ValueError):
+    """
+    Raised in strict mode when a query would scan a whole collection holding more documents than allowed
+    """
+
+
+def query_shape(value: Any) -> Any:
+    """
+    Function that reduces a query to its shape: the keys and operators are kept and every value is replaced by its type name, so that queries differing only by their values share a shape
+    :param value: receives the query, or a value inside it
+    :return: returns the shape of the value
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(item) for item in value]
+    return type(value).__name__
+
+
+def query_shape_key(query: dict) -> str:
+    """
+    Function that serializes the shape of a query, used as a dictionary key
+    :param query: receives the query
+    :return: returns the canonical JSON of the shape of the query
+    """
+    return json.dumps(query_shape(query), sort_keys=True)
+
+
+def explain_command(command_name: str, command: dict) -> dict:
+    """
+    Function that builds the command explaining a monitored command: its name and collection with the fields its plan depends on, the first statement only of a multi-statement update or delete
+    :param command_name: receives the name of the command, e.g. "find" or "aggregate"
+    :param command: receives the command sent by the driver
+    :return: returns the command to pass to explain, without the session and driver fields
+    """
+    explained = {command_name: command.get(command_name)}
+    for field in _EXPLAIN_FIELDS.get(command_name, ()):
+        if field in command:
+            explained[field] = list(command[field][:1]) if field in ("deletes", "updates") else command[field]
+    if command_name == "aggregate":
+        explained["cursor"] = {}
+    return explained
+
+
+def winning_plan(explain: dict) -> dict:
+    """
+    Function that extracts the winning plan from the output of an explain command, for the classic and the slot based query engines, the plan of an aggregate being the one of its first ($cursor) stage when the pipeline is not pushed down
+    :param explain: receives the output of the explain command
+    :return: returns the winning plan, a tree of stages linked by "inputStage"/"inputStages"
+    """
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        planner = next(iter(explain.get("stages") or [{}])).get("$cursor", {}).get("queryPlanner", {})
+    plan = planner.get("winningPlan", {})
+    return plan.get("queryPlan", plan)
+
+
+def plan_stages(plan: dict) -> set[str]:
+    """
+    Function that lists the stages of a plan, e.g. {"FETCH", "IXSCAN"} or {"COLLSCAN"}
+    :param plan: receives the winning plan
+    :return: returns the names of every stage of the plan tree
+    """
+    stages = {plan["stage"]} if "stage" in plan else set()
+    children = plan.get("inputStages", []) + ([plan["inputStage"]] if "inputStage" in plan else [])
+    for child in children:
+        stages |= plan_stages(child)
+    return stages
+
+
+class SlowQueryMonitor(monitoring.CommandListener):
+    """
+    pymongo command listener keeping the most recent queries slower than a threshold, with the shape of their filter.
+
+    The listener only records what the driver reports, with the command explaining each entry ("explain_command", see
+    explain_command). The explain plan of an entry is added later by the store that owns it, because a listener must not
+    issue commands itself.
+    """
+
+    def __init__(self, threshold_ms: float, maxlen: int):
+        """
+        Initializing the SlowQueryMonitor class
+        :param threshold_ms: receives the duration, in milliseconds, from which a query is recorded
+        :param maxlen: receives the number of slow queries kept, the oldest ones are dropped beyond it
+        """
+        self.threshold_ms = threshold_ms
+        self.entries = deque(maxlen=maxlen)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """
+        Method called by pymongo when a command starts, remembering the filter of the monitored commands
+        :param event: receives the pymongo CommandStartedEvent
+        :return: returns nothing
+        """
+        getter = _FILTER_GETTERS.get(event.command_name)
+        if getter is None:
+            return
+        try:
+            query = getter(event.command)
+        except (AttributeError, IndexError, KeyError, TypeError):
+            query = {}
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command.get(event.command_name), query,
+                                                                      explain_command(event.command_name, event.command))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """
+        Method called by pymongo when a command succeeds, recording it if it was slow
+        :param event: receives the pymongo CommandSucceededEvent
+        :return: returns nothing
+        """
+        self._finish(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """
+        Method called by pymongo when a command fails, recording it if it was slow
+        :param event: receives the pymongo CommandFailedEvent
+        :return: returns nothing
+        """
+        self._finish(event, failed=True)
+
+    def _finish(self, event: monitoring.CommandSucceededEvent | monitoring.CommandFailedEvent, failed: bool) -> None:
+        """
+        Records a finished command started with a monitored name, if it lasted at least threshold_ms
+        """
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+            duration_ms = event.duration_micros / 1000
+            if pending is None or duration_ms < self.threshold_ms:
+                return
+            database, collection, query, explain = pending
+            self.entries.append({
+                "command": event.command_name,
+                "database": database,
+                "collection": collection,
+                "filter_shape": query_shape(query),
+                "filter": query,
+                "duration_ms": round(duration_ms, 3),
+                "failed": failed,
+                "at": time.time(),
+                "explain_command": explain,
+            })
+
+    def snapshot(self) -> list[dict]:
+        """
+        Method for reading the recorded slow queries
+        :return: returns the slow queries, the most recent first
+        """
+        with self._lock:
+            return list(reversed(self.entries))
+
+    def clear(self) -> None:
+        """
+        Method for emptying the slow query log
+        :return: returns nothing
+        """
+        with self._lock:
+            self.entries.clear()
@@ -0,0 +1,69 @@
+"""
+This module provides the JSON response class of the read endpoints, rendering Pydantic models and ObjectIds straight to bytes with orjson,
+and the helpers of the conditional requests (ETag / If-None-Match).
+"""
+from typing import Any, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from utils.tracing import traced
+
+
+def orjson_default(value: Any) -> Any:
+    """
+    Function called by orjson for the values it cannot serialize natively
+    :param value: receives the value to be serialized
+    :return: returns the fields of a Pydantic model (which orjson serializes in turn) or the string of an ObjectId, a TypeError is raised for any other type
+    """
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def etag_values(if_none_match: Optional[str]) -> list[str]:
+    """
+    Function that parses the entity tags listed by an If-None-Match header
+    :param if_none_match: receives the value of the header, e.g. '"a.1", W/"b.2"', or None when the request has none
+    :return: returns the unquoted tags, weak tags included without their W/ prefix (GET uses the weak comparison), and "*" if listed
+    """
+    values = []
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*":
+            values.append(tag)
+        elif len(tag) >= 2 and tag[0] == tag[-1] == '"':
+            values.append(tag[1:-1])
+    return values
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Function that tells whether an If-None-Match header matches the current entity tag of a resource
+    :param if_none_match: receives the value of the header, or None when the request has none
+    :param etag: receives the quoted current entity tag of the resource
+    :return: returns True if the client already holds the current representation and a 304 Not Modified can be answered
+    """
+    values = etag_values(if_none_match)
+    return "*" in values or etag_values(etag)[0] in values
+
+
+class SablonJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Returning it from an endpoint skips the response_model validation and serialization of FastAPI, so the content must already be validated (or trusted)
+    """
+
+    @traced("serialize")
+    def render(self, content: Any) -> bytes:
+        """
+        Method rendering the content of the response
+        :param content: receives the content: dictionaries, lists, Pydantic models and ObjectIds, nested in any way
+        :return: returns the JSON bytes of the content
+        """
+        return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,244 @@
+"""
+This module provides the production launcher of the application: a supervisor process binding the listening socket once
+and running the worker processes that share it, each one a uvicorn server.
+
+The workers are spawned rather than forked, so each one imports the application and creates its own Mongo client in
+its lifespan, and no client, thread or lock of the supervisor leaks into them. The supervisor replaces a worker that
+dies, stops the workers gracefully on SIGINT/SIGTERM and restarts them one at a time on SIGHUP: a new worker is started
+and serving before an old one is stopped, so a rolling restart drops no connection.
+"""
+import importlib.util
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from typing import Callable, Optional
+
+import uvicorn
+
+_spawn = multiprocessing.get_context("spawn")
+
+
+def server_config(app: str, settings: dict, **kwargs) -> uvicorn.Config:
+    """
+    Function that builds the uvicorn configuration of the workers from the server settings
+    :param app: receives the import string of the application, e.g. "sablon_api:app"
+    :param settings: receives the server settings, see utils.settings.server_settings
+    :param kwargs: receives the other options of uvicorn.Config, e.g. factory=True
+    :return: returns the configuration, the socket is bound by the supervisor
+    """
+    return uvicorn.Config(app, host=settings["host"], port=settings["port"], backlog=settings["backlog"],
+                          timeout_keep_alive=settings["keep_alive"],
+                          timeout_graceful_shutdown=settings["graceful_timeout"], loop=settings["loop"],
+                          http=settings["http"], **kwargs)
+
+
+def resolved_implementations(config: uvicorn.Config) -> tuple[str, str]:
+    """
+    Function that tells the event loop and HTTP parser the workers will use, "auto" picking uvloop and httptools when installed
+    :param config: receives the uvicorn configuration
+    :return: returns the name of the event loop and of the HTTP parser
+    """
+    loop = config.loop if config.loop != "auto" else \
+        "uvloop" if importlib.util.find_spec("uvloop") is not None else "asyncio"
+    http = config.http if config.http != "auto" else \
+        "httptools" if importlib.util.find_spec("httptools") is not None else "h11"
+    return loop, http
+
+
+class _WorkerServer(uvicorn.Server):
+    """
+    uvicorn server telling the supervisor when it is ready to serve, once the lifespan of the application is done.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if self.started:
+            self.ready.set()
+
+
+def _run_worker(config: uvicorn.Config, sockets: list, ready) -> None:
+    """
+    Entry point of a worker process: serves the application on the sockets of the supervisor until SIGTERM
+    """
+    config.configure_logging()
+    _WorkerServer(config, ready).run(sockets=sockets)
+
+
+class _Worker:
+    """
+    Worker process of the supervisor, with the event it sets once it serves.
+    """
+
+    def __init__(self, config: uvicorn.Config, sockets: list):
+        self.ready = _spawn.Event()
+        self.process = _spawn.Process(target=_run_worker, args=(config, sockets, self.ready), daemon=False)
+        self.process.start()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+
+class ServerSupervisor:
+    """
+    Supervisor of the worker processes of the production server.
+
+    It binds the socket, starts the workers and waits for all of them to serve, then watches them until SIGINT or
+    SIGTERM. A worker that dies after it started serving is replaced, a worker that dies before is reported as a
+    failed startup and stops the server, so that a broken application does not respawn forever.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, startup_timeout: float = 60.0,
+                 on_worker_exit: Optional[Callable[[int], None]] = None):
+        """
+        Initializing the ServerSupervisor class
+        :param config: receives the uvicorn configuration of the workers, see server_config
+        :param workers: receives the number of worker processes
+        :param startup_timeout: receives the number of seconds a worker has to be ready, its lifespan included
+        :param on_worker_exit: receives the function called with the process id of every worker that exited, e.g. mark_worker_dead
+        """
+        if workers < 1:
+            raise ValueError("Error! The server needs at least 1 worker")
+        self.config = config
+        self.workers = workers
+        self.startup_timeout = startup_timeout
+        self.on_worker_exit = on_worker_exit
+        self.processes = []
+        self._stopping = False
+        self._restarting = False
+        self._wake = threading.Event()
+
+    def run(self) -> int:
+        """
+        Method running the server until it is stopped, installing the signal handlers of the supervisor
+        :return: returns the exit code, 0 after a graceful stop and 1 when the workers failed to start
+        """
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_restart)
+        sockets = [self.config.bind_socket()]
+        loop, http = resolved_implementations(self.config)
+        print(f"Supervisor [{os.getpid()}] serving on {self.config.host}:{self.config.port} with {self.workers} workers "
+              f"({loop}, {http})")
+        try:
+            if not self._start_workers(sockets, self.workers):
+                return 1
+            while not self._stopping:
+                self._wake.wait(0.5)
+                self._wake.clear()
+                if self._restarting and not self._stopping:
+                    self._restarting = False
+                    self._rolling_restart(sockets)
+                if not self._replace_dead_workers(sockets):
+                    return 1
+            return 0
+        finally:
+            for worker in self.processes:
+                worker.process.terminate()
+            for worker in self.processes:
+                self._join(worker)
+            self.processes = []
+            for sock in sockets:
+                sock.close()
+            print(f"Supervisor [{os.getpid()}] stopped")
+
+    def stop(self) -> None:
+        """
+        Method asking the supervisor to stop the workers gracefully and return from run
+        :return: returns nothing
+        """
+        self._stopping = True
+        self._wake.set()
+
+    def restart(self) -> None:
+        """
+        Method asking the supervisor for a rolling restart of the workers
+        :return: returns nothing
+        """
+        self._restarting = True
+        self._wake.set()
+
+    def _handle_stop(self, signum, frame) -> None:  # pylint: disable=unused-argument
+        self.stop()
+
+    def _handle_restart(self, signum, frame) -> None:  # pylint: disable=unused-argument
+        self.restart()
+
+    def _start_workers(self, sockets: list, count: int) -> list[_Worker]:
+        """
+        Starts workers and waits for them to be ready, returns them or an empty list when one of them failed to start
+        """
+        workers = [_Worker(self.config, sockets) for _ in range(count)]
+        self.processes.extend(workers)
+        deadline = time.monotonic() + self.startup_timeout
+        for worker in workers:
+            while not worker.ready.wait(0.1):
+                if self._stopping or not worker.process.is_alive() or time.monotonic() > deadline:
+                    if not self._stopping:
+                        print(f"Worker [{worker.pid}] failed to start (exit code {worker.process.exitcode})")
+                    for started in workers:
+                        self._stop_worker(started)
+                    return []
+        return workers
+
+    def _rolling_restart(self, sockets: list) -> None:
+        """
+        Replaces the workers one at a time, stopping an old worker only once its replacement serves
+        """
+        print(f"Supervisor [{os.getpid()}] rolling restart of {len(self.processes)} workers")
+        for old in list(self.processes):
+            if self._stopping:
+                return
+            if not self._start_workers(sockets, 1):
+                print("Rolling restart aborted, the previous workers keep serving")
+                return
+            self._stop_worker(old)
+        print(f"Supervisor [{os.getpid()}] rolling restart done")
+
+    def _replace_dead_workers(self, sockets: list) -> bool:
+        """
+        Replaces the workers that died, returns False when a replacement failed to start
+        """
+        for worker in list(self.processes):
+            if worker.process.is_alive():
+                continue
+            self.processes.remove(worker)
+            self._exited(worker)
+            print(f"Worker [{worker.pid}] died (exit code {worker.process.exitcode}), starting a new one")
+            if not self._stopping and not self._start_workers(sockets, 1):
+                return False
+        return True
+
+    def _stop_worker(self, worker: _Worker) -> None:
+        """
+        Stops a worker gracefully, it finishes its requests within the graceful timeout
+        """
+        if worker in self.processes:
+            self.processes.remove(worker)
+        worker.process.terminate()
+        self._join(worker)
+
+    def _join(self, worker: _Worker) -> None:
+        """
+        Waits for a stopping worker, and kills it once the graceful timeout is over
+        """
+        worker.process.join((self.config.timeout_graceful_shutdown or 30) + 5)
+        if worker.process.is_alive():
+            print(f"Worker [{worker.pid}] did not stop in time, killing it")
+            worker.process.kill()
+            worker.process.join()
+        self._exited(worker)
+
+    def _exited(self, worker: _Worker) -> None:
+        """
+        Reports an exited worker to on_worker_exit
+        """
+        if self.on_worker_exit is not None:
+            self.on_worker_exit(worker.pid)
@@ -0,0 +1,301 @@
+"""
+This module reads the settings of the Mongo connection and of the startup of the application from environment variables, so that every worker process uses the same options.
+
+Environment variables:
+    SABLON_MONGO_HOST: the host of the Mongo server, "localhost" by default. A "mongodb://" connection string is accepted as well
+    SABLON_MONGO_PORT: the port of the Mongo server, 27017 by default
+    SABLON_MONGO_MAX_POOL_SIZE: the maximum number of connections of the pool, 100 by default
+    SABLON_MONGO_MIN_POOL_SIZE: the number of connections kept open (and opened at startup), 10 by default
+    SABLON_MONGO_MAX_IDLE_TIME_MS: the number of milliseconds an idle connection stays in the pool, 300000 by default
+    SABLON_MONGO_CONNECT_TIMEOUT_MS: the number of milliseconds allowed to open a connection, 10000 by default
+    SABLON_MONGO_SERVER_SELECTION_TIMEOUT_MS: the number of milliseconds an operation waits for a reachable server, 10000 by default
+    SABLON_MONGO_COMPRESSORS: the comma separated wire compressors to negotiate ("zstd", "snappy", "zlib"), none by default
+    SABLON_SLOW_QUERY_MS: the duration, in milliseconds, from which a query is recorded in the slow query log, 100 by default
+    SABLON_SLOW_QUERY_LOG_SIZE: the number of slow queries kept in the log, 200 by default
+    SABLON_COLLSCAN_STRICT: whether queries planned as a collection scan are rejected ("1"/"0", "true"/"false"), false by default
+    SABLON_COLLSCAN_MAX_DOCUMENTS: the number of documents from which the strict mode rejects a collection scan, 10000 by default
+    SABLON_TRUSTED_READS: whether the documents read from Mongo are returned without validation ("1"/"0", "true"/"false"), false by default
+    SABLON_RECONCILE_INDEXES: whether the declared indexes are reconciled at startup ("1"/"0", "true"/"false"), true by default
+    SABLON_COMPRESSION: whether responses are compressed for the clients that accept it ("1"/"0", "true"/"false"), true by default
+    SABLON_COMPRESSION_MIN_SIZE: the size, in bytes, from which a response body is compressed, 1024 by default
+    SABLON_COMPRESSION_ENCODINGS: the comma separated encodings offered, by order of preference ("zstd", "br", "gzip"), "zstd,br,gzip" by default
+    SABLON_GZIP_LEVEL: the gzip compression level, from 1 to 9, 6 by default
+    SABLON_BROTLI_QUALITY: the brotli quality, from 0 to 11, 4 by default
+    SABLON_ZSTD_LEVEL: the zstd compression level, from 1 to 22, 3 by default
+    SABLON_METRICS: whether the requests are measured and the /metrics endpoint is served ("1"/"0", "true"/"false"), true by default
+    SABLON_SERVER_TIMING: whether the responses carry the Server-Timing header of their trace ("1"/"0", "true"/"false"), true by default
+    SABLON_TRACE_FILE: the file the traces of the requests are appended to, as OpenTelemetry protocol JSON lines, none by default
+    SABLON_INSERT_COALESCING: whether the concurrent single inserts are coalesced into insert_many calls ("1"/"0", "true"/"false"), false by default
+    SABLON_INSERT_BATCH_SIZE: the number of coalesced inserts from which a batch is written without waiting, 100 by default
+    SABLON_INSERT_MAX_DELAY_MS: the number of milliseconds a coalesced insert waits for others at most, 2 by default
+    SABLON_ADMIN_TOKEN: the token the admin-gated features (the on-demand profiler, the slow query log) require in the X-Sablon-Admin-Token header, none by default (disabled)
+    SABLON_PROFILE_SAMPLE_RATE: the share of the requests profiled and saved continuously, from 0 to 1, 0 by default
+    SABLON_PROFILER: the profiler, "sampling" (pyinstrument) or "deterministic" (cProfile), "sampling" by default when pyinstrument is installed
+    SABLON_PROFILE_DIR: the directory the saved profiles are written to, "profiles" by default
+    SABLON_PROFILE_KEEP: the number of saved profiles kept, the oldest ones are deleted beyond it, 100 by default
+    SABLON_WARMUP: whether a worker warms up (model schemas, document and query caches) before it reports ready on /readyz ("1"/"0", "true"/"false"), true by default
+    SABLON_WARMUP_DOCUMENTS: the number of most recent documents preloaded in the document cache at startup, 0 by default
+    SABLON_WARMUP_QUERIES: the JSON file of the queries whose results are preloaded in the query cache at startup, a list of {"query": {...}, "fields": "..."} objects, none by default
+    SABLON_CONFIG: the JSON file holding the settings of the production server, "config.json" by default (optional unless set)
+    SABLON_HOST: the address the production server listens on, overrides "host" of the config file, "0.0.0.0" by default
+    SABLON_PORT: the port the production server listens on, overrides "port" of the config file, 8000 by default
+    SABLON_WORKERS: the number of worker processes, overrides "workers" of the config file, the number of usable CPUs by default
+    SABLON_BACKLOG: the length of the queue of the connections not accepted yet, overrides "backlog" of the config file, 2048 by default
+    SABLON_KEEP_ALIVE: the number of seconds an idle keep-alive connection is kept open, overrides "keep_alive" of the config file, 5 by default
+    SABLON_GRACEFUL_TIMEOUT: the number of seconds a stopping worker has to finish its requests, overrides "graceful_timeout" of the config file, 30 by default
+    SABLON_LOOP: the event loop, "auto" (uvloop when installed), "uvloop" or "asyncio", overrides "loop" of the config file, "auto" by default
+    SABLON_HTTP: the HTTP parser, "auto" (httptools when installed), "httptools" or "h11", overrides "http" of the config file, "auto" by default
+"""
+import json
+import os
+
+SERVER_DEFAULTS = {
+    "host": "0.0.0.0",
+    "port": 8000,
+    "workers": None,
+    "backlog": 2048,
+    "keep_alive": 5,
+    "graceful_timeout": 30,
+    "loop": "auto",
+    "http": "auto",
+}
+SERVER_LOOPS = ("auto", "uvloop", "asyncio")
+SERVER_HTTP = ("auto", "httptools", "h11")
+
+
+def _env_int(name: str, default: int) -> int:
+    """
+    Function that reads an integer environment variable
+    :param name: receives the name of the environment variable
+    :param default: receives the value used when the variable is not set
+    :return: returns the integer value of the variable, a ValueError is raised if it is not an integer
+    """
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError as e:
+        raise ValueError(f"Error! {name} must be an integer, got '{value}'") from e
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """
+    Function that reads a boolean environment variable
+    :param name: receives the name of the environment variable
+    :param default: receives the value used when the variable is not set
+    :return: returns the boolean value of the variable, a ValueError is raised if it is not a boolean
+    """
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    if value.strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.strip().lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Error! {name} must be a boolean, got '{value}'")
+
+
+def _env_float(name: str, default: float) -> float:
+    """
+    Function that reads a floating point environment variable
+    :param name: receives the name of the environment variable
+    :param default: receives the value used when the variable is not set
+    :return: returns the float value of the variable, a ValueError is raised if it is not a number
+    """
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError as e:
+        raise ValueError(f"Error! {name} must be a number, got '{value}'") from e
+
+
+def mongo_client_options() -> dict:
+    """
+    Function that builds the keyword arguments of the pymongo MongoClient (and of the motor AsyncIOMotorClient) from the environment
+    :return: returns the dictionary of the client options
+    """
+    options = {
+        "host": os.environ.get("SABLON_MONGO_HOST", "localhost"),
+        "port": _env_int("SABLON_MONGO_PORT", 27017),
+        "maxPoolSize": _env_int("SABLON_MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _env_int("SABLON_MONGO_MIN_POOL_SIZE", 10),
+        "maxIdleTimeMS": _env_int("SABLON_MONGO_MAX_IDLE_TIME_MS", 300000),
+        "connectTimeoutMS": _env_int("SABLON_MONGO_CONNECT_TIMEOUT_MS", 10000),
+        "serverSelectionTimeoutMS": _env_int("SABLON_MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000),
+    }
+    compressors = os.environ.get("SABLON_MONGO_COMPRESSORS", "").strip()
+    if compressors:
+        options["compressors"] = compressors
+    return options
+
+
+def reconcile_indexes_on_startup() -> bool:
+    """
+    Function that tells whether the application reconciles the declared indexes when it starts
+    :return: returns the value of SABLON_RECONCILE_INDEXES, True by default
+    """
+    return _env_bool("SABLON_RECONCILE_INDEXES", True)
+
+
+def query_guard_settings() -> dict:
+    """
+    Function that reads the settings of the slow query log and of the collection scan guard
+    :return: returns the slow query threshold (slow_query_ms), the size of the log (slow_query_log_size), the strict mode flag (collscan_strict) and the collection size from which it applies (collscan_max_documents)
+    """
+    return {
+        "slow_query_ms": _env_int("SABLON_SLOW_QUERY_MS", 100),
+        "slow_query_log_size": _env_int("SABLON_SLOW_QUERY_LOG_SIZE", 200),
+        "collscan_strict": _env_bool("SABLON_COLLSCAN_STRICT", False),
+        "collscan_max_documents": _env_int("SABLON_COLLSCAN_MAX_DOCUMENTS", 10000),
+    }
+
+
+def trusted_reads() -> bool:
+    """
+    Function that tells whether the read path trusts the stored documents, returning them without validating them
+    :return: returns the value of SABLON_TRUSTED_READS, False by default
+    """
+    return _env_bool("SABLON_TRUSTED_READS", False)
+
+
+def compression_settings() -> dict:
+    """
+    Function that reads the settings of the response compression
+    :return: returns whether compression is enabled (enabled), the size from which a body is compressed (minimum_size), the offered encodings by order of preference (encodings) and the level of every encoding (levels)
+    """
+    encodings = os.environ.get("SABLON_COMPRESSION_ENCODINGS", "zstd,br,gzip")
+    return {
+        "enabled": _env_bool("SABLON_COMPRESSION", True),
+        "minimum_size": _env_int("SABLON_COMPRESSION_MIN_SIZE", 1024),
+        "encodings": [encoding.strip().lower() for encoding in encodings.split(",") if encoding.strip()],
+        "levels": {
+            "gzip": _env_int("SABLON_GZIP_LEVEL", 6),
+            "br": _env_int("SABLON_BROTLI_QUALITY", 4),
+            "zstd": _env_int("SABLON_ZSTD_LEVEL", 3),
+        },
+    }
+
+
+def metrics_enabled() -> bool:
+    """
+    Function that tells whether the application measures its requests and serves the Prometheus /metrics endpoint
+    :return: returns the value of SABLON_METRICS, True by default
+    """
+    return _env_bool("SABLON_METRICS", True)
+
+
+def tracing_settings() -> dict:
+    """
+    Function that reads the settings of the per-request trace spans
+    :return: returns whether the Server-Timing header is sent (server_timing) and the file the traces are exported to (trace_file), None to export nothing
+    """
+    return {
+        "server_timing": _env_bool("SABLON_SERVER_TIMING", True),
+        "trace_file": os.environ.get("SABLON_TRACE_FILE", "").strip() or None,
+    }
+
+
+def admin_token() -> str | None:
+    """
+    Function that reads the token of the admin-gated features
+    :return: returns the value of SABLON_ADMIN_TOKEN, None when it is not set and the admin features are disabled
+    """
+    return os.environ.get("SABLON_ADMIN_TOKEN", "").strip() or None
+
+
+def profiling_settings() -> dict:
+    """
+    Function that reads the settings of the request profiler
+    :return: returns the admin token of the on-demand profiles (admin_token, None when disabled), the share of the requests profiled continuously (sample_rate), the profiler (profiler, None for the default one), the directory of the saved profiles (directory) and the number of profiles kept (keep)
+    """
+    sample_rate = _env_float("SABLON_PROFILE_SAMPLE_RATE", 0.0)
+    if not 0 <= sample_rate <= 1:
+        raise ValueError(f"Error! SABLON_PROFILE_SAMPLE_RATE must be between 0 and 1, got '{sample_rate}'")
+    return {
+        "admin_token": admin_token(),
+        "sample_rate": sample_rate,
+        "profiler": os.environ.get("SABLON_PROFILER", "").strip().lower() or None,
+        "directory": os.environ.get("SABLON_PROFILE_DIR", "profiles"),
+        "keep": _env_int("SABLON_PROFILE_KEEP", 100),
+    }
+
+
+def insert_coalescing_settings() -> dict:
+    """
+    Function that reads the settings of the insert coalescer
+    :return: returns whether the single inserts are coalesced (enabled), the batch size from which a batch is written right away (max_batch) and the longest wait of an insert in seconds (max_delay)
+    """
+    return {
+        "enabled": _env_bool("SABLON_INSERT_COALESCING", False),
+        "max_batch": _env_int("SABLON_INSERT_BATCH_SIZE", 100),
+        "max_delay": _env_float("SABLON_INSERT_MAX_DELAY_MS", 2.0) / 1000,
+    }
+
+
+def warmup_settings() -> dict:
+    """
+    Function that reads the settings of the warm-up a worker runs before it reports ready
+    :return: returns whether the warm-up runs (enabled), the number of most recent documents preloaded in the document cache (documents) and the queries preloaded in the query cache (queries), a ValueError is raised if one is invalid
+    """
+    documents = _env_int("SABLON_WARMUP_DOCUMENTS", 0)
+    if documents < 0:
+        raise ValueError(f"Error! SABLON_WARMUP_DOCUMENTS must be a positive integer, got '{documents}'")
+    path = os.environ.get("SABLON_WARMUP_QUERIES", "").strip()
+    queries = []
+    if path:
+        try:
+            with open(path, encoding="utf-8") as file:
+                queries = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Error! Cannot read the warm-up queries file '{path}': {e}") from e
+        if not isinstance(queries, list) or not all(isinstance(query, dict) and isinstance(query.get("query"), dict)
+                                                    for query in queries):
+            raise ValueError(f"Error! The warm-up queries file '{path}' must hold a list of {{\"query\": {{...}}}} objects")
+    return {"enabled": _env_bool("SABLON_WARMUP", True), "documents": documents, "queries": queries}
+
+
+def usable_cpus() -> int:
+    """
+    Function that counts the CPUs the process may run on, which is lower than the CPUs of the host in a restricted container
+    :return: returns the number of usable CPUs, at least 1
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def server_settings() -> dict:
+    """
+    Function that reads the settings of the production server from the config file, then from the environment variables which override it
+    :return: returns the host, port, number of workers, backlog, keep-alive timeout, graceful shutdown timeout, event loop and HTTP parser of the server, a ValueError is raised if one is invalid
+    """
+    path = os.environ.get("SABLON_CONFIG", "").strip()
+    settings = dict(SERVER_DEFAULTS)
+    if path or os.path.exists("config.json"):
+        try:
+            with open(path or "config.json", encoding="utf-8") as file:
+                config = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Error! Cannot read the config file '{path or 'config.json'}': {e}") from e
+        unknown = set(config) - set(SERVER_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Error! Unknown settings {sorted(unknown)} in the config file, expected {list(SERVER_DEFAULTS)}")
+        settings.update(config)
+
+    settings["host"] = os.environ.get("SABLON_HOST", "").strip() or settings["host"]
+    settings["loop"] = (os.environ.get("SABLON_LOOP", "").strip() or settings["loop"]).lower()
+    settings["http"] = (os.environ.get("SABLON_HTTP", "").strip() or settings["http"]).lower()
+    for name in ("port", "workers", "backlog", "keep_alive", "graceful_timeout"):
+        settings[name] = _env_int(f"SABLON_{name.upper()}", settings[name])
+        if settings[name] is not None and (not isinstance(settings[name], int) or settings[name] < 0):
+            raise ValueError(f"Error! The server setting '{name}' must be a positive integer, got '{settings[name]}'")
+    if not settings["workers"]:
+        settings["workers"] = usable_cpus()
+    if settings["loop"] not in SERVER_LOOPS:
+        raise ValueError(f"Error! Unknown event loop '{settings['loop']}', expected {list(SERVER_LOOPS)}")
+    if settings["http"] not in SERVER_HTTP:
+        raise ValueError(f"Error! Unknown HTTP parser '{settings['http']}', expected {list(SERVER_HTTP)}")
+    return settings
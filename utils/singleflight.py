@@ -0,0 +1,141 @@
+"""
+This module provides the single-flight deduplication of the reads: the concurrent callers of a read with the same key
+share one call to the database, the first caller runs it and the others wait for its result.
+
+SingleFlight serves the threads of the sync store, AsyncSingleFlight the coroutines of the async store. Their stats
+follow the shape of the cache stats: a hit is a caller served by the call of another one, a miss a call that was run.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class _Call:
+    """
+    Call in flight of a SingleFlight, holding its outcome once it is done.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread safe single-flight group of blocking calls.
+
+    The key of a call must name everything its result depends on. Callers that read a cache should put its generation
+    in the key, so that a read started after a write never shares a call started before it.
+    """
+
+    def __init__(self):
+        """
+        Initializing the SingleFlight class
+        """
+        self.hits = 0
+        self.misses = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Method running a call, or waiting for the call with the same key already in flight
+        :param key: receives the key of the call
+        :param function: receives the function run by the first caller
+        :param args: receives the arguments of the function
+        :return: returns the result of the function, shared by every caller. The exception it raised is raised to every caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        """
+        Method for reading the counters of the group
+        :return: returns the number of calls in flight, the shared and run calls and the share of the callers served by another call
+        """
+        with self._lock:
+            calls = self.hits + self.misses
+            return {
+                "size": len(self._calls),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / calls, 4) if calls else 0.0,
+            }
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight group of coroutines, used from the event loop only.
+
+    The call runs as a task of its own, so a caller whose request is cancelled does not cancel it for the others. The key
+    follows the same rules as the keys of SingleFlight.
+    """
+
+    def __init__(self):
+        """
+        Initializing the AsyncSingleFlight class
+        """
+        self.hits = 0
+        self.misses = 0
+        self._calls = {}
+
+    async def do(self, key: Hashable, function: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Method running a call, or waiting for the call with the same key already in flight
+        :param key: receives the key of the call
+        :param function: receives the coroutine function run by the first caller
+        :param args: receives the arguments of the function
+        :return: returns the result of the function, shared by every caller. The exception it raised is raised to every caller
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(function(*args))
+            task.add_done_callback(lambda done: self._done(key, done))
+            self.misses += 1
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        """
+        Forgets a finished call, and retrieves its exception in case every caller was cancelled meanwhile
+        """
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """
+        Method for reading the counters of the group
+        :return: returns the number of calls in flight, the shared and run calls and the share of the callers served by another call
+        """
+        calls = self.hits + self.misses
+        return {
+            "size": len(self._calls),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / calls, 4) if calls else 0.0,
+        }
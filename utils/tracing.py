@@ -0,0 +1,449 @@
+"""
+This module provides the per-request trace spans of the application: an ASGI middleware opening the trace of every
+request and answering its timing breakdown in a Server-Timing header, decorators opening a span around every method of
+a layer (service, store) or a single function, a pymongo command listener adding a span per Mongo round trip, and an
+exporter appending the traces to a file in the OpenTelemetry protocol JSON encoding.
+
+The trace of the current request lives in a context variable, it follows the request into the worker threads of the
+sync endpoints. Outside of a request, opening a span is a single context variable lookup.
+
+The Server-Timing header reports the self time of every layer, the time spent in its spans minus the time spent in
+their child spans, so that e.g. "service" is the validation and logic of the service without the store calls it made:
+
+    Server-Timing: app;dur=0.41, service;dur=2.03, store;dur=0.12, mongo;dur=5.77, serialize;dur=0.35, total;dur=8.68
+"""
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# The order of the layers in the Server-Timing header
+LAYERS = ("app", "validate", "service", "store", "mongo", "serialize")
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("sablon_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("sablon_span", default=None)
+
+
+class Span:
+    """
+    One timed operation of a trace, nested in the span that was current when it started.
+    """
+
+    __slots__ = ("name", "layer", "span_id", "parent", "kind", "start", "end", "children", "attributes", "error")
+
+    def __init__(self, name: str, layer: str, parent: Optional["Span"], kind: int = SPAN_KIND_INTERNAL,
+                 start: Optional[float] = None):
+        """
+        Initializing the Span class
+        :param name: receives the name of the span, e.g. "store.get_all_documents"
+        :param layer: receives the layer the self time of the span is reported under in Server-Timing
+        :param parent: receives the span the new span is nested in, None for the root span of the request
+        :param kind: receives the OpenTelemetry span kind
+        :param start: receives the perf_counter start of the span, now when None
+        """
+        self.name = name
+        self.layer = layer
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent = parent
+        self.kind = kind
+        self.start = time.perf_counter() if start is None else start
+        self.end = None
+        self.children = 0.0
+        self.attributes = {}
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        """
+        Property returning the duration of the span in seconds, up to now while it is not finished
+        """
+        return (time.perf_counter() if self.end is None else self.end) - self.start
+
+    def finish(self, end: Optional[float] = None) -> None:
+        """
+        Method ending the span and adding its duration to the child time of its parent
+        :param end: receives the perf_counter end of the span, now when None
+        :return: returns nothing
+        """
+        self.end = time.perf_counter() if end is None else end
+        if self.parent is not None:
+            self.parent.children += self.end - self.start
+
+
+class Trace:
+    """
+    The spans of one request, with the wall clock time of its start to place them in time when exported.
+    """
+
+    def __init__(self, trace_id: Optional[str] = None, parent_span_id: Optional[str] = None):
+        """
+        Initializing the Trace class
+        :param trace_id: receives the 32 hex digits trace id propagated by the caller, a new one when None
+        :param parent_span_id: receives the 16 hex digits id of the span of the caller, None when there is none
+        """
+        self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+        self.parent_span_id = parent_span_id
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def unix_nanos(self, perf: float) -> int:
+        """
+        Method converting a perf_counter time of the request to Unix nanoseconds
+        :param perf: receives the perf_counter time
+        :return: returns the Unix time in nanoseconds
+        """
+        return self.start_ns + int((perf - self.start) * 1e9)
+
+
+def parse_traceparent(value: Optional[str]) -> tuple[Optional[str], Optional[str]]:
+    """
+    Function that reads the trace id and the parent span id of a W3C traceparent header
+    :param value: receives the value of the header, e.g. "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    :return: returns the trace id and the parent span id, (None, None) if the header is missing or invalid
+    """
+    parts = (value or "").strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        if int(parts[1], 16) == 0 or int(parts[2], 16) == 0:
+            return None, None
+    except ValueError:
+        return None, None
+    return parts[1].lower(), parts[2].lower()
+
+
+def start_span(name: str, layer: str, kind: int = SPAN_KIND_INTERNAL) -> Optional[tuple]:
+    """
+    Function that opens a span nested in the current one and makes it current
+    :param name: receives the name of the span
+    :param layer: receives the layer of the span
+    :param kind: receives the OpenTelemetry span kind
+    :return: returns the handle to pass to end_span, None outside of a traced request
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    span = Span(name, layer, _current_span.get(), kind)
+    return trace, span, _current_span.set(span)
+
+
+def end_span(handle: Optional[tuple], error: Optional[BaseException] = None) -> None:
+    """
+    Function that closes a span opened by start_span and makes its parent current again
+    :param handle: receives the handle returned by start_span
+    :param error: receives the exception raised in the span, None if it succeeded
+    :return: returns nothing
+    """
+    if handle is None:
+        return
+    trace, span, token = handle
+    span.finish()
+    if error is not None:
+        span.error = str(error)
+    _current_span.reset(token)
+    trace.spans.append(span)
+
+
+def traced(layer: str, name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """
+    Decorator opening a span around every call of a function or coroutine function
+    :param layer: receives the layer of the spans
+    :param name: receives the name of the spans, "<layer>.<function name>" when None
+    :return: returns the decorator
+    """
+    def decorate(function: Callable) -> Callable:
+        span_name = name or f"{layer}.{function.__name__}"
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def traced_coroutine(*args, **kwargs):
+                handle = start_span(span_name, layer)
+                try:
+                    result = await function(*args, **kwargs)
+                except Exception as e:
+                    end_span(handle, e)
+                    raise
+                end_span(handle)
+                return result
+            return traced_coroutine
+
+        @functools.wraps(function)
+        def traced_function(*args, **kwargs):
+            handle = start_span(span_name, layer)
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                end_span(handle, e)
+                raise
+            end_span(handle)
+            return result
+        return traced_function
+    return decorate
+
+
+def trace_methods(layer: str) -> Callable[[type], type]:
+    """
+    Class decorator opening a span around every public method of a class, so that a whole layer is traced without
+    changing its methods
+    :param layer: receives the layer of the spans, e.g. "service" or "store"
+    :return: returns the decorator, which replaces the public methods of the class in place
+    """
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.isfunction(method):
+                setattr(cls, name, traced(layer)(method))
+        return cls
+    return decorate
+
+
+def server_timing(trace: Trace, now: Optional[float] = None) -> str:
+    """
+    Function that builds the Server-Timing header of a trace from the self time of its layers
+    :param trace: receives the trace of the request, the root span included
+    :param now: receives the perf_counter time the header is built at, now when None
+    :return: returns the value of the header, the self time of every layer then the total, in milliseconds
+    """
+    now = time.perf_counter() if now is None else now
+    layers = dict.fromkeys(LAYERS, 0.0)
+    for span in trace.spans:
+        end = now if span.end is None else span.end
+        layers[span.layer] = layers.get(span.layer, 0.0) + (end - span.start) - span.children
+    metrics = [f"{layer};dur={duration * 1000:.2f}" for layer, duration in layers.items() if duration > 0]
+    metrics.append(f"total;dur={(now - trace.start) * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+class TraceCommandListener(monitoring.CommandListener):
+    """
+    pymongo command listener adding a span per Mongo round trip to the trace of the current request.
+
+    pymongo reports the events on the thread running the command, which is the thread of the request for the sync
+    store. motor runs the commands on its own threads, out of the context of the request, so the async store is traced
+    down to its methods only.
+    """
+
+    def __init__(self):
+        """
+        Initializing the TraceCommandListener class
+        """
+        self._pending = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        """
+        Method called by pymongo when a command starts, remembering the current span of the request
+        :param event: receives the pymongo CommandStartedEvent
+        :return: returns nothing
+        """
+        trace = _current_trace.get()
+        if trace is not None:
+            self._pending[(event.connection_id, event.request_id)] = (trace, _current_span.get())
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        """
+        Method called by pymongo when a command succeeds, adding its span
+        :param event: receives the pymongo CommandSucceededEvent
+        :return: returns nothing
+        """
+        self._finish(event, None)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        """
+        Method called by pymongo when a command fails, adding its span with the failure
+        :param event: receives the pymongo CommandFailedEvent
+        :return: returns nothing
+        """
+        self._finish(event, str(event.failure))
+
+    def _finish(self, event: monitoring.CommandSucceededEvent | monitoring.CommandFailedEvent,
+                error: Optional[str]) -> None:
+        """
+        Adds the span of a finished command started in a traced request, timed by the duration pymongo measured
+        """
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        trace, parent = pending
+        end = time.perf_counter()
+        span = Span(f"mongo.{event.command_name}", "mongo", parent, SPAN_KIND_CLIENT,
+                    start=end - event.duration_micros / 1e6)
+        span.attributes = {"db.system": "mongodb", "db.operation": event.command_name}
+        span.error = error
+        span.finish(end)
+        trace.spans.append(span)
+
+
+TRACE_LISTENER = TraceCommandListener()
+
+
+def otlp_trace(trace: Trace, service_name: str = "sablon") -> dict:
+    """
+    Function that encodes a trace in the OpenTelemetry protocol JSON encoding (an ExportTraceServiceRequest)
+    :param trace: receives the finished trace
+    :param service_name: receives the value of the service.name resource attribute
+    :return: returns the dictionary of the request, one resource with one scope holding the spans
+    """
+    spans = []
+    for span in trace.spans:
+        parent_id = span.parent.span_id if span.parent is not None else trace.parent_span_id
+        encoded = {
+            "traceId": trace.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(trace.unix_nanos(span.start)),
+            "endTimeUnixNano": str(trace.unix_nanos(span.end if span.end is not None else span.start)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error is not None else {},
+        }
+        if parent_id is not None:
+            encoded["parentSpanId"] = parent_id
+        spans.append(encoded)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{"scope": {"name": "sablon.tracing"}, "spans": spans}],
+    }]}
+
+
+def _otlp_value(value: Any) -> dict:
+    """
+    Encodes an attribute value as an OpenTelemetry AnyValue
+    """
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class SpanFileExporter:
+    """
+    Exporter appending every trace to a file as one OTLP JSON line, from a background thread so that the requests do
+    not wait on the disk. The lines can be replayed to an OpenTelemetry collector (otlpjsonfile receiver).
+    """
+
+    def __init__(self, path: str, service_name: str = "sablon"):
+        """
+        Initializing the SpanFileExporter class
+        :param path: receives the path of the file the traces are appended to
+        :param service_name: receives the value of the service.name resource attribute
+        """
+        self.path = path
+        self.service_name = service_name
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write, name="sablon-span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace) -> None:
+        """
+        Method queuing a finished trace for writing
+        :param trace: receives the trace
+        :return: returns nothing
+        """
+        self._queue.put(trace)
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """
+        Method waiting until the traces queued so far are written
+        :param timeout: receives the maximum number of seconds to wait
+        :return: returns nothing
+        """
+        written = threading.Event()
+        self._queue.put(written)
+        written.wait(timeout)
+
+    def _write(self) -> None:
+        """
+        Writes the queued traces, run by the background thread
+        """
+        with open(self.path, "a", encoding="utf-8") as file:
+            while True:
+                item = self._queue.get()
+                if isinstance(item, threading.Event):
+                    file.flush()
+                    item.set()
+                    continue
+                try:
+                    file.write(json.dumps(otlp_trace(item, self.service_name), separators=(",", ":")) + "\n")
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.warning("Span export failed: %s", e)
+                if self._queue.empty():
+                    file.flush()
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the trace of every request, answering its timing breakdown in a Server-Timing header and
+    handing the finished trace to the exporter.
+
+    The header is sent with the start of the response, so the spans of a streamed body (the NDJSON reads) are only
+    found in the exported trace.
+    """
+
+    def __init__(self, app: Callable, server_timing_header: bool = True, exporter: Optional[SpanFileExporter] = None):
+        """
+        Initializing the TracingMiddleware class
+        :param app: receives the wrapped ASGI application
+        :param server_timing_header: receives whether the Server-Timing header is added to the responses
+        :param exporter: receives the exporter of the finished traces, None to export nothing
+        """
+        self.app = app
+        self.server_timing_header = server_timing_header
+        self.exporter = exporter
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        """
+        Method called by the ASGI server for every connection
+        :param scope: receives the connection scope
+        :param receive: receives the function reading the messages of the client
+        :param send: receives the function sending the messages of the response
+        :return: returns nothing
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        trace = Trace(*parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1")))
+        root = Span(f"{scope['method']} {scope['path']}", "app", None, SPAN_KIND_SERVER, start=trace.start)
+        root.attributes = {"http.request.method": scope["method"], "url.path": scope["path"]}
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        trace.spans.append(root)
+
+        async def send_with_timing(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                root.attributes["http.response.status_code"] = message["status"]
+                if self.server_timing_header:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"server-timing", server_timing(trace).encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception as e:
+            root.error = str(e)
+            raise
+        finally:
+            root.finish()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            route = getattr(scope.get("route"), "path", None)
+            if route is not None:
+                root.name = f"{scope['method']} {route}"
+                root.attributes["http.route"] = route
+            if self.exporter is not None:
+                self.exporter.export(trace)